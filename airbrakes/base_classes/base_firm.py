@@ -37,6 +37,16 @@ class BaseFIRM(ABC):
     def start(self) -> None:
         """Starts the FIRM client for fetching data packets."""
 
+    def wait_until_started(self, timeout: float | None = None) -> bool:  # noqa: ARG002
+        """
+        Blocks until FIRM has started fetching data packets. FIRMs which fetch them in a thread
+        of their own override this, and the others have started as soon as `start` returns.
+
+        :param timeout: The longest to wait in seconds, or None to wait for as long as it takes.
+        :return: True if FIRM started in time, False otherwise.
+        """
+        return self.requested_to_run
+
     @abstractmethod
     def stop(self) -> None:
         """Stops the FIRM client for fetching data packets."""
@@ -54,6 +54,16 @@ class BaseServo(ABC):
         :return: The commanded servo extension.
         """
 
+    @property
+    @abstractmethod
+    def command_issued_ns(self) -> int:
+        """
+        Gets when the PWM signal was last changed, to measure how long the servo took to be told
+        to move.
+
+        :return: The time from `time.perf_counter_ns`, or 0 if it hasn't been changed yet.
+        """
+
     @property
     @abstractmethod
     def battery_volts(self) -> float:
@@ -1,6 +1,6 @@
 """Contains the constants used in the Airbrakes module."""
 
-from enum import Enum, StrEnum
+from enum import Enum, IntEnum, StrEnum
 from pathlib import Path
 
 from airbrakes.utils import convert_ft_to_m, convert_lbs_to_kg
@@ -9,8 +9,89 @@ from airbrakes.utils import convert_ft_to_m, convert_lbs_to_kg
 # Main Configuration
 # -------------------------------------------------------
 
-BUSY_WAIT_SECONDS = 0.1
-"""The amount of time to sleep while busy waiting in a loop."""
+CATCH_UP_PACKET_BUDGET = 20
+"""
+The most FIRM packets the main loop processes in full in one loop. If the main
+loop stalls, FIRM hands it every packet it held back at once. The data
+processor and the state machine then only run on this many of them, evenly
+spread over the backlog, and the logging thread makes the rows of every
+packet, so the loop after a stall doesn't take much longer than any other.
+Normally the main loop gets a packet or two each loop.
+"""
+
+
+class LoopStage(IntEnum):
+    """
+    The stages of one loop of the main loop, in the order `Context.update`
+    runs them, as timed by the LoopProfiler.
+    """
+
+    FIRM = 0
+    """Getting the packets from FIRM, including waiting for them."""
+    DATA_PROCESSOR = 1
+    """Updating the data processor with the packets."""
+    PROCESSOR_PACKETS = 2
+    """Getting the processed data packets from the data processor."""
+    APOGEE_PREDICTION = 3
+    """Getting the latest apogee prediction from the apogee predictor."""
+    STATE = 4
+    """Updating the state machine, which includes sending data to the apogee predictor."""
+    DATA_PACKETS = 5
+    """Generating the context and servo data packets."""
+    LOGGER = 6
+    """Handing the packets to the logger."""
+
+
+LATENCY_HISTOGRAM_SUB_BUCKETS = 8
+"""How many buckets each power of two of nanoseconds is split into in a
+latency histogram, so a percentile is within 1 / 8 of the real value. Must be
+a power of two."""
+
+LATENCY_HISTOGRAM_BUCKETS = 304
+"""How many buckets a latency histogram has. With 8 buckets per power of two,
+this covers durations up to 2^40 ns, about 18 minutes, and longer ones go in
+the last bucket."""
+
+
+class ThreadRole(StrEnum):
+    """The threads of a flight, which can each be given their own cores."""
+
+    MAIN_LOOP = "Main Loop"
+    """The main thread, which runs `Context.update`."""
+    LOGGER = "Logger"
+    """The thread which writes the log file."""
+    APOGEE_PREDICTOR = "Apogee Predictor"
+    """The thread which predicts the apogee."""
+    DISPLAY = "Display"
+    """The thread which updates the display."""
+
+
+PI_THREAD_CORES: dict[ThreadRole, tuple[int, ...]] = {
+    ThreadRole.MAIN_LOOP: (3,),
+    ThreadRole.APOGEE_PREDICTOR: (2,),
+    ThreadRole.LOGGER: (1,),
+    ThreadRole.DISPLAY: (0,),
+}
+"""Which of the Pi's four cores each thread runs on. The main loop has a core
+to itself, so the logger waiting on the disk and the apogee predictor's
+integration never keep it waiting, and the display shares core 0 with the rest
+of the system."""
+
+THREAD_CORES: dict[str, dict[ThreadRole, tuple[int, ...]]] = {
+    "real": PI_THREAD_CORES,
+    "pretend": PI_THREAD_CORES,
+    "mock": {},
+}
+"""Which cores each thread runs on in each mode, unless run with
+--pin-threads or --no-pin-threads. A mock replay can run on any computer, so
+its threads are left wherever the scheduler puts them."""
+
+THREAD_FIFO_PRIORITIES: dict[ThreadRole, int] = {ThreadRole.MAIN_LOOP: 40}
+"""The SCHED_FIFO priority of the threads which run before anything else on
+their cores as soon as they can. Only pinned threads are given one, as they
+could keep every other thread off a core otherwise. It needs root (or
+CAP_SYS_NICE), and is below the priority of 50 the kernel gives its interrupt
+threads."""
 
 # -------------------------------------------------------
 # Servo Configuration (DS3235 SG)
@@ -137,6 +218,12 @@ BUZZER_PIN = 7
 # Display Configuration
 # -------------------------------------------------------
 
+DISPLAY_WAIT_CHECK_SECONDS = 0.1
+"""
+How long the display waits for the first packets to be processed at a time, before checking if it
+was stopped in the meantime.
+"""
+
 
 class DisplayEndingType(StrEnum):
     """Enum that represents the different ways the display can end."""
@@ -179,9 +266,137 @@ This is to prevent log file sizes from growing too large. Some of our
 LOG_BUFFER_SIZE = 500
 """Buffer size if CAPACITY is reached.
 
-Once the state changes, this buffer will be logged to make sure we don't
-lose data.
+The buffer always holds the most recent data at the full data rate. Once
+the state changes, this buffer will be logged to make sure we don't lose
+the data right before launch.
+"""
+IDLE_LOG_DECIMATION = 10
+"""Once the log buffer is full, one in every this many rows pushed out of it
+is still logged.
+
+This keeps a low rate record of everything that happened on the pad
+without letting the log file grow at the full data rate.
+"""
+LOG_QUEUE_CAPACITY = 6000  # 60 seconds of data, which is longer than our flights
+"""The maximum number of rows which can be waiting in the log queue, before
+the logger starts dropping rows.
+
+If the SD card stalls, the log queue would otherwise grow without limit.
+Rows logged in StandbyState and LandedState are dropped oldest first once
+this capacity is reached. Rows logged during the flight are never
+dropped, even if this means the queue temporarily exceeds its capacity.
+The queue has room for twice this many rows. If the rows of the flight fill
+all of it, the main loop holds on to the rest, and puts them in the queue
+first the next loop, so it never waits for the logging thread.
+"""
+
+RING_WAIT_CHECK_SECONDS = 0.01
+"""The longest a thread waiting on an SPSCRing sleeps before it checks the ring
+again, in case it wasn't woken up."""
+
+
+class LogCompression(StrEnum):
+    """
+    Enum that represents the algorithms we can compress closed log segments
+    with.
+
+    The value is the suffix added to the name of the compressed segment.
+    """
+
+    LZMA = ".xz"
+    """Slow, but gives the smallest files. Read back with the lzma module."""
+    ZLIB = ".gz"
+    """Much faster, but gives larger files. Written in the gzip format."""
+
+
+LOG_SEGMENT_MAX_BYTES = 50 * 1024 * 1024
+"""The size in bytes at which the logger closes the current log segment and
+starts a new one.
+
+Closed segments are compressed in the background, so no single file gets
+as large as our 2023-2024 logs.
 """
+LOG_SEGMENT_MAX_SECONDS = 600.0
+"""The number of seconds after which the logger starts a new log segment,
+even if the current one has not reached LOG_SEGMENT_MAX_BYTES."""
+LOG_COMPRESSION = LogCompression.LZMA
+"""The algorithm used to compress closed log segments. Set to None to keep
+the segments uncompressed."""
+LOG_COMPRESSION_CHUNK_BYTES = 256 * 1024
+"""The number of bytes of a segment compressed at a time.
+
+The compression thread checks whether it is allowed to run between
+chunks, so this bounds how long it keeps running after launch is
+detected.
+"""
+LOG_COMPRESSION_NICENESS = 19
+"""The niceness of the compression thread. 19 is the lowest priority on
+Linux, so the compression only gets CPU time nothing else wants."""
+
+
+class LogIndexKind(StrEnum):
+    """Enum that represents why a row of the log was added to the log index."""
+
+    STATE = "state"
+    """The row is the first one logged in a new state."""
+    PREDICTION = "prediction"
+    """The row is the first one logged with a new apogee prediction."""
+    SEGMENT = "segment"
+    """The row is the first one in a new log segment."""
+    PERIODIC = "periodic"
+    """The row is one of every LOG_INDEX_INTERVAL_ROWS rows."""
+
+
+LOG_INDEX_INTERVAL_ROWS = 1000
+"""Every this many rows, the logger adds a row to the log index, so we can
+seek to any point in the log without reading more than this many rows
+before it."""
+
+SPARSE_LOG_COLUMNS = (
+    "set_extension",
+    "battery_voltage",
+    "current_milliamps",
+    "command_loop_id",
+    "command_firm_timestamp_seconds",
+    "actuation_latency_ns",
+    "predicted_apogee",
+    "height_used_for_prediction",
+    "vertical_velocity_meters_per_s_used_for_prediction",
+    "horizontal_velocity_meters_per_s_used_for_prediction",
+    "tilt_angle_degrees_used_for_prediction",
+    "angular_rate_deg_per_s_used_for_prediction",
+    "retrieved_firm_packets",
+    "apogee_predictor_queue_size",
+    "log_queue_high_watermark",
+    "dropped_log_packets",
+    "update_timestamp_ns",
+    "loop_stage_durations_ns",
+)
+"""The columns of the log which rarely change from one row to the next. The
+logger only writes their value when it changes, and leaves the cell empty
+otherwise. Every row in the log index has all of them written, so any part of
+the log can be read on its own."""
+
+
+class LogColumnType(StrEnum):
+    """
+    The type of the values in a column of the log, as written in the log
+    schema.
+
+    The values are the names of the Python types of the LoggerDataPacket
+    fields.
+    """
+
+    STRING = "str"
+    FLOAT = "float"
+    INT = "int"
+
+
+LOG_SCHEMA_VERSION = 1
+"""The version of the schema written alongside each log. The schema lists the
+columns itself, so adding or removing columns doesn't need a new version, but
+changing how the schema or the log is written does. Logs written before there
+was a schema are read as version 0."""
 
 
 # -------------------------------------------------------
@@ -196,6 +411,173 @@ FIRM_SERIAL_TIMEOUT_SECONDS = 1.0
 
 FIRM_FREQUENCY = 100
 
+MIN_REPLAY_SPEED = 0.25
+"""The slowest a real time replay can run, as a multiple of real time."""
+
+MAX_REPLAY_SPEED = 50.0
+"""The fastest a real time replay can run, as a multiple of real time. For
+faster replays, use a fast replay, which doesn't wait between packets."""
+
+MAX_REPLAY_GAP_SECONDS = 1.0
+"""The longest a real time replay waits between two packets, at 1x speed. Our
+logs can have gaps of many minutes where nothing was logged, e.g. between the
+first rows of Standby state and the log buffer before launch, which aren't
+worth waiting through."""
+
+
+class ReplayArrivalMode(StrEnum):
+    """Enum that represents how a mock replay hands the FIRM packets to the main loop."""
+
+    PACKETS = "packets"
+    """One packet at a time, at its timestamp."""
+    RECORDED = "recorded"
+    """In the same batches, and at the same times, as in the flight the log is from."""
+    SYNTHETIC = "synthetic"
+    """With random delays and bursts, to stress test the main loop."""
+
+
+MAX_FETCHED_MOCK_FIRM_PACKETS = 10
+"""The most packets MockFIRM returns from one call of `get_data_packets`, when
+it hands out one packet at a time. In flight, FIRM hands the main loop one or
+two packets at a time. A fast replay
+can read the log much faster than the main loop runs, and handing all of it to
+the main loop at once would skip over the state transitions, as the states
+only look at the latest data."""
+
+DERIVED_FIRM_FIELDS = (
+    "est_tilt_angle_degrees",
+    "est_mach_number",
+    "raw_rotated_acceleration_x_gs",
+    "raw_rotated_acceleration_y_gs",
+    "raw_rotated_acceleration_z_gs",
+)
+"""The fields of FIRMDataPacket which it calculates from its other fields when
+it is made, so they are logged but not replayed."""
+
+FIRM_PACKET_INPUT_FIELDS = (
+    "timestamp_seconds",
+    "temperature_celsius",
+    "pressure_pascals",
+    "raw_acceleration_x_gs",
+    "raw_acceleration_y_gs",
+    "raw_acceleration_z_gs",
+    "raw_angular_rate_x_deg_per_s",
+    "raw_angular_rate_y_deg_per_s",
+    "raw_angular_rate_z_deg_per_s",
+    "magnetic_field_x_microteslas",
+    "magnetic_field_y_microteslas",
+    "magnetic_field_z_microteslas",
+    "est_position_z_meters",
+    "est_velocity_z_meters_per_s",
+    "est_quaternion_w",
+    "est_quaternion_x",
+    "est_quaternion_y",
+    "est_quaternion_z",
+)
+"""The fields FIRMDataPacket is made from, in the order it takes them. The
+rest of its fields are the DERIVED_FIRM_FIELDS."""
+
+REPLAY_CACHE_PATH = Path("launch_data/.replay_cache")
+"""The directory where MockFIRM keeps the launch data it has already converted
+from CSV, so later replays of the same file can skip parsing it."""
+
+REPLAY_CACHE_VERSION = 3
+"""Part of the key of every replay cache file. Bump it when the format of the
+cache changes, so older cache files are not used."""
+
+REPLAY_CHUNK_ROWS = 256
+"""The number of rows MockFIRM converts to FIRMDataPackets at a time, so the
+first packets go out without waiting for the whole log to be converted."""
+
+REPLAY_READ_BATCH_ROWS = 2048
+"""The number of rows MockFIRM parses from the CSV at a time, which bounds
+how much of a log is held in memory while it is converted."""
+
+REPLAY_CACHE_FINGERPRINT_BYTES = 65536
+"""How many bytes from the start and from the end of each log segment go in
+the key of its replay cache file, along with its size and modification
+time."""
+
+FRM_HEADER_BYTES = 286
+"""The length of the header at the start of a FIRM log (.FRM) file, which is
+followed by the sensor frames FIRM logged."""
+
+FRM_CLOCK_HZ = 168_000_000
+"""The rate of the clock FIRM timestamps the sensor frames in its logs with.
+The timestamps are 32 bits, so they wrap around about every 25.6 seconds."""
+
+FRM_PAD_SECONDS = 1.0
+"""How long the start of a FIRM log is taken to be the rocket sitting still on
+the pad, to find which way is up and the pressure at the ground."""
+
+FRM_ESTIMATOR_TIME_CONSTANT_SECONDS = 1.0
+"""How long the altitude and velocity estimated from a FIRM log trust the
+accelerometer over the barometer for. Longer smooths out more of the noise of
+the barometer, but is thrown off more by bias in the accelerometer."""
+
+FRM_BAROMETER_MAX_SPEED_METERS_PER_S = 50.0
+"""How fast the rocket can go on the way up before the estimates made from a
+FIRM log stop using the barometer, which reads the pressure spikes of fast
+flight as jumps in altitude of hundreds of meters."""
+
+FRM_BAROMETER_MEDIAN_READINGS = 25
+"""How many of the latest barometer readings the estimates made from a FIRM
+log take the median of, which leaves out the pressure spikes of the ejection
+charges, which only last a few readings."""
+
+FIRM_IMU_YAW_DEGREES = 45.0
+"""How far FIRMDataPacket turns the raw acceleration about the z axis before
+rotating it with its quaternion, as the quaternion is of the board FIRM is
+on rather than of its IMU."""
+
+LAUNCH_DATA_PATH = Path("launch_data")
+"""The directory with the logs of past flights, which `airbrakes-regress` runs
+the air brakes over."""
+
+REGRESSION_SYNTHETIC_FLIGHTS = 4
+"""How many synthetic flights `airbrakes-regress` runs along with the logs, by
+default. Each one has a different seed, so different sensor errors."""
+
+REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS = 2000.0
+"""The target apogee of the synthetic flights `airbrakes-regress` runs, a
+little below the 2140 m a synthetic flight reaches with the air brakes
+retracted, so the air brakes are extended."""
+
+SYNTHETIC_SENSOR_ERROR_BLOCK_ROWS = 1000
+"""How many packets' worth of sensor errors are drawn at once when a synthetic
+flight is read a few packets at a time, as the closed-loop simulation does.
+Drawing them a packet at a time is many times slower."""
+
+
+class ScalingWorkload(StrEnum):
+    """The work the scaling benchmark runs on more and more threads at once."""
+
+    PIPELINE = "pipeline"
+    """A fast replay of a flight through the whole air brakes, with its own FIRM, logger, and
+    apogee predictor threads."""
+    APOGEE_PREDICTOR = "predictor"
+    """Predicting the apogee, as the apogee predictor thread does."""
+    LOGGER = "logger"
+    """Logging the packets of each loop and writing them to the log, as the logger does."""
+
+
+SCALING_THREAD_COUNTS = (1, 2, 4)
+"""How many threads the scaling benchmark runs each workload on at once, by
+default."""
+
+SCALING_ITEMS_PER_THREAD: dict[ScalingWorkload, int] = {
+    ScalingWorkload.PIPELINE: 20_000,
+    ScalingWorkload.APOGEE_PREDICTOR: 20_000,
+    ScalingWorkload.LOGGER: 20_000,
+}
+"""How much work each thread of the scaling benchmark does, by default: the
+packets replayed, the apogees predicted, and the packets logged. Each one
+takes a few seconds on one thread."""
+
+SCALING_LOG_BATCH_PACKETS = 10
+"""How many FIRM packets the scaling benchmark's logger workload logs at once,
+as if the main loop had got that many in one loop."""
+
 # -------------------------------------------------------
 # State Machine Configuration
 # -------------------------------------------------------
@@ -274,6 +656,17 @@ ROCKET_STAB_MARGIN_CAL: float = 3.24
 ROCKET_CL_A: float = 0.2
 """The lift curve slope of the rocket"""
 
+# TODO: Need to verify with aerodynamic analysis.
+ROCKET_EXTENDED_CD: float = 0.8
+"""The drag coefficient of the rocket with airbrakes all the way extended, over
+the same area as ROCKET_CD. Only the closed-loop simulation uses it, to slow
+the rocket down when the air brakes extend."""
+
+AIR_DENSITY_KG_PER_M3 = 1.225
+"""The density of the air. HPRM takes it to be the same at every altitude, so
+the closed-loop simulation does too, and flies the rocket the same way the
+apogee predictor expects it to fly with the air brakes retracted."""
+
 # ----------------------------------------
 # Data Processor Configuration
 # ----------------------------------------
@@ -3,13 +3,17 @@ Module which provides a high level interface to the air brakes system on the
 rocket.
 """
 
+import math
+import threading
 import time
 from typing import TYPE_CHECKING
 
-from airbrakes.constants import BUSY_WAIT_SECONDS, ServoExtension
+from airbrakes.constants import CATCH_UP_PACKET_BUDGET, LoopStage, ServoExtension
+from airbrakes.data_handling.actuation_latency import ActuationLatency
 from airbrakes.data_handling.packets.context_data_packet import ContextDataPacket
 from airbrakes.data_handling.packets.servo_data_packet import ServoDataPacket
 from airbrakes.state import StandbyState, State
+from airbrakes.utils import summarize_backlog
 
 if TYPE_CHECKING:
     from firm_client import FIRMDataPacket
@@ -19,6 +23,7 @@ if TYPE_CHECKING:
     from airbrakes.data_handling.apogee_predictor import ApogeePredictor
     from airbrakes.data_handling.data_processor import DataProcessor
     from airbrakes.data_handling.logger import Logger
+    from airbrakes.data_handling.loop_profiler import LoopProfiler
     from airbrakes.data_handling.packets.apogee_predictor_data_packet import (
         ApogeePredictorDataPacket,
     )
@@ -36,13 +41,19 @@ class Context:
     """
 
     __slots__ = (
+        "_first_packet_processed",
+        "_state_changed",
+        "actuation_latency",
         "apogee_predictor",
+        "catch_up_budget",
         "context_data_packet",
         "data_processor",
         "firm",
         "firm_data_packets",
         "launch_time_seconds",
         "logger",
+        "loop_id",
+        "loop_profiler",
         "most_recent_apogee_predictor_data_packet",
         "processor_data_packets",
         "servo",
@@ -58,6 +69,9 @@ class Context:
         logger: Logger,
         data_processor: DataProcessor,
         apogee_predictor: ApogeePredictor,
+        *,
+        loop_profiler: LoopProfiler | None = None,
+        catch_up_budget: int | None = CATCH_UP_PACKET_BUDGET,
     ) -> None:
         """
         Initializes Context with the specified hardware objects, Logger,
@@ -76,12 +90,19 @@ class Context:
         :param apogee_predictor: The ApogeePredictor object that
             predicts what the apogee of the rocket will be based on the
             processed data.
+        :param loop_profiler: The LoopProfiler which times each stage of `update`, or None to
+            not time them.
+        :param catch_up_budget: The most FIRM packets to process in full in one loop, or None to
+            process every packet in full. Past it, the loop catches up on the backlog with a
+            summary of it.
         """
         self.servo: BaseServo = servo
         self.firm: BaseFIRM = firm
         self.logger: Logger = logger
         self.data_processor: DataProcessor = data_processor
         self.apogee_predictor: ApogeePredictor = apogee_predictor
+        self.loop_profiler: LoopProfiler | None = loop_profiler
+        self.catch_up_budget = catch_up_budget
         # The rocket starts in the StandbyState
         self.state: State = StandbyState(self)
 
@@ -91,6 +112,13 @@ class Context:
         self.most_recent_apogee_predictor_data_packet: ApogeePredictorDataPacket | None = None
         self.context_data_packet: ContextDataPacket | None = None
         self.servo_data_packet: ServoDataPacket | None = None
+        # Counts the calls to update, to tag each servo command with the loop which issued it:
+        self.loop_id = 0
+        self.actuation_latency = ActuationLatency()
+        # Set once the first packets went all the way through the loop, and notified whenever the
+        # state changes, for other threads to wait on:
+        self._first_packet_processed = threading.Event()
+        self._state_changed = threading.Condition()
 
         # Keeps track of the launch time, used for calculating convergence time
         self.launch_time_seconds: float = 0
@@ -114,11 +142,48 @@ class Context:
         self.servo.retract_airbrakes()
 
         if wait_for_start:
-            # Wait for all processes to start. It is assumed that once FIRM is running, all other
-            # processes are also running. Even if they aren't it's okay, since the queue will fill
-            # up with data and the other processes will start processing it when they wake up.
-            while not self.firm.is_running:
-                time.sleep(BUSY_WAIT_SECONDS)
+            self.wait_until_started()
+
+    def wait_until_started(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until the threads of FIRM, the Logger, and the ApogeePredictor have started.
+
+        :param timeout: The longest to wait in seconds, or None to wait for as long as it takes.
+        :return: Whether every thread started in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return all(
+            wait_until_started(None if deadline is None else max(deadline - time.monotonic(), 0))
+            for wait_until_started in (
+                self.firm.wait_until_started,
+                self.logger.wait_until_started,
+                self.apogee_predictor.wait_until_started,
+            )
+        )
+
+    def wait_for_first_packet(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until the first FIRM packets have gone all the way through `update`, so there is
+        processed data and data packets to show.
+
+        :param timeout: The longest to wait in seconds, or None to wait for as long as it takes.
+        :return: Whether the first packets were processed in time.
+        """
+        return self._first_packet_processed.wait(timeout)
+
+    def wait_for_state(self, state: type[State], timeout: float | None = None) -> bool:
+        """
+        Blocks until the state machine is in a state, or the air brakes are shut down.
+
+        :param state: The state to wait for, e.g. MotorBurnState.
+        :param timeout: The longest to wait in seconds, or None to wait for as long as it takes.
+        :return: Whether the state machine is in the state.
+        """
+        with self._state_changed:
+            self._state_changed.wait_for(
+                lambda: isinstance(self.state, state) or self.shutdown_requested, timeout
+            )
+        return isinstance(self.state, state)
 
     def stop(self) -> None:
         """
@@ -131,6 +196,9 @@ class Context:
         if self.shutdown_requested:
             return
         self.shutdown_requested = True
+        # Wakes up the threads waiting for a state, which will never come now:
+        with self._state_changed:
+            self._state_changed.notify_all()
         self.retract_airbrakes()
         self.firm.stop()
         self.logger.stop()
@@ -146,44 +214,86 @@ class Context:
         This function retrieves the latest FIRM data packets, processes
         them, updates the state machine, generates data packets for
         logging, and logs all relevant data.
+
+        If there is a loop profiler, each of these stages is timed.
         """
+        # Only checked once per stage, so the loop is as fast as before when it isn't profiled:
+        loop_profiler = self.loop_profiler
+        if loop_profiler:
+            loop_profiler.start_loop()
+        self.loop_id += 1
+
         self.firm_data_packets = self.firm.get_data_packets()
+        if loop_profiler:
+            loop_profiler.lap(LoopStage.FIRM)
         # This should not happen generally, since we wait for FIRM packets. Only happens at the end
         # of the flight in a mock replay.
         if not self.firm_data_packets:
             return
+        self.actuation_latency.receive(self.firm_data_packets[-1].timestamp_seconds)
+
+        # After a stall, the state machine only runs on a summary of the backlog, so this loop
+        # doesn't take much longer than any other. The processed data packets are of the summary:
+        control_packets = summarize_backlog(self.firm_data_packets, self.catch_up_budget)
 
         # Update the data processor with the new data packets.
-        self.data_processor.update(self.firm_data_packets)
+        self.data_processor.update(control_packets)
+        if loop_profiler:
+            loop_profiler.lap(LoopStage.DATA_PROCESSOR)
         self.processor_data_packets = self.data_processor.get_processor_data_packets()
+        if loop_profiler:
+            loop_profiler.lap(LoopStage.PROCESSOR_PACKETS)
         # Gets the most recent Apogee Predictor Data Packets, this will only have new data if we are
         # in coast and have called predict_apogee(), and the apogee predictor has had time to
         # process the data and predict the apogee.
         apogee_prediction_packet = self.apogee_predictor.get_prediction_data_packet()
         if apogee_prediction_packet:
             self.most_recent_apogee_predictor_data_packet = apogee_prediction_packet
+        if loop_profiler:
+            loop_profiler.lap(LoopStage.APOGEE_PREDICTION)
 
         # Update the state machine based on the latest processed data
-        self.state.update()
+        state = self.state
+        state.update()
+        if self.state is not state:
+            with self._state_changed:
+                self._state_changed.notify_all()
+        if loop_profiler:
+            loop_profiler.lap(LoopStage.STATE)
 
         # Create Context Data Packets representing the current state of the air brakes system:
         self.generate_data_packets()
+        if loop_profiler:
+            loop_profiler.lap(LoopStage.DATA_PACKETS)
 
         # This if statement is just because my ide is being dumb, but it's not possible for them to
         # be None here
         if self.context_data_packet is not None and self.servo_data_packet is not None:
-            # Logs all the packet types from each of the relevant processes
-            self.logger.log(
+            # Logs all the packet types from each of the relevant processes. Every packet of a
+            # backlog is logged, but the rows of it are made in the logging thread:
+            log = (
+                self.logger.log
+                if control_packets is self.firm_data_packets
+                else self.logger.log_backlog
+            )
+            log(
                 self.context_data_packet,
                 self.servo_data_packet,
                 self.firm_data_packets,
                 self.most_recent_apogee_predictor_data_packet,
             )
+        if loop_profiler:
+            loop_profiler.lap(LoopStage.LOGGER)
+
+        # Checked first, as setting the event takes a lock:
+        if not self._first_packet_processed.is_set():
+            self._first_packet_processed.set()
 
     def extend_airbrakes(self) -> None:
         """Extends the air brakes to the maximum extension."""
         self.data_processor.prepare_for_extending_airbrakes()
         self.servo.extend_airbrakes()
+        self._record_servo_command()
 
     def retract_airbrakes(self) -> None:
         """Retracts the air brakes to the minimum extension."""
@@ -194,6 +304,20 @@ class Context:
         ):
             self.data_processor.prepare_for_retracting_airbrakes()
             self.servo.retract_airbrakes()
+            self._record_servo_command()
+
+    def _record_servo_command(self) -> None:
+        """
+        Tags the command just sent to the servo with this loop, and the newest FIRM packet it had,
+        which is the latest sample the command could have been caused by.
+        """
+        self.actuation_latency.record_command(
+            self.servo.servo_extension,
+            self.loop_id,
+            # There are no packets when the air brakes are retracted at the end of a mock replay:
+            self.firm_data_packets[-1].timestamp_seconds if self.firm_data_packets else math.nan,
+            self.servo.command_issued_ns,
+        )
 
     def predict_apogee(self) -> None:
         """
@@ -204,8 +328,14 @@ class Context:
         controlling the air brakes.
         """
         if self.processor_data_packets:
-            # We pass in the most recent FIRM Data Packet to the apogee predictor
-            self.apogee_predictor.update(self.processor_data_packets[-1])
+            # We pass in the most recent FIRM Data Packet to the apogee predictor, unless its
+            # readings are NaN, which HPRM can't predict from:
+            processor_data_packet = self.processor_data_packets[-1]
+            if not math.isnan(
+                processor_data_packet.current_altitude
+                + processor_data_packet.vertical_velocity_meters_per_s
+            ):
+                self.apogee_predictor.update(processor_data_packet)
 
     def generate_data_packets(self) -> None:
         """
@@ -218,13 +348,25 @@ class Context:
             state=type(self.state),
             retrieved_firm_packets=len(self.firm_data_packets),
             apogee_predictor_queue_size=self.apogee_predictor.processor_data_packet_queue_size,
+            log_queue_high_watermark=self.logger.log_queue_high_watermark,
+            dropped_log_packets=self.logger.dropped_packets,
             update_timestamp_ns=time.time_ns(),
+            # The stages up to the state update are all that have finished by now:
+            loop_stage_durations_ns=self.loop_profiler.get_stage_durations(LoopStage.STATE)
+            if self.loop_profiler and self.loop_profiler.log_each_loop
+            else None,
         )
 
         # Creates a Servo Data Packet to log the current extension
-        # of the servo and the electrical metrics.
+        # of the servo, the electrical metrics, and the latest servo command.
+        servo_command = self.actuation_latency.last_command
         self.servo_data_packet = ServoDataPacket(
             set_extension=self.servo.servo_extension,
             battery_voltage=f"{self.servo.battery_volts}",
             current_milliamps=f"{self.servo.system_current_milliamps}",
+            command_loop_id=servo_command.loop_id if servo_command else None,
+            command_firm_timestamp_seconds=servo_command.firm_timestamp_seconds
+            if servo_command
+            else None,
+            actuation_latency_ns=servo_command.latency_ns if servo_command else None,
         )
@@ -0,0 +1,137 @@
+"""
+Module for measuring how long it takes from FIRM taking a sample to the servo
+being told to move because of it, which is what decides how much the air
+brakes can do.
+"""
+
+import math
+import time
+
+import msgspec
+
+from airbrakes.constants import ServoExtension  # noqa: TC001 (doesn't work with msgspec)
+from airbrakes.data_handling.loop_profiler import LatencyHistogram
+
+
+class ServoCommand(msgspec.Struct, frozen=True):
+    """A command to the servo, tagged with the FIRM sample which caused it."""
+
+    extension: ServoExtension
+    """The extension the servo was told to move to."""
+    loop_id: int
+    """The loop of `Context.update` which issued the command."""
+    firm_timestamp_seconds: float
+    """The timestamp of the newest FIRM packet the loop had, on FIRM's clock."""
+    issued_ns: int
+    """When the PWM signal was changed, from `time.perf_counter_ns`."""
+    latency_ns: int | None
+    """How long after the FIRM packet was sampled the PWM signal was changed, or None if the
+    packet's timestamp wasn't a number."""
+
+
+class ActuationLatencyReport(msgspec.Struct, frozen=True):
+    """How long it took from a FIRM sample to the servo moving, over every servo command."""
+
+    commands: int
+    """How many servo commands had a latency."""
+    p50_us: float
+    """The median latency."""
+    p99_us: float
+    """The latency which 99% of the commands were within."""
+    max_us: float
+    """The longest latency."""
+
+    def __str__(self) -> str:
+        """Returns the latency as one line, to show at shutdown."""
+        return (
+            f"p50 {self.p50_us:>9.1f} us, p99 {self.p99_us:>9.1f} us, "
+            f"max {self.max_us:>9.1f} us over {self.commands} servo commands"
+        )
+
+
+class ActuationLatency:
+    """
+    Measures the latency from a FIRM sample to the servo command it caused.
+
+    FIRM timestamps its packets on its own clock, so the Context tells this
+    when each batch of packets was received, on the clock of the computer
+    running the main loop. The quickest a packet has ever been received
+    after it was sampled is taken as the offset between the two clocks, so a
+    sample's time on our clock is its timestamp plus that offset. The time
+    it takes a packet to get to us when nothing is in the way isn't counted,
+    but every delay on top of that is, e.g. packets waiting in a queue while
+    the main loop was busy.
+
+    A backwards jump of FIRM's clock makes the latencies after it look longer
+    by the jump, as the offset is never made bigger again.
+    """
+
+    __slots__ = ("_clock_offset_ns", "histogram", "last_command")
+
+    def __init__(self) -> None:
+        """Initializes the ActuationLatency, with no packets received yet."""
+        self._clock_offset_ns: int | None = None
+        self.histogram = LatencyHistogram()
+        """The latency of every servo command."""
+        self.last_command: ServoCommand | None = None
+        """The latest servo command, or None if the servo hasn't been told to move yet."""
+
+    def receive(self, firm_timestamp_seconds: float) -> None:
+        """
+        Notes that the main loop just received a FIRM packet.
+
+        :param firm_timestamp_seconds: The timestamp of the newest packet received, which is the
+            one which waited the shortest.
+        """
+        received_ns = time.perf_counter_ns()
+        if not math.isfinite(firm_timestamp_seconds):
+            return
+        clock_offset_ns = received_ns - round(firm_timestamp_seconds * 1e9)
+        if self._clock_offset_ns is None or clock_offset_ns < self._clock_offset_ns:
+            self._clock_offset_ns = clock_offset_ns
+
+    def record_command(
+        self,
+        extension: ServoExtension,
+        loop_id: int,
+        firm_timestamp_seconds: float,
+        issued_ns: int,
+    ) -> ServoCommand:
+        """
+        Records a command to the servo, and its latency.
+
+        :param extension: The extension the servo was told to move to.
+        :param loop_id: The loop which issued the command.
+        :param firm_timestamp_seconds: The timestamp of the newest FIRM packet the loop had.
+        :param issued_ns: When the PWM signal was changed, from `time.perf_counter_ns`.
+        :return: The servo command, which is also kept as `last_command`.
+        """
+        latency_ns = None
+        if self._clock_offset_ns is not None and math.isfinite(firm_timestamp_seconds):
+            # Never negative, as the packet can't have been received before it was sampled:
+            latency_ns = max(
+                issued_ns - round(firm_timestamp_seconds * 1e9) - self._clock_offset_ns, 0
+            )
+            self.histogram.record(latency_ns)
+        self.last_command = ServoCommand(
+            extension=extension,
+            loop_id=loop_id,
+            firm_timestamp_seconds=firm_timestamp_seconds,
+            issued_ns=issued_ns,
+            latency_ns=latency_ns,
+        )
+        return self.last_command
+
+    def get_report(self) -> ActuationLatencyReport:
+        """
+        Returns the latency over every servo command so far.
+
+        :return: The percentiles and max of the latency.
+        """
+        histogram = self.histogram
+        return ActuationLatencyReport(
+            commands=histogram.count,
+            p50_us=histogram.percentile_ns(50) / 1e3,
+            p99_us=histogram.percentile_ns(99) / 1e3,
+            max_us=histogram.max_ns / 1e3,
+        )
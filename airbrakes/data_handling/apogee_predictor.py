@@ -20,6 +20,60 @@ if TYPE_CHECKING:
     from airbrakes.data_handling.packets.processor_data_packet import ProcessorDataPacket
 
 
+def make_rocket() -> Rocket:
+    """
+    Makes the HPRM rocket the apogee is predicted with, from the rocket constants.
+
+    The constants are read when the rocket is made, so a mock replay which changed them to the
+    ones of the replayed rocket predicts with the replayed rocket.
+
+    :return: The HPRM rocket.
+    """
+    return Rocket(
+        constants.ROCKET_DRY_MASS_KG,
+        constants.ROCKET_CD,
+        constants.ROCKET_CROSS_SECTIONAL_AREA_M2,
+        constants.ROCKET_CROSS_SECTIONAL_AREA_M2,
+        constants.ROCKET_MOMENT_OF_INERTIA_KG_M2,
+        constants.ROCKET_STAB_MARGIN_CAL * constants.ROCKET_DIAMETER_M,
+        constants.ROCKET_CL_A,
+    )
+
+
+def predict_apogee(
+    rocket: Rocket, processor_data_packet: ProcessorDataPacket
+) -> ApogeePredictorDataPacket:
+    """
+    Predicts the apogee of the rocket from the state it is in.
+
+    :param rocket: The HPRM rocket from `make_rocket`.
+    :param processor_data_packet: The most recent processed data of the rocket.
+    :return: The predicted apogee, and the data it was predicted from.
+    """
+    initial_state = InitialState3DOF(
+        x=0.0,
+        y=processor_data_packet.current_altitude,
+        angle=math.radians(processor_data_packet.tilt_angle_degrees),
+        vx=processor_data_packet.horizontal_velocity_meters_per_s,
+        vy=processor_data_packet.vertical_velocity_meters_per_s,
+        angular_rate=math.radians(processor_data_packet.angular_rate_deg_per_s),
+    )
+
+    apogee = rocket.predict_apogee_3dof(
+        initial_state,
+        integration_method=OdeMethod.RK45,
+    )
+
+    return ApogeePredictorDataPacket(
+        apogee,
+        processor_data_packet.current_altitude,
+        processor_data_packet.vertical_velocity_meters_per_s,
+        processor_data_packet.horizontal_velocity_meters_per_s,
+        processor_data_packet.tilt_angle_degrees,
+        processor_data_packet.angular_rate_deg_per_s,
+    )
+
+
 class ApogeePredictor:
     """
     Class that performs the calculations to predict the apogee of the rocket
@@ -30,10 +84,12 @@ class ApogeePredictor:
         "_apogee_predictor_packet_queue",
         "_prediction_thread",
         "_processor_data_packet_queue",
+        "_started",
     )
 
     def __init__(self) -> None:
         # Single input queue: main thread -> prediction thread
+        # These carry a packet at a time, which a SimpleQueue hands over faster than an SPSCRing:
         self._processor_data_packet_queue: queue.SimpleQueue[
             ProcessorDataPacket | Literal["STOP"]
         ] = queue.SimpleQueue()
@@ -47,6 +103,8 @@ class ApogeePredictor:
             name="Apogee Prediction Thread",
             daemon=True,
         )
+        # Set once the prediction thread has made the rocket, and is ready to predict:
+        self._started = threading.Event()
 
     @property
     def is_running(self) -> bool:
@@ -57,6 +115,15 @@ class ApogeePredictor:
         """
         return self._prediction_thread.is_alive()
 
+    @property
+    def thread(self) -> threading.Thread:
+        """
+        Returns the thread which predicts the apogee.
+
+        :return: The prediction thread.
+        """
+        return self._prediction_thread
+
     @property
     def processor_data_packet_queue_size(self) -> int:
         """
@@ -76,6 +143,15 @@ class ApogeePredictor:
         if not self._prediction_thread.is_alive():
             self._prediction_thread.start()
 
+    def wait_until_started(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until the prediction thread is ready to predict the apogee.
+
+        :param timeout: The longest to wait in seconds, or None to wait for as long as it takes.
+        :return: True if the prediction thread started in time, False otherwise.
+        """
+        return self._started.wait(timeout)
+
     def stop(self) -> None:
         """Stops the prediction thread."""
         # Request the thread to stop:
@@ -117,17 +193,8 @@ class ApogeePredictor:
         finally predicting the apogee using the chosen method (e.g. HPRM).
         Runs in a separate thread.
         """
-        stability_margin_m = constants.ROCKET_STAB_MARGIN_CAL * constants.ROCKET_DIAMETER_M
-
-        rocket = Rocket(
-            constants.ROCKET_DRY_MASS_KG,
-            constants.ROCKET_CD,
-            constants.ROCKET_CROSS_SECTIONAL_AREA_M2,
-            constants.ROCKET_CROSS_SECTIONAL_AREA_M2,
-            constants.ROCKET_MOMENT_OF_INERTIA_KG_M2,
-            stability_margin_m,
-            constants.ROCKET_CL_A,
-        )
+        rocket = make_rocket()
+        self._started.set()
 
         # Keep checking for new data packets until the stop signal is received:
         while True:
@@ -141,30 +208,5 @@ class ApogeePredictor:
 
             most_recent_packet = cast("ProcessorDataPacket", processor_data_packets[-1])
 
-            # Compute apogee given the latest state and history
-
-            initial_state = InitialState3DOF(
-                x=0.0,
-                y=most_recent_packet.current_altitude,
-                angle=math.radians(most_recent_packet.tilt_angle_degrees),
-                vx=most_recent_packet.horizontal_velocity_meters_per_s,
-                vy=most_recent_packet.vertical_velocity_meters_per_s,
-                angular_rate=math.radians(most_recent_packet.angular_rate_deg_per_s),
-            )
-
-            apogee = rocket.predict_apogee_3dof(
-                initial_state,
-                integration_method=OdeMethod.RK45,
-            )
-
             # Push a prediction packet back to the main thread.
-            self._apogee_predictor_packet_queue.put(
-                ApogeePredictorDataPacket(
-                    apogee,
-                    most_recent_packet.current_altitude,
-                    most_recent_packet.vertical_velocity_meters_per_s,
-                    most_recent_packet.horizontal_velocity_meters_per_s,
-                    most_recent_packet.tilt_angle_degrees,
-                    most_recent_packet.angular_rate_deg_per_s,
-                )
-            )
+            self._apogee_predictor_packet_queue.put(predict_apogee(rocket, most_recent_packet))
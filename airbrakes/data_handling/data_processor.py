@@ -163,10 +163,7 @@ class DataProcessor:
                 dtype=np.float64,
             )
             self._previous_altitude = self._current_altitudes[-1]
-            self._max_altitude = max(self._current_altitudes.max(), self._max_altitude)
-            self._max_vertical_velocity = max(
-                self._vertical_velocities.max(), self._max_vertical_velocity
-            )
+            self._update_maxima()
             return
 
         self._time_differences = self._calculate_time_differences()
@@ -180,11 +177,7 @@ class DataProcessor:
 
         self._current_altitudes = self._calculate_current_altitudes()
 
-        self._max_vertical_velocity = max(
-            self._vertical_velocities.max(), self._max_vertical_velocity
-        )
-
-        self._max_altitude = max(self._current_altitudes.max(), self._max_altitude)
+        self._update_maxima()
 
         # Store the last data point for the next update
         self._last_data_packet = data_packets[-1]
@@ -208,6 +201,17 @@ class DataProcessor:
         self._integrating_for_altitude = False
         self._retraction_timestamp_seconds = self.current_timestamp_seconds
 
+    def _update_maxima(self) -> None:
+        """
+        Updates the max altitude and max vertical velocity with the data points of this update.
+
+        NaN readings are skipped, so that a burst of them can't reset the maxima.
+        """
+        self._max_altitude = np.fmax.reduce(self._current_altitudes, initial=self._max_altitude)
+        self._max_vertical_velocity = np.fmax.reduce(
+            self._vertical_velocities, initial=self._max_vertical_velocity
+        )
+
     def _calculate_current_altitudes(self) -> npt.NDArray[np.float64]:
         """
         Calculates the current altitudes, by zeroing out the initial altitude.
@@ -226,7 +230,8 @@ class DataProcessor:
         ):
             # Integrate the vertical velocities to get altitudes:
             # Start with the previous altitude and add the cumulative sum of (velocity * dt).
-            altitudes = self._previous_altitude + np.cumsum(
+            # A NaN velocity is skipped, so it can't make every altitude after it NaN.
+            altitudes = self._previous_altitude + np.nancumsum(
                 self._vertical_velocities * self._time_differences
             )
         elif self._initial_altitude is not None:
@@ -242,8 +247,10 @@ class DataProcessor:
                 [data_packet.est_position_z_meters for data_packet in self._data_packets],
             )
 
-        # Update the stored previous altitude for the next calculation.
-        self._previous_altitude = altitudes[-1]
+        # Update the stored previous altitude for the next calculation, unless it is NaN, which
+        # the altitudes integrated from it would all be:
+        if not np.isnan(altitudes[-1]):
+            self._previous_altitude = altitudes[-1]
 
         # Get the pressure altitudes from the data points and zero out the initial altitude
         return altitudes
@@ -0,0 +1,138 @@
+"""Module for compressing closed log segments in the background."""
+
+import contextlib
+import lzma
+import os
+import queue
+import threading
+import zlib
+from typing import TYPE_CHECKING, Literal
+
+from airbrakes.constants import (
+    LOG_COMPRESSION_CHUNK_BYTES,
+    LOG_COMPRESSION_NICENESS,
+    STOP_SIGNAL,
+    LogCompression,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class LogCompressor:
+    """
+    Compresses the log segments the Logger has finished writing.
+
+    The compression runs in a separate thread with the lowest scheduling
+    priority, so it only uses CPU time the rest of the program doesn't
+    need. It can also be paused, which the Logger does during MotorBurn and
+    Coast, so it never competes with the control loop while the air brakes
+    may be deployed. A paused compression picks up where it left off.
+    """
+
+    __slots__ = (
+        "_compression",
+        "_compression_allowed",
+        "_compression_thread",
+        "_segments_to_compress",
+    )
+
+    def __init__(self, compression: LogCompression) -> None:
+        """
+        Initializes the log compressor.
+
+        :param compression: The algorithm to compress the segments with.
+        """
+        self._compression = compression
+        self._segments_to_compress: queue.SimpleQueue[Path | Literal["STOP"]] = queue.SimpleQueue()
+        # The compression only runs while this is set:
+        self._compression_allowed = threading.Event()
+        self._compression_allowed.set()
+        self._compression_thread = threading.Thread(
+            target=self._compression_loop, name="Log Compressor Thread", daemon=True
+        )
+
+    @property
+    def is_running(self) -> bool:
+        """Returns whether the compression thread is running."""
+        return self._compression_thread.is_alive()
+
+    @property
+    def is_paused(self) -> bool:
+        """Returns whether the compression is paused."""
+        return not self._compression_allowed.is_set()
+
+    def start(self) -> None:
+        """Starts the compression thread."""
+        self._compression_thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the compression thread, after it has compressed every segment
+        it was given.
+        """
+        # We are shutting down, so there is nothing left for the compression to get in the way of:
+        self.resume()
+        self._segments_to_compress.put(STOP_SIGNAL)
+        self._compression_thread.join()
+
+    def pause(self) -> None:
+        """Pauses the compression, at the end of the chunk being compressed."""
+        self._compression_allowed.clear()
+
+    def resume(self) -> None:
+        """Resumes the compression."""
+        self._compression_allowed.set()
+
+    def compress(self, segment_path: Path) -> None:
+        """
+        Queues a closed segment to be compressed.
+
+        :param segment_path: The path of the segment, which must not be
+            written to anymore.
+        """
+        self._segments_to_compress.put(segment_path)
+
+    # ------------------------ ALL METHODS BELOW RUN IN A SEPARATE THREAD -------------------------
+    def _compression_loop(self) -> None:
+        """Compresses the segments put in the queue, one at a time."""
+        # On Linux, this only lowers the priority of this thread, not of the whole process. It is
+        # not available on Windows, where we don't fly anyway.
+        with contextlib.suppress(AttributeError, OSError):
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), LOG_COMPRESSION_NICENESS)
+
+        while True:
+            segment_path = self._segments_to_compress.get()
+            if segment_path == STOP_SIGNAL:
+                return
+            self._compress_segment(segment_path)
+
+    def _compress_segment(self, segment_path: Path) -> None:
+        """
+        Compresses a segment and deletes the uncompressed one.
+
+        The compressed segment is written to a temporary file first, so if
+        we lose power half way through, the uncompressed segment is still
+        there and intact.
+
+        :param segment_path: The path of the segment to compress.
+        """
+        compressed_path = segment_path.with_name(segment_path.name + self._compression.value)
+        temporary_path = compressed_path.with_name(compressed_path.name + ".part")
+        compressor = (
+            lzma.LZMACompressor()
+            if self._compression == LogCompression.LZMA
+            # wbits=31 makes zlib write the gzip format, which is what the log reader expects:
+            else zlib.compressobj(wbits=31)
+        )
+
+        with segment_path.open("rb") as source, temporary_path.open("wb") as destination:
+            while chunk := source.read(LOG_COMPRESSION_CHUNK_BYTES):
+                self._compression_allowed.wait()
+                destination.write(compressor.compress(chunk))
+            destination.write(compressor.flush())
+            destination.flush()
+            os.fsync(destination.fileno())
+
+        temporary_path.replace(compressed_path)
+        segment_path.unlink()
@@ -0,0 +1,333 @@
+"""
+Module for the index which is written alongside each log, so we can seek
+straight to any part of the log without reading all of it.
+"""
+
+import bisect
+import io
+from typing import TYPE_CHECKING, Any
+
+import msgspec
+import polars as pl
+
+from airbrakes.constants import LOG_INDEX_INTERVAL_ROWS, LogIndexKind
+from airbrakes.data_handling.log_reader import (
+    get_log_base_path,
+    get_log_segments,
+    open_log_segment,
+    read_log_schema,
+)
+from airbrakes.data_handling.sparse_columns import (
+    MISSING_VALUE_MARKER,
+    forward_fill_sparse_columns,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from pathlib import Path
+
+
+class LogIndexEntry(msgspec.Struct, frozen=True):
+    """
+    Points to a row of a log.
+
+    The index is a file with one of these per line, encoded as JSON.
+    """
+
+    kind: LogIndexKind
+    """Why this row was added to the index."""
+    row: int
+    """The number of the row in the whole log, starting at 0 and not counting
+    the header rows."""
+    segment: int
+    """The number of the segment the row is in, starting at 1."""
+    offset: int
+    """The position of the row in bytes from the start of the segment, once
+    the segment is decompressed."""
+    timestamp_seconds: float | None
+    """The timestamp of the row."""
+    state_letter: str | None
+    """The state the air brakes were in when the row was logged."""
+
+
+class LogIndexer:
+    """
+    Decides which rows of a log should be in its index.
+
+    It is fed every row of the log in order, and returns the index entries
+    for the rows which start a new state, a new apogee prediction, or a
+    new segment, plus one for every `interval_rows` rows.
+    """
+
+    __slots__ = (
+        "_interval_rows",
+        "_last_predicted_apogee",
+        "_last_state_letter",
+        "_predicted_apogee_column",
+        "_state_letter_column",
+        "_timestamp_column",
+    )
+
+    def __init__(
+        self, columns: Sequence[str], interval_rows: int = LOG_INDEX_INTERVAL_ROWS
+    ) -> None:
+        """
+        Initializes the indexer.
+
+        :param columns: The names of the columns of the log, in order.
+        :param interval_rows: Every this many rows, a row is indexed, even if
+            nothing else changed.
+        """
+        self._interval_rows = interval_rows
+        # Older logs may not have all of these columns:
+        self._state_letter_column = LogIndexer._find_column(columns, "state_letter")
+        self._timestamp_column = LogIndexer._find_column(columns, "timestamp_seconds")
+        self._predicted_apogee_column = LogIndexer._find_column(columns, "predicted_apogee")
+        self._last_state_letter: Any = None
+        self._last_predicted_apogee: Any = None
+
+    @staticmethod
+    def _find_column(columns: Sequence[str], name: str) -> int | None:
+        """Returns the position of the column with this name, or None if there isn't one."""
+        return columns.index(name) if name in columns else None
+
+    def index_row(
+        self,
+        values: Sequence[Any],
+        row: int,
+        segment: int,
+        offset: int,
+        first_in_segment: bool,
+    ) -> list[LogIndexEntry]:
+        """
+        Returns the index entries for a row of the log.
+
+        :param values: The values of the row. Missing values can be either
+            None or empty strings.
+        :param row: The number of the row in the whole log.
+        :param segment: The number of the segment the row is in.
+        :param offset: The position of the row in bytes from the start of
+            the segment.
+        :param first_in_segment: Whether this is the first row of the
+            segment.
+        :return: The index entries for the row, which is an empty list for
+            most rows.
+        """
+        kinds: list[LogIndexKind] = []
+
+        state_letter = None
+        if self._state_letter_column is not None:
+            state_letter = values[self._state_letter_column] or None
+            if state_letter != self._last_state_letter:
+                kinds.append(LogIndexKind.STATE)
+                self._last_state_letter = state_letter
+
+        if self._predicted_apogee_column is not None:
+            # The predicted apogee is a sparse column, so in a log read back it is empty when it
+            # didn't change:
+            predicted_apogee = values[self._predicted_apogee_column] or None
+            if predicted_apogee == MISSING_VALUE_MARKER:
+                predicted_apogee = None
+            if predicted_apogee is not None and predicted_apogee != self._last_predicted_apogee:
+                kinds.append(LogIndexKind.PREDICTION)
+                self._last_predicted_apogee = predicted_apogee
+
+        if first_in_segment:
+            kinds.append(LogIndexKind.SEGMENT)
+
+        if row % self._interval_rows == 0:
+            kinds.append(LogIndexKind.PERIODIC)
+
+        if not kinds:
+            return []
+
+        timestamp = None if self._timestamp_column is None else values[self._timestamp_column]
+        timestamp_seconds = float(timestamp) if timestamp not in (None, "") else None
+        return [
+            LogIndexEntry(kind, row, segment, offset, timestamp_seconds, state_letter)
+            for kind in kinds
+        ]
+
+
+def get_index_path(log_path: Path) -> Path:
+    """
+    Returns the path of the index of a log.
+
+    :param log_path: The path to any segment of the log.
+    :return: The path of the index, e.g. `log_1.idx` for `log_1.csv`.
+    """
+    return get_log_base_path(log_path).with_suffix(".idx")
+
+
+def build_log_index(
+    log_path: Path, interval_rows: int = LOG_INDEX_INTERVAL_ROWS
+) -> list[LogIndexEntry]:
+    """
+    Builds the index of a log by reading all of it. This is only needed for
+    logs which were written without an index.
+
+    :param log_path: The path to any segment of the log.
+    :param interval_rows: Every this many rows, a row is indexed.
+    :return: The index entries of the log, in order.
+    """
+    entries: list[LogIndexEntry] = []
+    indexer = None
+    row = 0
+    for segment_number, segment_path in enumerate(get_log_segments(log_path), start=1):
+        with open_log_segment(segment_path) as segment:
+            header = segment.readline()
+            offset = len(header)
+            if indexer is None:
+                indexer = LogIndexer(header.decode().rstrip("\r\n").split(","), interval_rows)
+            for line_number, line in enumerate(segment):
+                # Our logs only have numbers and state letters in them, so there is no quoting:
+                values = line.decode().rstrip("\r\n").split(",")
+                entries.extend(
+                    indexer.index_row(values, row, segment_number, offset, line_number == 0)
+                )
+                offset += len(line)
+                row += 1
+    return entries
+
+
+def read_log_index(log_path: Path) -> list[LogIndexEntry]:
+    """
+    Reads the index of a log, or builds it if the log doesn't have one.
+
+    :param log_path: The path to any segment of the log.
+    :return: The index entries of the log, in order.
+    """
+    index_path = get_index_path(log_path)
+    if not index_path.exists():
+        return build_log_index(log_path)
+
+    decoder = msgspec.json.Decoder(LogIndexEntry)
+    entries: list[LogIndexEntry] = []
+    for line in index_path.read_bytes().splitlines():
+        try:
+            entries.append(decoder.decode(line))
+        except msgspec.DecodeError:
+            # If we lost power while writing the index, the last line may be cut off:
+            break
+    return entries
+
+
+def find_state_transition(entries: list[LogIndexEntry], state_letter: str) -> LogIndexEntry | None:
+    """
+    Finds where a state starts in a log.
+
+    :param entries: The index entries of the log.
+    :param state_letter: The first letter of the name of the state, e.g. "C"
+        for CoastState.
+    :return: The index entry of the first row logged in that state, or None
+        if the log never got to that state.
+    """
+    for entry in entries:
+        if entry.kind == LogIndexKind.STATE and entry.state_letter == state_letter:
+            return entry
+    return None
+
+
+def read_log_window_bytes(
+    log_path: Path, start: LogIndexEntry | None, end: LogIndexEntry | None
+) -> bytes:
+    """
+    Reads the rows of a log between two index entries, without reading the
+    rest of the log.
+
+    Uncompressed segments are read straight from the start offset.
+    Compressed segments have to be decompressed up to it.
+
+    :param log_path: The path to any segment of the log.
+    :param start: The entry of the first row to read, or None to read from
+        the start of the log.
+    :param end: The entry of the row after the last one to read, or None to
+        read to the end of the log.
+    :return: The rows, as a CSV with one header row.
+    """
+    segments = get_log_segments(log_path)
+    first_segment = start.segment if start else 1
+    last_segment = end.segment if end else len(segments)
+    contents = io.BytesIO()
+    for segment_number in range(first_segment, last_segment + 1):
+        with open_log_segment(segments[segment_number - 1]) as segment:
+            header = segment.readline()
+            if segment_number == first_segment:
+                contents.write(header)
+                if start:
+                    segment.seek(start.offset)
+            if end and segment_number == last_segment:
+                contents.write(segment.read(end.offset - segment.tell()))
+            else:
+                contents.write(segment.read())
+    return contents.getvalue()
+
+
+def find_log_window(
+    entries: list[LogIndexEntry], start_seconds: float | None, end_seconds: float | None
+) -> tuple[LogIndexEntry | None, LogIndexEntry | None]:
+    """
+    Finds the index entries which surround a window of time in a log.
+
+    :param entries: The index entries of the log.
+    :param start_seconds: The earliest timestamp in the window, or None for
+        the start of the log.
+    :param end_seconds: The latest timestamp in the window, or None for the
+        end of the log.
+    :return: The entries to pass to `read_log_window_bytes` to read the
+        window. The rows read may start a bit before and end a bit after
+        the window.
+    """
+    entries = [entry for entry in entries if entry.timestamp_seconds is not None]
+    timestamps = [entry.timestamp_seconds for entry in entries]
+
+    # Start at the last indexed row at or before the start of the window:
+    start = None
+    if start_seconds is not None:
+        position = bisect.bisect_right(timestamps, start_seconds)
+        start = entries[position - 1] if position else None
+
+    # End at the first indexed row after the end of the window:
+    end = None
+    if end_seconds is not None:
+        position = bisect.bisect_right(timestamps, end_seconds)
+        end = entries[position] if position < len(entries) else None
+
+    return start, end
+
+
+def scan_log_window(
+    log_path: Path,
+    start_seconds: float | None = None,
+    end_seconds: float | None = None,
+    **kwargs,
+) -> pl.LazyFrame:
+    """
+    Lazily reads the rows of a log between two timestamps with polars, using
+    the index to only read that part of the log.
+
+    :param log_path: The path to any segment of the log.
+    :param start_seconds: The earliest timestamp to read, or None to read
+        from the start of the log.
+    :param end_seconds: The latest timestamp to read, or None to read to the
+        end of the log.
+    :param kwargs: Keyword arguments passed on to `pl.scan_csv`.
+    :return: A LazyFrame of the rows in the window.
+    """
+    start, end = find_log_window(read_log_index(log_path), start_seconds, end_seconds)
+    schema = read_log_schema(log_path)
+    # The window starts at an indexed row, which has all its values written:
+    window = forward_fill_sparse_columns(
+        pl.scan_csv(
+            read_log_window_bytes(log_path, start, end),
+            schema=schema.polars_read_schema,
+            **kwargs,
+        ),
+        schema.sparse_columns,
+        schema.polars_schema,
+    )
+    if start_seconds is not None:
+        window = window.filter(pl.col("timestamp_seconds") >= start_seconds)
+    if end_seconds is not None:
+        window = window.filter(pl.col("timestamp_seconds") <= end_seconds)
+    return window
@@ -0,0 +1,218 @@
+"""
+Module for reading log files, which may be split into several, possibly
+compressed, segments.
+"""
+
+import gzip
+import io
+import lzma
+import re
+from typing import TYPE_CHECKING, BinaryIO
+
+import msgspec
+import polars as pl
+
+from airbrakes.constants import LogCompression
+from airbrakes.data_handling.log_schema import LogSchema, build_log_schema, decode_log_schema
+from airbrakes.data_handling.sparse_columns import SparseColumnFiller, forward_fill_sparse_columns
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from pathlib import Path
+
+
+def get_log_base_path(log_path: Path) -> Path:
+    """
+    Returns the path of the first segment of a log, without any compression
+    suffix.
+
+    :param log_path: The path to any segment of the log, e.g. `log_1.csv`,
+        `log_1.csv.xz` or `log_1.3.csv.gz`.
+    :return: The path of the first segment, e.g. `log_1.csv`.
+    """
+    name = log_path.name
+    for compression in LogCompression:
+        name = name.removesuffix(compression.value)
+    # Remove the segment number, if there is one:
+    name = re.sub(r"\.\d+\.csv$", ".csv", name)
+    return log_path.with_name(name)
+
+
+def get_segment_path(log_path: Path, segment_number: int) -> Path:
+    """
+    Returns the path of an uncompressed segment of a log.
+
+    The first segment keeps the name of the log, e.g. `log_1.csv`, and the
+    following segments are numbered, e.g. `log_1.2.csv`.
+
+    :param log_path: The path of the first segment of the log.
+    :param segment_number: The number of the segment, starting at 1.
+    :return: The path of the segment.
+    """
+    if segment_number == 1:
+        return log_path
+    return log_path.with_name(f"{log_path.stem}.{segment_number}{log_path.suffix}")
+
+
+def get_log_segments(log_path: Path) -> list[Path]:
+    """
+    Finds all the segments of a log, in order.
+
+    If a segment exists both compressed and uncompressed (e.g. the system
+    lost power while it was being compressed), the uncompressed one is used.
+
+    :param log_path: The path to any segment of the log.
+    :return: The paths of the segments which exist on disk, in the order
+        they were written.
+    """
+    base_path = get_log_base_path(log_path)
+    segments: list[Path] = []
+    segment_number = 1
+    while True:
+        segment_path = get_segment_path(base_path, segment_number)
+        candidates = [
+            segment_path,
+            *(segment_path.with_name(segment_path.name + c.value) for c in LogCompression),
+        ]
+        existing = [candidate for candidate in candidates if candidate.exists()]
+        if not existing:
+            return segments
+        segments.append(existing[0])
+        segment_number += 1
+
+
+def open_log_segment(segment_path: Path) -> BinaryIO:
+    """
+    Opens a segment of a log for reading, decompressing it if needed.
+
+    :param segment_path: The path of the segment.
+    :return: A binary file object with the CSV contents of the segment.
+    """
+    if segment_path.suffix == LogCompression.LZMA.value:
+        return lzma.open(segment_path, "rb")
+    if segment_path.suffix == LogCompression.ZLIB.value:
+        return gzip.open(segment_path, "rb")
+    return segment_path.open("rb")
+
+
+def read_log_bytes(log_path: Path) -> bytes:
+    """
+    Reassembles the segments of a log into a single CSV.
+
+    Every segment starts with the header row, so it can be read on its own.
+    Only the header of the first segment is kept.
+
+    :param log_path: The path to any segment of the log.
+    :return: The contents of the whole log, as a CSV with one header row.
+    """
+    contents = io.BytesIO()
+    for segment_number, segment_path in enumerate(get_log_segments(log_path)):
+        with open_log_segment(segment_path) as segment:
+            header = segment.readline()
+            if segment_number == 0:
+                contents.write(header)
+            contents.write(segment.read())
+    return contents.getvalue()
+
+
+def get_schema_path(log_path: Path) -> Path:
+    """
+    Returns the path of the schema of a log.
+
+    :param log_path: The path to any segment of the log.
+    :return: The path of the schema, e.g. `log_1.schema.json` for
+        `log_1.csv`.
+    """
+    return get_log_base_path(log_path).with_suffix(".schema.json")
+
+
+def read_log_header(log_path: Path) -> list[str]:
+    """
+    Reads the names of the columns of a log from its header row.
+
+    :param log_path: The path to any segment of the log.
+    :return: The names of the columns, in order.
+    """
+    with open_log_segment(get_log_segments(log_path)[0]) as segment:
+        return segment.readline().decode().rstrip("\r\n").split(",")
+
+
+def write_log_schema(log_path: Path, schema: LogSchema) -> None:
+    """
+    Writes the schema of a log alongside it.
+
+    :param log_path: The path to any segment of the log.
+    :param schema: The schema of the log.
+    """
+    get_schema_path(log_path).write_bytes(msgspec.json.encode(schema))
+
+
+def read_log_schema(log_path: Path) -> LogSchema:
+    """
+    Reads the schema of a log.
+
+    Logs written before there was a schema are migrated by building their
+    schema from their header row, using the types of the LoggerDataPacket
+    fields. Use scripts/migrate_log_schema.py to write it alongside them.
+
+    :param log_path: The path to any segment of the log.
+    :return: The schema of the log.
+    """
+    schema_path = get_schema_path(log_path)
+    if schema_path.exists():
+        return decode_log_schema(schema_path.read_bytes())
+    return build_log_schema(read_log_header(log_path), version=0)
+
+
+def scan_log(log_path: Path, **kwargs) -> pl.LazyFrame:
+    """
+    Lazily reads a log with polars, no matter how many segments it was
+    split into or whether they were compressed. The types of the columns
+    come from the schema of the log, and the columns which were only
+    written when they changed are filled back in.
+
+    :param log_path: The path to any segment of the log.
+    :param kwargs: Keyword arguments passed on to `pl.scan_csv`.
+    :return: A LazyFrame of the whole log.
+    """
+    schema = read_log_schema(log_path)
+    segments = get_log_segments(log_path)
+    # If the log is a single plain CSV, which is the case for most of our logs, polars can read it
+    # straight from the disk:
+    source = log_path if segments == [log_path] else read_log_bytes(log_path)
+    return forward_fill_sparse_columns(
+        pl.scan_csv(source, schema=schema.polars_read_schema, **kwargs),
+        schema.sparse_columns,
+        schema.polars_schema,
+    )
+
+
+def iterate_log_batches(
+    log_path: Path, columns: Sequence[str], batch_rows: int
+) -> Iterator[pl.DataFrame]:
+    """
+    Reads some of the columns of a log a batch of rows at a time, so a log
+    of any length is read in about the same memory, and the first rows can
+    be used before the rest are read. The columns have the same types and
+    values as with `scan_log`.
+
+    Plain segments are streamed straight from the disk. Compressed segments
+    are decompressed one at a time.
+
+    :param log_path: The path to any segment of the log.
+    :param columns: The names of the columns to read.
+    :param batch_rows: The number of rows to read at a time. The last batch
+        of each segment may have fewer.
+    :return: The batches of rows, in order.
+    """
+    schema = read_log_schema(log_path)
+    compression_suffixes = {compression.value for compression in LogCompression}
+    filler = SparseColumnFiller(schema.sparse_columns, schema.polars_schema)
+    for segment_path in get_log_segments(log_path):
+        source: Path | bytes = segment_path
+        if segment_path.suffix in compression_suffixes:
+            with open_log_segment(segment_path) as segment:
+                source = segment.read()
+        segment_rows = pl.scan_csv(source, schema=schema.polars_read_schema).select(columns)
+        for batch in segment_rows.collect_batches(chunk_size=batch_rows):
+            yield filler.fill(batch)
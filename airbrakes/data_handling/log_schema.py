@@ -0,0 +1,166 @@
+"""
+Module for the schema which is written alongside each log, so the log can be
+read with the right type for every column without having to guess them.
+"""
+
+import typing
+from typing import TYPE_CHECKING
+
+import msgspec
+import polars as pl
+
+from airbrakes.constants import LOG_SCHEMA_VERSION, SPARSE_LOG_COLUMNS, LogColumnType
+from airbrakes.data_handling.packets.logger_data_packet import LoggerDataPacket
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+POLARS_COLUMN_TYPES: dict[LogColumnType, type[pl.DataType]] = {
+    LogColumnType.STRING: pl.String,
+    LogColumnType.FLOAT: pl.Float64,
+    LogColumnType.INT: pl.Int64,
+}
+"""The polars data type each column type is read as."""
+
+PANDAS_COLUMN_TYPES: dict[LogColumnType, str] = {
+    LogColumnType.STRING: "string",
+    LogColumnType.FLOAT: "float64",
+    # The nullable integer type, as the columns can have missing values:
+    LogColumnType.INT: "Int64",
+}
+"""The pandas data type each column type is read as."""
+
+LOGGER_DATA_PACKET_TYPES = typing.get_type_hints(LoggerDataPacket)
+"""The type annotation of each field of LoggerDataPacket."""
+
+LEGACY_LOG_COLUMN_TYPES: dict[str, LogColumnType] = {
+    "encoder_position": LogColumnType.INT,
+    "velocity_used_for_prediction": LogColumnType.FLOAT,
+    "est_position_x_meters": LogColumnType.FLOAT,
+    "est_position_y_meters": LogColumnType.FLOAT,
+    "est_velocity_x_meters_per_s": LogColumnType.FLOAT,
+    "est_velocity_y_meters_per_s": LogColumnType.FLOAT,
+    "est_acceleration_x_gs": LogColumnType.FLOAT,
+    "est_acceleration_y_gs": LogColumnType.FLOAT,
+    "est_acceleration_z_gs": LogColumnType.FLOAT,
+    "est_angular_rate_x_rad_per_s": LogColumnType.FLOAT,
+    "est_angular_rate_y_rad_per_s": LogColumnType.FLOAT,
+    "est_angular_rate_z_rad_per_s": LogColumnType.FLOAT,
+}
+"""The types of the columns which our older logs have, but which are no
+longer in LoggerDataPacket."""
+
+
+class LogColumn(msgspec.Struct, frozen=True):
+    """Describes a column of a log."""
+
+    name: str
+    """The name of the column, as written in the header row."""
+    type: LogColumnType
+    """The type of the values in the column."""
+    sparse: bool = False
+    """Whether the value is only written when it changes, so the empty cells
+    have to be filled in with the value above them."""
+
+
+class LogSchema(msgspec.Struct, frozen=True):
+    """
+    Describes the columns of a log, in order.
+
+    The logger writes this as JSON alongside the log. Logs written before
+    there was a schema get one built from their header row.
+    """
+
+    version: int
+    """The version of the schema, see LOG_SCHEMA_VERSION."""
+    columns: tuple[LogColumn, ...]
+    """The columns of the log, in the order they are written."""
+
+    @property
+    def column_names(self) -> list[str]:
+        """Returns the names of the columns, in order."""
+        return [column.name for column in self.columns]
+
+    @property
+    def sparse_columns(self) -> list[str]:
+        """Returns the names of the columns which are only written when they change."""
+        return [column.name for column in self.columns if column.sparse]
+
+    @property
+    def polars_schema(self) -> dict[str, type[pl.DataType]]:
+        """Returns the schema to pass to polars when reading the log."""
+        return {column.name: POLARS_COLUMN_TYPES[column.type] for column in self.columns}
+
+    @property
+    def polars_read_schema(self) -> dict[str, type[pl.DataType]]:
+        """
+        Returns the schema to read the CSV of the log with. The integer sparse columns are read
+        as strings, as a value going back to being missing is marked in them with "nan", and
+        they are cast to the types of `polars_schema` once they are filled in.
+        """
+        return {
+            column.name: pl.String
+            if column.sparse and column.type == LogColumnType.INT
+            else POLARS_COLUMN_TYPES[column.type]
+            for column in self.columns
+        }
+
+    @property
+    def pandas_dtypes(self) -> dict[str, str]:
+        """Returns the dtypes to pass to pandas when reading the log."""
+        return {column.name: PANDAS_COLUMN_TYPES[column.type] for column in self.columns}
+
+
+def get_column_type(name: str) -> LogColumnType:
+    """
+    Returns the type of a column of a log, from the type of its
+    LoggerDataPacket field.
+
+    :param name: The name of the column.
+    :return: The type of the column. Columns we don't know about are read
+        as strings, so reading them never fails.
+    """
+    field_type = LOGGER_DATA_PACKET_TYPES.get(name)
+    if field_type is None:
+        return LEGACY_LOG_COLUMN_TYPES.get(name, LogColumnType.STRING)
+    # Every field is optional, e.g. `float | None`, so we take the type which isn't None:
+    value_type = next(arg for arg in typing.get_args(field_type) if arg is not type(None))
+    return LogColumnType(value_type.__name__)
+
+
+def build_log_schema(columns: Sequence[str], version: int = LOG_SCHEMA_VERSION) -> LogSchema:
+    """
+    Builds the schema of a log from the names of its columns.
+
+    :param columns: The names of the columns of the log, in order.
+    :param version: The version of the schema. Logs written before there
+        was a schema are version 0.
+    :return: The schema of the log.
+    """
+    return LogSchema(
+        version=version,
+        columns=tuple(
+            # Filling in the sparse columns doesn't change logs which have all their values
+            # written, so it is safe to do for the older logs too:
+            LogColumn(name=name, type=get_column_type(name), sparse=name in SPARSE_LOG_COLUMNS)
+            for name in columns
+        ),
+    )
+
+
+def decode_log_schema(contents: bytes) -> LogSchema:
+    """
+    Decodes a schema written alongside a log.
+
+    :param contents: The contents of the schema file.
+    :return: The schema of the log.
+    :raises ValueError: If the schema is from a newer version of the code,
+        which this version doesn't know how to read.
+    """
+    schema = msgspec.json.decode(contents, type=LogSchema)
+    if schema.version > LOG_SCHEMA_VERSION:
+        raise ValueError(
+            f"The log schema is version {schema.version}, but we can only read up to version "
+            f"{LOG_SCHEMA_VERSION}. Update the code to read this log."
+        )
+    return schema
@@ -2,29 +2,42 @@
 
 import csv
 import os
-import queue
 import threading
+import time
 import typing
-from collections import deque
 from typing import Any, Literal
 
 import msgspec
+from firm_client import FIRMDataPacket
 
 from airbrakes.constants import (
     IDLE_LOG_CAPACITY,
-    LOG_BUFFER_SIZE,
+    LOG_COMPRESSION,
+    LOG_QUEUE_CAPACITY,
+    LOG_SEGMENT_MAX_BYTES,
+    LOG_SEGMENT_MAX_SECONDS,
     NUMBER_OF_LINES_TO_LOG_BEFORE_FLUSHING,
     STOP_SIGNAL,
+    LogCompression,
 )
+from airbrakes.data_handling.log_compressor import LogCompressor
+from airbrakes.data_handling.log_index import LogIndexer, get_index_path
+from airbrakes.data_handling.log_reader import (
+    get_log_segments,
+    get_segment_path,
+    write_log_schema,
+)
+from airbrakes.data_handling.log_schema import build_log_schema
 from airbrakes.data_handling.packets.logger_data_packet import LoggerDataPacket
-from airbrakes.state import LandedState, StandbyState
-from airbrakes.utils import get_all_packets_from_queue
+from airbrakes.data_handling.pre_trigger_buffer import LoopDataPackets, PreTriggerBuffer
+from airbrakes.data_handling.sparse_columns import SparseColumnEncoder
+from airbrakes.data_handling.spsc_ring import SPSCRing
+from airbrakes.state import CoastState, LandedState, MotorBurnState, StandbyState
 
 if typing.TYPE_CHECKING:
+    import _csv
     from pathlib import Path
 
-    from firm_client import FIRMDataPacket
-
     from airbrakes.data_handling.packets.apogee_predictor_data_packet import (
         ApogeePredictorDataPacket,
     )
@@ -36,6 +49,13 @@ DecodedLoggerDataPacket = list[int | float | str]
 """The type of LoggerDataPacket after an instance of it converted to primitive
 type by msgspec.to_builtins."""
 
+LOG_INDEX_ENCODER = msgspec.json.Encoder()
+"""The encoder for the entries of the log index."""
+
+BacklogLoop = tuple[LoopDataPackets, list[FIRMDataPacket]]
+"""The packets of a loop which got a backlog from FIRM, put in the log queue as
+they are, for the logging thread to make the rows of."""
+
 
 class Logger:
     """
@@ -47,17 +67,48 @@ class Logger:
     we can continue to log data while the main loop is running. It uses
     Python's csv module to append the airbrakes' current state,
     extension, and FIRM data to our logs in real time.
+
+    The log is split into segments, so no single file grows too large.
+    Once a segment reaches a maximum size or age, it is closed, and
+    compressed in the background while the logger moves on to the next
+    one. Use the functions in log_reader.py to read the whole log back.
+
+    Alongside the log, it writes an index (see log_index.py) of where each
+    state and apogee prediction starts in the log, so we can seek straight
+    to them later, and a schema (see log_schema.py) with the type of every
+    column, so the log can be read without guessing them.
+
+    The columns which rarely change, like the servo extension and the apogee
+    prediction, are only written when they change (see sparse_columns.py).
+    The log readers in log_reader.py fill them back in.
     """
 
     __slots__ = (
+        "_backlog_rows_queued",
+        "_backlog_rows_taken",
+        "_dropped_packets",
         "_log_buffer",
+        "_log_compressor",
         "_log_counter",
         "_log_queue",
+        "_log_queue_capacity",
+        "_log_queue_high_watermark",
+        "_log_queue_overflow",
         "_log_thread",
+        "_max_segment_bytes",
+        "_max_segment_seconds",
+        "_started",
         "log_path",
     )
 
-    def __init__(self, log_dir: Path) -> None:
+    def __init__(
+        self,
+        log_dir: Path,
+        log_queue_capacity: int = LOG_QUEUE_CAPACITY,
+        max_segment_bytes: int = LOG_SEGMENT_MAX_BYTES,
+        max_segment_seconds: float = LOG_SEGMENT_MAX_SECONDS,
+        compression: LogCompression | None = LOG_COMPRESSION,
+    ) -> None:
         """
         Initializes the logger object.
 
@@ -68,43 +119,122 @@ class Logger:
         loop to continue running without waiting for the log file to be
         written to.
         :param log_dir: The directory where the log files will be.
+        :param log_queue_capacity: The maximum number of rows which can wait
+            in the log queue before rows logged in the idle states are dropped.
+        :param max_segment_bytes: The size in bytes at which a new log segment
+            is started.
+        :param max_segment_seconds: The number of seconds after which a new
+            log segment is started.
+        :param compression: The algorithm to compress closed log segments
+            with, or None to leave them uncompressed.
         """
         # Create the log directory if it doesn't exist
         log_dir.mkdir(parents=True, exist_ok=True)
 
-        # Get all existing log files and find the highest suffix number
-        existing_logs = list(log_dir.glob("log_*.csv"))
+        # Get all existing log files (including their later and compressed segments, in case the
+        # first segment was deleted) and find the highest suffix number
+        existing_logs = list(log_dir.glob("log_*.csv*"))
         max_suffix = (
-            max(int(log.stem.split("_")[-1]) for log in existing_logs) if existing_logs else 0
+            max(int(log.name.split(".")[0].split("_")[-1]) for log in existing_logs)
+            if existing_logs
+            else 0
         )
 
         # Buffer for StandbyState and LandedState
         self._log_counter = 0
-        self._log_buffer = deque(maxlen=LOG_BUFFER_SIZE)
+        self._log_buffer = PreTriggerBuffer()
 
         # Create a new log file with the next number in sequence
         self.log_path = log_dir / f"log_{max_suffix + 1}.csv"
         with self.log_path.open(mode="w", newline="") as file_writer:
-            headers = list(LoggerDataPacket.__struct_fields__)
-            writer = csv.writer(file_writer)
-            writer.writerow(headers)
-
-        self._log_queue: queue.SimpleQueue[LoggerDataPacket | Literal["STOP"]] = queue.SimpleQueue()
+            Logger._write_headers(csv.writer(file_writer))
+        get_index_path(self.log_path).touch()
+        write_log_schema(self.log_path, build_log_schema(LoggerDataPacket.__struct_fields__))
+        self._max_segment_bytes = max_segment_bytes
+        self._max_segment_seconds = max_segment_seconds
+        self._log_compressor = LogCompressor(compression) if compression else None
+
+        # The main loop is the only thread putting rows in the log queue, and the logging thread is
+        # the only one taking them out. It has room for twice the capacity, so rows logged during
+        # the flight, which can go over the capacity, still fit. A backlog takes a single slot, but
+        # is counted as all of its rows:
+        self._log_queue: SPSCRing[LoggerDataPacket | BacklogLoop | Literal["STOP"]] = SPSCRing(
+            2 * log_queue_capacity
+        )
+        # The rows of the flight which didn't fit in the log queue, as the main loop never waits
+        # for the logging thread. They are put in the queue before any other rows:
+        self._log_queue_overflow: list[LoggerDataPacket | BacklogLoop] = []
+        # Keeps track of how backed up the log queue gets, and how many new rows we had to drop
+        # before they were put in it. The log queue counts the rows it dropped itself:
+        self._log_queue_capacity = log_queue_capacity
+        self._log_queue_high_watermark = 0
+        self._dropped_packets = 0
+        # The rows of the backlogs beyond the one slot each takes, put in the log queue by the main
+        # loop and taken out by the logging thread. Each is only ever changed by that one thread:
+        self._backlog_rows_queued = 0
+        self._backlog_rows_taken = 0
 
         # Start the logging thread
         self._log_thread = threading.Thread(
             target=self._logging_loop, name="Logger Thread", daemon=True
         )
+        # Set once the logging thread has opened the log:
+        self._started = threading.Event()
 
     @property
     def is_running(self) -> bool:
         """Returns whether the logging thread is running."""
         return self._log_thread.is_alive()
 
+    @property
+    def thread(self) -> threading.Thread:
+        """The thread which writes the log file."""
+        return self._log_thread
+
     @property
     def is_log_buffer_full(self) -> bool:
         """Returns whether the log buffer is full."""
-        return len(self._log_buffer) == LOG_BUFFER_SIZE
+        return self._log_buffer.is_full
+
+    @property
+    def segment_paths(self) -> list[Path]:
+        """
+        Returns the paths of the segments of this log written so far, in
+        order.
+        """
+        return get_log_segments(self.log_path)
+
+    @property
+    def log_queue_size(self) -> int:
+        """
+        Returns the number of rows waiting in the log queue to be written,
+        counting every row of the backlogs waiting in it, and the rows of the
+        flight which didn't fit in it yet.
+        """
+        return (
+            len(self._log_queue)
+            + len(self._log_queue_overflow)
+            + self._backlog_rows_queued
+            - self._backlog_rows_taken
+        )
+
+    @property
+    def log_queue_high_watermark(self) -> int:
+        """
+        Returns the largest number of rows that have been waiting in the log
+        queue at once.
+        """
+        return self._log_queue_high_watermark
+
+    @property
+    def dropped_packets(self) -> int:
+        """
+        Returns the total number of rows dropped because the log queue was
+        full. The oldest rows discarded from the queue are only counted once
+        the logging thread skips them, so the rows it took out before it saw
+        they were discarded aren't counted.
+        """
+        return self._log_queue.dropped + self._dropped_packets
 
     @staticmethod
     def _convert_unknown_type_to_str(obj_type: Any) -> str:
@@ -170,6 +300,9 @@ class Logger:
                 set_extension=str(servo_data_packet.set_extension.value),
                 battery_voltage=servo_data_packet.battery_voltage,
                 current_milliamps=servo_data_packet.current_milliamps,
+                command_loop_id=servo_data_packet.command_loop_id,
+                command_firm_timestamp_seconds=servo_data_packet.command_firm_timestamp_seconds,
+                actuation_latency_ns=servo_data_packet.actuation_latency_ns,
                 # FIRMDataPacket Fields
                 timestamp_seconds=firm_data_packet.timestamp_seconds,
                 temperature_celsius=firm_data_packet.temperature_celsius,
@@ -204,7 +337,10 @@ class Logger:
                 # Remaining Context Fields
                 retrieved_firm_packets=context_data_packet.retrieved_firm_packets,
                 apogee_predictor_queue_size=context_data_packet.apogee_predictor_queue_size,
+                log_queue_high_watermark=context_data_packet.log_queue_high_watermark,
+                dropped_log_packets=context_data_packet.dropped_log_packets,
                 update_timestamp_ns=context_data_packet.update_timestamp_ns,
+                loop_stage_durations_ns=context_data_packet.loop_stage_durations_ns,
             )
 
             logger_data_packets.append(logger_packet)
@@ -217,8 +353,19 @@ class Logger:
 
         This is called before the main while loop starts.
         """
+        if self._log_compressor:
+            self._log_compressor.start()
         self._log_thread.start()
 
+    def wait_until_started(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until the logging thread has opened the log, and is ready to write to it.
+
+        :param timeout: The longest to wait in seconds, or None to wait for as long as it takes.
+        :return: True if the logging thread started in time, False otherwise.
+        """
+        return self._started.wait(timeout)
+
     def stop(self) -> None:
         """
         Stops the logging thread.
@@ -227,9 +374,15 @@ class Logger:
         """
         # Log the buffer before stopping the thread
         self._log_the_buffer()
-        self._log_queue.put(STOP_SIGNAL)  # Put the stop signal in the queue
+        # The main loop is done, so it can wait for the rows which didn't fit in the log queue:
+        self._log_queue.push_many(self._log_queue_overflow)
+        self._log_queue_overflow.clear()
+        self._log_queue.push(STOP_SIGNAL)  # Put the stop signal in the queue
         # Waits for the thread to finish before stopping it
         self._log_thread.join()
+        # Finish compressing the segments which were closed:
+        if self._log_compressor and self._log_compressor.is_running:
+            self._log_compressor.stop()
 
     def log(
         self,
@@ -247,28 +400,37 @@ class Logger:
         :param apogee_predictor_data_packet: The most recent apogee
             predictor data packet to log.
         """
-        # We are populating a list with the fields of the logger data packet
-        logger_data_packets: list[LoggerDataPacket] = Logger._prepare_logger_packets(
-            context_data_packet,
-            servo_data_packet,
-            firm_data_packets,
-            apogee_predictor_data_packet,
-        )
+        self._pause_compression_in_flight(context_data_packet)
 
         # If we are in Standby or Landed State, we need to buffer the data packets:
         if context_data_packet.state in (StandbyState, LandedState):
             # Determine how many packets to log and buffer
             log_capacity = max(0, IDLE_LOG_CAPACITY - self._log_counter)
-            to_log = logger_data_packets[:log_capacity]
-            to_buffer = logger_data_packets[log_capacity:]
+            to_log = firm_data_packets[:log_capacity]
+            to_buffer = firm_data_packets[log_capacity:]
 
-            # Update counter and handle logging/buffering
+            # Update counter and handle logging/buffering. We can afford to lose these rows if
+            # the logger can't keep up.
             self._log_counter += len(to_log)
             if to_log:
-                for packet in to_log:
-                    self._log_queue.put(packet, block=False)
+                self._enqueue_packets(
+                    Logger._prepare_logger_packets(
+                        context_data_packet,
+                        servo_data_packet,
+                        to_log,
+                        apogee_predictor_data_packet,
+                    ),
+                    drop_oldest=True,
+                )
             if to_buffer:
-                self._log_buffer.extend(to_buffer)
+                # The buffer only gives back a decimated trickle of the rows it pushes out:
+                evicted_loops = self._log_buffer.push(
+                    to_buffer, context_data_packet, servo_data_packet, apogee_predictor_data_packet
+                )
+                if evicted_loops:
+                    self._enqueue_packets(
+                        Logger._prepare_buffered_packets(evicted_loops), drop_oldest=True
+                    )
         else:
             # If we are not in Standby or Landed State, we should log the buffer if it's not empty:
             if self._log_buffer:
@@ -276,19 +438,206 @@ class Logger:
 
             # Reset the counter for other states
             self._log_counter = 0
-            for packet in logger_data_packets:
-                self._log_queue.put(packet, block=False)
+            # Flight data is never dropped:
+            self._enqueue_packets(
+                Logger._prepare_logger_packets(
+                    context_data_packet,
+                    servo_data_packet,
+                    firm_data_packets,
+                    apogee_predictor_data_packet,
+                ),
+                drop_oldest=False,
+            )
+
+    def log_backlog(
+        self,
+        context_data_packet: ContextDataPacket,
+        servo_data_packet: ServoDataPacket,
+        firm_data_packets: list[FIRMDataPacket],
+        apogee_predictor_data_packet: ApogeePredictorDataPacket | None,
+    ) -> None:
+        """
+        Logs a backlog of FIRM data packets, like `log`. In flight, the packets
+        are put in the log queue as they are, and the logging thread makes the
+        rows of them, so the main loop can catch up on the backlog quickly.
+
+        :param context_data_packet: The Context Data Packet to log.
+        :param servo_data_packet: The Servo Data Packet to log.
+        :param firm_data_packets: The FIRM data packets of the backlog.
+        :param apogee_predictor_data_packet: The most recent apogee
+            predictor data packet to log.
+        """
+        # The log buffer already stores the packets without making rows of them:
+        if context_data_packet.state in (StandbyState, LandedState):
+            self.log(
+                context_data_packet,
+                servo_data_packet,
+                firm_data_packets,
+                apogee_predictor_data_packet,
+            )
+            return
+
+        self._pause_compression_in_flight(context_data_packet)
+        if self._log_buffer:
+            self._log_the_buffer()
+        self._log_counter = 0
+        # Flight data is never dropped:
+        self._push_flight_packets(
+            [
+                (
+                    LoopDataPackets(
+                        context_data_packet, servo_data_packet, apogee_predictor_data_packet
+                    ),
+                    firm_data_packets,
+                )
+            ]
+        )
+        self._backlog_rows_queued += len(firm_data_packets) - 1
+        self._log_queue_high_watermark = max(self._log_queue_high_watermark, self.log_queue_size)
+
+    def _pause_compression_in_flight(self, context_data_packet: ContextDataPacket) -> None:
+        """
+        Pauses compressing the closed segments while the air brakes may be
+        deployed, so it never competes with the control loop, and resumes it
+        after.
+
+        :param context_data_packet: The Context Data Packet of this loop.
+        """
+        if self._log_compressor:
+            in_flight = context_data_packet.state in (MotorBurnState, CoastState)
+            if in_flight and not self._log_compressor.is_paused:
+                self._log_compressor.pause()
+            elif not in_flight and self._log_compressor.is_paused:
+                self._log_compressor.resume()
+
+    @staticmethod
+    def _prepare_buffered_packets(
+        buffered_loops: list[tuple[LoopDataPackets, list[FIRMDataPacket]]],
+    ) -> list[LoggerDataPacket]:
+        """
+        Creates the rows to be logged from the FIRM data packets which were
+        held in the log buffer.
+
+        :param buffered_loops: The packets of each loop, and the FIRM data
+            packets fetched in that loop.
+        :return: A list of LoggerDataPacket objects.
+        """
+        logger_data_packets: list[LoggerDataPacket] = []
+        for loop_data_packets, firm_data_packets in buffered_loops:
+            logger_data_packets.extend(
+                Logger._prepare_logger_packets(
+                    loop_data_packets.context_data_packet,
+                    loop_data_packets.servo_data_packet,
+                    firm_data_packets,
+                    loop_data_packets.apogee_predictor_data_packet,
+                )
+            )
+        return logger_data_packets
 
     def _log_the_buffer(self):
         """
         Enqueues all the packets in the log buffer to the log queue, so they
         will be logged.
         """
-        for packet in self._log_buffer:
-            self._log_queue.put(packet, block=False)
-        self._log_buffer.clear()
+        self._enqueue_packets(
+            Logger._prepare_buffered_packets(self._log_buffer.flush()), drop_oldest=False
+        )
+
+    def _enqueue_packets(self, logger_data_packets: list[LoggerDataPacket], drop_oldest: bool):
+        """
+        Puts the packets in the log queue, and keeps track of how backed up the
+        queue is.
+
+        :param logger_data_packets: The packets to put in the log queue.
+        :param drop_oldest: Whether to drop the oldest rows if the log queue
+            would exceed its capacity. If False, all the packets are enqueued,
+            even if it means the queue exceeds its capacity, and the ones which
+            don't fit once the queue is full (at twice its capacity) are held
+            until the next time, so the main loop never waits.
+        """
+        if drop_oldest and not self._push_overflow():
+            # The rows of the flight which didn't fit go first, so these would have to wait behind
+            # them, and we can afford to lose them:
+            self._dropped_packets += len(logger_data_packets)
+        elif drop_oldest:
+            overflow = self.log_queue_size + len(logger_data_packets) - self._log_queue_capacity
+            # A backlog from the flight takes a single slot, so while one may still be waiting, the
+            # newest rows are dropped instead, so it is never discarded:
+            if overflow > 0 and self._backlog_rows_taken != self._backlog_rows_queued:
+                kept = max(len(logger_data_packets) - overflow, 0)
+                self._dropped_packets += len(logger_data_packets) - kept
+                logger_data_packets = logger_data_packets[:kept]
+            elif overflow > 0:
+                # First drop the oldest rows still waiting in the queue. The queue counts them
+                # once the logging thread skips them:
+                discarded = self._log_queue.discard_oldest(overflow)
+                # If the queue drained before we dropped enough, the oldest of the new rows go too:
+                if overflow > discarded:
+                    sliced_off = min(overflow - discarded, len(logger_data_packets))
+                    logger_data_packets = logger_data_packets[sliced_off:]
+                    self._dropped_packets += sliced_off
+            # The dropped rows keep their slots until the logging thread skips them, so if it is
+            # stuck, the newest rows are dropped once the queue is full, instead of waiting:
+            pushed = self._log_queue.try_push_many(logger_data_packets)
+            self._dropped_packets += len(logger_data_packets) - pushed
+        else:
+            self._push_flight_packets(logger_data_packets)
+
+        self._log_queue_high_watermark = max(self._log_queue_high_watermark, self.log_queue_size)
+
+    def _push_flight_packets(self, packets: list[LoggerDataPacket | BacklogLoop]) -> None:
+        """
+        Puts packets which must not be dropped in the log queue, after the ones
+        which didn't fit before. The ones which don't fit now are held until
+        the next time, instead of waiting for the logging thread.
+
+        :param packets: The rows, or backlogs, to put in the log queue.
+        """
+        pushed = self._log_queue.try_push_many(packets) if self._push_overflow() else 0
+        self._log_queue_overflow.extend(packets[pushed:])
+
+    def _push_overflow(self) -> bool:
+        """
+        Puts as many of the rows which didn't fit in the log queue before in it
+        as there is room for now, without waiting.
+
+        :return: Whether all of them are in the log queue now.
+        """
+        if self._log_queue_overflow:
+            del self._log_queue_overflow[: self._log_queue.try_push_many(self._log_queue_overflow)]
+        return not self._log_queue_overflow
+
+    @staticmethod
+    def _write_headers(writer: _csv.Writer) -> int:
+        """
+        Writes the header row, which every log segment starts with.
+
+        :param writer: The CSV writer of the segment.
+        :return: The number of characters written.
+        """
+        return writer.writerow(LoggerDataPacket.__struct_fields__)
 
     # ------------------------ ALL METHODS BELOW RUN IN A SEPARATE THREAD -------------------------
+    def _prepare_queued_packets(
+        self,
+        queued_packets: list[LoggerDataPacket | BacklogLoop],
+    ) -> list[LoggerDataPacket]:
+        """
+        Makes the rows of the backlogs in the packets taken out of the log
+        queue, and counts them as taken out. The rest of them are rows already.
+
+        :param queued_packets: The packets taken out of the log queue.
+        :return: The rows to write, in the order they were logged.
+        """
+        logger_data_packets: list[LoggerDataPacket] = []
+        for queued_packet in queued_packets:
+            if isinstance(queued_packet, LoggerDataPacket):
+                logger_data_packets.append(queued_packet)
+            else:
+                logger_data_packets.extend(Logger._prepare_buffered_packets([queued_packet]))
+        self._backlog_rows_taken += len(logger_data_packets) - len(queued_packets)
+        return logger_data_packets
+
     @staticmethod
     def _truncate_floats(data: DecodedLoggerDataPacket) -> list[str | int]:
         """
@@ -307,38 +656,158 @@ class Logger:
         It runs in parallel with the main loop.
         """
         # Set up the csv logging in the new thread
-        with self.log_path.open(mode="a", newline="") as file_writer:
-            writer = csv.writer(file_writer)
-            number_of_lines_logged = 0
+        log_writer = LogWriter(
+            self.log_path,
+            self._max_segment_bytes,
+            self._max_segment_seconds,
+            self._log_compressor,
+        )
+        self._started.set()
+        try:
             while True:
                 # Get a message from the queue (this will block until a message is available)
                 # Because there's no timeout, it will wait indefinitely until it gets a message.
-                logger_packets: list[LoggerDataPacket | Literal["STOP"]] = (
-                    get_all_packets_from_queue(self._log_queue, block=True)
-                )
-                packet_fields: list[DecodedLoggerDataPacket | Literal["STOP"]] = (
-                    msgspec.to_builtins(
-                        logger_packets, enc_hook=Logger._convert_unknown_type_to_str
+                logger_packets: list[LoggerDataPacket | BacklogLoop | Literal["STOP"]] = []
+                self._log_queue.drain_into(logger_packets, block=True)
+                # If the message is the stop signal, log what came before it and stop:
+                if STOP_SIGNAL in logger_packets:
+                    log_writer.write(
+                        self._prepare_queued_packets(
+                            logger_packets[: logger_packets.index(STOP_SIGNAL)]
+                        )
                     )
-                )
-                # If the message is the stop signal, break out of the loop
-                for message_field in packet_fields:
-                    if message_field == STOP_SIGNAL:
-                        return
-                    writer.writerow(Logger._truncate_floats(message_field))
-                    number_of_lines_logged += 1
-                    # During our Pelicanator 1 flight, the rocket fell and had a very hard impact
-                    # causing the pi to lose power. This caused us to lose a lot of lines of data
-                    # that were not written to the log file. To prevent this from happening again,
-                    # we flush the logger 1000 lines (equivalent to 1 second).
-                    if number_of_lines_logged % NUMBER_OF_LINES_TO_LOG_BEFORE_FLUSHING == 0:
-                        # Tell Python to flush the data. This gives the data to the OS, and it is
-                        # stored as a dirty page cache (in memory) until the OS decides to write it
-                        # to disk. Technically python automatically flushes the data when the python
-                        # buffer is full (8192 bytes, which would be about 25 lines of data).
-                        file_writer.flush()
-                        # Tell the OS to write the file to disk from the dirty page cache. This
-                        # ensures that the data is written to disk and not just stored in memory.
-                        # This operation is the one which is actually "blocking" when talking about
-                        # file I/O.
-                        os.fsync(file_writer.fileno())
+                    return
+                log_writer.write(self._prepare_queued_packets(logger_packets))
+        finally:
+            log_writer.close()
+
+
+class LogWriter:
+    """
+    Writes rows to the segments of a log, and to its index, in the thread
+    it is called from. The logging thread of the Logger writes its rows
+    with it.
+    """
+
+    __slots__ = (
+        "_file_writer",
+        "_index_file",
+        "_log_compressor",
+        "_log_indexer",
+        "_max_segment_bytes",
+        "_max_segment_seconds",
+        "_number_of_lines_logged",
+        "_rows_in_segment",
+        "_segment_deadline",
+        "_segment_number",
+        "_segment_path",
+        "_segment_size",
+        "_sparse_column_encoder",
+        "_writer",
+        "log_path",
+    )
+
+    def __init__(
+        self,
+        log_path: Path,
+        max_segment_bytes: int,
+        max_segment_seconds: float,
+        log_compressor: LogCompressor | None,
+    ) -> None:
+        """
+        Opens the first segment of the log, which already has its headers, and the index of the
+        log, to add rows to them.
+
+        :param log_path: The path to the first segment of the log.
+        :param max_segment_bytes: The size in bytes at which a new segment is started.
+        :param max_segment_seconds: The number of seconds after which a new segment is started.
+        :param log_compressor: The compressor to hand the closed segments to, or None to leave
+            them uncompressed.
+        """
+        self.log_path = log_path
+        self._max_segment_bytes = max_segment_bytes
+        self._max_segment_seconds = max_segment_seconds
+        self._log_compressor = log_compressor
+        self._segment_number = 1
+        self._segment_path = log_path
+        self._file_writer = log_path.open(mode="a", newline="")
+        self._writer = csv.writer(self._file_writer)
+        # We log plain ASCII, so the number of characters written is the number of bytes written:
+        self._segment_size = log_path.stat().st_size
+        self._rows_in_segment = 0
+        self._segment_deadline = time.monotonic() + max_segment_seconds
+        self._number_of_lines_logged = 0
+        self._index_file = get_index_path(log_path).open(mode="ab")
+        self._log_indexer = LogIndexer(LoggerDataPacket.__struct_fields__)
+        self._sparse_column_encoder = SparseColumnEncoder(LoggerDataPacket.__struct_fields__)
+
+    def write(self, logger_packets: list[LoggerDataPacket]) -> None:
+        """
+        Writes the packets to the log, as rows.
+
+        :param logger_packets: The packets to write, in order.
+        """
+        packet_fields: list[DecodedLoggerDataPacket] = msgspec.to_builtins(
+            logger_packets, enc_hook=Logger._convert_unknown_type_to_str
+        )
+        for message_field in packet_fields:
+            # Move on to the next segment once this one is big or old enough:
+            if self._rows_in_segment and (
+                self._segment_size >= self._max_segment_bytes
+                or time.monotonic() >= self._segment_deadline
+            ):
+                self._close_segment()
+                self._segment_number += 1
+                self._segment_path = get_segment_path(self.log_path, self._segment_number)
+                self._file_writer = self._segment_path.open(mode="w", newline="")
+                self._writer = csv.writer(self._file_writer)
+                self._segment_size = Logger._write_headers(self._writer)
+                self._segment_deadline = time.monotonic() + self._max_segment_seconds
+                self._rows_in_segment = 0
+            index_entries = self._log_indexer.index_row(
+                message_field,
+                self._number_of_lines_logged,
+                self._segment_number,
+                self._segment_size,
+                first_in_segment=not self._rows_in_segment,
+            )
+            if index_entries:
+                self._index_file.write(LOG_INDEX_ENCODER.encode_lines(index_entries))
+            # Rows in the index are written in full, so the log can be read starting from any of
+            # them:
+            self._sparse_column_encoder.encode_row(message_field, keyframe=bool(index_entries))
+            self._segment_size += self._writer.writerow(Logger._truncate_floats(message_field))
+            self._rows_in_segment += 1
+            self._number_of_lines_logged += 1
+            # During our Pelicanator 1 flight, the rocket fell and had a very hard impact causing
+            # the pi to lose power. This caused us to lose a lot of lines of data that were not
+            # written to the log file. To prevent this from happening again, we flush the logger
+            # 1000 lines (equivalent to 1 second).
+            if self._number_of_lines_logged % NUMBER_OF_LINES_TO_LOG_BEFORE_FLUSHING == 0:
+                # Tell Python to flush the data. This gives the data to the OS, and it is stored
+                # as a dirty page cache (in memory) until the OS decides to write it to disk.
+                # Technically python automatically flushes the data when the python buffer is
+                # full (8192 bytes, which would be about 25 lines of data).
+                self._file_writer.flush()
+                # Tell the OS to write the file to disk from the dirty page cache. This ensures
+                # that the data is written to disk and not just stored in memory. This operation
+                # is the one which is actually "blocking" when talking about file I/O.
+                os.fsync(self._file_writer.fileno())
+                # The index can be rebuilt from the log, so it doesn't need to be synced:
+                self._index_file.flush()
+
+    def close(self) -> None:
+        """Closes the segment being written to, and the index."""
+        self._file_writer.close()
+        self._index_file.close()
+
+    def _close_segment(self) -> None:
+        """
+        Makes sure the segment being written to is fully on disk, closes it,
+        and hands it off to be compressed.
+        """
+        self._file_writer.flush()
+        os.fsync(self._file_writer.fileno())
+        self._file_writer.close()
+        if self._log_compressor:
+            self._log_compressor.compress(self._segment_path)
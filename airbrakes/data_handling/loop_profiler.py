@@ -0,0 +1,182 @@
+"""
+Module for timing each stage of the main loop, to see where the time goes on
+the Pi.
+"""
+
+import time
+
+import msgspec
+
+from airbrakes.constants import LATENCY_HISTOGRAM_BUCKETS, LATENCY_HISTOGRAM_SUB_BUCKETS, LoopStage
+
+_SUB_BUCKET_BITS = LATENCY_HISTOGRAM_SUB_BUCKETS.bit_length() - 1
+
+
+class StageLatency(msgspec.Struct, frozen=True):
+    """How long a stage of the main loop took, over every loop it was timed in."""
+
+    stage: str
+    """The name of the stage, from LoopStage."""
+    loops: int
+    """How many loops the stage was timed in."""
+    p50_us: float
+    """The median time the stage took."""
+    p99_us: float
+    """The time which 99% of the loops took the stage within."""
+    max_us: float
+    """The longest time the stage took."""
+
+    def __str__(self) -> str:
+        """Returns the latency as one line, to show at shutdown."""
+        return (
+            f"{self.stage:<18} p50 {self.p50_us:>9.1f} us, p99 {self.p99_us:>9.1f} us, "
+            f"max {self.max_us:>9.1f} us over {self.loops} loops"
+        )
+
+
+class LatencyHistogram:
+    """
+    Counts how many durations fell in each bucket of a fixed number of
+    buckets, whose width grows with the duration, so recording a duration
+    takes the same short time however many have been recorded, and never
+    allocates.
+
+    Each power of two of nanoseconds is split into
+    LATENCY_HISTOGRAM_SUB_BUCKETS buckets, so a percentile read from the
+    histogram is within that fraction of the real one. The max is exact.
+    """
+
+    __slots__ = ("_counts", "count", "max_ns")
+
+    def __init__(self) -> None:
+        """Initializes an empty histogram."""
+        self._counts = [0] * LATENCY_HISTOGRAM_BUCKETS
+        self.count = 0
+        """How many durations have been recorded."""
+        self.max_ns = 0
+        """The longest duration recorded."""
+
+    @staticmethod
+    def _bucket(duration_ns: int) -> int:
+        """
+        Returns the bucket a duration goes in.
+
+        :param duration_ns: The duration, in nanoseconds.
+        :return: The index of the bucket.
+        """
+        # The top bits of the duration pick the bucket within its power of two:
+        shift = max(duration_ns.bit_length() - 1 - _SUB_BUCKET_BITS, 0)
+        return min(
+            (shift << _SUB_BUCKET_BITS) + (duration_ns >> shift), LATENCY_HISTOGRAM_BUCKETS - 1
+        )
+
+    @staticmethod
+    def _bucket_bounds(bucket: int) -> tuple[int, int]:
+        """
+        Returns the shortest and longest durations which go in a bucket.
+
+        :param bucket: The index of the bucket.
+        :return: The shortest and longest duration, in nanoseconds.
+        """
+        shift = max((bucket >> _SUB_BUCKET_BITS) - 1, 0)
+        lowest_ns = (bucket - (shift << _SUB_BUCKET_BITS)) << shift
+        return lowest_ns, lowest_ns + (1 << shift) - 1
+
+    def record(self, duration_ns: int) -> None:
+        """
+        Records a duration.
+
+        :param duration_ns: The duration, in nanoseconds.
+        """
+        self._counts[self._bucket(duration_ns)] += 1
+        self.count += 1
+        self.max_ns = max(self.max_ns, duration_ns)
+
+    def percentile_ns(self, percent: float) -> float:
+        """
+        Returns the duration which this percent of the durations recorded were within, as the
+        middle of the bucket it is in.
+
+        :param percent: The percentile, from 0 to 100.
+        :return: The duration, in nanoseconds, or 0 if nothing was recorded.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(percent / 100 * self.count, 1)
+        seen = 0
+        for bucket, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if seen >= rank:
+                lowest_ns, highest_ns = self._bucket_bounds(bucket)
+                return min((lowest_ns + highest_ns) / 2, self.max_ns)
+        return float(self.max_ns)
+
+
+class LoopProfiler:
+    """
+    Times each stage of the main loop with `time.perf_counter_ns`, into a
+    LatencyHistogram per stage.
+
+    `Context.update` calls `start_loop` before the first stage, and `lap`
+    after each stage, so each stage is timed from the end of the one before
+    it.
+    """
+
+    __slots__ = ("_histograms", "_lap_start_ns", "last_loop_ns", "log_each_loop")
+
+    def __init__(self, log_each_loop: bool = False) -> None:
+        """
+        Initializes the LoopProfiler.
+
+        :param log_each_loop: Whether to log how long each stage took in every loop, as well as
+            keeping the histograms.
+        """
+        self._histograms = [LatencyHistogram() for _ in LoopStage]
+        self._lap_start_ns = 0
+        self.log_each_loop = log_each_loop
+        """Whether the Context logs how long each stage took in every loop."""
+        self.last_loop_ns = [0] * len(LoopStage)
+        """How long each stage took in the latest loop, in the order of LoopStage."""
+
+    def start_loop(self) -> None:
+        """Starts timing a loop, from the start of its first stage."""
+        self._lap_start_ns = time.perf_counter_ns()
+
+    def lap(self, stage: LoopStage) -> None:
+        """
+        Records how long a stage took, from the end of the stage before it.
+
+        :param stage: The stage which just finished.
+        """
+        now_ns = time.perf_counter_ns()
+        duration_ns = now_ns - self._lap_start_ns
+        self.last_loop_ns[stage] = duration_ns
+        self._histograms[stage].record(duration_ns)
+        self._lap_start_ns = now_ns
+
+    def get_stage_durations(self, last_stage: LoopStage) -> str:
+        """
+        Returns how long each stage took in this loop, up to a stage, to log.
+
+        :param last_stage: The last stage which has finished in this loop.
+        :return: The durations in nanoseconds, in the order of LoopStage, separated by spaces.
+        """
+        return " ".join(map(str, self.last_loop_ns[: last_stage + 1]))
+
+    def get_report(self) -> list[StageLatency]:
+        """
+        Returns how long each stage took, over every loop so far.
+
+        :return: The latency of each stage which was timed, in the order of LoopStage.
+        """
+        return [
+            StageLatency(
+                stage=stage.name.lower(),
+                loops=histogram.count,
+                p50_us=histogram.percentile_ns(50) / 1e3,
+                p99_us=histogram.percentile_ns(99) / 1e3,
+                max_us=histogram.max_ns / 1e3,
+            )
+            for stage, histogram in zip(LoopStage, self._histograms, strict=True)
+            if histogram.count
+        ]
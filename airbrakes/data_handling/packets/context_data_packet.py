@@ -28,6 +28,18 @@ class ContextDataPacket(msgspec.Struct, tag=True, array_like=True):
     """The number of apogee predictor data packets in the apogee predictor
     queue, waiting to be fetched by the main thread."""
 
+    log_queue_high_watermark: int
+    """The largest number of rows that have been waiting in the log queue at
+    once, since the logger was started.
+
+    If this number approaches LOG_QUEUE_CAPACITY, the logger thread
+    can't keep up with writing to the SD card.
+    """
+
+    dropped_log_packets: int
+    """The total number of rows the logger has dropped because the log queue
+    was full."""
+
     update_timestamp_ns: int
     """The timestamp reported by the local computer at which we processed and
     logged this data packet.
@@ -35,3 +47,10 @@ class ContextDataPacket(msgspec.Struct, tag=True, array_like=True):
     This is used to compare the time difference between what is reported
     by the FIRM, and when we finished processing the data packet.
     """
+
+    loop_stage_durations_ns: str | None = None
+    """How long each stage of this loop took before the packets were generated, in nanoseconds,
+    in the order of LoopStage, separated by spaces.
+
+    Only filled in if the loop profiler logs each loop.
+    """
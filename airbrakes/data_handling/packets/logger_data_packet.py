@@ -19,6 +19,9 @@ class LoggerDataPacket(msgspec.Struct, array_like=True, kw_only=True):
     set_extension: str | None
     battery_voltage: str | None
     current_milliamps: str | None
+    command_loop_id: int | None = None
+    command_firm_timestamp_seconds: float | None = None
+    actuation_latency_ns: int | None = None
 
     # FIRMDataPacket Fields
     timestamp_seconds: float | None = None
@@ -56,4 +59,7 @@ class LoggerDataPacket(msgspec.Struct, array_like=True, kw_only=True):
     # Other fields in ContextDataPacket
     retrieved_firm_packets: int | None
     apogee_predictor_queue_size: int | None
+    log_queue_high_watermark: int | None
+    dropped_log_packets: int | None
     update_timestamp_ns: int | None
+    loop_stage_durations_ns: str | None = None
@@ -21,3 +21,19 @@ class ServoDataPacket(msgspec.Struct, tag=True, array_like=True):
 
     current_milliamps: str | None
     """The current system current draw in milliamps."""
+
+    command_loop_id: int | None = None
+    """The loop of the main loop which issued the latest servo command.
+
+    None until the servo is first told to move.
+    """
+
+    command_firm_timestamp_seconds: float | None = None
+    """The timestamp of the newest FIRM packet the loop which issued the latest servo command
+    had, on FIRM's clock."""
+
+    actuation_latency_ns: int | None = None
+    """How long after that FIRM packet was sampled the PWM signal was changed, in nanoseconds.
+
+    See ActuationLatency for how FIRM's clock is lined up with ours.
+    """
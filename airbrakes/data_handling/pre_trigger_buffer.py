@@ -0,0 +1,201 @@
+"""Module for the ring buffer which holds the most recent data before launch."""
+
+import msgspec
+import numpy as np
+import numpy.typing as npt
+from firm_client import FIRMDataPacket
+
+from airbrakes.constants import FIRM_PACKET_INPUT_FIELDS, IDLE_LOG_DECIMATION, LOG_BUFFER_SIZE
+
+# These don't work with msgspec if they are only imported for type checking:
+from airbrakes.data_handling.packets.apogee_predictor_data_packet import (
+    ApogeePredictorDataPacket,  # noqa: TC001
+)
+from airbrakes.data_handling.packets.context_data_packet import ContextDataPacket  # noqa: TC001
+from airbrakes.data_handling.packets.servo_data_packet import ServoDataPacket  # noqa: TC001
+
+
+class LoopDataPackets(msgspec.Struct):
+    """
+    The packets which are shared by every FIRMDataPacket fetched in one loop
+    of the main thread.
+    """
+
+    context_data_packet: ContextDataPacket
+    servo_data_packet: ServoDataPacket
+    apogee_predictor_data_packet: ApogeePredictorDataPacket | None
+
+
+class PreTriggerBuffer:
+    """
+    A fixed size ring buffer which holds the most recent FIRM data in the
+    StandbyState and LandedState, at the full data rate.
+
+    The FIRM data is stored compactly in a numpy array, instead of as
+    LoggerDataPackets. Once the buffer is full, the oldest rows are evicted
+    to make room, and only one in every `decimation` evicted rows is kept
+    for logging. This way, however long we sit on the pad, memory stays
+    bounded and the log only grows at a fraction of the FIRM rate, while
+    the seconds right before launch are still logged in full once the
+    buffer is flushed.
+    """
+
+    __slots__ = (
+        "_capacity",
+        "_decimation",
+        "_firm_values",
+        "_head",
+        "_loop_data_packets",
+        "_rows_pushed",
+        "_size",
+    )
+
+    def __init__(
+        self, capacity: int = LOG_BUFFER_SIZE, decimation: int = IDLE_LOG_DECIMATION
+    ) -> None:
+        """
+        Initializes the buffer.
+
+        :param capacity: The number of rows the buffer can hold.
+        :param decimation: One in every `decimation` rows evicted from the
+            buffer is returned for logging.
+        """
+        self._capacity = capacity
+        self._decimation = decimation
+        self._firm_values: npt.NDArray[np.float64] = np.zeros(
+            (capacity, len(FIRM_PACKET_INPUT_FIELDS)), dtype=np.float64
+        )
+        # The packets of the loop each row was fetched in. Rows from the same loop share them:
+        self._loop_data_packets: npt.NDArray[np.object_] = np.empty(capacity, dtype=object)
+        # Index of the oldest row in the buffer:
+        self._head = 0
+        self._size = 0
+        # The total number of rows ever pushed, used to decide which rows to keep when decimating:
+        self._rows_pushed = 0
+
+    def __len__(self) -> int:
+        """Returns the number of rows in the buffer."""
+        return self._size
+
+    @property
+    def is_full(self) -> bool:
+        """Returns whether the buffer is full."""
+        return self._size == self._capacity
+
+    def push(
+        self,
+        firm_data_packets: list[FIRMDataPacket],
+        context_data_packet: ContextDataPacket,
+        servo_data_packet: ServoDataPacket,
+        apogee_predictor_data_packet: ApogeePredictorDataPacket | None,
+    ) -> list[tuple[LoopDataPackets, list[FIRMDataPacket]]]:
+        """
+        Adds the FIRM data packets to the buffer, evicting the oldest rows if
+        the buffer is full.
+
+        :param firm_data_packets: The FIRM data packets to add.
+        :param context_data_packet: The Context Data Packet for this loop.
+        :param servo_data_packet: The Servo Data Packet for this loop.
+        :param apogee_predictor_data_packet: The most recent apogee predictor
+            data packet.
+        :return: The decimated rows which were evicted from the buffer, which
+            should be logged. Consecutive rows from the same loop are grouped
+            together with the packets of that loop.
+        """
+        number_of_rows = len(firm_data_packets)
+        if not number_of_rows:
+            return []
+
+        values = np.array(
+            [
+                [getattr(packet, field) for field in FIRM_PACKET_INPUT_FIELDS]
+                for packet in firm_data_packets
+            ],
+            dtype=np.float64,
+        )
+        loop_data_packets = LoopDataPackets(
+            context_data_packet, servo_data_packet, apogee_predictor_data_packet
+        )
+
+        # Rows that overflow the buffer are evicted, oldest first:
+        number_to_evict = max(0, self._size + number_of_rows - self._capacity)
+        evicted_from_buffer = min(number_to_evict, self._size)
+        evicted_from_new_rows = number_to_evict - evicted_from_buffer
+
+        evicted_rows = self._pop(evicted_from_buffer)
+        # If we were given more rows than fit in the buffer, the oldest new rows never make it in:
+        if evicted_from_new_rows:
+            keep = self._decimated_mask(self._rows_pushed, evicted_from_new_rows)
+            evicted_rows.extend((values[i], loop_data_packets) for i in np.flatnonzero(keep))
+
+        # Write the rest of the new rows after the newest row in the buffer:
+        rows_to_store = values[evicted_from_new_rows:]
+        indices = (self._head + self._size + np.arange(len(rows_to_store))) % self._capacity
+        self._firm_values[indices] = rows_to_store
+        self._loop_data_packets[indices] = loop_data_packets
+        self._size += len(rows_to_store)
+        self._rows_pushed += number_of_rows
+
+        return self._group_by_loop(evicted_rows)
+
+    def flush(self) -> list[tuple[LoopDataPackets, list[FIRMDataPacket]]]:
+        """
+        Empties the buffer.
+
+        :return: Every row in the buffer, oldest first, grouped by the loop
+            they were fetched in.
+        """
+        return self._group_by_loop(self._pop(self._size, decimate=False))
+
+    def _pop(
+        self, number_of_rows: int, decimate: bool = True
+    ) -> list[tuple[npt.NDArray[np.float64], LoopDataPackets]]:
+        """
+        Removes the oldest rows from the buffer.
+
+        :param number_of_rows: The number of rows to remove.
+        :param decimate: Whether to only return the rows kept by decimation.
+        :return: The removed rows, as pairs of FIRM values and loop packets.
+        """
+        if not number_of_rows:
+            return []
+
+        indices = (self._head + np.arange(number_of_rows)) % self._capacity
+        if decimate:
+            first_sequence_number = self._rows_pushed - self._size
+            indices = indices[self._decimated_mask(first_sequence_number, number_of_rows)]
+
+        rows = list(zip(self._firm_values[indices], self._loop_data_packets[indices], strict=True))
+        # Drop our references to the packets so they can be garbage collected:
+        self._loop_data_packets[(self._head + np.arange(number_of_rows)) % self._capacity] = None
+        self._head = (self._head + number_of_rows) % self._capacity
+        self._size -= number_of_rows
+        return rows
+
+    def _decimated_mask(self, first_sequence_number: int, number_of_rows: int) -> npt.NDArray:
+        """
+        Returns which of the consecutive rows starting at `first_sequence_number`
+        are kept when decimating.
+        """
+        sequence_numbers = first_sequence_number + np.arange(number_of_rows)
+        return sequence_numbers % self._decimation == 0
+
+    @staticmethod
+    def _group_by_loop(
+        rows: list[tuple[npt.NDArray[np.float64], LoopDataPackets]],
+    ) -> list[tuple[LoopDataPackets, list[FIRMDataPacket]]]:
+        """
+        Converts the rows of the buffer back into FIRMDataPackets, grouping
+        consecutive rows fetched in the same loop.
+
+        :param rows: The rows to convert, as pairs of FIRM values and loop
+            packets.
+        :return: The packets of each loop, and the FIRMDataPackets fetched in
+            that loop.
+        """
+        groups: list[tuple[LoopDataPackets, list[FIRMDataPacket]]] = []
+        for values, loop_data_packets in rows:
+            if not groups or groups[-1][0] is not loop_data_packets:
+                groups.append((loop_data_packets, []))
+            groups[-1][1].append(FIRMDataPacket(*values.tolist()))
+        return groups
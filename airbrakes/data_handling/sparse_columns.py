@@ -0,0 +1,190 @@
+"""
+Module for writing the columns of the log which rarely change only when they
+change, and for filling them back in when the log is read.
+"""
+
+import math
+from typing import TYPE_CHECKING, Any
+
+import polars as pl
+
+from airbrakes.constants import SPARSE_LOG_COLUMNS
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+
+MISSING_VALUE_MARKER = "nan"
+"""What is written in a sparse column when its value goes back to being
+missing. An empty cell can't be used for that, as it means "the same as the row
+before". It isn't an integer, so the integer sparse columns are read as strings,
+and cast to integers once it is replaced."""
+
+
+class SparseColumnEncoder:
+    """
+    Blanks out the values of the sparse columns which are the same as in the
+    row before.
+
+    Most of our columns change every row, but some, like the servo extension
+    or the apogee prediction, only change every few hundred rows. Leaving
+    them empty when they don't change makes the log smaller and means the
+    logger has fewer floats to format. Use `forward_fill_sparse_columns` to
+    get the values back when reading the log.
+    """
+
+    __slots__ = ("_column_positions", "_last_values")
+
+    def __init__(
+        self, columns: Sequence[str], sparse_columns: Sequence[str] = SPARSE_LOG_COLUMNS
+    ) -> None:
+        """
+        Initializes the encoder.
+
+        :param columns: The names of the columns of the log, in order.
+        :param sparse_columns: The names of the columns which should only be
+            written when they change.
+        """
+        self._column_positions = [columns.index(name) for name in sparse_columns if name in columns]
+        self._last_values: list[Any] = [None] * len(self._column_positions)
+
+    def encode_row(self, values: list[Any], keyframe: bool) -> None:
+        """
+        Replaces the values of the sparse columns which haven't changed since
+        the row before with None, which the CSV writer writes as an empty
+        cell.
+
+        :param values: The values of the row, which are changed in place.
+        :param keyframe: Whether to write all the values of the row, even if
+            they haven't changed. This is done for the rows which can be
+            seeked to, so reading the log from them doesn't need any row
+            before them.
+        """
+        last_values = self._last_values
+        for position, column in enumerate(self._column_positions):
+            value = values[column]
+            last_value = last_values[position]
+            # NaN isn't equal to itself, but it is still the same value as the row before:
+            unchanged = value == last_value or (
+                isinstance(value, float)
+                and isinstance(last_value, float)
+                and math.isnan(value)
+                and math.isnan(last_value)
+            )
+            if unchanged and not keyframe:
+                values[column] = None
+                continue
+            last_values[position] = value
+            if value is None and last_value is not None:
+                values[column] = MISSING_VALUE_MARKER
+
+
+def _fill_sparse_column(
+    name: str, dtype: pl.DataType, last_value: Any = None, cast_to: pl.DataType | None = None
+) -> pl.Expr:
+    """
+    Returns the expression which fills in the empty cells of a sparse column.
+
+    :param name: The name of the column.
+    :param dtype: The type the column was read as.
+    :param last_value: The last value written in the column before these rows, if they are not
+        the first rows of the log.
+    :param cast_to: The type to cast the column to once it is filled in, if it was read as
+        another type, e.g. an integer column read as strings.
+    :return: The expression for the filled in column.
+    """
+    column = pl.col(name).forward_fill()
+    if last_value is not None:
+        column = column.fill_null(pl.lit(last_value, dtype=dtype))
+    # A value which went back to being missing was marked, so it wasn't filled in:
+    if dtype.is_float():
+        column = column.fill_nan(None)
+    elif dtype == pl.String:
+        column = column.replace(MISSING_VALUE_MARKER, None)
+    if cast_to is not None and cast_to != dtype:
+        column = column.cast(cast_to)
+    return column
+
+
+def forward_fill_sparse_columns(
+    log: pl.LazyFrame,
+    sparse_columns: Sequence[str] = SPARSE_LOG_COLUMNS,
+    column_types: Mapping[str, pl.DataType] | None = None,
+) -> pl.LazyFrame:
+    """
+    Fills in the empty cells of the sparse columns of a log with the last
+    value written above them.
+
+    Logs which were written before the sparse columns existed have all their
+    values written, so they read the same as before.
+
+    :param log: The log, as read by `pl.scan_csv`.
+    :param sparse_columns: The names of the columns which were only written
+        when they changed.
+    :param column_types: The types to cast the sparse columns to once they
+        are filled in, if they were read as other types, e.g. from
+        `LogSchema.polars_schema`.
+    :return: The log with the values of the sparse columns filled in.
+    """
+    schema = log.collect_schema()
+    column_types = column_types or {}
+    filled_columns = [
+        _fill_sparse_column(name, schema[name], cast_to=column_types.get(name))
+        for name in sparse_columns
+        if name in schema
+    ]
+    return log.with_columns(filled_columns) if filled_columns else log
+
+
+class SparseColumnFiller:
+    """
+    Fills in the empty cells of the sparse columns of a log which is read a
+    batch of rows at a time, the same as `forward_fill_sparse_columns` does
+    for the whole log.
+
+    The empty cells at the start of a batch are filled in with the last
+    value written in the batches before it.
+    """
+
+    __slots__ = ("_column_types", "_last_values", "_sparse_columns")
+
+    def __init__(
+        self,
+        sparse_columns: Sequence[str] = SPARSE_LOG_COLUMNS,
+        column_types: Mapping[str, pl.DataType] | None = None,
+    ) -> None:
+        """
+        Initializes the filler.
+
+        :param sparse_columns: The names of the columns which were only
+            written when they changed.
+        :param column_types: The types to cast the sparse columns to once
+            they are filled in, if they were read as other types.
+        """
+        self._sparse_columns = sparse_columns
+        self._column_types = column_types or {}
+        self._last_values: dict[str, Any] = {}
+
+    def fill(self, batch: pl.DataFrame) -> pl.DataFrame:
+        """
+        Fills in the sparse columns of the next batch of rows of the log.
+
+        :param batch: The rows, as read by `pl.scan_csv`.
+        :return: The rows with the values of the sparse columns filled in.
+        """
+        filled_columns = []
+        for name in self._sparse_columns:
+            if name not in batch.schema:
+                continue
+            filled_columns.append(
+                _fill_sparse_column(
+                    name,
+                    batch.schema[name],
+                    self._last_values.get(name),
+                    self._column_types.get(name),
+                )
+            )
+            # The value carried over is the one written in the log, which may be the marker:
+            written_values = batch[name].drop_nulls()
+            if len(written_values):
+                self._last_values[name] = written_values[-1]
+        return batch.with_columns(filled_columns) if filled_columns else batch
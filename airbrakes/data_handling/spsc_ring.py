@@ -0,0 +1,241 @@
+"""
+Module for the ring buffer which hands packets from one thread to another,
+e.g. from the main loop to the logger thread.
+"""
+
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from airbrakes.constants import RING_WAIT_CHECK_SECONDS
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+class SPSCRing[T]:
+    """
+    A fixed size ring buffer, for exactly one thread putting items in (the
+    producer) and exactly one other thread taking them out (the consumer).
+
+    Items are put in and taken out in batches, with a slice assignment and a
+    slice copy, instead of a lock being taken for every item like
+    `queue.SimpleQueue` does. Neither thread takes a lock to use the ring:
+    the producer only writes the slots the consumer is done with, and then
+    moves `_tail` on, and the consumer only reads the slots before `_tail`,
+    and then moves `_head` on. A thread only waits for the other when it
+    asked to, in `push` and `push_many` while the ring is full, and in
+    `drain_into` with `block` while it is empty. Each of `_tail` and
+    `_drop_until` is only ever written by the producer, and `_head` and
+    `_dropped` by the consumer. This relies on stores and loads of list items
+    and attributes being atomic, and seen by other threads in the order they
+    were done, which they are with or without the GIL.
+
+    The events are only used to wake up a thread which is waiting, for the
+    consumer when the ring is empty, and for the producer when it is full,
+    and are only set if the thread said it is waiting, as setting an event
+    takes a lock. In case the thread said so just as the other one looked,
+    a waiting thread also checks the ring every RING_WAIT_CHECK_SECONDS.
+    """
+
+    __slots__ = (
+        "_buffer",
+        "_consumer_waiting",
+        "_drop_until",
+        "_dropped",
+        "_head",
+        "_mask",
+        "_not_empty",
+        "_not_full",
+        "_producer_waiting",
+        "_tail",
+    )
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Initializes an empty ring.
+
+        :param capacity: The number of items the ring can hold at least. It is rounded up to a
+            power of two.
+        """
+        if capacity < 1:
+            raise ValueError(f"The capacity of a ring must be at least 1, not {capacity}")
+        size = 1 << (capacity - 1).bit_length()
+        # The slots are left holding the items taken out, until they are written again:
+        self._buffer: list[T | None] = [None] * size
+        self._mask = size - 1
+        # How many items have been put in, and taken out or skipped:
+        self._tail = 0
+        self._head = 0
+        self._drop_until = 0
+        self._dropped = 0
+        self._not_empty = threading.Event()
+        self._not_full = threading.Event()
+        self._consumer_waiting = False
+        self._producer_waiting = False
+
+    def __len__(self) -> int:
+        """Returns the number of items waiting to be taken out."""
+        return self._tail - max(self._head, self._drop_until)
+
+    @property
+    def capacity(self) -> int:
+        """The number of items the ring can hold."""
+        return self._mask + 1
+
+    @property
+    def dropped(self) -> int:
+        """The number of items the consumer skipped, because `discard_oldest` discarded them."""
+        return self._dropped
+
+    def push(self, item: T) -> None:
+        """
+        Puts one item in the ring, waiting for space if it is full. Only the producer may call
+        this.
+
+        :param item: The item to put in.
+        """
+        tail = self._tail
+        if tail - self._head > self._mask:
+            self.push_many((item,))
+            return
+        self._buffer[tail & self._mask] = item
+        self._tail = tail + 1
+        if self._consumer_waiting:
+            self._not_empty.set()
+
+    def push_many(self, items: Sequence[T]) -> None:
+        """
+        Puts items in the ring, waiting for the consumer to take items out whenever it is full.
+        Only the producer may call this.
+
+        :param items: The items to put in, in order.
+        """
+        pushed = self.try_push_many(items)
+        while pushed < len(items):
+            self._not_full.clear()
+            self._producer_waiting = True
+            # Checked again after saying so, in case the consumer took items out in between:
+            if self._tail - self._head > self._mask:
+                self._not_full.wait(RING_WAIT_CHECK_SECONDS)
+            self._producer_waiting = False
+            pushed += self.try_push_many(items[pushed:])
+
+    def try_push_many(self, items: Sequence[T]) -> int:
+        """
+        Puts as many of the items in the ring as there is space for, without waiting. Only the
+        producer may call this.
+
+        :param items: The items to put in, in order.
+        :return: How many of the items were put in, from the start.
+        """
+        tail = self._tail
+        size = self._mask + 1
+        count = min(len(items), size - (tail - self._head))
+        if count <= 0:
+            return 0
+        start = tail & self._mask
+        # The items go in with at most two slice assignments, the second one when they wrap
+        # round to the start of the ring:
+        first_count = min(count, size - start)
+        if first_count == len(items):
+            self._buffer[start : start + first_count] = items
+        else:
+            self._buffer[start : start + first_count] = items[:first_count]
+            self._buffer[: count - first_count] = items[first_count:count]
+        # Only now can the consumer see the new items:
+        self._tail = tail + count
+        if self._consumer_waiting:
+            self._not_empty.set()
+        return count
+
+    def discard_oldest(self, count: int) -> int:
+        """
+        Discards the oldest items waiting, so the consumer skips them. Their slots are only free
+        once the consumer has skipped them. Only the producer may call this.
+
+        :param count: How many items to discard at most.
+        :return: How many items were discarded. The consumer may have taken some of them out
+            before it saw they were discarded, which `dropped` doesn't count.
+        """
+        start = max(self._head, self._drop_until)
+        end = min(start + max(count, 0), self._tail)
+        self._drop_until = max(end, self._drop_until)
+        return max(end - start, 0)
+
+    def drain_into(self, items: list[T], block: bool = False, timeout: float | None = None) -> int:
+        """
+        Takes every item waiting out of the ring. Only the consumer may call this.
+
+        :param items: The list to add the items to, in order.
+        :param block: Whether to wait for an item to be put in, if there are none.
+        :param timeout: The longest to wait for an item in seconds, or None to wait for as long
+            as it takes.
+        :return: How many items were taken out.
+        """
+        head = self._head
+        tail = self._tail
+        # The producer may have discarded items it put in after `tail` was read:
+        start = min(max(head, self._drop_until), tail)
+        if start == tail:
+            # Every item waiting (if any) was discarded, so they are skipped:
+            self._hand_back(start, start - head)
+            if not block:
+                return 0
+            head, start, tail = self._wait_for_items(timeout)
+            if start == tail:
+                return 0
+
+        count = tail - start
+        buffer = self._buffer
+        first_start = start & self._mask
+        if count == 1:
+            items.append(buffer[first_start])
+        else:
+            first_end = min(first_start + count, len(buffer))
+            items.extend(buffer[first_start:first_end])
+            if first_start + count > first_end:
+                items.extend(buffer[: first_start + count - first_end])
+        self._hand_back(tail, start - head)
+        return count
+
+    def _wait_for_items(self, timeout: float | None) -> tuple[int, int, int]:
+        """
+        Waits for the producer to put items in the ring, skipping the items it discards while
+        waiting. Only the consumer may call this.
+
+        :param timeout: The longest to wait in seconds, or None to wait for as long as it takes.
+        :return: Where the consumer is in the ring, where the first item to take out is, and where
+            the last one put in is. The last two are the same if no items came in time.
+        """
+        deadline = time.monotonic() + (float("inf") if timeout is None else timeout)
+        while True:
+            head = self._head
+            tail = self._tail
+            start = min(max(head, self._drop_until), tail)
+            if start < tail:
+                return head, start, tail
+            self._hand_back(start, start - head)
+            wait_seconds = min(deadline - time.monotonic(), RING_WAIT_CHECK_SECONDS)
+            if wait_seconds <= 0:
+                return start, start, start
+            self._not_empty.clear()
+            self._consumer_waiting = True
+            # Checked again after saying so, in case the producer put items in in between:
+            if self._tail == tail:
+                self._not_empty.wait(wait_seconds)
+            self._consumer_waiting = False
+
+    def _hand_back(self, new_head: int, skipped: int) -> None:
+        """
+        Hands the slots of the items taken out or skipped back to the producer, once they were
+        read.
+
+        :param new_head: Where the consumer is now, after the items taken out or skipped.
+        :param skipped: How many of the items were skipped, because they were discarded.
+        """
+        if skipped:
+            self._dropped += skipped
+        self._head = new_head
+        if self._producer_waiting:
+            self._not_full.set()
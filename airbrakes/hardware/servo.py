@@ -5,6 +5,7 @@ controls the extension of the airbrakes.
 
 import contextlib
 import threading
+import time
 
 # Can only be imported on Linux:
 with contextlib.suppress(ImportError):
@@ -41,6 +42,7 @@ class Servo(BaseServo):
     """
 
     __slots__ = (
+        "_command_issued_ns",
         "_go_to_max_no_buzz",
         "_go_to_min_no_buzz",
         "current_extension",
@@ -57,6 +59,7 @@ class Servo(BaseServo):
             connected to.
         """
         self.current_extension: ServoExtension = ServoExtension.MIN_NO_BUZZ
+        self._command_issued_ns = 0
         self._go_to_max_no_buzz: threading.Timer | None = None
         self._go_to_min_no_buzz: threading.Timer | None = None
 
@@ -136,6 +139,7 @@ class Servo(BaseServo):
         self.current_extension = extension
         duty_cycle: float = self._angle_to_duty_cycle(extension.value)
         self.servo.change_duty_cycle(duty_cycle)
+        self._command_issued_ns = time.perf_counter_ns()
 
     def _cancel_timer(self, timer_name: str) -> None:
         """Cancels the pending transition stored in the named timer slot."""
@@ -152,6 +156,15 @@ class Servo(BaseServo):
         """
         return self.current_extension
 
+    @property
+    def command_issued_ns(self) -> int:
+        """
+        Gets when the PWM duty cycle was last changed.
+
+        :return: The time from `time.perf_counter_ns`, or 0 if it hasn't been changed yet.
+        """
+        return self._command_issued_ns
+
     @property
     def battery_volts(self) -> float:
         """
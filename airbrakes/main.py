@@ -6,24 +6,44 @@ It will create the Context object and run the main loop.
 
 import sys
 import sysconfig
+import threading
 from typing import TYPE_CHECKING
 
+import msgspec
+
 from airbrakes.constants import (
+    CATCH_UP_PACKET_BUDGET,
     ENCODER_PIN_A,
     ENCODER_PIN_B,
     LOGS_PATH,
+    PI_THREAD_CORES,
+    REGRESSION_SYNTHETIC_FLIGHTS,
     SERVO_CHANNEL,
+    THREAD_CORES,
+    THREAD_FIFO_PRIORITIES,
+    ReplayArrivalMode,
+    ThreadRole,
 )
 from airbrakes.context import Context
 from airbrakes.data_handling.apogee_predictor import ApogeePredictor
 from airbrakes.data_handling.data_processor import DataProcessor
 from airbrakes.data_handling.logger import Logger
+from airbrakes.data_handling.loop_profiler import LoopProfiler
 from airbrakes.hardware.firm import FIRM
 from airbrakes.hardware.servo import Servo
+from airbrakes.mock.arrival_patterns import ARRIVAL_PATTERNS
 from airbrakes.mock.display import FlightDisplay
+from airbrakes.mock.fault_injection import FaultRates
 from airbrakes.mock.mock_firm import MockFIRM
 from airbrakes.mock.mock_logger import MockLogger
 from airbrakes.mock.mock_servo import MockServo
+from airbrakes.mock.regression import (
+    find_launch_logs,
+    get_regression_flights,
+    run_regression,
+)
+from airbrakes.mock.replay_seek import ReplaySeekPoint, seed_context
+from airbrakes.thread_placement import ThreadPlacer
 from airbrakes.utils import arg_parser
 
 if TYPE_CHECKING:
@@ -31,6 +51,9 @@ if TYPE_CHECKING:
 
     from airbrakes.base_classes.base_firm import BaseFIRM
     from airbrakes.base_classes.base_servo import BaseServo
+    from airbrakes.data_handling.actuation_latency import ActuationLatency
+    from airbrakes.mock.regression import RegressionReport
+    from airbrakes.thread_placement import PlacedThread
 
 
 def run_real_flight() -> None:
@@ -72,6 +95,125 @@ def run_pretend_flight() -> None:
     run_flight(args)
 
 
+def run_regression_flights() -> None:
+    """
+    Entry point for running the air brakes over every flight in the launch
+    data at once.
+
+    Entered when run with
+    `uv run airbrakes-regress` or `uvx --from git+... airbrakes-regress`.
+    """
+    # Modify sys.argv to include regress as the first argument:
+    sys.argv.insert(1, "regress")
+    args = arg_parser()
+    flights = get_regression_flights(
+        args.path or find_launch_logs(),
+        REGRESSION_SYNTHETIC_FLIGHTS if args.synthetic is None else args.synthetic,
+        args.target_apogee,
+        FaultRates() if args.faults else None,
+    )
+    report = run_regression(flights, args.jobs, time_loops=not args.no_timing)
+    if args.output:
+        args.output.write_bytes(msgspec.json.format(msgspec.json.encode(report)))
+    print_regression_report(report)
+
+
+def print_regression_report(report: RegressionReport) -> None:
+    """
+    Prints a line for each flight of a regression run: when it reached each state, how high it
+    went (and really went, if it was flown in a closed loop), what the last prediction before
+    apogee was, when the air brakes first extended, how long the loops took, and the faults
+    injected into it, with how long each backlog took to drain.
+
+    :param report: The report of the regression run.
+    """
+    for flight in report.flights:
+        print(flight.name)
+        states = ", ".join(
+            f"{transition.state.removesuffix('State')} {transition.timestamp_seconds:.2f}s"
+            for transition in flight.state_transitions
+        )
+        print(f"  states:    {states or 'Standby'}")
+        last_prediction = (
+            f"{flight.apogee_predictions[-1].predicted_apogee_meters:.1f} m"
+            if flight.apogee_predictions
+            else "none"
+        )
+        flown_apogee = (
+            f", flown {flight.flown_apogee_meters:.1f} m"
+            if flight.flown_apogee_meters is not None
+            else ""
+        )
+        print(
+            f"  apogee:    {flight.max_altitude_meters:.1f} m, target "
+            f"{flight.target_apogee_meters:.1f} m, last prediction {last_prediction}{flown_apogee}"
+        )
+        first_extension = next(
+            (decision for decision in flight.extension_decisions if decision.extended), None
+        )
+        print(
+            "  extended:  "
+            + (
+                f"{first_extension.timestamp_seconds:.2f}s, {len(flight.extension_decisions)} moves"
+                if first_extension
+                else "never"
+            )
+        )
+        if flight.loop_timing:
+            timing = flight.loop_timing
+            print(
+                f"  loops:     {timing.loops}, p50 {timing.p50_us:.1f} us, "
+                f"p99 {timing.p99_us:.1f} us, max {timing.max_us:.1f} us"
+            )
+        if flight.faults:
+            injected = flight.faults.injected
+            print(
+                f"  faults:    {injected.dropped} dropped, {injected.duplicated} duplicated, "
+                f"{injected.repeated_timestamps + injected.backwards_timestamps} bad timestamps, "
+                f"{injected.nan_packets} NaN, {injected.stalls} stalls, "
+                f"{injected.clock_jumps} clock jumps; "
+                f"{flight.faults.nan_processor_packets} NaN processed"
+            )
+            for drain in flight.faults.backlog_drains:
+                drain_time = f" in {drain.drain_us:.1f} us" if drain.drain_us is not None else ""
+                print(
+                    f"  backlog:   {drain.packets} packets at "
+                    f"{drain.timestamp_seconds:.2f}s{drain_time}, "
+                    f"{drain.processed_packets} processed"
+                )
+
+
+def print_loop_profile(loop_profiler: LoopProfiler) -> None:
+    """
+    Prints how long each stage of the main loop took, at shutdown.
+
+    :param loop_profiler: The LoopProfiler which timed the main loop.
+    """
+    print("Main loop stages:")
+    for stage_latency in loop_profiler.get_report():
+        print(f"  {stage_latency}")
+
+
+def print_thread_placement(placed_threads: list[PlacedThread]) -> None:
+    """
+    Prints which cores each thread runs on, at startup.
+
+    :param placed_threads: Where each thread ended up running.
+    """
+    print("Thread placement:")
+    for placed_thread in placed_threads:
+        print(f"  {placed_thread}")
+
+
+def print_actuation_latency(actuation_latency: ActuationLatency) -> None:
+    """
+    Prints how long it took from a FIRM sample to the servo moving, at shutdown.
+
+    :param actuation_latency: The ActuationLatency which measured the servo commands.
+    """
+    print(f"Sensor to servo latency: {actuation_latency.get_report()}")
+
+
 def run_flight(args: argparse.Namespace) -> None:
     """
     Initializes the Airbrakes components and starts the main loop.
@@ -90,11 +232,52 @@ def run_flight(args: argparse.Namespace) -> None:
         )
 
     # Initialize the Airbrakes Context and display
-    context = Context(servo, firm, logger, data_processor, apogee_predictor)
+    loop_profiler = (
+        LoopProfiler(log_each_loop=args.profile_log) if args.profile or args.profile_log else None
+    )
+    context = Context(
+        servo,
+        firm,
+        logger,
+        data_processor,
+        apogee_predictor,
+        loop_profiler=loop_profiler,
+        catch_up_budget=get_catch_up_budget(args),
+    )
+    # A replay which starts part way through the flight carries on from what happened before it:
+    if isinstance(firm, MockFIRM) and firm.replay_seek is not None:
+        seed_context(context, firm.replay_seek)
     flight_display = FlightDisplay(context, args)
+    thread_placer = ThreadPlacer(get_thread_cores(args), THREAD_FIFO_PRIORITIES)
 
     # Run the main flight loop
-    run_flight_loop(context, flight_display, args.mode == "mock")
+    run_flight_loop(context, flight_display, args.mode == "mock", thread_placer=thread_placer)
+
+
+def get_thread_cores(args: argparse.Namespace) -> dict[ThreadRole, tuple[int, ...]]:
+    """
+    Returns which cores each thread of the flight should run on.
+
+    :param args: Command line arguments determining the program
+        configuration.
+    :return: The cores of each thread, which is empty if they shouldn't be pinned.
+    """
+    if args.pin_threads is None:
+        return THREAD_CORES[args.mode]
+    return PI_THREAD_CORES if args.pin_threads else {}
+
+
+def get_catch_up_budget(args: argparse.Namespace) -> int | None:
+    """
+    Returns the most FIRM packets the main loop should process in full in one loop.
+
+    :param args: Command line arguments determining the program
+        configuration.
+    :return: The budget, or None if every packet should be processed in full.
+    """
+    if args.catch_up_budget is None:
+        return CATCH_UP_PACKET_BUDGET
+    return args.catch_up_budget if args.catch_up_budget > 0 else None
 
 
 def create_components(
@@ -119,6 +302,9 @@ def create_components(
             firm = MockFIRM(
                 real_time_replay=not args.fast_replay,
                 log_file_path=args.path,
+                replay_speed=args.speed,
+                arrival_pattern=ARRIVAL_PATTERNS[ReplayArrivalMode(args.arrivals)],
+                start_at=ReplaySeekPoint.from_string(args.start_at) if args.start_at else None,
             )
 
         # If using a real servo, use the real servo object, otherwise use a mock servo object
@@ -161,6 +347,8 @@ def run_flight_loop(
     context: Context,
     flight_display: FlightDisplay,
     is_mock: bool,
+    *,
+    thread_placer: ThreadPlacer | None = None,
 ) -> None:
     """
     Main flight control loop that runs until shutdown is requested or
@@ -169,19 +357,32 @@ def run_flight_loop(
     :param context: The AirbrakesContext managing the state machine.
     :param flight_display: Display interface for flight data.
     :param is_mock: Whether running in mock replay mode.
+    :param thread_placer: Places the threads on their cores once they are started, if given.
     """
     try:
         # Starts the air brakes system and display
         context.start(wait_for_start=True)
         flight_display.start()
+        if thread_placer is not None:
+            print_thread_placement(
+                thread_placer.place(
+                    {
+                        ThreadRole.MAIN_LOOP: threading.current_thread(),
+                        ThreadRole.LOGGER: context.logger.thread,
+                        ThreadRole.APOGEE_PREDICTOR: context.apogee_predictor.thread,
+                        ThreadRole.DISPLAY: flight_display.thread,
+                    }
+                )
+            )
 
         # Run the main loop until shutdown is requested:
         while not context.shutdown_requested:
             # Update the state machine
             context.update()
 
-            # Stop the replay when the data is exhausted
-            if is_mock and not context.firm.is_running:
+            # Stop the replay when the data is exhausted. The packets still queued when the replay
+            # ends are processed first, as a fast replay can get ahead of the main loop:
+            if is_mock and not context.firm.is_running and not context.firm_data_packets:
                 break
 
     # Handle user interrupt gracefully
@@ -197,6 +398,10 @@ def run_flight_loop(
         # Stops the display and the Airbrakes program
         flight_display.stop()
         context.stop()
+        if context.loop_profiler:
+            print_loop_profile(context.loop_profiler)
+        if context.actuation_latency.histogram.count:
+            print_actuation_latency(context.actuation_latency)
 
 
 if __name__ == "__main__":
@@ -216,11 +421,22 @@ if __name__ == "__main__":
     #   Optional arguments include:
     #     -s, --real-servo   : Uses the real servo instead of a mock one.
     #     -f, --fast-replay  : Runs the replay at full speed instead of real-time.
+    #     --speed <factor>   : Runs the replay this many times faster than real-time (0.25-50).
+    #     --arrivals <mode>  : Hands the packets to the main loop one at a time (packets), as in
+    #                          the flight (recorded), or with random delays and bursts (synthetic).
+    #     --start-at <point> : Starts the replay at a timestamp or state, e.g. MotorBurn-2 or Coast.
     #     -p, --path <file>  : Specifies a flight data file to use (default is the first file).
 
     # `uv run pretend [ARGS]`: Runs the program in mock replay mode, using pre-recorded flight data.
     #     -p, --path <file>  : Specifies a flight data file to use (default is the first file).
 
+    # `uv run airbrakes-regress [ARGS]`: Runs every flight in launch_data at once, and reports
+    #   what the air brakes did in each. Optional arguments include:
+    #     -p, --path <files> : Specifies the flight data files to run (default is all of them).
+    #     --synthetic <n>    : Also runs this many synthetic flights (default is 4).
+    #     -j, --jobs <n>     : Runs this many flights at once (default is the number of cores).
+    #     -o, --output <file>: Writes the whole report to a JSON file.
+
     # Global options for all modes:
     #     -d, --debug   : Runs without a display, allowing inspection of print statements.
     #     -v, --verbose : Enables a detailed display with more flight data.
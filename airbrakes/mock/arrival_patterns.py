@@ -0,0 +1,102 @@
+"""
+Module for the patterns a mock replay can hand the FIRM packets to the main
+loop in, instead of one packet at a time.
+"""
+
+import msgspec
+import numpy as np
+
+from airbrakes.constants import ReplayArrivalMode
+from airbrakes.utils import convert_ns_to_s
+
+
+class RecordedArrivals(msgspec.Struct, frozen=True):
+    """
+    Hands the packets to the main loop in the same batches, and at the same
+    times, as the main loop got them in the flight the log is from.
+
+    Every loop of the main loop logs one row for each packet it got, all with
+    the same `update_timestamp_ns`, so each run of rows with the same
+    `update_timestamp_ns` is one batch, with as many packets as its
+    `retrieved_firm_packets`.
+    """
+
+    def get_batches(self, replay_data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Splits the rows of a log into the batches they arrived in.
+
+        :param replay_data: The rows of the log to replay, as converted by MockFIRM.
+        :return: The index of the first row of each batch, and the time each batch should
+            arrive at, in seconds.
+        :raises ValueError: If the log doesn't have the time of each loop of the main loop.
+        """
+        # Missing values would be NaN:
+        if (
+            "update_timestamp_ns" not in replay_data.dtype.names
+            or np.isnan(replay_data["update_timestamp_ns"].astype(np.float64)).any()
+        ):
+            raise ValueError("The log doesn't have the update_timestamp_ns of every row to replay.")
+        update_timestamps_ns = replay_data["update_timestamp_ns"]
+        batch_starts = np.flatnonzero(np.diff(update_timestamps_ns, prepend=np.nan) != 0)
+        return batch_starts, convert_ns_to_s(update_timestamps_ns[batch_starts].astype(np.float64))
+
+
+class SyntheticArrivals(msgspec.Struct, frozen=True):
+    """
+    Hands the packets to the main loop with random delays and bursts, to
+    test how the main loop copes with a worse connection to FIRM than we had
+    in our flights.
+
+    Every packet arrives a random time after its timestamp. Every so often,
+    the connection stalls, and the packets held up by it all arrive at once
+    when it ends. The same seed always gives the same arrivals, so a run can
+    be reproduced.
+    """
+
+    jitter_ms: float = 1.0
+    """The standard deviation of how long after its timestamp each packet arrives."""
+    burst_probability: float = 0.005
+    """The chance that the connection stalls after each packet."""
+    mean_burst_ms: float = 50.0
+    """The average length of a stall."""
+    seed: int = 0
+    """The seed of the random number generator."""
+
+    def get_batches(self, replay_data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Decides when each packet of a log arrives, and splits them into the
+        batches they arrive in.
+
+        :param replay_data: The rows of the log to replay, as converted by MockFIRM.
+        :return: The index of the first row of each batch, and the time each batch should
+            arrive at, in seconds.
+        """
+        timestamps = replay_data["timestamp_seconds"].astype(np.float64)
+        rng = np.random.default_rng(self.seed)
+        arrivals = timestamps + np.abs(rng.normal(0.0, self.jitter_ms / 1e3, len(timestamps)))
+
+        # The packets which would arrive during a stall are held until it ends:
+        stalls = rng.random(len(timestamps)) < self.burst_probability
+        stall_ends = np.where(
+            stalls,
+            arrivals + rng.exponential(self.mean_burst_ms / 1e3, len(timestamps)),
+            -np.inf,
+        )
+        arrivals = np.maximum(arrivals, np.maximum.accumulate(stall_ends))
+        # The packets arrive in the order FIRM sent them:
+        arrivals = np.maximum.accumulate(arrivals)
+
+        batch_starts = np.flatnonzero(np.diff(arrivals, prepend=np.nan) != 0)
+        return batch_starts, arrivals[batch_starts]
+
+
+ArrivalPattern = RecordedArrivals | SyntheticArrivals
+"""The ways a mock replay can batch the packets it hands to the main loop."""
+
+ARRIVAL_PATTERNS: dict[ReplayArrivalMode, ArrivalPattern | None] = {
+    ReplayArrivalMode.PACKETS: None,
+    ReplayArrivalMode.RECORDED: RecordedArrivals(),
+    ReplayArrivalMode.SYNTHETIC: SyntheticArrivals(),
+}
+"""The arrival pattern to replay with, for each mode. None hands out one packet
+at a time."""
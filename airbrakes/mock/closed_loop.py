@@ -0,0 +1,332 @@
+"""
+Module for flying a synthetic flight in a closed loop with the air brakes,
+so that what the air brakes do changes the flight.
+
+Replaying a flight is open-loop: the packets are the same whatever the air
+brakes do, so a change to when they extend can't change the apogee. Here,
+the flight is flown as the main loop runs. Once the motor burns out, the
+rocket is flown a packet at a time, with drag which depends on how far the
+air brakes are extended, and read with the sensors of a synthetic flight.
+The flight runs in lockstep with the main loop, so it only depends on the
+flight and on what the air brakes do, and runs as fast as the main loop can
+go.
+"""
+
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from airbrakes import constants
+from airbrakes.base_classes.base_firm import BaseFIRM
+from airbrakes.constants import (
+    AIR_DENSITY_KG_PER_M3,
+    GRAVITY_METERS_PER_SECOND_SQUARED,
+    SERVO_DELAY_SECONDS,
+    ServoExtension,
+)
+from airbrakes.mock.lockstep import NO_PREDICTION_LATENCY, LockstepSimulation, PredictionLatency
+from airbrakes.mock.synthetic_flight import FIRMSensors
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from firm_client import FIRMDataPacket
+
+    from airbrakes.base_classes.base_servo import BaseServo
+    from airbrakes.mock.fault_injection import FaultRates
+    from airbrakes.mock.synthetic_flight import SyntheticFlight
+
+
+class ClosedLoopFIRM(BaseFIRM):
+    """
+    Flies a synthetic flight as the main loop runs, and hands the main loop
+    the packets FIRM would send, a batch at a time, without a thread.
+
+    The rocket sits on the pad and burns its motor like a SyntheticFlight.
+    It then coasts with drag which goes from ROCKET_CD with the air brakes
+    retracted, to ROCKET_EXTENDED_CD with them all the way extended, in air
+    of AIR_DENSITY_KG_PER_M3, like HPRM flies it. The air brakes take
+    SERVO_DELAY_SECONDS to move from one extreme to the other once the servo
+    is told to. From apogee on, the rocket falls under its parachute and
+    lands like a SyntheticFlight.
+
+    The timestamp of the latest packet handed out is the clock of the flight.
+    """
+
+    __slots__ = (
+        "_altitude",
+        "_apogee_seconds",
+        "_batch_size",
+        "_burn_acceleration",
+        "_clock_seconds",
+        "_coast_seconds",
+        "_drag_per_cd",
+        "_extension",
+        "_flight",
+        "_packet_number",
+        "_requested_to_run",
+        "_sensors",
+        "_velocity",
+        "apogee_meters",
+        "servo",
+    )
+
+    def __init__(self, flight: SyntheticFlight, batch_size: int = 1) -> None:
+        """
+        Initializes the ClosedLoopFIRM.
+
+        :param flight: The flight to fly. Its packet rate, pad, motor, parachute, landing, and
+            sensor errors are used, and its rocket is made from the rocket constants as they are
+            now.
+        :param batch_size: How many packets to hand out at a time.
+        """
+        self._flight = flight
+        self._batch_size = batch_size
+        self._sensors = FIRMSensors(flight)
+        self._burn_acceleration = flight.burnout_velocity_meters_per_s / flight.burn_seconds
+        self._drag_per_cd = (
+            0.5
+            * AIR_DENSITY_KG_PER_M3
+            * constants.ROCKET_CROSS_SECTIONAL_AREA_M2
+            / constants.ROCKET_DRY_MASS_KG
+        )
+        self._packet_number = 0
+        self._clock_seconds = math.nan
+        self._requested_to_run = False
+        self._extension = 0.0
+        self._altitude = 0.0
+        self._velocity = 0.0
+        self._coast_seconds: float | None = None
+        self._apogee_seconds: float | None = None
+        self.apogee_meters: float | None = None
+        """How high the rocket went, once it reached apogee."""
+        self.servo: BaseServo | None = None
+        """The servo of the air brakes. Without one, the air brakes stay retracted."""
+
+    @property
+    def requested_to_run(self) -> bool:
+        return self._requested_to_run
+
+    @property
+    def is_running(self) -> bool:
+        return self._requested_to_run and self._packet_timestamp() < self._end_seconds()
+
+    @property
+    def extension(self) -> float:
+        """How far the air brakes are extended, from 0 when retracted to 1 when all the way out."""
+        return self._extension
+
+    def now_seconds(self) -> float:
+        """
+        Returns the time on the clock of the flight, which is the timestamp of the latest packet
+        handed out, or of the first packet before any were handed out.
+
+        :return: The time in seconds.
+        """
+        return self._clock_seconds
+
+    def start(self) -> None:
+        self._requested_to_run = True
+        if self._packet_number == 0:
+            self._clock_seconds = 0.0
+
+    def stop(self) -> None:
+        self._requested_to_run = False
+
+    def get_data_packets(self, block: bool = True) -> list[FIRMDataPacket]:
+        """
+        Flies the next batch of packets, with the air brakes moving to where the servo was told
+        to put them, and reads them.
+
+        :param block: Unused, as the next batch is always ready.
+        :return: The packets of the batch which weren't lost in a dropout, or an empty list if
+            FIRM isn't running.
+        """
+        _ = block
+        if not self.is_running:
+            return []
+        extended = self.servo is not None and self.servo.servo_extension in (
+            ServoExtension.MAX_EXTENSION,
+            ServoExtension.MAX_NO_BUZZ,
+        )
+        period = 1 / self._flight.rate_hz
+        extension_step = period / SERVO_DELAY_SECONDS
+        rows = []
+        while len(rows) < self._batch_size and self.is_running:
+            timestamp = self._packet_timestamp()
+            self._extension = min(
+                max(self._extension + (extension_step if extended else -extension_step), 0.0),
+                1.0,
+            )
+            rows.append((timestamp, *self._fly_to(timestamp)))
+            self._packet_number += 1
+
+        timestamps, altitudes, velocities, specific_forces = np.array(rows).T
+        self._clock_seconds = float(timestamps[-1])
+        return self._sensors.read_packets(timestamps, altitudes, velocities, specific_forces)
+
+    def _packet_timestamp(self) -> float:
+        """Returns the timestamp of the next packet."""
+        return self._packet_number / self._flight.rate_hz
+
+    def _end_seconds(self) -> float:
+        """
+        Returns when the flight ends, after the rocket has lain on the ground for a while, or
+        infinity if it hasn't reached apogee yet.
+        """
+        if self._apogee_seconds is None:
+            return math.inf
+        return self._landing_seconds() + (
+            self._flight.landing_impact_seconds + self._flight.landed_seconds
+        )
+
+    def _landing_seconds(self) -> float:
+        """Returns when the rocket lands. Only known once it reached apogee."""
+        flight = self._flight
+        return (
+            self._apogee_seconds
+            + self.apogee_meters / flight.descent_velocity_meters_per_s
+            + flight.descent_velocity_meters_per_s / GRAVITY_METERS_PER_SECOND_SQUARED
+        )
+
+    def _fly_to(self, timestamp: float) -> tuple[float, float, float]:
+        """
+        Flies the rocket on to the timestamp of the next packet.
+
+        :param timestamp: The timestamp of the next packet, after the ones flown to before.
+        :return: The altitude, vertical velocity, and vertical specific force (what an
+            accelerometer pointing up would read) of the rocket, in SI units.
+        """
+        flight = self._flight
+        gravity = GRAVITY_METERS_PER_SECOND_SQUARED
+        launch = flight.pad_seconds
+        burnout = launch + flight.burn_seconds
+        if timestamp < launch:
+            return 0.0, 0.0, gravity
+        if timestamp < burnout:
+            burn_time = timestamp - launch
+            return (
+                self._burn_acceleration * burn_time**2 / 2,
+                self._burn_acceleration * burn_time,
+                self._burn_acceleration + gravity,
+            )
+        if self._apogee_seconds is None:
+            if self._coast_seconds is None:
+                # The coast starts where the burn left off:
+                self._coast_seconds = burnout
+                self._altitude = self._burn_acceleration * flight.burn_seconds**2 / 2
+                self._velocity = flight.burnout_velocity_meters_per_s
+            step = timestamp - self._coast_seconds
+            last_altitude, last_velocity = self._altitude, self._velocity
+            self._coast(step)
+            self._coast_seconds = timestamp
+            if self._velocity > 0.0:
+                return self._altitude, self._velocity, self._drag_acceleration(self._velocity)
+            # The rocket reached apogee during the step, when its velocity went through zero:
+            self._apogee_seconds = timestamp - step * self._velocity / (
+                self._velocity - last_velocity
+            )
+            self.apogee_meters = max(last_altitude, self._altitude)
+
+        # The parachute slows the rocket to its descent velocity over the time it would take to
+        # fall that fast:
+        descent_time_constant = flight.descent_velocity_meters_per_s / gravity
+        landing = self._landing_seconds()
+        if timestamp < landing:
+            descent_time = timestamp - self._apogee_seconds
+            descent_decay = math.exp(-descent_time / descent_time_constant)
+            altitude = self.apogee_meters - flight.descent_velocity_meters_per_s * (
+                descent_time - descent_time_constant * (1 - descent_decay)
+            )
+            return (
+                max(altitude, 0.0),
+                -flight.descent_velocity_meters_per_s * (1 - descent_decay),
+                gravity * (1 - descent_decay),
+            )
+        if timestamp < landing + flight.landing_impact_seconds:
+            return 0.0, 0.0, flight.landing_impact_gs * gravity
+        return 0.0, 0.0, gravity
+
+    def _coast(self, step: float) -> None:
+        """
+        Flies the coasting rocket on by a step, with the classic Runge-Kutta method, and the
+        air brakes where they are now.
+
+        :param step: How long to fly for, in seconds.
+        """
+        gravity = GRAVITY_METERS_PER_SECOND_SQUARED
+        altitude, velocity = self._altitude, self._velocity
+        acceleration_1 = self._drag_acceleration(velocity) - gravity
+        velocity_2 = velocity + step / 2 * acceleration_1
+        acceleration_2 = self._drag_acceleration(velocity_2) - gravity
+        velocity_3 = velocity + step / 2 * acceleration_2
+        acceleration_3 = self._drag_acceleration(velocity_3) - gravity
+        velocity_4 = velocity + step * acceleration_3
+        acceleration_4 = self._drag_acceleration(velocity_4) - gravity
+        self._altitude = altitude + step / 6 * (
+            velocity + 2 * velocity_2 + 2 * velocity_3 + velocity_4
+        )
+        self._velocity = velocity + step / 6 * (
+            acceleration_1 + 2 * acceleration_2 + 2 * acceleration_3 + acceleration_4
+        )
+
+    def _drag_acceleration(self, velocity: float) -> float:
+        """
+        Returns the acceleration of the rocket from its drag, with the air brakes where they
+        are now, which is also what an accelerometer pointing up reads while it coasts.
+
+        :param velocity: The vertical velocity of the rocket.
+        :return: The acceleration, which is against the velocity.
+        """
+        drag_coefficient = constants.ROCKET_CD + self._extension * (
+            constants.ROCKET_EXTENDED_CD - constants.ROCKET_CD
+        )
+        return -self._drag_per_cd * drag_coefficient * velocity * abs(velocity)
+
+
+class ClosedLoopSimulation(LockstepSimulation):
+    """
+    Runs the air brakes over a synthetic flight in a closed loop, one loop at
+    a time, without any threads, like a LockstepSimulation. The packets come
+    from a ClosedLoopFIRM, whose air brakes follow the servo of the Context,
+    so the apogee depends on what the air brakes do.
+    """
+
+    __slots__ = ()
+
+    def __init__(
+        self,
+        flight: SyntheticFlight,
+        log_dir: Path,
+        batch_size: int = 1,
+        prediction_latency: PredictionLatency = NO_PREDICTION_LATENCY,
+        delete_log_file: bool = True,
+        *,
+        faults: FaultRates | None = None,
+    ) -> None:
+        """
+        Initializes the ClosedLoopSimulation.
+
+        :param flight: The flight to fly.
+        :param log_dir: The directory to write the log in.
+        :param batch_size: How many packets to hand the main loop at a time.
+        :param prediction_latency: How long each apogee prediction takes.
+        :param delete_log_file: True if the log file should be deleted after the run.
+        :param faults: How often to inject each fault into the packets, or None for no faults.
+        """
+        super().__init__(
+            flight, log_dir, batch_size, prediction_latency, delete_log_file, faults=faults
+        )
+        # The air brakes of the flight follow the servo of the Context:
+        self.firm.servo = self.context.servo
+
+    def _make_firm(self, flight: SyntheticFlight, batch_size: int) -> ClosedLoopFIRM:
+        """
+        Makes the FIRM which flies the flight with the air brakes of the Context.
+
+        :param flight: The flight to fly.
+        :param batch_size: How many packets to hand the main loop at a time.
+        :return: The FIRM of the simulation.
+        """
+        return ClosedLoopFIRM(flight, batch_size)
@@ -7,7 +7,7 @@ from typing import TYPE_CHECKING
 
 from colorama import Fore, Style, init
 
-from airbrakes.constants import DisplayEndingType
+from airbrakes.constants import DISPLAY_WAIT_CHECK_SECONDS, DisplayEndingType
 
 if TYPE_CHECKING:
     import argparse
@@ -88,6 +88,11 @@ class FlightDisplay:
         self._running = True
         self._display_update_thread.start()
 
+    @property
+    def thread(self) -> threading.Thread:
+        """The thread which updates the display."""
+        return self._display_update_thread
+
     def stop(self) -> None:
         """Stops the display thread."""
         self._running = False
@@ -129,9 +134,7 @@ class FlightDisplay:
 
         # Wait till we processed a data packet. This is to prevent the display from updating
         # before we have any data to display.
-        while not (
-            self._context.context_data_packet and self._context.data_processor._last_data_packet
-        ):
+        while self._running and not self._context.wait_for_first_packet(DISPLAY_WAIT_CHECK_SECONDS):
             pass
 
         self._start_time = time.time()
@@ -201,10 +204,18 @@ class FlightDisplay:
                     f"Predicted apogee:                {G}{self._context.most_recent_apogee_predictor_data_packet.predicted_apogee if self._context.most_recent_apogee_predictor_data_packet else 0:<10.2f}{RESET} {R}m{RESET}",  # noqa: E501
                     f"Fetched packets in Main:         {G}{fetched_packets_in_main:<10}{RESET} {R}packets{RESET}",  # noqa: E501
                     f"Log buffer size:                 {G}{len(self._context.logger._log_buffer):<10}{RESET} {R}packets{RESET}",  # noqa: E501
+                    f"Log queue high watermark:        {G}{self._context.logger.log_queue_high_watermark:<10}{RESET} {R}packets{RESET}",  # noqa: E501
+                    f"Dropped log packets:             {G}{self._context.logger.dropped_packets:<10}{RESET} {R}packets{RESET}",  # noqa: E501
                     # Use htop -H -p <PID> to see thread CPU usage
                     f"Current process ID:              {G}{self._current_pid:<10}{RESET} ",
                 ]
             )
+            # How long each stage of the main loop took, if it is being profiled:
+            if self._context.loop_profiler:
+                output.extend(
+                    f"{stage.stage + ' p50/p99/max:':<33}{G}{f'{stage.p50_us:.0f}/{stage.p99_us:.0f}/{stage.max_us:.0f}':<16}{RESET} {R}us{RESET}"  # noqa: E501
+                    for stage in self._context.loop_profiler.get_report()
+                )
 
         # Print the output
         print("\n".join(output))
@@ -217,7 +228,19 @@ class FlightDisplay:
         match end_type:
             case DisplayEndingType.NATURAL:
                 print(f"{R}{'=' * 14} END OF REPLAY {'=' * 14}{RESET}")
+                self._print_replay_jitter_report()
             case DisplayEndingType.INTERRUPTED:
                 print(f"{R}{'=' * 12} INTERRUPTED REPLAY {'=' * 13}{RESET}")
+                self._print_replay_jitter_report()
             case DisplayEndingType.TAKEOFF:
                 print(f"{R}{'=' * 13} ROCKET LAUNCHED {'=' * 14}{RESET}")
+
+    def _print_replay_jitter_report(self) -> None:
+        """Prints how close a real time replay came to sending each packet on time."""
+        try:
+            # Only available in MockFIRM, and only if the replay ran in real time:
+            report = self._context.firm.replay_jitter_report
+        except AttributeError:
+            return
+        if report:
+            print(f"Replay timing:  {C}{report}{RESET}")
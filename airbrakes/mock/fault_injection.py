@@ -0,0 +1,267 @@
+"""
+Module for injecting faults into the packets FIRM hands the main loop, to
+check how the air brakes cope with worse sensor input than we had in our
+flights.
+
+FaultInjectingFIRM wraps any FIRM, real or mock, and can wrap another
+FaultInjectingFIRM, so faults can be layered. Each fault happens at a rate
+set in FaultRates, drawn from a seeded random number generator, so the same
+packets with the same rates always get the same faults.
+"""
+
+from typing import TYPE_CHECKING
+
+import msgspec
+import numpy as np
+from firm_client import FIRMDataPacket
+
+from airbrakes.base_classes.base_firm import BaseFIRM
+from airbrakes.constants import FIRM_PACKET_INPUT_FIELDS
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+class FaultRates(msgspec.Struct, frozen=True):
+    """
+    How often each fault is injected. The probabilities are per packet FIRM
+    sends, so at FIRM_FREQUENCY, a probability of 0.001 is a fault every 10
+    seconds or so.
+    """
+
+    drop_probability: float = 0.01
+    """The chance that a packet is lost."""
+    duplicate_probability: float = 0.002
+    """The chance that a packet is handed out twice in a row."""
+    repeated_timestamp_probability: float = 0.002
+    """The chance that a packet has the same timestamp as the packet before it."""
+    backwards_timestamp_probability: float = 0.001
+    """The chance that a packet has a timestamp from before the packet before it."""
+    backwards_timestamp_seconds: float = 0.005
+    """How far before the packet before it a packet with a backwards timestamp is."""
+    nan_burst_probability: float = 0.0005
+    """The chance that a burst of packets with every reading NaN starts at a packet."""
+    mean_nan_burst_packets: float = 5.0
+    """The average number of packets in a NaN burst."""
+    stall_probability: float = 0.0002
+    """The chance that FIRM stalls at a packet, and then hands out every packet it held back at
+    once, as a backlog."""
+    stall_seconds: float = 1.0
+    """How long a stall lasts, on the timestamps of the packets, so how big the backlog is."""
+    clock_jump_probability: float = 0.0001
+    """The chance that FIRM's clock jumps forwards or backwards at a packet, and stays jumped."""
+    clock_jump_seconds: float = 0.5
+    """How far FIRM's clock jumps."""
+    seed: int = 0
+    """The seed of the random number generator, so the same faults can be injected again."""
+
+
+NO_FAULTS = FaultRates(
+    drop_probability=0.0,
+    duplicate_probability=0.0,
+    repeated_timestamp_probability=0.0,
+    backwards_timestamp_probability=0.0,
+    nan_burst_probability=0.0,
+    stall_probability=0.0,
+    clock_jump_probability=0.0,
+)
+"""No faults, to inject a single kind of fault with `msgspec.structs.replace`."""
+
+
+class InjectedFaults(msgspec.Struct):
+    """How many of each fault a FaultInjectingFIRM has injected."""
+
+    dropped: int = 0
+    duplicated: int = 0
+    repeated_timestamps: int = 0
+    backwards_timestamps: int = 0
+    nan_packets: int = 0
+    stalls: int = 0
+    clock_jumps: int = 0
+
+
+class FaultInjectingFIRM(BaseFIRM):
+    """
+    Hands the main loop the packets of another FIRM, with faults injected at
+    the rates of a FaultRates.
+
+    During a stall, no packets are handed out, until a packet with a
+    timestamp `stall_seconds` after the one the stall started at comes in.
+    All the packets held back are then handed out at once, as a backlog.
+    The stalls follow the timestamps the other FIRM sent, so they last as
+    long on a real FIRM as in a replay or a lockstep simulation.
+    """
+
+    __slots__ = (
+        "_clock_offset_seconds",
+        "_firm",
+        "_held_packets",
+        "_last_timestamp_seconds",
+        "_nan_packets_left",
+        "_rates",
+        "_rng",
+        "_stall_end_seconds",
+        "injected",
+        "last_backlog_packets",
+    )
+
+    def __init__(self, firm: BaseFIRM, rates: FaultRates) -> None:
+        """
+        Initializes the FaultInjectingFIRM.
+
+        :param firm: The FIRM to inject faults into the packets of.
+        :param rates: How often each fault is injected.
+        """
+        self._firm = firm
+        self._rates = rates
+        self._rng = np.random.default_rng(rates.seed)
+        self._clock_offset_seconds = 0.0
+        self._last_timestamp_seconds: float | None = None
+        self._nan_packets_left = 0
+        self._stall_end_seconds: float | None = None
+        self._held_packets: list[FIRMDataPacket] = []
+        self.injected = InjectedFaults()
+        """How many of each fault have been injected so far."""
+        self.last_backlog_packets = 0
+        """How many packets were held back in the backlogs the last call handed out, or 0 if it
+        didn't hand out a backlog."""
+
+    @property
+    def requested_to_run(self) -> bool:
+        return self._firm.requested_to_run
+
+    @property
+    def is_running(self) -> bool:
+        # The backlog of a stall is still handed out after the other FIRM stops:
+        return self._firm.is_running or bool(self._held_packets)
+
+    @property
+    def firm(self) -> BaseFIRM:
+        """The FIRM the faults are injected into the packets of."""
+        return self._firm
+
+    def start(self) -> None:
+        self._firm.start()
+
+    def wait_until_started(self, timeout: float | None = None) -> bool:
+        return self._firm.wait_until_started(timeout)
+
+    def stop(self) -> None:
+        self._firm.stop()
+
+    def get_data_packets(self, block: bool = True) -> list[FIRMDataPacket]:
+        """
+        Gets the packets of the other FIRM, and injects faults into them.
+
+        :param block: Passed on to the other FIRM.
+        :return: The packets with the faults injected, nothing during a stall, or the whole
+            backlog once a stall ends.
+        """
+        self.last_backlog_packets = 0
+        faulty_packets: list[FIRMDataPacket] = []
+        for packet in self._firm.get_data_packets(block):
+            # Stalls end on the timestamp FIRM really sent the packet at:
+            if (
+                self._stall_end_seconds is not None
+                and packet.timestamp_seconds >= self._stall_end_seconds
+            ):
+                self._end_stall(faulty_packets)
+            injected_packets = self._inject(packet)
+            if self._stall_end_seconds is None:
+                faulty_packets.extend(injected_packets)
+            else:
+                self._held_packets.extend(injected_packets)
+
+        if self._stall_end_seconds is not None and not self._firm.is_running:
+            # The other FIRM stopped during the stall, so the backlog is handed out now:
+            self._end_stall(faulty_packets)
+        return faulty_packets
+
+    def _end_stall(self, faulty_packets: list[FIRMDataPacket]) -> None:
+        """
+        Ends the stall, and hands out the packets held back during it.
+
+        :param faulty_packets: The packets being handed out, which the backlog is added to.
+        """
+        self.last_backlog_packets += len(self._held_packets)
+        faulty_packets.extend(self._held_packets)
+        self._held_packets = []
+        self._stall_end_seconds = None
+
+    def _inject(self, packet: FIRMDataPacket) -> Iterable[FIRMDataPacket]:
+        """
+        Injects the faults into one packet.
+
+        :param packet: The packet from the other FIRM.
+        :return: The packets to hand out in its place: none if it was dropped, two if it was
+            duplicated, and one otherwise.
+        """
+        rates = self._rates
+        injected = self.injected
+        (
+            stall_draw,
+            drop_draw,
+            clock_jump_draw,
+            timestamp_draw,
+            nan_draw,
+            duplicate_draw,
+        ) = self._rng.random(6)
+
+        if self._stall_end_seconds is None and stall_draw < rates.stall_probability:
+            self._stall_end_seconds = packet.timestamp_seconds + rates.stall_seconds
+            injected.stalls += 1
+        if drop_draw < rates.drop_probability:
+            injected.dropped += 1
+            return ()
+
+        if clock_jump_draw < rates.clock_jump_probability:
+            self._clock_offset_seconds += self._rng.choice((-1.0, 1.0)) * rates.clock_jump_seconds
+            injected.clock_jumps += 1
+        timestamp = packet.timestamp_seconds + self._clock_offset_seconds
+        if self._last_timestamp_seconds is not None:
+            if timestamp_draw < rates.repeated_timestamp_probability:
+                timestamp = self._last_timestamp_seconds
+                injected.repeated_timestamps += 1
+            elif timestamp_draw < (
+                rates.repeated_timestamp_probability + rates.backwards_timestamp_probability
+            ):
+                timestamp = self._last_timestamp_seconds - rates.backwards_timestamp_seconds
+                injected.backwards_timestamps += 1
+        self._last_timestamp_seconds = timestamp
+
+        if nan_draw < rates.nan_burst_probability:
+            self._nan_packets_left += int(
+                self._rng.geometric(1 / max(rates.mean_nan_burst_packets, 1.0))
+            )
+        readings_nan = self._nan_packets_left > 0
+        if readings_nan:
+            self._nan_packets_left -= 1
+            injected.nan_packets += 1
+
+        if timestamp != packet.timestamp_seconds or readings_nan:
+            packet = _replace_readings(packet, timestamp, readings_nan)
+        if duplicate_draw < rates.duplicate_probability:
+            injected.duplicated += 1
+            return (packet, packet)
+        return (packet,)
+
+
+def _replace_readings(
+    packet: FIRMDataPacket, timestamp_seconds: float, readings_nan: bool
+) -> FIRMDataPacket:
+    """
+    Makes a copy of a packet with another timestamp, and optionally every reading NaN.
+
+    :param packet: The packet to copy.
+    :param timestamp_seconds: The timestamp of the copy.
+    :param readings_nan: Whether every reading of the copy is NaN.
+    :return: The copy, with its derived fields worked out again.
+    """
+    return FIRMDataPacket(
+        timestamp_seconds,
+        *(
+            np.nan if readings_nan else getattr(packet, field)
+            for field in FIRM_PACKET_INPUT_FIELDS
+            if field != "timestamp_seconds"
+        ),
+    )
@@ -0,0 +1,592 @@
+"""
+Module for reading the raw sensor logs FIRM writes to its SD card (.FRM files),
+so they can be replayed by MockFIRM without FIRM.
+
+A FIRM log is a header, with the settings and calibration of the FIRM it was
+written by, followed by a frame for every reading of one of its sensors, in
+the order they were read. Every frame is a byte for its sensor, a 32 bit
+timestamp, and the reading, in the sensor's own format.
+
+A log only has the readings of the sensors, not the estimates FIRM would have
+made from them (e.g. its altitude and orientation), so those are estimated
+from the readings when the log is read.
+"""
+
+from typing import TYPE_CHECKING
+
+import msgspec
+import numpy as np
+import polars as pl
+from scipy.signal import lfilter
+
+from airbrakes.constants import (
+    FIRM_IMU_YAW_DEGREES,
+    FRM_BAROMETER_MAX_SPEED_METERS_PER_S,
+    FRM_BAROMETER_MEDIAN_READINGS,
+    FRM_CLOCK_HZ,
+    FRM_ESTIMATOR_TIME_CONSTANT_SECONDS,
+    FRM_HEADER_BYTES,
+    FRM_PAD_SECONDS,
+    GRAVITY_METERS_PER_SECOND_SQUARED,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+FRM_MAGIC = b"FIRM LOG v1.3\n"
+"""The first line of every FIRM log."""
+
+FRM_HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S14"),
+        ("device_id", "<u8"),
+        ("device_name", "S32"),
+        ("protocol", "<u4"),
+        ("firmware_version", "S8"),
+        ("frequency_hz", "<u4"),
+        # The offsets and scale matrix of the accelerometer, gyroscope, magnetometer, and high g
+        # accelerometer:
+        ("calibrations", "<f4", (4, 12)),
+        # How many counts of each reading are one of its unit, e.g. counts per g:
+        ("temperature_scale", "<f4"),
+        ("pressure_scale", "<f4"),
+        ("acceleration_scale", "<f4"),
+        ("angular_rate_scale", "<f4"),
+        ("magnetic_field_scale", "<f4"),
+        ("high_g_acceleration_scale", "<f4"),
+    ]
+)
+"""The layout of the header of a FIRM log."""
+
+FRAME_PREFIX_DTYPE = np.dtype([("frame_type", "u1"), ("ticks", "<u4")])
+"""The layout of the start of every frame: its type, and the tick count of the
+clock when it was read."""
+
+IMU_FRAME_DTYPE = np.dtype(
+    [
+        ("frame_type", "u1"),
+        ("ticks", "<u4"),
+        # The top 16 bits of each 20 bit reading:
+        ("acceleration", ">i2", (3,)),
+        ("angular_rate", ">i2", (3,)),
+        # The bottom 4 bits of the x, y, and z acceleration (high nibble) and angular rate (low
+        # nibble):
+        ("low_bits", "u1", (3,)),
+    ]
+)
+"""The layout of a frame with a reading of the accelerometer and gyroscope."""
+
+BAROMETER_FRAME_DTYPE = np.dtype(
+    [
+        ("frame_type", "u1"),
+        ("ticks", "<u4"),
+        # Little endian 24 bit numbers. The temperature is signed:
+        ("temperature", "u1", (3,)),
+        ("pressure", "u1", (3,)),
+    ]
+)
+"""The layout of a frame with a reading of the barometer."""
+
+MAGNETOMETER_FRAME_DTYPE = np.dtype(
+    [
+        ("frame_type", "u1"),
+        ("ticks", "<u4"),
+        # The top 16 bits of each 18 bit reading, which are offset by 2**17:
+        ("magnetic_field", ">u2", (3,)),
+        # The bottom 2 bits of the x, y, and z readings, from the highest bits down:
+        ("low_bits", "u1"),
+    ]
+)
+"""The layout of a frame with a reading of the magnetometer."""
+
+HIGH_G_FRAME_DTYPE = np.dtype(
+    [("frame_type", "u1"), ("ticks", "<u4"), ("acceleration", "u1", (6,))]
+)
+"""The layout of a frame with a reading of the high g accelerometer, which
+FIRMDataPacket has no fields for."""
+
+FRAME_DTYPES: dict[int, np.dtype] = {
+    ord("I"): IMU_FRAME_DTYPE,
+    ord("B"): BAROMETER_FRAME_DTYPE,
+    ord("M"): MAGNETOMETER_FRAME_DTYPE,
+    ord("A"): HIGH_G_FRAME_DTYPE,
+}
+"""The layout of each type of frame, by the byte the frame starts with."""
+
+
+class SensorCalibration(msgspec.Struct, frozen=True):
+    """The calibration FIRM applies to the readings of one of its sensors."""
+
+    offsets: tuple[float, float, float]
+    """What is subtracted from the x, y, and z readings."""
+    scale_matrix: tuple[float, float, float, float, float, float, float, float, float]
+    """The 3x3 matrix the readings are then multiplied by, row by row."""
+
+    def apply(self, readings: np.ndarray) -> np.ndarray:
+        """
+        Calibrates readings of the sensor.
+
+        :param readings: The x, y, and z readings, one row per reading.
+        :return: The calibrated readings.
+        """
+        return (readings - np.asarray(self.offsets)) @ np.reshape(self.scale_matrix, (3, 3)).T
+
+
+class FRMHeader(msgspec.Struct, frozen=True):
+    """The settings and calibration of the FIRM a log was written by."""
+
+    device_id: int
+    device_name: str
+    firmware_version: str
+    frequency_hz: int
+    """How many packets a second FIRM sends."""
+    accelerometer_calibration: SensorCalibration
+    gyroscope_calibration: SensorCalibration
+    magnetometer_calibration: SensorCalibration
+    temperature_scale: float
+    pressure_scale: float
+    acceleration_scale: float
+    angular_rate_scale: float
+    magnetic_field_scale: float
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> FRMHeader:
+        """
+        Reads the header at the start of a FIRM log.
+
+        :param data: The log, or at least its first FRM_HEADER_BYTES bytes.
+        :return: The header.
+        :raises ValueError: If the data isn't a FIRM log.
+        """
+        if not data.startswith(FRM_MAGIC) or len(data) < FRM_HEADER_BYTES:
+            raise ValueError(f"Not a FIRM log, which would start with {FRM_MAGIC!r}.")
+        header = np.frombuffer(data, FRM_HEADER_DTYPE, count=1)[0]
+        accelerometer, gyroscope, magnetometer, _ = (
+            SensorCalibration(
+                offsets=tuple(calibration[:3].tolist()),
+                scale_matrix=tuple(calibration[3:].tolist()),
+            )
+            for calibration in header["calibrations"]
+        )
+        return cls(
+            device_id=int(header["device_id"]),
+            device_name=header["device_name"].rstrip(b"\0").decode(errors="replace"),
+            firmware_version=header["firmware_version"].rstrip(b"\0 ").decode(errors="replace"),
+            frequency_hz=int(header["frequency_hz"]),
+            accelerometer_calibration=accelerometer,
+            gyroscope_calibration=gyroscope,
+            magnetometer_calibration=magnetometer,
+            temperature_scale=float(header["temperature_scale"]),
+            pressure_scale=float(header["pressure_scale"]),
+            acceleration_scale=float(header["acceleration_scale"]),
+            angular_rate_scale=float(header["angular_rate_scale"]),
+            magnetic_field_scale=float(header["magnetic_field_scale"]),
+        )
+
+
+class FRMLog(msgspec.Struct, frozen=True):
+    """
+    The calibrated readings of the sensors in a FIRM log, in the units of
+    FIRMDataPacket. Each sensor has the timestamps of its readings, in
+    seconds, and the readings, one row per reading.
+    """
+
+    header: FRMHeader
+    frame_types: np.ndarray
+    """The type of every frame of the log, in the order they were logged."""
+    frame_timestamps: np.ndarray
+    """The timestamp of every frame of the log."""
+    imu_timestamps: np.ndarray
+    accelerations: np.ndarray
+    """The x, y, and z acceleration in gs."""
+    angular_rates: np.ndarray
+    """The x, y, and z angular rate in degrees per second."""
+    barometer_timestamps: np.ndarray
+    temperatures: np.ndarray
+    """The temperature in degrees Celsius."""
+    pressures: np.ndarray
+    """The pressure in Pascals."""
+    magnetometer_timestamps: np.ndarray
+    magnetic_fields: np.ndarray
+    """The x, y, and z magnetic field in microteslas."""
+
+
+def is_frm_log(log_path: Path) -> bool:
+    """
+    Returns whether a file is a FIRM log, rather than one of our CSV logs.
+
+    :param log_path: The path of the file.
+    """
+    return log_path.suffix.upper() == ".FRM"
+
+
+def read_frm_log(log_path: Path) -> FRMLog:
+    """
+    Reads and calibrates the sensor readings in a FIRM log.
+
+    How long each frame is depends on its type, so the frames are found with one pass over the
+    log. Everything else is done a whole sensor at a time, by viewing the frames of each sensor
+    as a structured NumPy array.
+
+    :param log_path: The path of the .FRM file.
+    :return: The readings.
+    :raises ValueError: If the file isn't a FIRM log, or has a frame of an unknown type.
+    """
+    data = log_path.read_bytes()
+    header = FRMHeader.from_bytes(data)
+    log_bytes = np.frombuffer(data, np.uint8)
+    frame_offsets = _find_frame_offsets(data, log_path)
+    frame_types = log_bytes[frame_offsets]
+
+    # The timestamps are 32 bit tick counts, which wrap around, so we count how many times they
+    # did to make them go up for the whole log:
+    ticks = _get_frames(log_bytes, frame_offsets, FRAME_PREFIX_DTYPE)["ticks"].astype(np.int64)
+    wrap_arounds = np.cumsum(np.diff(ticks, prepend=ticks[:1]) < -(2**31))
+    frame_timestamps = (ticks + (wrap_arounds << 32)) / FRM_CLOCK_HZ
+
+    imu_frames = frame_types == ord("I")
+    imu = _get_frames(log_bytes, frame_offsets[imu_frames], IMU_FRAME_DTYPE)
+    low_bits = imu["low_bits"].astype(np.int32)
+    accelerations = (imu["acceleration"].astype(np.int32) * 16 + (low_bits >> 4)) / (
+        header.acceleration_scale
+    )
+    angular_rates = (imu["angular_rate"].astype(np.int32) * 16 + (low_bits & 0xF)) / (
+        header.angular_rate_scale
+    )
+
+    barometer_frames = frame_types == ord("B")
+    barometer = _get_frames(log_bytes, frame_offsets[barometer_frames], BAROMETER_FRAME_DTYPE)
+    temperatures = _read_uint24(barometer["temperature"])
+    temperatures -= (temperatures >= 2**23) * 2**24
+    pressures = _read_uint24(barometer["pressure"])
+
+    magnetometer_frames = frame_types == ord("M")
+    magnetometer = _get_frames(
+        log_bytes, frame_offsets[magnetometer_frames], MAGNETOMETER_FRAME_DTYPE
+    )
+    low_bit_shifts = np.array([6, 4, 2])
+    magnetic_fields = (
+        magnetometer["magnetic_field"].astype(np.int32) * 4
+        + ((magnetometer["low_bits"][:, None] >> low_bit_shifts) & 0b11)
+        - 2**17
+    ) / header.magnetic_field_scale
+
+    return FRMLog(
+        header=header,
+        frame_types=frame_types,
+        frame_timestamps=frame_timestamps,
+        imu_timestamps=frame_timestamps[imu_frames],
+        accelerations=header.accelerometer_calibration.apply(accelerations),
+        angular_rates=header.gyroscope_calibration.apply(angular_rates),
+        barometer_timestamps=frame_timestamps[barometer_frames],
+        temperatures=temperatures / header.temperature_scale,
+        pressures=pressures / header.pressure_scale,
+        magnetometer_timestamps=frame_timestamps[magnetometer_frames],
+        magnetic_fields=header.magnetometer_calibration.apply(magnetic_fields),
+    )
+
+
+def read_frm_packets(log_path: Path) -> pl.DataFrame:
+    """
+    Makes the packets FIRM would have sent while it was logging a FIRM log.
+
+    FIRM sends a packet every 1 / `frequency_hz` seconds, with the latest reading of each sensor,
+    timestamped with the latest frame. The estimated fields come from `estimate_flight`.
+
+    :param log_path: The path of the .FRM file.
+    :return: A row for each packet, with a column named after each field FIRMDataPacket is made
+        from.
+    """
+    frm_log = read_frm_log(log_path)
+    estimates = estimate_flight(frm_log)
+
+    # The index of the latest reading of each sensor at every frame:
+    latest_imu = np.cumsum(frm_log.frame_types == ord("I")) - 1
+    latest_barometer = np.cumsum(frm_log.frame_types == ord("B")) - 1
+    latest_magnetometer = np.cumsum(frm_log.frame_types == ord("M")) - 1
+
+    # A packet is sent at the first frame in every period, once every sensor was read:
+    timestamps = frm_log.frame_timestamps
+    periods = np.floor((timestamps - timestamps[0]) * frm_log.header.frequency_hz)
+    packet_frames = np.flatnonzero(
+        (np.diff(periods, prepend=-1.0) != 0)
+        & (latest_imu >= 0)
+        & (latest_barometer >= 0)
+        & (latest_magnetometer >= 0)
+    )
+    imu = latest_imu[packet_frames]
+    barometer = latest_barometer[packet_frames]
+    magnetometer = latest_magnetometer[packet_frames]
+    return pl.DataFrame(
+        {
+            "timestamp_seconds": timestamps[packet_frames],
+            "temperature_celsius": frm_log.temperatures[barometer],
+            "pressure_pascals": frm_log.pressures[barometer],
+            **_name_axes("raw_acceleration_{}_gs", frm_log.accelerations[imu]),
+            **_name_axes("raw_angular_rate_{}_deg_per_s", frm_log.angular_rates[imu]),
+            **_name_axes("magnetic_field_{}_microteslas", frm_log.magnetic_fields[magnetometer]),
+            "est_position_z_meters": estimates.altitudes[imu],
+            "est_velocity_z_meters_per_s": estimates.vertical_velocities[imu],
+            **{
+                f"est_quaternion_{axis}": estimates.quaternions[imu, i]
+                for i, axis in enumerate("wxyz")
+            },
+        }
+    )
+
+
+class FlightEstimates(msgspec.Struct, frozen=True):
+    """The estimates made from a FIRM log, at every reading of its IMU."""
+
+    altitudes: np.ndarray
+    """The altitude above where the log started, in meters."""
+    vertical_velocities: np.ndarray
+    """The vertical velocity, in meters per second."""
+    quaternions: np.ndarray
+    """The orientation of the board FIRM is on, as w, x, y, z quaternions, in the convention
+    FIRMDataPacket uses."""
+
+
+def estimate_flight(frm_log: FRMLog) -> FlightEstimates:
+    """
+    Estimates the altitude, vertical velocity, and orientation of the rocket from the readings of
+    a FIRM log, in place of the estimates FIRM would have made.
+
+    FIRM's own filter isn't reproduced. Instead, the orientation is found from the direction of
+    gravity while the rocket is on the pad, and then followed by integrating the gyroscope. The
+    altitude and velocity fuse the vertical acceleration with the barometer, with a complementary
+    filter which trusts the accelerometer over FRM_ESTIMATOR_TIME_CONSTANT_SECONDS, and only the
+    accelerometer while the rocket is faster than FRM_BAROMETER_MAX_SPEED_METERS_PER_S. Every
+    estimate only uses the readings up to it, like FIRM's would.
+
+    :param frm_log: The readings.
+    :return: The estimates.
+    """
+    timestamps = frm_log.imu_timestamps
+    time_steps = np.diff(timestamps, prepend=timestamps[:1])
+    on_pad = timestamps < timestamps[0] + FRM_PAD_SECONDS
+
+    # The accelerometer reads 1 g straight up on the pad, so we start with the rotation which
+    # turns that reading straight up, and then add up the rotations the gyroscope measured:
+    pad_acceleration = frm_log.accelerations[on_pad].mean(axis=0)
+    pad_orientation = _rotation_between(pad_acceleration, np.array([0.0, 0.0, 1.0]))
+    rotation_vectors = np.radians(frm_log.angular_rates) * time_steps[:, None]
+    orientations = _multiply_quaternions(
+        pad_orientation, _accumulate_rotations(_rotation_vector_to_quaternion(rotation_vectors))
+    )
+    orientations /= np.linalg.norm(orientations, axis=1, keepdims=True)
+    vertical_accelerations = (
+        _rotate(orientations, frm_log.accelerations)[:, 2] - np.linalg.norm(pad_acceleration)
+    ) * GRAVITY_METERS_PER_SECOND_SQUARED
+
+    # The altitude from the latest pressure at each IMU reading, with the standard atmosphere:
+    latest_barometer = np.cumsum(frm_log.frame_types == ord("B"))[frm_log.frame_types == ord("I")]
+    # The median of the latest readings leaves out the short spikes of the ejection charges:
+    padded_pressures = np.concatenate(
+        [np.repeat(frm_log.pressures[:1], FRM_BAROMETER_MEDIAN_READINGS - 1), frm_log.pressures]
+    )
+    median_pressures = np.median(
+        np.lib.stride_tricks.sliding_window_view(padded_pressures, FRM_BAROMETER_MEDIAN_READINGS),
+        axis=1,
+    )
+    pressures = median_pressures[np.maximum(latest_barometer - 1, 0)]
+    ground_pressure = frm_log.pressures[
+        frm_log.barometer_timestamps < timestamps[0] + FRM_PAD_SECONDS
+    ].mean()
+    barometer_altitudes = 44330.0 * (1 - (pressures / ground_pressure) ** 0.190263)
+
+    # The barometer reads the pressure spikes of fast flight as jumps of hundreds of meters, so
+    # it is ignored from when the accelerometer says the rocket got fast until it slowed down:
+    fast = np.cumsum(vertical_accelerations * time_steps) > FRM_BAROMETER_MAX_SPEED_METERS_PER_S
+    fast_start = int(np.argmax(fast)) if fast.any() else len(fast)
+    fast_end = fast_start + int(np.argmax(~fast[fast_start:])) if not fast[-1] else len(fast)
+    barometer_weight = np.mean(time_steps) / FRM_ESTIMATOR_TIME_CONSTANT_SECONDS
+    barometer_velocities = np.diff(barometer_altitudes, prepend=barometer_altitudes[:1]) / np.mean(
+        time_steps
+    )
+
+    vertical_velocities = np.empty_like(timestamps)
+    altitudes = np.empty_like(timestamps)
+    velocity, altitude = 0.0, barometer_altitudes[0]
+    for segment, weight in (
+        (slice(0, fast_start), barometer_weight),
+        (slice(fast_start, fast_end), 0.0),
+        (slice(fast_end, None), barometer_weight),
+    ):
+        if not (steps := time_steps[segment]).size:
+            continue
+        vertical_velocities[segment] = _blend(
+            vertical_accelerations[segment] * steps,
+            barometer_velocities[segment],
+            weight,
+            velocity,
+        )
+        altitudes[segment] = _blend(
+            vertical_velocities[segment] * steps, barometer_altitudes[segment], weight, altitude
+        )
+        velocity, altitude = vertical_velocities[segment][-1], altitudes[segment][-1]
+
+    # FIRMDataPacket turns the IMU readings by FIRM_IMU_YAW_DEGREES before its quaternion:
+    imu_yaw = _rotation_vector_to_quaternion(
+        np.array([0.0, 0.0, -np.radians(FIRM_IMU_YAW_DEGREES)])
+    )
+    return FlightEstimates(
+        altitudes=altitudes,
+        vertical_velocities=vertical_velocities,
+        quaternions=_multiply_quaternions(orientations, imu_yaw),
+    )
+
+
+def _blend(
+    steps: np.ndarray, measurements: np.ndarray, measurement_weight: float, initial: float
+) -> np.ndarray:
+    """
+    Runs a complementary filter, where each estimate is the last one moved on by its step, and
+    then pulled a little towards its measurement.
+
+    :param steps: How much each estimate changed since the last one, e.g. the velocity times
+        the time step for an altitude.
+    :param measurements: The measurement of each estimate.
+    :param measurement_weight: How far each estimate is pulled towards its measurement, from 0 to
+        ignore the measurements to 1 to only use them.
+    :param initial: The estimate before the first one.
+    :return: The estimates.
+    """
+    step_weight = 1 - measurement_weight
+    return lfilter(
+        [1.0],
+        [1.0, -step_weight],
+        step_weight * steps + measurement_weight * measurements,
+        zi=[step_weight * initial],
+    )[0]
+
+
+def _find_frame_offsets(data: bytes, log_path: Path) -> np.ndarray:
+    """
+    Finds where every frame of a FIRM log starts.
+
+    :param data: The log.
+    :param log_path: The path of the log, for the error message.
+    :return: The offset of every frame, in bytes from the start of the log. A frame cut off by
+        the end of the log, e.g. because FIRM lost power while writing it, is left out.
+    :raises ValueError: If a frame has an unknown type.
+    """
+    frame_sizes = [0] * 256
+    for frame_type, frame_dtype in FRAME_DTYPES.items():
+        frame_sizes[frame_type] = frame_dtype.itemsize
+
+    offsets = []
+    offset = FRM_HEADER_BYTES
+    while offset < len(data):
+        if not (frame_size := frame_sizes[data[offset]]):
+            raise ValueError(
+                f"Unknown frame type {data[offset]:#04x} at byte {offset} of {log_path}."
+            )
+        offsets.append(offset)
+        offset += frame_size
+    if offset > len(data):
+        offsets.pop()
+    return np.array(offsets, dtype=np.int64)
+
+
+def _get_frames(log_bytes: np.ndarray, frame_offsets: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """
+    Views frames of a FIRM log as a structured array.
+
+    :param log_bytes: The log.
+    :param frame_offsets: Where the frames start.
+    :param dtype: The layout of the frames. Only as many bytes as it has are read.
+    :return: An element for each frame.
+    """
+    frames = log_bytes[frame_offsets[:, None] + np.arange(dtype.itemsize)]
+    return frames.view(dtype)[:, 0]
+
+
+def _read_uint24(little_endian_bytes: np.ndarray) -> np.ndarray:
+    """
+    Reads little endian unsigned 24 bit numbers.
+
+    :param little_endian_bytes: The 3 bytes of each number, one row per number.
+    :return: The numbers.
+    """
+    values = little_endian_bytes.astype(np.int64)
+    return values[:, 0] | (values[:, 1] << 8) | (values[:, 2] << 16)
+
+
+def _name_axes(name_format: str, values: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Names the x, y, and z columns of readings.
+
+    :param name_format: The name of the columns, with {} where the axis goes.
+    :param values: The readings, one row per reading.
+    :return: Each column, by its name.
+    """
+    return {name_format.format(axis): values[:, i] for i, axis in enumerate("xyz")}
+
+
+def _multiply_quaternions(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Multiplies w, x, y, z quaternions, which are broadcast against each other.
+
+    :return: The products, which are the rotation `second` followed by `first`.
+    """
+    w1, x1, y1, z1 = np.moveaxis(first, -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(second, -1, 0)
+    return np.stack(
+        [
+            w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+            w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+            w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+        ],
+        axis=-1,
+    )
+
+
+def _accumulate_rotations(quaternions: np.ndarray) -> np.ndarray:
+    """
+    Returns the running product of quaternions, i.e. the product of the first n for every n.
+
+    Each pass multiplies every quaternion by the running product ending twice as far back as the
+    last pass did, so it takes log2(n) passes over all of them instead of n multiplications.
+
+    :param quaternions: The quaternions, one row each.
+    :return: The running products.
+    """
+    products = quaternions.copy()
+    shift = 1
+    while shift < len(products):
+        products[shift:] = _multiply_quaternions(products[:-shift], products[shift:])
+        shift *= 2
+    return products
+
+
+def _rotation_vector_to_quaternion(rotation_vectors: np.ndarray) -> np.ndarray:
+    """
+    Converts rotations about the direction of each vector, by its length in radians, to
+    quaternions.
+    """
+    angles = np.linalg.norm(rotation_vectors, axis=-1, keepdims=True)
+    # sin(angle / 2) / angle, which is 1/2 for no rotation:
+    scales = 0.5 * np.sinc(angles / (2 * np.pi))
+    return np.concatenate([np.cos(angles / 2), rotation_vectors * scales], axis=-1)
+
+
+def _rotation_between(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """
+    Returns the quaternion of the smallest rotation which turns one direction into another.
+    """
+    start = start / np.linalg.norm(start)
+    end = end / np.linalg.norm(end)
+    quaternion = np.concatenate([[1.0 + start @ end], np.cross(start, end)])
+    return quaternion / np.linalg.norm(quaternion)
+
+
+def _rotate(quaternions: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """
+    Rotates each vector by its quaternion.
+    """
+    w = quaternions[:, :1]
+    axes = quaternions[:, 1:]
+    twice_cross = 2 * np.cross(axes, vectors)
+    return vectors + w * twice_cross + np.cross(axes, twice_cross)
@@ -0,0 +1,564 @@
+"""
+Module for running the air brakes in lockstep with the packets they are fed,
+so that a run only depends on the packets, and not on how fast the computer
+running it is.
+
+A mock replay hands the main loop however many packets MockFIRM's thread
+has read since the last loop, the apogee predictions come back from the
+prediction thread whenever it is done with them, and the logger thread
+writes the rows whenever it gets to them. All of that changes from run to
+run. Here, there are no threads: the packets are handed out in fixed
+batches, the apogee is predicted in the main loop, and the rows are written
+in the main loop too. Anything which takes time in flight, like predicting
+the apogee or moving the servo, takes that time on the clock of the flight,
+which is the timestamp of the latest packet. So every run of the same
+packets is the same, and runs as fast as the main loop can go.
+"""
+
+import itertools
+import math
+import time
+from typing import TYPE_CHECKING
+
+import msgspec
+import numpy as np
+
+from airbrakes.base_classes.base_firm import BaseFIRM
+from airbrakes.constants import SERVO_DELAY_SECONDS, ServoExtension
+from airbrakes.context import Context
+from airbrakes.data_handling.apogee_predictor import ApogeePredictor, make_rocket, predict_apogee
+from airbrakes.data_handling.data_processor import DataProcessor
+from airbrakes.data_handling.logger import LogWriter
+from airbrakes.mock.fault_injection import FaultInjectingFIRM
+from airbrakes.mock.mock_logger import MockLogger
+from airbrakes.mock.mock_servo import MockServo
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from pathlib import Path
+
+    from firm_client import FIRMDataPacket
+    from hprm import Rocket
+
+    from airbrakes.data_handling.logger import BacklogLoop
+    from airbrakes.data_handling.packets.apogee_predictor_data_packet import (
+        ApogeePredictorDataPacket,
+    )
+    from airbrakes.data_handling.packets.context_data_packet import ContextDataPacket
+    from airbrakes.data_handling.packets.logger_data_packet import LoggerDataPacket
+    from airbrakes.data_handling.packets.processor_data_packet import ProcessorDataPacket
+    from airbrakes.data_handling.packets.servo_data_packet import ServoDataPacket
+    from airbrakes.mock.closed_loop import ClosedLoopFIRM
+    from airbrakes.mock.fault_injection import FaultRates
+
+
+class PredictionLatency(msgspec.Struct, frozen=True):
+    """
+    How long the prediction thread takes to predict the apogee, on the clock
+    of the flight. Each prediction takes `base_seconds`, plus a random part of
+    `jitter_seconds`.
+    """
+
+    base_seconds: float = 0.0
+    """How long every prediction takes at least."""
+    jitter_seconds: float = 0.0
+    """How much longer than `base_seconds` a prediction can take."""
+    seed: int = 0
+    """The seed of the random number generator, so the latencies are the same every run."""
+
+
+NO_PREDICTION_LATENCY = PredictionLatency()
+"""Predictions which take no time, so each one is handed back in the next loop."""
+
+
+class LockstepFIRM(BaseFIRM):
+    """
+    Hands the packets to the main loop in batches, one batch every time the
+    main loop asks for packets, without a thread.
+
+    FIRM is running until the last batch was handed out, so the main loop
+    stops when it runs out of packets. The timestamp of the latest packet
+    handed out is the clock of the flight.
+    """
+
+    __slots__ = ("_batches", "_clock_seconds", "_next_batch", "_requested_to_run")
+
+    def __init__(
+        self, packets: Iterable[FIRMDataPacket], batch_sizes: int | Iterable[int] = 1
+    ) -> None:
+        """
+        Initializes the LockstepFIRM.
+
+        :param packets: The packets to hand out, in order. They are only taken from the iterable
+            as they are handed out.
+        :param batch_sizes: How many packets to hand out at a time, or the size of each batch in
+            turn. Once the sizes run out, the rest of the packets are handed out one at a time.
+        """
+        packets = iter(packets)
+        sizes = (
+            itertools.repeat(batch_sizes)
+            if isinstance(batch_sizes, int)
+            else itertools.chain(batch_sizes, itertools.repeat(1))
+        )
+        self._batches = self._make_batches(packets, sizes)
+        self._next_batch: list[FIRMDataPacket] = []
+        self._clock_seconds = math.nan
+        self._requested_to_run = False
+
+    @property
+    def requested_to_run(self) -> bool:
+        return self._requested_to_run
+
+    @property
+    def is_running(self) -> bool:
+        return self._requested_to_run and bool(self._next_batch)
+
+    def now_seconds(self) -> float:
+        """
+        Returns the time on the clock of the flight, which is the timestamp of the latest packet
+        handed out, or of the first packet before any were handed out.
+
+        :return: The time in seconds, or NaN if there are no packets.
+        """
+        return self._clock_seconds
+
+    def start(self) -> None:
+        self._requested_to_run = True
+        # The next batch is taken ahead of time, to know when the packets run out:
+        self._next_batch = next(self._batches, [])
+        if self._next_batch:
+            self._clock_seconds = self._next_batch[0].timestamp_seconds
+
+    def stop(self) -> None:
+        self._requested_to_run = False
+
+    def get_data_packets(self, block: bool = True) -> list[FIRMDataPacket]:
+        """
+        Returns the next batch of packets, and moves the clock of the flight on to the last of
+        them.
+
+        :param block: Unused, as the next batch is always ready.
+        :return: The next batch, or an empty list if FIRM isn't running.
+        """
+        _ = block
+        if not self.is_running:
+            return []
+        packets = self._next_batch
+        self._clock_seconds = packets[-1].timestamp_seconds
+        self._next_batch = next(self._batches, [])
+        return packets
+
+    @staticmethod
+    def _make_batches(
+        packets: Iterator[FIRMDataPacket], sizes: Iterator[int]
+    ) -> Iterator[list[FIRMDataPacket]]:
+        """
+        Splits the packets into batches of the sizes.
+
+        :param packets: The packets.
+        :param sizes: The size of each batch, which never run out.
+        :return: The batches, until the packets run out. Batches of size 0 are skipped.
+        """
+        for size in sizes:
+            if size <= 0:
+                continue
+            batch = list(itertools.islice(packets, size))
+            if not batch:
+                return
+            yield batch
+
+
+class InlineApogeePredictor(ApogeePredictor):
+    """
+    An apogee predictor which predicts the apogee in the main loop, instead
+    of in the prediction thread, but hands the predictions back when the
+    prediction thread would have.
+
+    Like the prediction thread, it predicts with the newest data it was given
+    once it is done with the last prediction, and each prediction takes as
+    long as the latency model says, on the clock of the flight. A prediction
+    is handed back the first time the main loop asks for one after it is
+    done, which is in the next loop at the earliest.
+    """
+
+    __slots__ = (
+        "_clock",
+        "_latency",
+        "_latency_rng",
+        "_latest_prediction",
+        "_prediction_in_progress",
+        "_rocket",
+        "_waiting_packet",
+    )
+
+    def __init__(
+        self,
+        latency: PredictionLatency = NO_PREDICTION_LATENCY,
+        clock: Callable[[], float] | None = None,
+    ) -> None:
+        """
+        Initializes the InlineApogeePredictor.
+
+        :param latency: How long each prediction takes.
+        :param clock: Returns the time on the clock of the flight, e.g. `LockstepFIRM.now_seconds`,
+            or None to hand back every prediction in the next loop, whatever the latency.
+        """
+        super().__init__()
+        self._latency = latency
+        self._clock = clock
+        self._latency_rng = np.random.default_rng(latency.seed)
+        self._rocket: Rocket | None = None
+        self._waiting_packet: ProcessorDataPacket | None = None
+        self._prediction_in_progress: tuple[float, ApogeePredictorDataPacket] | None = None
+        self._latest_prediction: ApogeePredictorDataPacket | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._rocket is not None
+
+    def wait_until_started(self, timeout: float | None = None) -> bool:  # noqa: ARG002
+        return self.is_running
+
+    @property
+    def processor_data_packet_queue_size(self) -> int:
+        # Only the newest data waits for the prediction in progress to be done:
+        return 0 if self._waiting_packet is None else 1
+
+    def start(self) -> None:
+        """
+        Makes the rocket to predict with, from the rocket constants as they are when the main
+        loop starts, like the prediction thread does.
+        """
+        self._rocket = make_rocket()
+        self._latency_rng = np.random.default_rng(self._latency.seed)
+
+    def stop(self) -> None:
+        self._rocket = None
+
+    def update(self, processor_data_packet: ProcessorDataPacket) -> None:
+        """
+        Gives the predictor the most recent processed data. It is predicted with straight away,
+        unless a prediction is still in progress.
+
+        :param processor_data_packet: The most recent ProcessorDataPacket.
+        """
+        if self._rocket is None:
+            return
+        now_seconds = self._now_seconds()
+        self._advance(now_seconds)
+        self._waiting_packet = processor_data_packet
+        self._advance(now_seconds)
+
+    def get_prediction_data_packet(self) -> ApogeePredictorDataPacket | None:
+        """
+        Returns the newest prediction which was done since this was last called.
+
+        :return: The latest ApogeePredictorDataPacket, or None if no prediction was done since.
+        """
+        if self._rocket is not None:
+            self._advance(self._now_seconds())
+        prediction = self._latest_prediction
+        self._latest_prediction = None
+        return prediction
+
+    def _now_seconds(self) -> float:
+        """Returns the time on the clock of the flight, or infinity if there is no clock."""
+        return math.inf if self._clock is None else self._clock()
+
+    def _advance(self, now_seconds: float) -> None:
+        """
+        Moves the simulated prediction thread on to a time: the predictions done by then are
+        ready to be handed back, and the newest waiting data is predicted with once the thread
+        is free.
+
+        :param now_seconds: The time on the clock of the flight.
+        """
+        while True:
+            free_seconds = now_seconds
+            if self._prediction_in_progress is not None:
+                done_seconds, prediction = self._prediction_in_progress
+                if done_seconds > now_seconds:
+                    return
+                self._latest_prediction = prediction
+                self._prediction_in_progress = None
+                free_seconds = done_seconds
+            if self._waiting_packet is None:
+                return
+            latency_seconds = (
+                self._latency.base_seconds
+                + self._latency.jitter_seconds * self._latency_rng.random()
+            )
+            self._prediction_in_progress = (
+                free_seconds + latency_seconds,
+                predict_apogee(self._rocket, self._waiting_packet),
+            )
+            self._waiting_packet = None
+
+
+class LockstepServo(MockServo):
+    """
+    A mock servo which stops buzzing once it has had time to move, on the
+    clock of the flight, instead of after a timer thread goes off.
+    """
+
+    __slots__ = ("_clock", "_settle_seconds", "_settled_extension")
+
+    def __init__(self, clock: Callable[[], float]) -> None:
+        """
+        Initializes the LockstepServo.
+
+        :param clock: Returns the time on the clock of the flight, e.g.
+            `LockstepFIRM.now_seconds`.
+        """
+        super().__init__()
+        self._clock = clock
+        self._settle_seconds = math.inf
+        self._settled_extension: ServoExtension | None = None
+
+    def extend_airbrakes(self) -> None:
+        self._set_extension(ServoExtension.MAX_EXTENSION)
+        self._settle(ServoExtension.MAX_NO_BUZZ)
+
+    def retract_airbrakes(self) -> None:
+        self._set_extension(ServoExtension.MIN_EXTENSION)
+        self._settle(ServoExtension.MIN_NO_BUZZ)
+
+    @property
+    def servo_extension(self) -> ServoExtension:
+        """
+        Gets the extension most recently commanded to the servo, which stops buzzing
+        SERVO_DELAY_SECONDS after it was told to move.
+
+        :return: The commanded servo extension.
+        """
+        if self._settled_extension is not None and self._clock() >= self._settle_seconds:
+            self._set_extension(self._settled_extension)
+            self._settled_extension = None
+        return self._servo_extension
+
+    def _settle(self, extension: ServoExtension) -> None:
+        """
+        Stops the servo buzzing at the extension, once it has had time to move there.
+
+        :param extension: The extension to stop buzzing at.
+        """
+        self._settled_extension = extension
+        self._settle_seconds = self._clock() + SERVO_DELAY_SECONDS
+
+
+class SynchronousLogger(MockLogger):
+    """
+    A mock logger which writes the rows to the log in the main loop, as soon
+    as they are logged, instead of in the logging thread. The segments are
+    left uncompressed, as compressing them would take a thread too.
+    """
+
+    __slots__ = ("_log_writer",)
+
+    def __init__(self, log_file_path: Path, delete_log_file: bool = True) -> None:
+        """
+        Initializes the SynchronousLogger.
+
+        :param log_file_path: The directory to write the log in.
+        :param delete_log_file: True if the log file should be deleted after the logger stops.
+        """
+        super().__init__(log_file_path, delete_log_file, compression=None)
+        self._log_writer: LogWriter | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._log_writer is not None
+
+    def wait_until_started(self, timeout: float | None = None) -> bool:  # noqa: ARG002
+        return self.is_running
+
+    def start(self) -> None:
+        self._log_writer = LogWriter(
+            self.log_path, self._max_segment_bytes, self._max_segment_seconds, None
+        )
+
+    def stop(self) -> None:
+        """Writes the rows still in the log buffer, closes the log, and deletes it if asked to."""
+        if self._log_writer is None:
+            return
+        self._log_the_buffer()
+        self._write_queued_packets()
+        self._log_writer.close()
+        self._log_writer = None
+        if self._delete_log_file:
+            self._delete_log()
+
+    def log(
+        self,
+        context_data_packet: ContextDataPacket,
+        servo_data_packet: ServoDataPacket,
+        firm_data_packets: list[FIRMDataPacket],
+        apogee_predictor_data_packet: ApogeePredictorDataPacket | None,
+    ) -> None:
+        """
+        Logs the packets like the Logger does, and writes them straight away.
+
+        :param context_data_packet: The Context Data Packet to log.
+        :param servo_data_packet: The Servo Data Packet to log.
+        :param firm_data_packets: The FIRM data packets to log.
+        :param apogee_predictor_data_packet: The most recent apogee predictor data packet to log.
+        """
+        super().log(
+            context_data_packet, servo_data_packet, firm_data_packets, apogee_predictor_data_packet
+        )
+        self._write_queued_packets()
+
+    def log_backlog(
+        self,
+        context_data_packet: ContextDataPacket,
+        servo_data_packet: ServoDataPacket,
+        firm_data_packets: list[FIRMDataPacket],
+        apogee_predictor_data_packet: ApogeePredictorDataPacket | None,
+    ) -> None:
+        """
+        Logs a backlog like the Logger does, and writes it straight away.
+
+        :param context_data_packet: The Context Data Packet to log.
+        :param servo_data_packet: The Servo Data Packet to log.
+        :param firm_data_packets: The FIRM data packets of the backlog.
+        :param apogee_predictor_data_packet: The most recent apogee predictor data packet to log.
+        """
+        super().log_backlog(
+            context_data_packet, servo_data_packet, firm_data_packets, apogee_predictor_data_packet
+        )
+        self._write_queued_packets()
+
+    def _write_queued_packets(self) -> None:
+        """Writes the rows waiting in the log queue to the log."""
+        if self._log_writer is not None:
+            queued_packets: list[LoggerDataPacket | BacklogLoop] = []
+            self._log_queue.drain_into(queued_packets)
+            # The rows which didn't fit in the log queue come after the ones in it:
+            queued_packets.extend(self._log_queue_overflow)
+            self._log_queue_overflow.clear()
+            self._log_writer.write(self._prepare_queued_packets(queued_packets))
+
+
+class LockstepSimulation:
+    """
+    Runs the air brakes over a flight, one loop at a time, in lockstep with
+    the packets of the flight, without any threads.
+
+    Every loop hands the main loop the next batch of packets. The apogee is
+    predicted with an InlineApogeePredictor, the servo is a LockstepServo,
+    and the log is written by a SynchronousLogger, so a run depends on
+    nothing but the packets, the batch sizes, and the prediction latency.
+
+    With fault rates, the packets are handed to the main loop through a
+    FaultInjectingFIRM, which is the FIRM of the Context. The servo and the
+    apogee predictor still follow the clock of the flight, not the clock the
+    faulty packets are stamped with.
+    """
+
+    __slots__ = ("_start_seconds", "context", "firm", "loops", "wall_seconds")
+
+    def __init__(
+        self,
+        packets: Iterable[FIRMDataPacket],
+        log_dir: Path,
+        batch_sizes: int | Iterable[int] = 1,
+        prediction_latency: PredictionLatency = NO_PREDICTION_LATENCY,
+        delete_log_file: bool = True,
+        *,
+        faults: FaultRates | None = None,
+    ) -> None:
+        """
+        Initializes the LockstepSimulation.
+
+        :param packets: The packets of the flight, in order.
+        :param log_dir: The directory to write the log in.
+        :param batch_sizes: How many packets to hand the main loop at a time, or the size of
+            each batch in turn, like LockstepFIRM takes.
+        :param prediction_latency: How long each apogee prediction takes.
+        :param delete_log_file: True if the log file should be deleted after the run.
+        :param faults: How often to inject each fault into the packets, or None for no faults.
+        """
+        self.firm = self._make_firm(packets, batch_sizes)
+        self.context = self._make_context(log_dir, prediction_latency, delete_log_file, faults)
+        self._start_seconds = math.nan
+        self.loops = 0
+        """How many loops the main loop has run."""
+        self.wall_seconds = 0.0
+        """How long the loops took, on the clock of the computer running them."""
+
+    def _make_firm(
+        self, packets: Iterable[FIRMDataPacket], batch_sizes: int | Iterable[int]
+    ) -> LockstepFIRM | ClosedLoopFIRM:
+        """
+        Makes the FIRM which hands the main loop the packets of the flight.
+
+        :param packets: The packets of the flight, in order.
+        :param batch_sizes: How many packets to hand the main loop at a time, or the size of
+            each batch in turn.
+        :return: The FIRM of the simulation.
+        """
+        return LockstepFIRM(packets, batch_sizes)
+
+    def _make_context(
+        self,
+        log_dir: Path,
+        prediction_latency: PredictionLatency,
+        delete_log_file: bool,
+        faults: FaultRates | None,
+    ) -> Context:
+        """
+        Makes the air brakes which run in lockstep with the FIRM of the simulation.
+
+        :param log_dir: The directory to write the log in.
+        :param prediction_latency: How long each apogee prediction takes.
+        :param delete_log_file: True if the log file should be deleted after the run.
+        :param faults: How often to inject each fault into the packets, or None for no faults.
+        :return: The Context of the air brakes.
+        """
+        return Context(
+            LockstepServo(self.firm.now_seconds),
+            self.firm if faults is None else FaultInjectingFIRM(self.firm, faults),
+            SynchronousLogger(log_dir, delete_log_file),
+            DataProcessor(),
+            InlineApogeePredictor(prediction_latency, self.firm.now_seconds),
+        )
+
+    @property
+    def flight_seconds(self) -> float:
+        """How far into the flight the main loop is, from the first packet."""
+        return self.firm.now_seconds() - self._start_seconds if self.loops else 0.0
+
+    @property
+    def speedup(self) -> float:
+        """How many times faster than real time the flight has run."""
+        return self.flight_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+    def start(self) -> None:
+        """Starts the air brakes, and the clock of the flight at the first packet."""
+        self.context.start()
+        self._start_seconds = self.firm.now_seconds()
+
+    def step(self) -> bool:
+        """
+        Runs one loop of the main loop, with the next batch of packets.
+
+        :return: Whether there is more of the flight to run: False once the packets ran out, or
+            the air brakes stopped after landing.
+        """
+        start_ns = time.perf_counter_ns()
+        self.context.update()
+        self.wall_seconds += (time.perf_counter_ns() - start_ns) / 1e9
+        self.loops += 1
+        # A FaultInjectingFIRM keeps running until it hands out the backlog of its last stall:
+        return self.context.firm.is_running and not self.context.shutdown_requested
+
+    def stop(self) -> None:
+        """Stops the air brakes, and writes the rest of the log."""
+        self.context.stop()
+
+    def run(self) -> None:
+        """Runs the whole flight, from the first packet to the last, or until landing."""
+        self.start()
+        while self.step():
+            pass
+        self.stop()
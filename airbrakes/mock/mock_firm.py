@@ -1,17 +1,50 @@
 """Module for simulating the FIRM hardware by reading from a log file."""
 
+import collections
+import hashlib
+import itertools
 import queue
 import threading
-import time
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import msgspec
+import numpy as np
 import polars as pl
 from firm_client import FIRMDataPacket
 
 import airbrakes.constants
 from airbrakes.base_classes.base_firm import BaseFIRM
-from airbrakes.constants import FIRM_SERIAL_TIMEOUT_SECONDS, STOP_SIGNAL
+from airbrakes.constants import (
+    DERIVED_FIRM_FIELDS,
+    FIRM_PACKET_INPUT_FIELDS,
+    FIRM_SERIAL_TIMEOUT_SECONDS,
+    LOG_BUFFER_SIZE,
+    MAX_FETCHED_MOCK_FIRM_PACKETS,
+    REPLAY_CACHE_FINGERPRINT_BYTES,
+    REPLAY_CACHE_PATH,
+    REPLAY_CACHE_VERSION,
+    REPLAY_CHUNK_ROWS,
+    REPLAY_READ_BATCH_ROWS,
+    STOP_SIGNAL,
+)
+from airbrakes.data_handling.log_index import find_state_transition, read_log_index
+from airbrakes.data_handling.log_reader import (
+    get_log_base_path,
+    get_log_segments,
+    get_schema_path,
+    iterate_log_batches,
+    read_log_schema,
+)
+from airbrakes.mock.frm_reader import is_frm_log, read_frm_packets
+from airbrakes.mock.replay_scheduler import ReplayJitterReport, ReplayScheduler
+from airbrakes.mock.replay_seek import ReplaySeek
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from airbrakes.mock.arrival_patterns import ArrivalPattern
+    from airbrakes.mock.replay_seek import ReplaySeekPoint
 
 
 class RocketParameters(msgspec.Struct):
@@ -32,19 +65,32 @@ class MockFIRM(BaseFIRM):
     """
     A mock implementation of FIRM for testing/simulation purposes.
 
-    It reads a CSV log file and feeds FIRMDataPackets into the queue as
-    if they were coming from the hardware.
+    It reads a CSV log file, or a raw .FRM log from FIRM's flash, and feeds
+    FIRMDataPackets into the queue as if they were coming from the hardware.
+
+    The first time a log file is replayed, its FIRM data is converted to a
+    NumPy array and saved in the replay cache. Later replays of the same
+    file memory-map the cached array instead of parsing the CSV again.
+
+    A replay can also start part way through the log. The packets before
+    the start are then kept in `replay_seek`, for the Context to be
+    brought up to date with before the replay starts.
     """
 
     __slots__ = (
+        "_arrival_pattern",
         "_data_fetch_thread",
         "_headers",
         "_is_running",
         "_log_file_path",
         "_needed_fields",
         "_queued_packets",
+        "_replay_cache_dir",
+        "_replay_scheduler",
         "_requested_to_run",
+        "_started",
         "file_metadata",
+        "replay_seek",
         "rocket_parameters",
     )
 
@@ -53,6 +99,11 @@ class MockFIRM(BaseFIRM):
         real_time_replay: bool = False,
         log_file_path: Path | None = None,
         start_after_log_buffer: bool = True,
+        *,
+        replay_cache_dir: Path | None = REPLAY_CACHE_PATH,
+        replay_speed: float = 1.0,
+        arrival_pattern: ArrivalPattern | None = None,
+        start_at: ReplaySeekPoint | None = None,
     ):
         """
         Initializes the MockFIRM.
@@ -60,9 +111,17 @@ class MockFIRM(BaseFIRM):
         :param real_time_replay: If True, packets are emitted with
             delays matching their original timestamps. If False, packets
             are emitted as fast as possible.
-        :param log_file_path: Optional path to a specific CSV log file.
+        :param log_file_path: Optional path to a specific CSV or .FRM log file.
         :param start_after_log_buffer: Whether to send the data packets only after the log buffer
             was filled for Standby state.
+        :param replay_cache_dir: The directory to cache the converted log file in, or None to
+            parse the CSV on every replay.
+        :param replay_speed: How many times faster than real time a real time replay runs, from
+            MIN_REPLAY_SPEED to MAX_REPLAY_SPEED.
+        :param arrival_pattern: The batches to hand the packets to the main loop in, and when
+            to hand them over, or None to hand over one packet at a time, at its timestamp.
+        :param start_at: Where in the log to start the replay, or None to start at the start of
+            the log, or after the log buffer.
         """
         # 1. Resolve Log File Path
         self._log_file_path = log_file_path
@@ -79,6 +138,9 @@ class MockFIRM(BaseFIRM):
                 self._log_file_path = Path("launch_data/real_firm_launches/jackpot_launch_1.csv")
 
         self._log_file_path = self._log_file_path
+        self._replay_cache_dir = replay_cache_dir
+        self._replay_scheduler = ReplayScheduler(replay_speed)
+        self._arrival_pattern = arrival_pattern
 
         file_metadata: dict = MockFIRM.read_file_metadata()
         self.file_metadata = file_metadata.get(self._log_file_path.name, {})
@@ -106,8 +168,15 @@ class MockFIRM(BaseFIRM):
         if self.rocket_parameters.rocket_cl_a is not None:
             airbrakes.constants.ROCKET_CL_A = self.rocket_parameters.rocket_cl_a
 
+        # Find where to start before the replay starts, so the Context can be brought up to date:
+        self.replay_seek: ReplaySeek | None = (
+            self._seek(start_at, start_after_log_buffer) if start_at else None
+        )
+
         # Set up a queue and thread
-        self._queued_packets: queue.SimpleQueue[FIRMDataPacket | str] = queue.SimpleQueue()
+        self._queued_packets: queue.SimpleQueue[FIRMDataPacket | list[FIRMDataPacket] | str] = (
+            queue.SimpleQueue()
+        )
         self._data_fetch_thread = threading.Thread(
             target=self._fetch_data_loop,
             args=(real_time_replay, start_after_log_buffer),
@@ -117,6 +186,8 @@ class MockFIRM(BaseFIRM):
 
         self._is_running = threading.Event()
         self._requested_to_run = threading.Event()
+        # Unlike _is_running, this stays set after the replay ends:
+        self._started = threading.Event()
 
         super().__init__()
 
@@ -128,6 +199,11 @@ class MockFIRM(BaseFIRM):
         """
         return self._is_running.is_set()
 
+    @property
+    def thread(self) -> threading.Thread:
+        """The Mock FIRM thread, which reads the packets of the log."""
+        return self._data_fetch_thread
+
     @property
     def requested_to_run(self) -> bool:
         """
@@ -135,6 +211,14 @@ class MockFIRM(BaseFIRM):
         """
         return self._requested_to_run.is_set()
 
+    @property
+    def replay_jitter_report(self) -> ReplayJitterReport | None:
+        """
+        Returns how close a real time replay came to sending each packet on time, or None if
+        no packets were sent in real time.
+        """
+        return self._replay_scheduler.get_jitter_report()
+
     @staticmethod
     def read_file_metadata() -> dict:
         """
@@ -149,6 +233,15 @@ class MockFIRM(BaseFIRM):
         if not self._data_fetch_thread.is_alive():
             self._data_fetch_thread.start()
 
+    def wait_until_started(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until the Mock FIRM thread has started reading the log.
+
+        :param timeout: The longest to wait in seconds, or None to wait for as long as it takes.
+        :return: True if the thread started in time, False otherwise.
+        """
+        return self._started.wait(timeout)
+
     def stop(self) -> None:
         """Stops the Mock FIRM thread."""
         self._requested_to_run.clear()
@@ -161,27 +254,59 @@ class MockFIRM(BaseFIRM):
             raise RuntimeError("FIRM data fetch thread did not terminate in time.")
 
     def get_data_packets(self, block: bool = True) -> list[FIRMDataPacket]:
-        """Returns all available FIRM data packets from the queue."""
+        """
+        Returns the available FIRM data packets from the queue, up to
+        MAX_FETCHED_MOCK_FIRM_PACKETS of them. If the replay has an arrival
+        pattern, returns the next batch of packets instead.
+        """
         packets = []
 
         if block:
+            # The replay has ended and every packet was read (including the stop signal), so there
+            # is nothing left to wait for:
+            if not self.is_running and self._queued_packets.empty():
+                return packets
             # Block until at least one item is available
             item = self._queued_packets.get(block=True)
             if item == STOP_SIGNAL:
                 return packets  # Makes the main update() loop exit early.
+            # A replay with an arrival pattern puts whole batches in the queue, which are handed
+            # out as they are:
+            if isinstance(item, list):
+                return item
             packets.append(item)
 
-        while not self._queued_packets.empty():
+        while len(packets) < MAX_FETCHED_MOCK_FIRM_PACKETS and not self._queued_packets.empty():
             item = self._queued_packets.get(block=block)
 
             # If we hit the stop signal, ensure we mark ourselves as stopped
             if item == STOP_SIGNAL:
                 break  # Makes the main update() loop exit early.
 
+            # Batches and single packets are never in the queue together, so this is the first item:
+            if isinstance(item, list):
+                return item
+
             packets.append(item)
 
         return packets
 
+    def iterate_packets(self, start_after_log_buffer: bool = True) -> Iterator[FIRMDataPacket]:
+        """
+        Yields the packets of the log in order, in the calling thread, as they are read. This is
+        for running the air brakes without the replay thread, in lockstep with the packets.
+
+        :param start_after_log_buffer: Whether to start after the log buffer, if the replay
+            doesn't seek.
+        :return: The packets, from the first one to replay to the end of the log.
+        """
+        self._check_packet_fields()
+        if self.replay_seek is not None:
+            chunks = self._split_into_chunks(self._load_replay_data(), self.replay_seek.start_row)
+        else:
+            chunks = self._iterate_replay_chunks(start_after_log_buffer)
+        yield from self._iterate_packets(chunks)
+
     def _get_rocket_parameters(self, metadata: dict) -> RocketParameters:
         """
         Extracts the rocket parameters from the metadata dictionary.
@@ -202,97 +327,442 @@ class MockFIRM(BaseFIRM):
 
     # ------------------------ THREAD METHODS -------------------------
 
-    def _scan_csv(self, *, start_index: int = 0, **kwargs) -> pl.LazyFrame:
-        """Prepares the Polars LazyFrame with only the columns we need."""
-        # 1. Get all headers present in the CSV
-        excluded_columns = [
-            "est_tilt_angle_degrees",
-            "est_mach_number",
-            "raw_rotated_acceleration_x_gs",
-            "raw_rotated_acceleration_y_gs",
-            "raw_rotated_acceleration_z_gs",
-        ]
+    def _check_packet_fields(self) -> None:
+        """
+        Checks that the log has every field FIRMDataPacket is made from.
+
+        :raises ValueError: If the log is missing any of them, as it can't be replayed.
+        """
+        field_names = self._get_replay_dtype().names
+        if missing_fields := [f for f in FIRM_PACKET_INPUT_FIELDS if f not in field_names]:
+            raise ValueError(f"The log file {self._log_file_path} is missing {missing_fields}")
+
+    def _get_replay_dtype(self) -> np.dtype:
+        """
+        Returns the type of the rows of the converted log file: a field for each FIRMDataPacket
+        field in the log, followed by the state letter and update timestamp of the row, if the
+        log has them. The numbers are all floats, so missing values can be NaN.
+
+        A .FRM log has every field FIRMDataPacket is made from, and no states.
+
+        :return: The structured NumPy type.
+        """
+        if is_frm_log(self._log_file_path):
+            self._headers = list(FIRM_PACKET_INPUT_FIELDS)
+            self._needed_fields = self._headers
+            return np.dtype([(name, np.float64) for name in self._needed_fields])
+
+        # The schema has the names and types of the columns, so we don't have to scan the log to
+        # find them:
         self._headers = [
             h
-            for h in pl.scan_csv(self._log_file_path).collect_schema().names()
-            if h not in excluded_columns
+            for h in read_log_schema(self._log_file_path).column_names
+            if h not in DERIVED_FIRM_FIELDS
         ]
+        # Only read columns that exist in both the CSV and the Packet:
+        self._needed_fields = [f for f in FIRMDataPacket.__struct_fields__ if f in self._headers]
 
-        # 2. Get all fields defined in the FIRMDataPacket struct
-        packet_fields = list(FIRMDataPacket.__struct_fields__)
-
-        # 3. Intersection: Only read columns that exist in both the CSV and the Packet
-        self._needed_fields = [f for f in packet_fields if f in self._headers]
+        fields = [(name, np.float64) for name in self._needed_fields]
+        if "state_letter" in self._headers:
+            fields.append(("state_letter", "<U1"))
+        if "update_timestamp_ns" in self._headers:
+            fields.append(("update_timestamp_ns", np.float64))
+        return np.dtype(fields)
 
-        return pl.scan_csv(
-            self._log_file_path,
-            has_header=True,
-            skip_rows_after_header=start_index,
-            infer_schema_length=100,
-            **kwargs,
-        ).select(self._needed_fields)
-
-    def _calculate_start_index(self) -> int:
+    def _calculate_start_index(self, state_letters: np.ndarray | None = None) -> int:
         """
         Calculate the start index based on log buffer size and time differences.
 
+        :param state_letters: The state letter of every row of the log, if we have them already.
+            Otherwise, the state transitions are looked up in the log index.
         :return: The index where the log buffer ends.
         """
-        metadata_buffer_index: int | None = self.file_metadata["flight_data"]["log_buffer_index"]
+        metadata_buffer_index: int | None = self.file_metadata.get("flight_data", {}).get(
+            "log_buffer_index"
+        )
 
         if metadata_buffer_index:
             return metadata_buffer_index
 
-        result = (
-            pl.scan_csv(self._log_file_path)
-            .with_row_index("index")  # Add an index column to the DataFrame
-            .with_columns(pl.col("timestamp").diff().alias("time_diff"))  # Calculate time diff
-            .filter(pl.col("time_diff") > 1e9)  # Filter rows with time diff > 1 second
-            .select("index")  # Select the index of the first row with time diff > 1 second
-            .collect()
+        # Otherwise, the log buffer holds the rows right before motor burn:
+        if state_letters is not None:
+            motor_burn_rows = np.flatnonzero(state_letters == "M")
+            return max(0, int(motor_burn_rows[0]) - LOG_BUFFER_SIZE) if motor_burn_rows.size else 0
+
+        # Which we can find in the log index without reading the whole log:
+        motor_burn = find_state_transition(read_log_index(self._log_file_path), "M")
+        return max(0, motor_burn.row - LOG_BUFFER_SIZE) if motor_burn else 0
+
+    def _get_first_row(self, replay_data: np.ndarray, start_after_log_buffer: bool) -> int:
+        """
+        Returns the row a replay which doesn't seek starts at.
+
+        :param replay_data: The structured array from `_load_replay_data`.
+        :param start_after_log_buffer: Whether to start after the log buffer.
+        :return: The first row to replay.
+        """
+        # A .FRM log has no states to find the log buffer with:
+        if not start_after_log_buffer or is_frm_log(self._log_file_path):
+            return 0
+        field_names = replay_data.dtype.names
+        state_letters = replay_data["state_letter"] if "state_letter" in field_names else None
+        return self._calculate_start_index(state_letters)
+
+    def _seek(self, start_at: ReplaySeekPoint, start_after_log_buffer: bool) -> ReplaySeek:
+        """
+        Finds where a replay which seeks starts, and makes the packets before it.
+
+        The seek is done on the columns of the replay cache, so the log file isn't read again.
+
+        :param start_at: Where in the log to start the replay.
+        :param start_after_log_buffer: Whether the packets before the start begin after the log
+            buffer, like the replay would have if it hadn't seeked.
+        :return: Where the replay starts, and the packets before it.
+        :raises ValueError: If the log doesn't have the states of the rows, or the seek point
+            isn't in the log.
+        """
+        replay_data = self._load_replay_data()
+        if "state_letter" not in replay_data.dtype.names:
+            raise ValueError(
+                f"The log file {self._log_file_path} doesn't have states to seek with."
+            )
+        timestamps = replay_data["timestamp_seconds"]
+        state_letters = replay_data["state_letter"]
+        start_row = start_at.find_start_row(timestamps, state_letters)
+
+        # Seeking to before the log buffer just starts the replay earlier:
+        first_row = min(self._get_first_row(replay_data, start_after_log_buffer), start_row)
+        history = list(
+            itertools.islice(
+                self._iterate_packets(self._split_into_chunks(replay_data, first_row)),
+                start_row - first_row,
+            )
+        )
+
+        # The state the air brakes were in when the first row arrived is the state the row
+        # before it was logged in:
+        state_letter = str(state_letters[start_row - 1]) if start_row else "S"
+        state_start_row = int(np.argmax(state_letters == state_letter))
+        motor_burn_rows = np.flatnonzero(state_letters[:start_row] == "M")
+        return ReplaySeek(
+            start_row=start_row,
+            history=history,
+            state_letter=state_letter,
+            state_start_seconds=float(timestamps[state_start_row]),
+            launch_time_seconds=float(timestamps[motor_burn_rows[0]])
+            if motor_burn_rows.size
+            else 0.0,
+        )
+
+    def _get_replay_cache_path(self) -> Path:
+        """
+        Returns the path the converted log file is cached at.
+
+        The name of the cache file includes a fingerprint of the log file, so a log file which
+        changed is converted again instead of replaying stale data. The fingerprint is made from
+        the size, modification time, and the first and last bytes of each segment, so it doesn't
+        take longer to make for longer logs.
+
+        :return: The path of the cache file, which may not exist yet.
+        """
+        file_hash = hashlib.sha256()
+        # The cache also has to be rebuilt if the format of the cache or the packets change:
+        file_hash.update(f"{REPLAY_CACHE_VERSION}:{FIRMDataPacket.__struct_fields__}".encode())
+        for segment_path in get_log_segments(self._log_file_path):
+            segment_stat = segment_path.stat()
+            file_hash.update(f"{segment_stat.st_size}:{segment_stat.st_mtime_ns}".encode())
+            with segment_path.open("rb") as segment:
+                file_hash.update(segment.read(REPLAY_CACHE_FINGERPRINT_BYTES))
+                segment.seek(max(0, segment_stat.st_size - REPLAY_CACHE_FINGERPRINT_BYTES))
+                file_hash.update(segment.read())
+        schema_path = get_schema_path(self._log_file_path)
+        if schema_path.exists():
+            file_hash.update(schema_path.read_bytes())
+        log_name = get_log_base_path(self._log_file_path).stem
+        return self._replay_cache_dir / f"{log_name}-{file_hash.hexdigest()[:32]}.npy"
+
+    @staticmethod
+    def _make_cache_header(dtype: np.dtype, rows: int) -> bytes:
+        """
+        Makes the header of a `.npy` file for a cache file with this many rows.
+
+        The number of rows is padded to the same width whatever it is, so the header can be
+        written before the rows are, and written again with the number of rows once it is known.
+
+        :param dtype: The type of the rows.
+        :param rows: The number of rows.
+        :return: The header, which is always the same length for the same type.
+        """
+        header = (
+            f"{{'descr': {np.lib.format.dtype_to_descr(dtype)!r}, 'fortran_order': False, "
+            f"'shape': ({rows:20d},), }}"
         )
-        return result["index"][0] if not result.is_empty() else 0  # Default to 0 if no index found
+        magic = np.lib.format.magic(1, 0)
+        # The header ends with a newline, and is padded so the rows start at a multiple of 64
+        # bytes, like NumPy does:
+        padding = -(len(magic) + 2 + len(header) + 1) % 64
+        header += " " * padding + "\n"
+        return magic + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+    def _convert_log_file(self, cache_path: Path | None = None) -> Iterator[np.ndarray]:
+        """
+        Parses the log file into structured NumPy arrays of the type from `_get_replay_dtype`, a
+        batch of rows at a time. Only one batch is held in memory at a time, however long the
+        log is, and the first batch is ready without waiting for the rest of the log.
+
+        If there is a cache path, the rows are written to it as they are parsed. The cache file
+        is only put in place once the whole log was parsed, so a replay which is stopped half
+        way through doesn't leave a broken cache behind.
+
+        :param cache_path: The path to cache the converted log file at, or None to not cache it.
+        :return: The arrays, in the order of the rows in the log.
+        """
+        dtype = self._get_replay_dtype()
+        if is_frm_log(self._log_file_path):
+            # The frames of a .FRM log are decoded all at once, which is much faster than parsing
+            # a CSV, so only the conversion is done in batches:
+            batches = read_frm_packets(self._log_file_path).iter_slices(REPLAY_READ_BATCH_ROWS)
+        else:
+            batches = iterate_log_batches(self._log_file_path, dtype.names, REPLAY_READ_BATCH_ROWS)
+        if cache_path is None:
+            for batch in batches:
+                yield self._convert_batch(batch, dtype)
+            return
+
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = cache_path.with_name(cache_path.name + ".part")
+        rows = 0
+        try:
+            with temporary_path.open("wb") as cache_file:
+                # We don't know how many rows there are yet:
+                cache_file.write(self._make_cache_header(dtype, rows))
+                for batch in batches:
+                    converted = self._convert_batch(batch, dtype)
+                    cache_file.write(converted.tobytes())
+                    rows += len(converted)
+                    yield converted
+                cache_file.seek(0)
+                cache_file.write(self._make_cache_header(dtype, rows))
+            temporary_path.replace(cache_path)
+        finally:
+            temporary_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _convert_batch(batch: pl.DataFrame, dtype: np.dtype) -> np.ndarray:
+        """
+        Converts a batch of rows of the log file to a structured NumPy array.
+
+        :param batch: The rows, with the columns named in the type.
+        :param dtype: The type from `_get_replay_dtype`.
+        :return: The array, with one element for every row. Missing values are NaN, and missing
+            state letters are empty.
+        """
+        converted = np.empty(len(batch), dtype=dtype)
+        for name in dtype.names:
+            column = batch[name]
+            if name == "state_letter":
+                converted[name] = column.fill_null("").to_numpy()
+            else:
+                converted[name] = column.cast(pl.Float64).to_numpy()
+        return converted
+
+    def _load_replay_data(self) -> np.ndarray:
+        """
+        Loads the whole converted log file from the replay cache, converting and caching it
+        first if it isn't cached yet.
+
+        :return: The structured array from `_convert_log_file`, memory-mapped from the cache.
+        """
+        if self._replay_cache_dir is None:
+            return np.concatenate(
+                [np.empty(0, self._get_replay_dtype()), *self._convert_log_file()]
+            )
+
+        cache_path = self._get_replay_cache_path()
+        if not cache_path.exists():
+            collections.deque(self._convert_log_file(cache_path), maxlen=0)
+        return np.load(cache_path, mmap_mode="r")
+
+    def _iterate_replay_chunks(self, start_after_log_buffer: bool) -> Iterator[np.ndarray]:
+        """
+        Yields the rows of the log to replay, a chunk of REPLAY_CHUNK_ROWS rows at a time,
+        without loading the whole log.
+
+        A log which is cached is replayed from the memory-mapped cache. Otherwise, it is
+        replayed while it is being parsed, and cached at the same time.
+
+        :param start_after_log_buffer: Whether to start after the log buffer.
+        :return: The chunks of rows, from the first row to replay to the end of the log.
+        """
+        cache_path = None if self._replay_cache_dir is None else self._get_replay_cache_path()
+        if cache_path is not None and cache_path.exists():
+            replay_data = np.load(cache_path, mmap_mode="r")
+            yield from self._split_into_chunks(
+                replay_data, self._get_first_row(replay_data, start_after_log_buffer)
+            )
+            return
+
+        converted_batches = self._convert_log_file(cache_path)
+        metadata_buffer_index: int | None = self.file_metadata.get("flight_data", {}).get(
+            "log_buffer_index"
+        )
+        if not start_after_log_buffer or "state_letter" not in self._get_replay_dtype().names:
+            yield from self._skip_rows(converted_batches, 0)
+        elif metadata_buffer_index:
+            yield from self._skip_rows(converted_batches, metadata_buffer_index)
+        else:
+            yield from self._skip_to_log_buffer(converted_batches)
+
+    def _skip_to_log_buffer(self, converted_batches: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+        """
+        Yields the rows of a log which is being parsed from the start of the log buffer, which
+        is the same row `_calculate_start_index` finds from the whole log. Only the rows which
+        could be in the log buffer are held on to until motor burn is found.
+
+        :param converted_batches: The batches of rows from `_convert_log_file`.
+        :return: The chunks of rows, from the start of the log buffer to the end of the log.
+        """
+        recent_batches: collections.deque[np.ndarray] = collections.deque()
+        recent_rows = 0
+        for converted in converted_batches:
+            motor_burn_rows = np.flatnonzero(converted["state_letter"] == "M")
+            if motor_burn_rows.size:
+                rows_before_motor_burn = recent_rows + int(motor_burn_rows[0])
+                yield from self._skip_rows(
+                    itertools.chain(recent_batches, [converted], converted_batches),
+                    max(0, rows_before_motor_burn - LOG_BUFFER_SIZE),
+                )
+                return
+            recent_batches.append(converted)
+            recent_rows += len(converted)
+            # Let go of the batches which are too far back to be in the log buffer:
+            while recent_rows - len(recent_batches[0]) >= LOG_BUFFER_SIZE:
+                recent_rows -= len(recent_batches.popleft())
+
+        # The log never got to motor burn, so all of it is replayed, like `_calculate_start_index`
+        # does. The log was cached while it was parsed, so this doesn't parse it again:
+        yield from self._split_into_chunks(self._load_replay_data(), 0)
+
+    @staticmethod
+    def _skip_rows(
+        converted_batches: Iterable[np.ndarray], rows_to_skip: int
+    ) -> Iterator[np.ndarray]:
+        """
+        Skips rows at the start of a log which is being parsed, and splits the rest into chunks.
+
+        :param converted_batches: The batches of rows from `_convert_log_file`.
+        :param rows_to_skip: The number of rows to skip.
+        :return: The chunks of rows after the skipped ones.
+        """
+        for converted in converted_batches:
+            if rows_to_skip >= len(converted):
+                rows_to_skip -= len(converted)
+                continue
+            yield from MockFIRM._split_into_chunks(converted, rows_to_skip)
+            rows_to_skip = 0
+
+    @staticmethod
+    def _split_into_chunks(replay_data: np.ndarray, start_index: int) -> Iterator[np.ndarray]:
+        """
+        Splits rows of the converted log file into chunks of REPLAY_CHUNK_ROWS rows.
+
+        :param replay_data: The rows.
+        :param start_index: The first row to yield.
+        :return: The chunks, which are views of the rows.
+        """
+        for chunk_start in range(start_index, len(replay_data), REPLAY_CHUNK_ROWS):
+            yield replay_data[chunk_start : chunk_start + REPLAY_CHUNK_ROWS]
 
     def _read_file(self, real_time_replay: bool, start_after_log_buffer: bool = False) -> None:
         """
-        Reads the CSV, converts rows to FIRMDataPackets, and manages replay
-        timing.
+        Reads the log file, from the replay cache if it is there, converts rows to
+        FIRMDataPackets, and manages replay timing.
+
+        The log file is streamed, unless the replay seeks or has an arrival pattern, which need
+        the whole log up front. The whole log is then memory-mapped from the cache.
 
         :param real_time_replay: Whether to mimic a real flight by sleeping for a set period, or run
             at full speed, e.g. for using it in the CI.
         :param start_after_log_buffer: Whether to send the data packets only after the log buffer
             was filled for Standby state.
         """
-        start_index = self._calculate_start_index() if start_after_log_buffer else 0
-
-        launch_raw_data_packet_rate = 1 / self.file_metadata["ins_details"]["data_packet_frequency"]
-
-        collected_data: pl.DataFrame = self._scan_csv(start_index=start_index).collect()
+        self._check_packet_fields()
+
+        if self.replay_seek is None and self._arrival_pattern is None:
+            arrivals = (
+                (packet.timestamp_seconds, packet)
+                for packet in self._iterate_packets(
+                    self._iterate_replay_chunks(start_after_log_buffer)
+                )
+            )
+        else:
+            replay_data = self._load_replay_data()
+            if self.replay_seek is not None:
+                start_index = self.replay_seek.start_row
+            else:
+                start_index = self._get_first_row(replay_data, start_after_log_buffer)
+            arrivals = self._iterate_arrivals(replay_data, start_index)
 
-        # Iterate over the rows of the dataframe and put the data packets in the queue
-        for row in collected_data.iter_rows(named=True):
+        # Iterate over the packets of the log and put them in the queue
+        for arrival_seconds, packets in arrivals:
             # Check if the loop should stop:
             if not self._requested_to_run.is_set():
                 break
 
-            start_time = time.time()
+            # Wait till the packets would have come from FIRM, if we are running a real-time replay
+            if real_time_replay:
+                self._replay_scheduler.wait_until_due(arrival_seconds)
 
-            # Drop None values from the row so msgspec Structs can be made:
-            # This approach of deleting is faster than using a dict comprehension by about 6%
-            row_dict = row.copy()
-            for k in list(row_dict.keys()):
-                if row_dict[k] is None:
-                    del row_dict[k]
+            self._queued_packets.put(packets)
 
-            firm_data_packet = FIRMDataPacket(**row_dict)
+    def _iterate_arrivals(
+        self, replay_data: np.ndarray, start_index: int
+    ) -> Iterator[tuple[float, FIRMDataPacket | list[FIRMDataPacket]]]:
+        """
+        Yields what to put in the queue next, and when it would have come from FIRM.
 
-            self._queued_packets.put(firm_data_packet)
+        Without an arrival pattern, every packet is put in the queue on its own, at its
+        timestamp. With one, the packets are put in the queue in batches, at the time of the
+        batch.
 
-            # Sleep only if we are running a real-time replay
-            if real_time_replay:
-                # Mimic the polling interval so it "runs in real time"
-                end_time = time.time()
-                time.sleep(max(0.0, launch_raw_data_packet_rate - (end_time - start_time)))
+        :param replay_data: The structured array from `_load_replay_data`.
+        :param start_index: The first row to replay.
+        :return: The time in seconds, and the packet or batch of packets.
+        """
+        packets = self._iterate_packets(self._split_into_chunks(replay_data, start_index))
+        if self._arrival_pattern is None:
+            for packet in packets:
+                yield packet.timestamp_seconds, packet
+            return
+
+        batch_starts, arrival_times = self._arrival_pattern.get_batches(replay_data[start_index:])
+        batch_sizes = np.diff(batch_starts, append=len(replay_data) - start_index)
+        for batch_size, arrival_seconds in zip(
+            batch_sizes.tolist(), arrival_times.tolist(), strict=True
+        ):
+            yield arrival_seconds, list(itertools.islice(packets, batch_size))
+
+    @staticmethod
+    def _iterate_packets(chunks: Iterable[np.ndarray]) -> Iterator[FIRMDataPacket]:
+        """
+        Yields the rows of the converted log file as FIRMDataPackets.
+
+        The packets are made a chunk of rows at a time, straight from the columns of the chunk,
+        by passing the columns to FIRMDataPacket as its positional arguments. Converting the
+        columns to Python floats a chunk at a time is much faster than one row at a time, and
+        converting the whole log at once would hold back the first packet.
+
+        Missing values are NaN in the converted log file, and are passed on to the packet as they
+        are, the same as FIRM would send them.
+
+        :param chunks: The rows to yield, from `_split_into_chunks`.
+        """
+        for chunk in chunks:
+            yield from map(
+                FIRMDataPacket,
+                *(chunk[name].tolist() for name in FIRM_PACKET_INPUT_FIELDS),
+                strict=True,
+            )
 
     def _fetch_data_loop(
         self,
@@ -307,6 +777,7 @@ class MockFIRM(BaseFIRM):
         """
         """The main thread loop."""
         self._is_running.set()
+        self._started.set()
 
         self._read_file(real_time_replay, start_after_log_buffer)
 
@@ -6,16 +6,21 @@ Currently only used to delete the log file.
 
 from typing import TYPE_CHECKING
 
+from airbrakes.constants import LOG_COMPRESSION
+from airbrakes.data_handling.log_index import get_index_path
+from airbrakes.data_handling.log_reader import get_schema_path
 from airbrakes.data_handling.logger import Logger
 
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from airbrakes.constants import LogCompression
+
 
 class MockLogger(Logger):
     """
     This class has the same functionality as the Logger class, but simply
-    removes the log file it generates after the logger has stopped.
+    removes the log segments it generates after the logger has stopped.
 
     We use this class in the tests to avoid cluttering the filesystem
     with log files. Additionally, this helps mimic the behavior of the
@@ -24,7 +29,12 @@ class MockLogger(Logger):
 
     __slots__ = ("_delete_log_file",)
 
-    def __init__(self, log_file_path: Path, delete_log_file: bool = True) -> None:
+    def __init__(
+        self,
+        log_file_path: Path,
+        delete_log_file: bool = True,
+        compression: LogCompression | None = LOG_COMPRESSION,
+    ) -> None:
         """
         Initializes the mock logger object.
 
@@ -33,16 +43,25 @@ class MockLogger(Logger):
         :param log_file_path: The path to the log file to.
         :param delete_log_file: True if the log file should be deleted
             after the logger stops.
+        :param compression: The algorithm to compress closed log segments
+            with, or None to leave them uncompressed.
         """
-        super().__init__(log_file_path)
+        super().__init__(log_file_path, compression=compression)
         self._delete_log_file = delete_log_file
         self._log_thread.name = "Mock Logger Thread"
 
     def stop(self) -> None:
         """
-        Stops the logger and deletes the log file if the _delete_log_file
-        attribute is True.
+        Stops the logger and deletes every segment of the log file, its
+        index and its schema, if the _delete_log_file attribute is True.
         """
         super().stop()
         if self._delete_log_file:
-            self.log_path.unlink()
+            self._delete_log()
+
+    def _delete_log(self) -> None:
+        """Deletes every segment of the log file, its index and its schema."""
+        for segment_path in self.segment_paths:
+            segment_path.unlink()
+        get_index_path(self.log_path).unlink(missing_ok=True)
+        get_schema_path(self.log_path).unlink(missing_ok=True)
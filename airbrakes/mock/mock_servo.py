@@ -4,6 +4,7 @@ circuitpython library.
 """
 
 import threading
+import time
 
 from airbrakes.base_classes.base_servo import BaseServo
 from airbrakes.constants import (
@@ -23,6 +24,7 @@ class MockServo(BaseServo):
     """
 
     __slots__ = (
+        "_command_issued_ns",
         "_go_to_max_no_buzz",
         "_go_to_min_no_buzz",
         "_servo_extension",
@@ -45,6 +47,7 @@ class MockServo(BaseServo):
         _ = servo_channel, encoder_pin_a, encoder_pin_b
         self._servo_extension = ServoExtension.MIN_NO_BUZZ
         self.duty_cycle = 0.0
+        self._command_issued_ns = 0
         self._go_to_max_no_buzz: threading.Timer | None = None
         self._go_to_min_no_buzz: threading.Timer | None = None
 
@@ -88,6 +91,7 @@ class MockServo(BaseServo):
         """Sets the simulated servo extension."""
         self._servo_extension = extension
         self.duty_cycle = self._angle_to_duty_cycle(extension.value)
+        self._command_issued_ns = time.perf_counter_ns()
 
     def _cancel_timer(self, timer_name: str) -> None:
         """Cancels the pending transition stored in the named timer slot."""
@@ -120,6 +124,15 @@ class MockServo(BaseServo):
         """Gets the extension most recently commanded to the mock servo."""
         return self._servo_extension
 
+    @property
+    def command_issued_ns(self) -> int:
+        """
+        Gets when the simulated duty cycle was last changed.
+
+        :return: The time from `time.perf_counter_ns`, or 0 if it hasn't been changed yet.
+        """
+        return self._command_issued_ns
+
     @property
     def battery_volts(self) -> float:
         """
@@ -0,0 +1,322 @@
+"""
+Module for running the air brakes over every flight in the launch data, and
+some synthetic flights, to see how a change to the air brakes does on all of
+them at once.
+
+Each flight runs in its own process, so the flights run on all the cores at
+once, and a replay changing the rocket constants to the ones of its rocket
+doesn't change them for the other flights. The flights are run in lockstep
+with their packets, so everything in the report except how long the loops
+took comes out the same on every run. The synthetic flights are flown in a
+closed loop with the air brakes, so their apogee shows what the air brakes
+did. Faults can be injected into the packets of every flight, to see how
+the air brakes cope with them, and how long they take to catch up on a
+backlog.
+"""
+
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import msgspec
+import numpy as np
+
+import airbrakes.state
+from airbrakes.constants import (
+    LAUNCH_DATA_PATH,
+    REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS,
+    TARGET_APOGEE_METERS,
+    ServoExtension,
+)
+from airbrakes.data_handling.log_reader import get_log_base_path
+from airbrakes.mock.closed_loop import ClosedLoopSimulation
+from airbrakes.mock.fault_injection import FaultInjectingFIRM, FaultRates, InjectedFaults
+from airbrakes.mock.frm_reader import is_frm_log
+from airbrakes.mock.lockstep import LockstepSimulation
+from airbrakes.mock.mock_firm import MockFIRM
+from airbrakes.mock.synthetic_flight import SyntheticFlight
+
+
+class RegressionFlight(msgspec.Struct, frozen=True):
+    """A flight for `airbrakes-regress` to run the air brakes over."""
+
+    name: str
+    """The name of the flight in the report."""
+    target_apogee_meters: float
+    """The apogee the air brakes aim for in this flight."""
+    log_file_path: Path | None = None
+    """The log of the flight, if it is a past flight."""
+    synthetic_flight: SyntheticFlight | None = None
+    """The synthetic flight, flown in a closed loop, if it isn't a past flight."""
+    faults: FaultRates | None = None
+    """How often to inject each fault into the packets of the flight, or None for no faults."""
+
+
+class StateTransition(msgspec.Struct, frozen=True):
+    """When the air brakes went into a state."""
+
+    state: str
+    timestamp_seconds: float
+
+
+class ApogeePrediction(msgspec.Struct, frozen=True):
+    """An apogee the air brakes predicted, and the timestamp of the loop which got it."""
+
+    timestamp_seconds: float
+    predicted_apogee_meters: float
+
+
+class ExtensionDecision(msgspec.Struct, frozen=True):
+    """When the air brakes decided to extend or retract."""
+
+    timestamp_seconds: float
+    extended: bool
+
+
+class LoopTiming(msgspec.Struct, frozen=True):
+    """How long the calls to `Context.update` took, in microseconds."""
+
+    loops: int
+    mean_us: float
+    p50_us: float
+    p99_us: float
+    max_us: float
+
+    @classmethod
+    def from_durations(cls, durations_ns: list[int]) -> LoopTiming:
+        """
+        Summarizes how long each loop took.
+
+        :param durations_ns: How long each loop took, in nanoseconds.
+        :return: The summary.
+        """
+        durations_us = np.array(durations_ns, dtype=np.float64) / 1e3
+        p50_us, p99_us = np.percentile(durations_us, [50, 99]).tolist()
+        return cls(
+            loops=len(durations_us),
+            mean_us=float(durations_us.mean()),
+            p50_us=p50_us,
+            p99_us=p99_us,
+            max_us=float(durations_us.max()),
+        )
+
+
+class BacklogDrain(msgspec.Struct, frozen=True):
+    """A backlog of packets after a stall, and how long the loop which got it took."""
+
+    timestamp_seconds: float
+    packets: int
+    processed_packets: int
+    """How many packets of the backlog the state machine ran on, which is fewer than `packets`
+    if the backlog was over the catch up budget."""
+    drain_us: float | None
+    """How long the loop took, or None if it wasn't timed."""
+
+
+class FaultReport(msgspec.Struct, frozen=True):
+    """The faults injected into a flight, and how the air brakes coped with them."""
+
+    injected: InjectedFaults
+    nan_processor_packets: int
+    """How many packets from the data processor had a NaN altitude or vertical velocity."""
+    backlog_drains: list[BacklogDrain]
+
+
+class FlightReport(msgspec.Struct, frozen=True):
+    """What the air brakes did in one flight."""
+
+    name: str
+    target_apogee_meters: float
+    max_altitude_meters: float
+    state_transitions: list[StateTransition]
+    apogee_predictions: list[ApogeePrediction]
+    extension_decisions: list[ExtensionDecision]
+    loop_timing: LoopTiming | None
+    """How long the loops took, or None if it wasn't timed, as it differs from run to run."""
+    flown_apogee_meters: float | None = None
+    """How high the rocket really went in a closed-loop flight, which depends on what the air
+    brakes did. None for a past flight."""
+    faults: FaultReport | None = None
+    """The faults injected into the flight, or None if there weren't any."""
+
+
+class RegressionReport(msgspec.Struct, frozen=True):
+    """What the air brakes did in every flight, in the order the flights were given."""
+
+    flights: list[FlightReport]
+
+
+def find_launch_logs(launch_data_path: Path = LAUNCH_DATA_PATH) -> list[Path]:
+    """
+    Finds the logs of every flight in the launch data: the CSV logs, and the raw .FRM logs from
+    FIRM. A log split into segments is only found once.
+
+    :param launch_data_path: The directory to look in, and in its subdirectories.
+    :return: The paths of the logs, sorted.
+    """
+    return sorted(
+        path
+        for path in launch_data_path.rglob("*")
+        if is_frm_log(path) or (path.suffix == ".csv" and get_log_base_path(path) == path)
+    )
+
+
+def get_regression_flights(
+    log_file_paths: list[Path],
+    synthetic_flights: int,
+    target_apogee_meters: float | None = None,
+    faults: FaultRates | None = None,
+) -> list[RegressionFlight]:
+    """
+    Makes the flights to run, from logs of past flights, and synthetic flights.
+
+    :param log_file_paths: The logs of the past flights.
+    :param synthetic_flights: How many synthetic flights to run, with the seeds 0, 1, 2...
+    :param target_apogee_meters: The apogee to aim for in every flight, or None to aim for the
+        target apogee of the flight in the launch metadata, or TARGET_APOGEE_METERS if it has
+        none. The synthetic flights then aim for REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS.
+    :param faults: How often to inject each fault into the packets of every flight, or None for
+        no faults.
+    :return: The flights, with the logs first.
+    """
+    file_metadata = MockFIRM.read_file_metadata()
+    flights = []
+    for path in log_file_paths:
+        flight_data = file_metadata.get(path.name, {}).get("flight_data", {})
+        flights.append(
+            RegressionFlight(
+                name=path.as_posix(),
+                target_apogee_meters=flight_data.get("target_apogee_meters", TARGET_APOGEE_METERS)
+                if target_apogee_meters is None
+                else target_apogee_meters,
+                log_file_path=path,
+                faults=faults,
+            )
+        )
+    flights.extend(
+        RegressionFlight(
+            name=f"synthetic_{seed}",
+            target_apogee_meters=REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS
+            if target_apogee_meters is None
+            else target_apogee_meters,
+            synthetic_flight=SyntheticFlight(seed=seed),
+            faults=faults,
+        )
+        for seed in range(synthetic_flights)
+    )
+    return flights
+
+
+def run_regression_flight(flight: RegressionFlight, time_loops: bool = True) -> FlightReport:
+    """
+    Runs the air brakes over one flight, from the start of the log to the end, or until they
+    stop after landing.
+
+    This changes the target apogee and the rocket constants of the process it runs in, so it
+    should run in a process of its own.
+
+    :param flight: The flight to run.
+    :param time_loops: Whether to time each loop.
+    :return: What the air brakes did.
+    """
+    # The states read the target apogee from their module:
+    airbrakes.state.TARGET_APOGEE_METERS = flight.target_apogee_meters
+
+    state_transitions: list[StateTransition] = []
+    apogee_predictions: list[ApogeePrediction] = []
+    extension_decisions: list[ExtensionDecision] = []
+    durations_ns: list[int] = []
+    backlog_drains: list[BacklogDrain] = []
+    nan_processor_packets = 0
+    with tempfile.TemporaryDirectory() as log_dir:
+        if flight.synthetic_flight is not None:
+            simulation = ClosedLoopSimulation(
+                flight.synthetic_flight, Path(log_dir), faults=flight.faults
+            )
+        else:
+            # Making the MockFIRM sets the rocket constants to the ones of the rocket in the log:
+            packets = MockFIRM(log_file_path=flight.log_file_path).iterate_packets()
+            simulation = LockstepSimulation(packets, Path(log_dir), faults=flight.faults)
+        context = simulation.context
+        state_name = context.state.name
+        prediction = None
+        extended = False
+        simulation.start()
+        running = True
+        while running:
+            start_ns = time.perf_counter_ns()
+            running = simulation.step()
+            duration_ns = time.perf_counter_ns() - start_ns
+            if time_loops:
+                durations_ns.append(duration_ns)
+            if not context.firm_data_packets:
+                continue
+
+            timestamp_seconds = context.data_processor.current_timestamp_seconds
+            if isinstance(context.firm, FaultInjectingFIRM):
+                nan_processor_packets += sum(
+                    math.isnan(packet.current_altitude)
+                    or math.isnan(packet.vertical_velocity_meters_per_s)
+                    for packet in context.processor_data_packets
+                )
+                if context.firm.last_backlog_packets:
+                    backlog_drains.append(
+                        BacklogDrain(
+                            timestamp_seconds,
+                            context.firm.last_backlog_packets,
+                            len(context.processor_data_packets),
+                            duration_ns / 1e3 if time_loops else None,
+                        )
+                    )
+            if context.state.name != state_name:
+                state_name = context.state.name
+                state_transitions.append(StateTransition(state_name, timestamp_seconds))
+            if context.most_recent_apogee_predictor_data_packet is not prediction:
+                prediction = context.most_recent_apogee_predictor_data_packet
+                apogee_predictions.append(
+                    ApogeePrediction(timestamp_seconds, prediction.predicted_apogee)
+                )
+            # The servo stops buzzing a while after it moves, so only the moves are recorded:
+            if (
+                context.servo.servo_extension
+                in (ServoExtension.MAX_EXTENSION, ServoExtension.MAX_NO_BUZZ)
+            ) != extended:
+                extended = not extended
+                extension_decisions.append(ExtensionDecision(timestamp_seconds, extended))
+        simulation.stop()
+
+    return FlightReport(
+        name=flight.name,
+        target_apogee_meters=flight.target_apogee_meters,
+        max_altitude_meters=context.data_processor.max_altitude,
+        state_transitions=state_transitions,
+        apogee_predictions=apogee_predictions,
+        extension_decisions=extension_decisions,
+        loop_timing=LoopTiming.from_durations(durations_ns) if durations_ns else None,
+        flown_apogee_meters=simulation.firm.apogee_meters
+        if isinstance(simulation, ClosedLoopSimulation)
+        else None,
+        faults=FaultReport(context.firm.injected, nan_processor_packets, backlog_drains)
+        if isinstance(context.firm, FaultInjectingFIRM)
+        else None,
+    )
+
+
+def run_regression(
+    flights: list[RegressionFlight], jobs: int | None = None, time_loops: bool = True
+) -> RegressionReport:
+    """
+    Runs the air brakes over every flight, each in a process of its own.
+
+    :param flights: The flights to run.
+    :param jobs: How many flights to run at once, or None to run one on every core.
+    :param time_loops: Whether to time each loop of each flight.
+    :return: What the air brakes did in each flight, in the same order as the flights.
+    """
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count(), max_tasks_per_child=1) as pool:
+        return RegressionReport(
+            list(pool.map(run_regression_flight, flights, [time_loops] * len(flights)))
+        )
@@ -0,0 +1,132 @@
+"""Module for timing the packets of a real time replay."""
+
+import array
+import time
+
+import msgspec
+import numpy as np
+
+from airbrakes.constants import MAX_REPLAY_GAP_SECONDS, MAX_REPLAY_SPEED, MIN_REPLAY_SPEED
+from airbrakes.utils import convert_ns_to_s, convert_s_to_ns
+
+
+class ReplayJitterReport(msgspec.Struct, frozen=True):
+    """
+    How close a real time replay came to sending each packet when it should
+    have. Lateness is how long after its deadline a packet was sent.
+    """
+
+    packets: int
+    """The number of packets sent."""
+    speed: float
+    """How many times faster than real time the replay ran."""
+    mean_lateness_ms: float
+    """The average lateness of the packets."""
+    p50_lateness_ms: float
+    """The median lateness of the packets."""
+    p99_lateness_ms: float
+    """The lateness which 99% of the packets were within."""
+    max_lateness_ms: float
+    """The lateness of the latest packet."""
+
+    def __str__(self) -> str:
+        """Returns the report as one line, to show at the end of the replay."""
+        return (
+            f"{self.packets} packets at {self.speed:g}x, lateness "
+            f"p50 {self.p50_lateness_ms:.3f} ms, p99 {self.p99_lateness_ms:.3f} ms, "
+            f"max {self.max_lateness_ms:.3f} ms"
+        )
+
+
+class ReplayScheduler:
+    """
+    Decides when each packet of a real time replay should be sent, from the
+    timestamps of the packets.
+
+    Every packet has a deadline, which is how long after the first packet it
+    was logged, divided by the speed of the replay. The deadlines are measured
+    from when the first packet was sent with `time.monotonic_ns`, so a packet
+    which is sent late doesn't make the packets after it late too, and
+    changes to the wall clock don't affect the replay. The gaps between the
+    timestamps are kept, so a log with decimated or missing rows replays
+    with the same gaps, up to MAX_REPLAY_GAP_SECONDS.
+    """
+
+    __slots__ = (
+        "_first_timestamp_ns",
+        "_last_deadline_ns",
+        "_last_timestamp_ns",
+        "_lateness_ns",
+        "_speed",
+        "_start_ns",
+    )
+
+    def __init__(self, speed: float = 1.0) -> None:
+        """
+        Initializes the scheduler.
+
+        :param speed: How many times faster than real time to replay, from
+            MIN_REPLAY_SPEED to MAX_REPLAY_SPEED.
+        """
+        if not MIN_REPLAY_SPEED <= speed <= MAX_REPLAY_SPEED:
+            raise ValueError(
+                f"The replay speed must be between {MIN_REPLAY_SPEED}x and {MAX_REPLAY_SPEED}x, "
+                f"not {speed}x."
+            )
+        self._speed = speed
+        self._start_ns: int | None = None
+        self._first_timestamp_ns = 0
+        self._last_deadline_ns = 0
+        self._last_timestamp_ns = 0
+        # A compact array, as a long replay can have millions of packets:
+        self._lateness_ns = array.array("q")
+
+    def wait_until_due(self, timestamp_seconds: float) -> None:
+        """
+        Sleeps until the packet with this timestamp should be sent. Returns
+        straight away if it is already late.
+
+        :param timestamp_seconds: The timestamp of the packet, as it was logged.
+        """
+        timestamp_ns = int(convert_s_to_ns(timestamp_seconds))
+        if self._start_ns is None:
+            # The first packet is sent straight away, and the rest are timed from it:
+            self._start_ns = time.monotonic_ns()
+            self._first_timestamp_ns = timestamp_ns
+            self._last_timestamp_ns = timestamp_ns
+
+        # Shorten long gaps by timing this packet, and the ones after it, as if the gap was
+        # shorter:
+        gap_ns = timestamp_ns - self._last_timestamp_ns
+        max_gap_ns = int(convert_s_to_ns(MAX_REPLAY_GAP_SECONDS))
+        if gap_ns > max_gap_ns:
+            self._first_timestamp_ns += gap_ns - max_gap_ns
+        self._last_timestamp_ns = timestamp_ns
+
+        deadline_ns = self._start_ns + int((timestamp_ns - self._first_timestamp_ns) / self._speed)
+        # A timestamp which goes backwards is due with the packet before it, not before it:
+        deadline_ns = max(deadline_ns, self._last_deadline_ns)
+        self._last_deadline_ns = deadline_ns
+        remaining_ns = deadline_ns - time.monotonic_ns()
+        if remaining_ns > 0:
+            time.sleep(convert_ns_to_s(remaining_ns))
+        self._lateness_ns.append(time.monotonic_ns() - deadline_ns)
+
+    def get_jitter_report(self) -> ReplayJitterReport | None:
+        """
+        Returns how late the packets sent so far were.
+
+        :return: The report, or None if no packets were sent.
+        """
+        if not self._lateness_ns:
+            return None
+        lateness_ms = np.frombuffer(self._lateness_ns, dtype=np.int64) / 1e6
+        p50, p99 = np.percentile(lateness_ms, [50, 99])
+        return ReplayJitterReport(
+            packets=len(lateness_ms),
+            speed=self._speed,
+            mean_lateness_ms=float(lateness_ms.mean()),
+            p50_lateness_ms=float(p50),
+            p99_lateness_ms=float(p99),
+            max_lateness_ms=float(lateness_ms.max()),
+        )
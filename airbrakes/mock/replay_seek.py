@@ -0,0 +1,141 @@
+"""
+Module for starting a mock replay part way through a flight, e.g. 2 seconds
+before motor burn or at the start of coast, instead of from the start of the
+log.
+"""
+
+import re
+from typing import TYPE_CHECKING
+
+import msgspec
+import numpy as np
+
+from airbrakes.state import CoastState, FreeFallState, LandedState, MotorBurnState, StandbyState
+
+if TYPE_CHECKING:
+    from firm_client import FIRMDataPacket
+
+    from airbrakes.context import Context
+    from airbrakes.state import State
+
+SEEKABLE_STATES: dict[str, type[State]] = {
+    state.__name__.removesuffix("State"): state
+    for state in (StandbyState, MotorBurnState, CoastState, FreeFallState, LandedState)
+}
+"""The states a replay can start in, by the name used to seek to them, e.g.
+"MotorBurn"."""
+
+
+class ReplaySeekPoint(msgspec.Struct, frozen=True):
+    """
+    Where in a log a replay should start: either an offset from the start of
+    a state, or a timestamp.
+    """
+
+    state_letter: str | None = None
+    """The first letter of the state to start at, or None to start at
+    `timestamp_seconds`."""
+    offset_seconds: float = 0.0
+    """How long after the start of the state to start. Negative to start
+    before it."""
+    timestamp_seconds: float | None = None
+    """The timestamp to start at, if there is no state."""
+
+    @classmethod
+    def from_string(cls, text: str) -> ReplaySeekPoint:
+        """
+        Reads a seek point from the command line, e.g. "Coast" for the start
+        of coast, "MotorBurn-2" for 2 seconds before motor burn, or "152.4"
+        for the timestamp 152.4 seconds.
+
+        :param text: The seek point.
+        :return: The seek point.
+        :raises ValueError: If the text isn't a state, state and offset, or timestamp.
+        """
+        try:
+            return cls(timestamp_seconds=float(text))
+        except ValueError:
+            pass
+
+        state_names = {name.lower(): name for name in SEEKABLE_STATES}
+        match = re.fullmatch(r"([A-Za-z]+)([+-]\d+(?:\.\d*)?)?", text.strip())
+        if match is None or match[1].lower() not in state_names:
+            raise ValueError(
+                f"Can't start a replay at '{text}'. Use a timestamp, or one of "
+                f"{', '.join(SEEKABLE_STATES)}, optionally followed by an offset in seconds, "
+                "e.g. MotorBurn-2."
+            )
+        return cls(
+            state_letter=state_names[match[1].lower()][0],
+            offset_seconds=float(match[2] or 0.0),
+        )
+
+    def find_start_row(self, timestamps: np.ndarray, state_letters: np.ndarray) -> int:
+        """
+        Finds the first row of a log to replay.
+
+        The timestamps of a log only go up, so the row is found with a
+        binary search over them, without looking at the rest of the log.
+
+        :param timestamps: The timestamp of every row of the log.
+        :param state_letters: The state letter of every row of the log.
+        :return: The first row at or after the seek point.
+        :raises ValueError: If the log never got to the state, or ended before the seek point.
+        """
+        target_seconds = self.timestamp_seconds
+        if self.state_letter is not None:
+            state_rows = np.flatnonzero(state_letters == self.state_letter)
+            if not state_rows.size:
+                raise ValueError(f"The log never got to the state '{self.state_letter}'.")
+            target_seconds = float(timestamps[state_rows[0]]) + self.offset_seconds
+
+        start_row = int(np.searchsorted(timestamps, target_seconds, side="left"))
+        if start_row >= len(timestamps):
+            raise ValueError(f"The log ends before {target_seconds} s.")
+        return start_row
+
+
+class ReplaySeek(msgspec.Struct, frozen=True):
+    """
+    Where a replay starts, and what the air brakes would have known by then,
+    so the replay can carry on from there as if it had started at the
+    beginning.
+    """
+
+    start_row: int
+    """The first row of the log to replay."""
+    history: list[FIRMDataPacket]
+    """The packets before the first row, which the replay would have sent
+    first if it hadn't seeked."""
+    state_letter: str
+    """The state the air brakes were in when the first row arrived."""
+    state_start_seconds: float
+    """The timestamp of the first row in that state."""
+    launch_time_seconds: float
+    """The timestamp of the first row in motor burn, or 0 if the rocket hadn't
+    launched yet."""
+
+
+def seed_context(context: Context, replay_seek: ReplaySeek) -> None:
+    """
+    Brings the Context up to where a replay starts: processes the packets
+    before it, and puts the state machine in the state the air brakes were in.
+
+    This is called before the Context is started.
+
+    :param context: The Context the replay is run with.
+    :param replay_seek: Where the replay starts.
+    """
+    if replay_seek.history:
+        # The first update sets the altitude the rest are zeroed from, so it gets the first packet
+        # on its own, like it would have in the replay:
+        context.data_processor.update(replay_seek.history[:1])
+        if len(replay_seek.history) > 1:
+            context.data_processor.update(replay_seek.history[1:])
+        context.processor_data_packets = context.data_processor.get_processor_data_packets()
+
+    states_by_letter = {name[0]: state for name, state in SEEKABLE_STATES.items()}
+    context.state = states_by_letter[replay_seek.state_letter](context)
+    # The state would have started before the first row, not when it was made:
+    context.state.start_time_seconds = replay_seek.state_start_seconds
+    context.launch_time_seconds = replay_seek.launch_time_seconds
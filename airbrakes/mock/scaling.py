@@ -0,0 +1,386 @@
+"""
+Module for measuring how the work of the air brakes scales with the number of
+threads doing it at once, with the GIL enabled and disabled.
+
+`run_flight` only runs with the GIL disabled, so that the main loop, the
+logger, the apogee predictor, and FIRM's thread can run at the same time,
+instead of taking turns. Each workload is run on more and more threads at
+once, in its own Python process started with PYTHON_GIL set to 0 or 1, as the
+GIL can only be enabled or disabled when Python starts. With the GIL enabled,
+the throughput stays about the same however many threads there are, as they
+take turns. With it disabled, it goes up with the threads, up to the number
+of cores.
+"""
+
+import math
+import os
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import msgspec
+from firm_client import FIRMDataPacket  # noqa: TC002 (doesn't work with msgspec)
+
+from airbrakes.constants import (
+    SCALING_ITEMS_PER_THREAD,
+    SCALING_LOG_BATCH_PACKETS,
+    ScalingWorkload,
+    ServoExtension,
+)
+from airbrakes.context import Context
+from airbrakes.data_handling.apogee_predictor import ApogeePredictor, make_rocket, predict_apogee
+from airbrakes.data_handling.data_processor import DataProcessor
+from airbrakes.data_handling.packets.context_data_packet import ContextDataPacket
+from airbrakes.data_handling.packets.processor_data_packet import (
+    ProcessorDataPacket,  # noqa: TC001 (doesn't work with msgspec)
+)
+from airbrakes.data_handling.packets.servo_data_packet import ServoDataPacket
+from airbrakes.mock.lockstep import SynchronousLogger
+from airbrakes.mock.mock_firm import MockFIRM
+from airbrakes.mock.mock_logger import MockLogger
+from airbrakes.mock.mock_servo import MockServo
+from airbrakes.mock.regression import LoopTiming
+from airbrakes.mock.synthetic_flight import SyntheticFIRM, SyntheticFlight
+from airbrakes.state import CoastState
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+
+class ScalingResult(msgspec.Struct, frozen=True):
+    """How a workload did on a number of threads at once, with the GIL enabled or disabled."""
+
+    workload: ScalingWorkload
+    """The work the threads did."""
+    threads: int
+    """How many threads did the work at once."""
+    gil_enabled: bool
+    """Whether the GIL was enabled."""
+    items: int
+    """How many packets were replayed or logged, or apogees predicted, by all the threads."""
+    wall_seconds: float
+    """How long it took from the threads starting to the last one being done."""
+    timing: LoopTiming
+    """How long each loop of the replays, prediction, or call to log took."""
+    thread_cpu_seconds: dict[str, float]
+    """The CPU time of the threads doing each part of the work, added up over the threads, e.g.
+    of every logger thread."""
+
+    @property
+    def throughput(self) -> float:
+        """How many items the threads got through per second, together."""
+        return self.items / self.wall_seconds if self.wall_seconds else 0.0
+
+    def __str__(self) -> str:
+        """Returns the result as one row of a table."""
+        # How busy each thread doing that part of the work was, on average:
+        cpu = ", ".join(
+            f"{name} {seconds / (self.wall_seconds * self.threads):.0%}"
+            for name, seconds in self.thread_cpu_seconds.items()
+            if self.wall_seconds and not math.isnan(seconds)
+        )
+        return (
+            f"{self.workload:<10} {'on' if self.gil_enabled else 'off':<4} {self.threads:>7} "
+            f"{self.throughput:>12,.0f} {self.timing.p50_us:>9.1f} {self.timing.p99_us:>9.1f} "
+            f"{self.timing.max_us:>10.1f}  {cpu}"
+        )
+
+
+class FlightPackets(msgspec.Struct, frozen=True):
+    """The packets of a synthetic flight, for the workloads which don't read a log."""
+
+    firm_data_packets: list[FIRMDataPacket]
+    """Every packet FIRM sent."""
+    coast_processor_data_packets: list[ProcessorDataPacket]
+    """The processed data of the packets on the way up, which the apogee is predicted from."""
+
+    @classmethod
+    def from_synthetic_flight(cls, flight: SyntheticFlight) -> FlightPackets:
+        """
+        Makes the packets of a synthetic flight, and processes them.
+
+        :param flight: The synthetic flight.
+        :return: The packets.
+        """
+        firm = SyntheticFIRM(flight.generate())
+        firm.start()
+        data_processor = DataProcessor()
+        firm_data_packets = []
+        coast_processor_data_packets = []
+        while firm_packets := firm.get_data_packets():
+            data_processor.update(firm_packets)
+            firm_data_packets.extend(firm_packets)
+            coast_processor_data_packets.extend(
+                packet
+                for packet in data_processor.get_processor_data_packets()
+                if packet.vertical_velocity_meters_per_s > 10 and packet.current_altitude > 10
+            )
+        return cls(firm_data_packets, coast_processor_data_packets)
+
+
+class ThreadWork(msgspec.Struct, frozen=True):
+    """What one of the threads running a workload did."""
+
+    items: int
+    """How many items the thread got through."""
+    durations_ns: list[int]
+    """How long each loop, prediction, or call to log took."""
+    cpu_seconds: dict[str, float]
+    """The CPU time of the threads doing each part of the work, e.g. the main loop and the
+    threads of its components."""
+
+
+def get_thread_cpu_seconds(thread: threading.Thread) -> float:
+    """
+    Returns the CPU time a running thread has used so far, from another thread.
+
+    :param thread: The thread.
+    :return: The CPU time in seconds, or NaN if the thread isn't running, or the OS can't tell.
+    """
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except AttributeError, OSError, TypeError:
+        return math.nan
+
+
+def get_gil_settings() -> tuple[bool, ...]:
+    """
+    Returns the GIL settings the scaling benchmark can be run with on this Python.
+
+    :return: Whether the GIL is enabled in each setting. Only the free-threaded build can disable
+        it.
+    """
+    return (False, True) if sysconfig.get_config_var("Py_GIL_DISABLED") else (True,)
+
+
+def run_workload(
+    workload: ScalingWorkload, threads: int, items_per_thread: int | None = None
+) -> ScalingResult:
+    """
+    Runs a workload on a number of threads at once, in this process.
+
+    :param workload: The work to run.
+    :param threads: How many threads to run it on.
+    :param items_per_thread: How much work each thread does, or None for the default of the
+        workload.
+    :return: How the workload did.
+    """
+    if items_per_thread is None:
+        items_per_thread = SCALING_ITEMS_PER_THREAD[workload]
+    work: Callable[[int, FlightPackets, Path, threading.Barrier], ThreadWork] = {
+        ScalingWorkload.PIPELINE: _replay_flight,
+        ScalingWorkload.APOGEE_PREDICTOR: _predict_apogees,
+        ScalingWorkload.LOGGER: _log_packets,
+    }[workload]
+    # The pipeline replays a log instead:
+    flight_packets = (
+        FlightPackets([], [])
+        if workload == ScalingWorkload.PIPELINE
+        else FlightPackets.from_synthetic_flight(SyntheticFlight())
+    )
+
+    # Every thread gets ready, and then they all start at once:
+    barrier = threading.Barrier(threads + 1)
+    thread_work: list[ThreadWork] = []
+    with tempfile.TemporaryDirectory() as logs_path:
+        workers = [
+            threading.Thread(
+                target=lambda index=index: thread_work.append(
+                    work(items_per_thread, flight_packets, Path(logs_path) / str(index), barrier)
+                ),
+                name=f"Scaling Thread {index}",
+            )
+            for index in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start_ns = time.perf_counter_ns()
+        for worker in workers:
+            worker.join()
+        wall_seconds = (time.perf_counter_ns() - start_ns) / 1e9
+
+    thread_cpu_seconds: dict[str, float] = {}
+    for work_done in thread_work:
+        for name, seconds in work_done.cpu_seconds.items():
+            thread_cpu_seconds[name] = thread_cpu_seconds.get(name, 0.0) + seconds
+    return ScalingResult(
+        workload=workload,
+        threads=threads,
+        gil_enabled=sys._is_gil_enabled(),
+        items=sum(work_done.items for work_done in thread_work),
+        wall_seconds=wall_seconds,
+        timing=LoopTiming.from_durations(
+            [duration_ns for work_done in thread_work for duration_ns in work_done.durations_ns]
+        ),
+        thread_cpu_seconds=thread_cpu_seconds,
+    )
+
+
+def run_scaling_benchmark(
+    workloads: Iterable[ScalingWorkload],
+    thread_counts: Iterable[int],
+    gil_settings: Iterable[bool] | None = None,
+    items_per_thread: int | None = None,
+) -> list[ScalingResult]:
+    """
+    Runs each workload on each number of threads, with the GIL enabled and disabled, each in a
+    Python process of its own.
+
+    :param workloads: The work to run.
+    :param thread_counts: How many threads to run each workload on.
+    :param gil_settings: Whether the GIL is enabled in each run, or None for every setting this
+        Python can be run with.
+    :param items_per_thread: How much work each thread does, or None for the default of each
+        workload.
+    :return: How each workload did, in the order they were run.
+    """
+    gil_settings = get_gil_settings() if gil_settings is None else tuple(gil_settings)
+    thread_counts = tuple(thread_counts)
+    results = []
+    for workload in workloads:
+        for gil_enabled in gil_settings:
+            for threads in thread_counts:
+                # Runs this module, with the arguments we made:
+                completed = subprocess.run(  # noqa: S603
+                    [
+                        sys.executable,
+                        "-m",
+                        "airbrakes.mock.scaling",
+                        workload,
+                        str(threads),
+                        str(items_per_thread or SCALING_ITEMS_PER_THREAD[workload]),
+                    ],
+                    env={**os.environ, "PYTHON_GIL": "1" if gil_enabled else "0"},
+                    capture_output=True,
+                    check=True,
+                )
+                # The result is the last line, after anything the components printed:
+                results.append(
+                    msgspec.json.decode(completed.stdout.splitlines()[-1], type=ScalingResult)
+                )
+    return results
+
+
+def _replay_flight(
+    items: int, _: FlightPackets, logs_path: Path, barrier: threading.Barrier
+) -> ThreadWork:
+    """
+    Replays a flight log through the whole air brakes as fast as it can, as `uv run mock -f`
+    does.
+
+    :param items: How many packets to replay at most.
+    :param logs_path: The directory to write the log in.
+    :param barrier: Waited on once the replay is ready, to start with the other threads.
+    :return: What the main loop did.
+    """
+    firm = MockFIRM()
+    context = Context(MockServo(), firm, MockLogger(logs_path), DataProcessor(), ApogeePredictor())
+    barrier.wait()
+    cpu_start = time.thread_time()
+    context.start(wait_for_start=True)
+    durations_ns = []
+    replayed = 0
+    while replayed < items and not context.shutdown_requested:
+        start_ns = time.perf_counter_ns()
+        context.update()
+        durations_ns.append(time.perf_counter_ns() - start_ns)
+        replayed += len(context.firm_data_packets)
+        if not firm.is_running and not context.firm_data_packets:
+            break
+
+    # Read while the threads are still running, as their CPU time is gone once they stop:
+    cpu_seconds = {
+        "main loop": time.thread_time() - cpu_start,
+        "FIRM": get_thread_cpu_seconds(firm.thread),
+        "logger": get_thread_cpu_seconds(context.logger.thread),
+        "predictor": get_thread_cpu_seconds(context.apogee_predictor.thread),
+    }
+    context.stop()
+    return ThreadWork(replayed, durations_ns, cpu_seconds)
+
+
+def _predict_apogees(
+    items: int, flight_packets: FlightPackets, _: Path, barrier: threading.Barrier
+) -> ThreadWork:
+    """
+    Predicts the apogee from the processed data of a flight on the way up, as the apogee
+    predictor thread does.
+
+    :param items: How many apogees to predict.
+    :param flight_packets: The packets of the flight.
+    :param barrier: Waited on before predicting, to start with the other threads.
+    :return: What the thread did.
+    """
+    rocket = make_rocket()
+    processor_data_packets = flight_packets.coast_processor_data_packets
+    barrier.wait()
+    cpu_start = time.thread_time()
+    durations_ns = []
+    for index in range(items):
+        start_ns = time.perf_counter_ns()
+        predict_apogee(rocket, processor_data_packets[index % len(processor_data_packets)])
+        durations_ns.append(time.perf_counter_ns() - start_ns)
+    return ThreadWork(items, durations_ns, {"predictor": time.thread_time() - cpu_start})
+
+
+def _log_packets(
+    items: int, flight_packets: FlightPackets, logs_path: Path, barrier: threading.Barrier
+) -> ThreadWork:
+    """
+    Logs the packets of a flight a batch at a time, and writes them to the log straight away,
+    as the main loop and the logger thread do between them.
+
+    :param items: How many packets to log.
+    :param flight_packets: The packets of the flight.
+    :param logs_path: The directory to write the log in.
+    :param barrier: Waited on before logging, to start with the other threads.
+    :return: What the thread did.
+    """
+    logger = SynchronousLogger(logs_path)
+    logger.start()
+    firm_data_packets = flight_packets.firm_data_packets
+    batches = [
+        firm_data_packets[start : start + SCALING_LOG_BATCH_PACKETS]
+        for start in range(0, len(firm_data_packets), SCALING_LOG_BATCH_PACKETS)
+    ]
+    servo_data_packet = ServoDataPacket(
+        set_extension=ServoExtension.MIN_EXTENSION, battery_voltage=None, current_milliamps=None
+    )
+    barrier.wait()
+    cpu_start = time.thread_time()
+    durations_ns = []
+    logged = 0
+    while logged < items:
+        batch = batches[len(durations_ns) % len(batches)]
+        start_ns = time.perf_counter_ns()
+        # Logged in flight, so every row is written, and none are kept in the log buffer:
+        logger.log(
+            ContextDataPacket(
+                state=CoastState,
+                retrieved_firm_packets=len(batch),
+                apogee_predictor_queue_size=0,
+                log_queue_high_watermark=0,
+                dropped_log_packets=0,
+                update_timestamp_ns=time.time_ns(),
+            ),
+            servo_data_packet,
+            batch,
+            None,
+        )
+        durations_ns.append(time.perf_counter_ns() - start_ns)
+        logged += len(batch)
+    logger.stop()
+    return ThreadWork(logged, durations_ns, {"logger": time.thread_time() - cpu_start})
+
+
+if __name__ == "__main__":
+    # Run by `run_scaling_benchmark` as `python -m airbrakes.mock.scaling WORKLOAD THREADS ITEMS`,
+    # in a process started with the GIL enabled or disabled:
+    result = run_workload(ScalingWorkload(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]))
+    sys.stdout.buffer.write(msgspec.json.encode(result) + b"\n")
@@ -0,0 +1,596 @@
+"""
+Module for making up flights to feed the air brakes, at any packet rate, to
+find out how fast a stream of packets the main loop can keep up with.
+
+The flight is flown by HPRM, the same model the apogee predictor uses, and
+then read by FIRM's sensors, with noise, bias, and dropouts added. The
+packets of the whole flight are made at once with NumPy, so making a flight
+at 5 kHz takes about as long as one at 100 Hz.
+"""
+
+import time
+
+import msgspec
+import numpy as np
+import polars as pl
+from firm_client import FIRMDataPacket
+from hprm import FixedTimeStep, InitialState1DOF, OdeMethod
+from scipy.signal import lfilter
+
+from airbrakes.base_classes.base_firm import BaseFIRM
+from airbrakes.constants import (
+    FIRM_FREQUENCY,
+    FIRM_IMU_YAW_DEGREES,
+    FIRM_PACKET_INPUT_FIELDS,
+    GRAVITY_METERS_PER_SECOND_SQUARED,
+    SYNTHETIC_SENSOR_ERROR_BLOCK_ROWS,
+)
+from airbrakes.data_handling.apogee_predictor import make_rocket
+
+
+class SensorErrors(msgspec.Struct, frozen=True):
+    """
+    How far off FIRM's readings of a synthetic flight are.
+
+    The raw readings get white noise and a constant bias. The estimates come
+    out of FIRM's filter, so their noise wanders slowly instead, over about
+    `estimate_noise_seconds`, whatever the packet rate is.
+    """
+
+    acceleration_noise_gs: float = 0.01
+    """The standard deviation of the noise of each axis of the accelerometer."""
+    acceleration_bias_gs: float = 0.0
+    """What the accelerometer adds to each axis."""
+    angular_rate_noise_deg_per_s: float = 0.2
+    """The standard deviation of the noise of each axis of the gyroscope."""
+    angular_rate_bias_deg_per_s: float = 0.0
+    """What the gyroscope adds to each axis."""
+    pressure_noise_pascals: float = 5.0
+    """The standard deviation of the noise of the barometer."""
+    pressure_bias_pascals: float = 0.0
+    """What the barometer adds to the pressure."""
+    magnetic_field_noise_microteslas: float = 0.5
+    """The standard deviation of the noise of each axis of the magnetometer."""
+    altitude_noise_meters: float = 0.5
+    """The standard deviation of the error of the estimated altitude."""
+    velocity_noise_meters_per_s: float = 0.2
+    """The standard deviation of the error of the estimated vertical velocity."""
+    estimate_noise_seconds: float = 0.5
+    """How long the error of the estimates takes to wander."""
+    dropout_probability: float = 0.0
+    """The chance that FIRM stops sending packets at each packet."""
+    mean_dropout_ms: float = 50.0
+    """The average length of a dropout. The packets FIRM would have sent during it are lost."""
+
+
+NO_SENSOR_ERRORS = SensorErrors(
+    acceleration_noise_gs=0.0,
+    angular_rate_noise_deg_per_s=0.0,
+    pressure_noise_pascals=0.0,
+    magnetic_field_noise_microteslas=0.0,
+    altitude_noise_meters=0.0,
+    velocity_noise_meters_per_s=0.0,
+)
+"""Perfect sensors, which read the flight exactly as it was flown."""
+
+
+class SyntheticFlight(msgspec.Struct, frozen=True):
+    """
+    A made up flight: the rocket sits on the pad, burns its motor with a
+    constant acceleration, coasts to apogee as HPRM flies it with the rocket
+    constants, falls under a parachute, and lands with a jolt.
+
+    The rocket is tilted from vertical by `tilt_degrees` for the whole
+    flight, and rolls about its axis at `roll_rate_deg_per_s`, so every axis
+    of every sensor changes during the flight.
+    """
+
+    rate_hz: float = FIRM_FREQUENCY
+    """How many packets a second FIRM sends."""
+    pad_seconds: float = 5.0
+    """How long the rocket is on the pad before launch."""
+    burn_seconds: float = 2.5
+    """How long the motor burns for."""
+    burnout_velocity_meters_per_s: float = 250.0
+    """How fast the rocket is going when the motor burns out."""
+    tilt_degrees: float = 3.0
+    """How far the rocket is tilted from vertical."""
+    roll_rate_deg_per_s: float = 20.0
+    """How fast the rocket rolls about its axis."""
+    descent_velocity_meters_per_s: float = 25.0
+    """How fast the rocket falls under its parachute."""
+    landing_impact_gs: float = 6.0
+    """The acceleration of the jolt when the rocket lands."""
+    landing_impact_seconds: float = 0.05
+    """How long the jolt lasts."""
+    landed_seconds: float = 10.0
+    """How long the rocket lies on the ground after it lands."""
+    ground_pressure_pascals: float = 101_325.0
+    """The air pressure at the pad."""
+    ground_temperature_celsius: float = 15.0
+    """The air temperature at the pad."""
+    magnetic_field_microteslas: tuple[float, float, float] = (20.0, 0.0, -45.0)
+    """The Earth's magnetic field at the pad, with z pointing up."""
+    errors: SensorErrors = SensorErrors()
+    """How far off FIRM's readings are."""
+    seed: int = 0
+    """The seed of the random number generator, so a flight can be made again."""
+
+    def generate(self) -> pl.DataFrame:
+        """
+        Makes the packets FIRM would send during the flight.
+
+        :return: A row for each packet, with a column for each field FIRMDataPacket is made from,
+            in the order it takes them.
+        """
+        return FIRMSensors(self).read(*self._fly())
+
+    def _fly(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Flies the rocket, and samples the flight at every packet.
+
+        :return: The timestamp, altitude, vertical velocity, and vertical specific force (what an
+            accelerometer pointing up would read) of every packet, in SI units.
+        """
+        period = 1 / self.rate_hz
+        gravity = GRAVITY_METERS_PER_SECOND_SQUARED
+        burn_acceleration = self.burnout_velocity_meters_per_s / self.burn_seconds
+        burnout_altitude = burn_acceleration * self.burn_seconds**2 / 2
+
+        # HPRM flies the coast, with the same step as the packets, so no detail is lost between
+        # its steps at high packet rates:
+        coast_times, coast_states = make_rocket().simulate_flight_1dof(
+            InitialState1DOF(burnout_altitude, self.burnout_velocity_meters_per_s),
+            OdeMethod.RK3,
+            FixedTimeStep(period),
+            max_iterations=int(600 * self.rate_hz),
+        )
+        coast_altitudes = coast_states[:, 0]
+        coast_velocities = coast_states[:, 1]
+        coast_forces = np.gradient(coast_velocities, coast_times) + gravity
+        apogee = float(coast_altitudes[-1])
+
+        # The parachute slows the rocket to its descent velocity over the time it would take to
+        # fall that fast:
+        descent_time_constant = self.descent_velocity_meters_per_s / gravity
+        launch = self.pad_seconds
+        burnout = launch + self.burn_seconds
+        apogee_time = burnout + float(coast_times[-1])
+        landing = apogee_time + apogee / self.descent_velocity_meters_per_s + descent_time_constant
+        landed = landing + self.landing_impact_seconds
+        timestamps = np.arange(0.0, landed + self.landed_seconds, period)
+
+        burn_times = np.clip(timestamps - launch, 0.0, self.burn_seconds)
+        descent_times = np.clip(timestamps - apogee_time, 0.0, None)
+        descent_decay = np.exp(-descent_times / descent_time_constant)
+        descent_altitudes = apogee - self.descent_velocity_meters_per_s * (
+            descent_times - descent_time_constant * (1 - descent_decay)
+        )
+
+        phases = [
+            timestamps < launch,
+            timestamps < burnout,
+            timestamps < apogee_time,
+            timestamps < landing,
+            timestamps < landed,
+        ]
+        coast_offsets = timestamps - burnout
+        altitudes = np.select(
+            phases,
+            [
+                0.0,
+                burn_acceleration * burn_times**2 / 2,
+                np.interp(coast_offsets, coast_times, coast_altitudes),
+                np.maximum(descent_altitudes, 0.0),
+                0.0,
+            ],
+            0.0,
+        )
+        velocities = np.select(
+            phases,
+            [
+                0.0,
+                burn_acceleration * burn_times,
+                np.interp(coast_offsets, coast_times, coast_velocities),
+                -self.descent_velocity_meters_per_s * (1 - descent_decay),
+                0.0,
+            ],
+            0.0,
+        )
+        specific_forces = np.select(
+            phases,
+            [
+                gravity,
+                burn_acceleration + gravity,
+                np.interp(coast_offsets, coast_times, coast_forces),
+                gravity * (1 - descent_decay),
+                self.landing_impact_gs * gravity,
+            ],
+            gravity,
+        )
+        return timestamps, altitudes, velocities, specific_forces
+
+
+class FIRMSensors:
+    """
+    FIRM's sensors, which read a synthetic flight as it is flown, with the
+    errors of the flight.
+
+    The flight can be read all at once, or a few packets at a time as it is
+    flown. The errors don't depend on the flight, so when it is read a few
+    packets at a time they are drawn ahead, SYNTHETIC_SENSOR_ERROR_BLOCK_ROWS
+    packets at a time. The errors which carry on from one packet to the next,
+    like the wandering error of the estimates and the dropouts, carry on from
+    one read to the next too.
+    """
+
+    __slots__ = (
+        "_altitude_noise",
+        "_dropout_end_seconds",
+        "_errors",
+        "_flight",
+        "_next_error_row",
+        "_rng",
+        "_velocity_noise",
+    )
+
+    def __init__(self, flight: SyntheticFlight) -> None:
+        """
+        Initializes the FIRMSensors.
+
+        :param flight: The flight to read, whose errors, orientation, and seed the readings use.
+        """
+        self._flight = flight
+        self._rng = np.random.default_rng(flight.seed)
+        self._errors = np.empty((0, 14))
+        self._next_error_row = 0
+        self._altitude_noise: float | None = None
+        self._velocity_noise: float | None = None
+        self._dropout_end_seconds = -np.inf
+
+    def read(
+        self,
+        timestamps: np.ndarray,
+        altitudes: np.ndarray,
+        velocities: np.ndarray,
+        specific_forces: np.ndarray,
+    ) -> pl.DataFrame:
+        """
+        Reads the flight at the timestamps, which come after the ones read before.
+
+        :param timestamps: The timestamp of every packet.
+        :param altitudes: The altitude of the rocket at every packet.
+        :param velocities: The vertical velocity of the rocket at every packet.
+        :param specific_forces: What an accelerometer pointing up would read at every packet.
+        :return: A row for each packet which wasn't lost in a dropout, with a column for each
+            field FIRMDataPacket is made from, in the order it takes them.
+        """
+        columns, lost = self._read_columns(timestamps, altitudes, velocities, specific_forces)
+        return pl.DataFrame(columns).filter(~lost)
+
+    def read_packets(
+        self,
+        timestamps: np.ndarray,
+        altitudes: np.ndarray,
+        velocities: np.ndarray,
+        specific_forces: np.ndarray,
+    ) -> list[FIRMDataPacket]:
+        """
+        Reads the flight at the timestamps, like `read`, straight into packets.
+
+        :param timestamps: The timestamp of every packet.
+        :param altitudes: The altitude of the rocket at every packet.
+        :param velocities: The vertical velocity of the rocket at every packet.
+        :param specific_forces: What an accelerometer pointing up would read at every packet.
+        :return: The packets which weren't lost in a dropout.
+        """
+        columns, lost = self._read_columns(timestamps, altitudes, velocities, specific_forces)
+        # Stacking the columns first is much faster than going through them one by one, for the
+        # few packets the closed-loop simulation reads at a time:
+        rows = np.column_stack(list(columns.values()))[~lost].tolist()
+        return [FIRMDataPacket(*row) for row in rows]
+
+    def _read_columns(
+        self,
+        timestamps: np.ndarray,
+        altitudes: np.ndarray,
+        velocities: np.ndarray,
+        specific_forces: np.ndarray,
+    ) -> tuple[dict[str, np.ndarray], np.ndarray]:
+        """
+        Reads the flight at the timestamps.
+
+        :param timestamps: The timestamp of every packet.
+        :param altitudes: The altitude of the rocket at every packet.
+        :param velocities: The vertical velocity of the rocket at every packet.
+        :param specific_forces: What an accelerometer pointing up would read at every packet.
+        :return: A column for each field FIRMDataPacket is made from, in the order it takes them,
+            and whether each packet is lost in a dropout.
+        """
+        flight = self._flight
+        errors = flight.errors
+        rows = len(timestamps)
+        packet_errors = self._take_errors(rows)
+
+        # FIRM is tilted about its y axis, and then rolled about its own z axis:
+        tilt = np.radians(flight.tilt_degrees)
+        rolls = np.radians(flight.roll_rate_deg_per_s) * timestamps
+        accelerations = _to_sensor_frame(
+            np.column_stack([np.zeros(rows), np.zeros(rows), specific_forces]), tilt, rolls
+        )
+        magnetic_fields = _to_sensor_frame(
+            np.broadcast_to(np.array(flight.magnetic_field_microteslas), (rows, 3)), tilt, rolls
+        )
+        # FIRMDataPacket turns the IMU readings by FIRM_IMU_YAW_DEGREES before its quaternion, so
+        # the quaternion is the tilt, and then the roll less the yaw:
+        half_tilt = tilt / 2
+        half_rolls = (rolls - np.radians(FIRM_IMU_YAW_DEGREES)) / 2
+
+        columns = {
+            "timestamp_seconds": timestamps,
+            "temperature_celsius": flight.ground_temperature_celsius - 0.0065 * altitudes,
+            "pressure_pascals": flight.ground_pressure_pascals
+            * (1 - altitudes / 44330.0) ** (1 / 0.190263)
+            + errors.pressure_bias_pascals
+            + packet_errors[:, 0],
+            **_name_axes(
+                "raw_acceleration_{}_gs",
+                accelerations / GRAVITY_METERS_PER_SECOND_SQUARED
+                + errors.acceleration_bias_gs
+                + packet_errors[:, 1:4],
+            ),
+            **_name_axes(
+                "raw_angular_rate_{}_deg_per_s",
+                np.array([0.0, 0.0, flight.roll_rate_deg_per_s])
+                + errors.angular_rate_bias_deg_per_s
+                + packet_errors[:, 4:7],
+            ),
+            **_name_axes("magnetic_field_{}_microteslas", magnetic_fields + packet_errors[:, 7:10]),
+            "est_position_z_meters": altitudes + packet_errors[:, 10],
+            "est_velocity_z_meters_per_s": velocities + packet_errors[:, 11],
+            "est_quaternion_w": np.cos(half_tilt) * np.cos(half_rolls),
+            "est_quaternion_x": np.sin(half_tilt) * np.sin(half_rolls),
+            "est_quaternion_y": np.sin(half_tilt) * np.cos(half_rolls),
+            "est_quaternion_z": np.cos(half_tilt) * np.sin(half_rolls),
+        }
+        return columns, self._find_dropouts(timestamps, packet_errors[:, 12], packet_errors[:, 13])
+
+    def _take_errors(self, rows: int) -> np.ndarray:
+        """
+        Takes the errors of the next packets from the ones drawn ahead, drawing more if needed.
+
+        :param rows: How many packets to take the errors of.
+        :return: The errors of each packet, one row per packet, as `_draw_errors` makes them.
+        """
+        available = len(self._errors) - self._next_error_row
+        if available < rows:
+            self._errors = np.concatenate(
+                [
+                    self._errors[self._next_error_row :],
+                    self._draw_errors(max(rows - available, SYNTHETIC_SENSOR_ERROR_BLOCK_ROWS)),
+                ]
+            )
+            self._next_error_row = 0
+        errors = self._errors[self._next_error_row : self._next_error_row + rows]
+        self._next_error_row += rows
+        return errors
+
+    def _draw_errors(self, rows: int) -> np.ndarray:
+        """
+        Draws the errors of the next packets.
+
+        :param rows: How many packets to draw the errors of.
+        :return: One row per packet, with the noise of the pressure, the 3 axes of the
+            accelerometer, gyroscope, and magnetometer, the altitude, and the velocity, then a
+            uniform draw which decides if a dropout starts at the packet, and how long it lasts.
+        """
+        rng = self._rng
+        errors = self._flight.errors
+        pressure_noise = rng.normal(0.0, errors.pressure_noise_pascals, rows)
+        acceleration_noise = rng.normal(0.0, errors.acceleration_noise_gs, (rows, 3))
+        angular_rate_noise = rng.normal(0.0, errors.angular_rate_noise_deg_per_s, (rows, 3))
+        magnetic_field_noise = rng.normal(0.0, errors.magnetic_field_noise_microteslas, (rows, 3))
+        altitude_noise, self._altitude_noise = self._wandering_noise(
+            errors.altitude_noise_meters, rows, self._altitude_noise
+        )
+        velocity_noise, self._velocity_noise = self._wandering_noise(
+            errors.velocity_noise_meters_per_s, rows, self._velocity_noise
+        )
+        dropout_draws = rng.random(rows)
+        dropout_seconds = rng.exponential(errors.mean_dropout_ms / 1e3, rows)
+        return np.column_stack(
+            [
+                pressure_noise,
+                acceleration_noise,
+                angular_rate_noise,
+                magnetic_field_noise,
+                altitude_noise,
+                velocity_noise,
+                dropout_draws,
+                dropout_seconds,
+            ]
+        )
+
+    def _wandering_noise(
+        self, deviation: float, rows: int, last_noise: float | None
+    ) -> tuple[np.ndarray, float]:
+        """
+        Makes noise which wanders over about `estimate_noise_seconds`, like the error of a
+        filtered estimate, with the same standard deviation at any packet rate.
+
+        :param deviation: The standard deviation of the noise.
+        :param rows: How many packets to make the noise for.
+        :param last_noise: The noise of the packet before these, or None if these are the first.
+        :return: The noise of each packet, and the noise of the last one.
+        """
+        flight = self._flight
+        correlation = np.exp(-1 / (flight.rate_hz * flight.errors.estimate_noise_seconds))
+        white_noise = self._rng.normal(0.0, deviation, rows)
+        if last_noise is None:
+            last_noise = self._rng.normal(0.0, deviation)
+        # Each packet keeps most of the noise of the packet before it:
+        noise, _ = lfilter(
+            [np.sqrt(1 - correlation**2)],
+            [1.0, -correlation],
+            white_noise,
+            zi=[correlation * last_noise],
+        )
+        return noise, float(noise[-1])
+
+    def _find_dropouts(
+        self, timestamps: np.ndarray, dropout_draws: np.ndarray, dropout_seconds: np.ndarray
+    ) -> np.ndarray:
+        """
+        Decides which packets are lost in dropouts.
+
+        :param timestamps: The timestamp of every packet.
+        :param dropout_draws: The uniform draw of every packet, which starts a dropout if it is
+            below the dropout probability.
+        :param dropout_seconds: How long a dropout starting at each packet would last.
+        :return: Whether each packet is lost.
+        """
+        starts = dropout_draws < self._flight.errors.dropout_probability
+        ends = np.where(starts, timestamps + dropout_seconds, -np.inf)
+        # A packet is lost if a dropout started at it, or hadn't ended by the time it was sent:
+        latest_ends = np.maximum.accumulate(
+            np.concatenate([[self._dropout_end_seconds], ends[:-1]])
+        )
+        if len(timestamps):
+            self._dropout_end_seconds = max(latest_ends[-1], ends[-1])
+        return starts | (timestamps < latest_ends)
+
+
+class SyntheticFIRM(BaseFIRM):
+    """
+    Hands the packets of a synthetic flight to the main loop as fast as it
+    can take them, in the batches it would have got them in if FIRM were
+    sending them in real time.
+
+    The packets arrive on a simulated clock, which moves on by however long
+    the main loop took between each call to `get_data_packets`. When the main
+    loop would have been waiting for the next packet, the clock skips ahead to
+    it, so a flight takes only as long as the main loop is busy for. If the
+    main loop can't keep up with the packet rate, the packets fall further and
+    further behind the clock, which shows in `max_lag_seconds`.
+    """
+
+    __slots__ = (
+        "_clock_seconds",
+        "_columns",
+        "_last_call_ns",
+        "_next_row",
+        "_requested_to_run",
+        "_timestamps",
+        "busy_seconds",
+        "max_lag_seconds",
+    )
+
+    def __init__(self, packets: pl.DataFrame) -> None:
+        """
+        Initializes the SyntheticFIRM.
+
+        :param packets: The packets to hand out, from `SyntheticFlight.generate`.
+        """
+        self._columns = [packets[name].to_numpy() for name in FIRM_PACKET_INPUT_FIELDS]
+        self._timestamps = packets["timestamp_seconds"].to_numpy()
+        self._next_row = 0
+        self._clock_seconds = 0.0
+        self._last_call_ns: int | None = None
+        self._requested_to_run = False
+        self.busy_seconds = 0.0
+        """How long the main loop spent between its calls to `get_data_packets`."""
+        self.max_lag_seconds = 0.0
+        """How long after its timestamp the latest packet was handed out, at most."""
+
+    @property
+    def requested_to_run(self) -> bool:
+        return self._requested_to_run
+
+    @property
+    def is_running(self) -> bool:
+        return self._requested_to_run and self._next_row < len(self._timestamps)
+
+    @property
+    def flight_seconds(self) -> float:
+        """How long the flight lasts, from the first packet to the last."""
+        return float(self._timestamps[-1] - self._timestamps[0]) if len(self._timestamps) else 0.0
+
+    def start(self) -> None:
+        self._requested_to_run = True
+        self._clock_seconds = float(self._timestamps[0]) if len(self._timestamps) else 0.0
+
+    def stop(self) -> None:
+        self._requested_to_run = False
+
+    def get_data_packets(self, block: bool = True) -> list[FIRMDataPacket]:
+        """
+        Returns the packets which arrived on the simulated clock since the last call.
+
+        :param block: If True, skips the clock ahead to the next packet if none arrived.
+        :return: The packets, or an empty list once the flight is over.
+        """
+        call_ns = time.perf_counter_ns()
+        if self._last_call_ns is not None:
+            loop_seconds = (call_ns - self._last_call_ns) / 1e9
+            self.busy_seconds += loop_seconds
+            self._clock_seconds += loop_seconds
+
+        if not self.is_running:
+            return []
+        next_timestamp = float(self._timestamps[self._next_row])
+        if next_timestamp > self._clock_seconds:
+            if not block:
+                self._last_call_ns = time.perf_counter_ns()
+                return []
+            self._clock_seconds = next_timestamp
+
+        end_row = int(np.searchsorted(self._timestamps, self._clock_seconds, side="right"))
+        self.max_lag_seconds = max(
+            self.max_lag_seconds, self._clock_seconds - float(self._timestamps[end_row - 1])
+        )
+        packets = list(
+            map(
+                FIRMDataPacket,
+                *(column[self._next_row : end_row].tolist() for column in self._columns),
+                strict=True,
+            )
+        )
+        self._next_row = end_row
+        # Making the packets is FIRM's work, not the main loop's:
+        self._last_call_ns = time.perf_counter_ns()
+        return packets
+
+
+def _to_sensor_frame(vectors: np.ndarray, tilt: float, rolls: np.ndarray) -> np.ndarray:
+    """
+    Turns vectors from the ground's frame into the frame of a sensor which is tilted about its y
+    axis, and then rolled about its z axis.
+
+    :param vectors: The x, y, and z of each vector, with z pointing up.
+    :param tilt: How far the sensor is tilted, in radians.
+    :param rolls: How far the sensor is rolled for each vector, in radians.
+    :return: The vectors as the sensor reads them.
+    """
+    x, y, z = vectors.T
+    # Undo the tilt:
+    tilted_x = x * np.cos(tilt) - z * np.sin(tilt)
+    tilted_z = x * np.sin(tilt) + z * np.cos(tilt)
+    # And then the roll:
+    return np.column_stack(
+        [
+            tilted_x * np.cos(rolls) + y * np.sin(rolls),
+            -tilted_x * np.sin(rolls) + y * np.cos(rolls),
+            tilted_z,
+        ]
+    )
+
+
+def _name_axes(name: str, values: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Splits readings into a column for each axis.
+
+    :param name: The name of the columns, with {} where the axis goes.
+    :param values: The x, y, and z readings, one row per reading.
+    :return: The columns, by name.
+    """
+    return {name.format(axis): values[:, i] for i, axis in enumerate("xyz")}
@@ -0,0 +1,158 @@
+"""
+Module for pinning the threads of a flight to their own cores, and giving the
+main loop a real time scheduling priority.
+"""
+
+import os
+from typing import TYPE_CHECKING
+
+import msgspec
+
+from airbrakes.constants import ThreadRole  # noqa: TC001 (doesn't work with msgspec)
+
+if TYPE_CHECKING:
+    import threading
+
+
+class PlacedThread(msgspec.Struct, frozen=True):
+    """Where a thread ended up running, after the ThreadPlacer placed it."""
+
+    role: ThreadRole
+    """What the thread does."""
+    name: str
+    """The name of the thread."""
+    native_id: int | None
+    """The ID the OS knows the thread by, or None if it isn't running."""
+    cores: tuple[int, ...]
+    """The cores the thread can run on, or empty if they couldn't be read."""
+    fifo_priority: int | None
+    """The SCHED_FIFO priority of the thread, or None if it is scheduled normally."""
+    notes: tuple[str, ...] = ()
+    """Why the thread isn't where it was meant to be, if it isn't."""
+
+    def __str__(self) -> str:
+        """Returns the placement as one line, to show at startup."""
+        cores = ",".join(map(str, self.cores)) or "?"
+        policy = "normal" if self.fifo_priority is None else f"SCHED_FIFO {self.fifo_priority}"
+        line = f"{self.role:<17} cores {cores:<16} {policy:<14} ({self.name}, {self.native_id})"
+        return f"{line}: {'; '.join(self.notes)}" if self.notes else line
+
+
+class ThreadPlacer:
+    """
+    Pins each thread of a flight to its cores with `os.sched_setaffinity`,
+    and gives the threads which should run before anything else on their cores
+    SCHED_FIFO with `os.sched_setscheduler`.
+
+    The threads are placed from the main thread by their native IDs, after
+    they were started, so none of the components have to know about it. When
+    a thread can't be placed, e.g. because its cores don't exist on this
+    computer, the program isn't running as root, or the OS doesn't support it,
+    the thread is left where it is, and the reason is noted in its
+    PlacedThread.
+    """
+
+    __slots__ = ("_cores", "_fifo_priorities", "placed_threads")
+
+    def __init__(
+        self,
+        cores: dict[ThreadRole, tuple[int, ...]],
+        fifo_priorities: dict[ThreadRole, int] | None = None,
+    ) -> None:
+        """
+        Initializes the ThreadPlacer.
+
+        :param cores: The cores to pin each thread to. The threads which aren't in it are left
+            where they are.
+        :param fifo_priorities: The SCHED_FIFO priority to give each thread, if it is pinned.
+        """
+        self._cores = cores
+        self._fifo_priorities = fifo_priorities or {}
+        self.placed_threads: list[PlacedThread] = []
+        """Where each thread ended up running, after `place` was called."""
+
+    def place(self, threads: dict[ThreadRole, threading.Thread]) -> list[PlacedThread]:
+        """
+        Places each thread on its cores, and gives it its priority.
+
+        :param threads: The threads of the flight, which must have been started.
+        :return: Where each thread ended up running, which is also kept as `placed_threads`.
+        """
+        if not hasattr(os, "sched_setaffinity"):
+            self.placed_threads = [
+                PlacedThread(
+                    role=role,
+                    name=thread.name,
+                    native_id=thread.native_id,
+                    cores=(),
+                    fifo_priority=None,
+                    notes=("this OS can't pin threads",),
+                )
+                for role, thread in threads.items()
+            ]
+            return self.placed_threads
+
+        # Read before any thread is pinned, as a pinned main thread would only see its own cores:
+        available_cores = os.sched_getaffinity(0)
+        self.placed_threads = [
+            self._place_thread(role, thread, available_cores) for role, thread in threads.items()
+        ]
+        return self.placed_threads
+
+    def _place_thread(
+        self, role: ThreadRole, thread: threading.Thread, available_cores: set[int]
+    ) -> PlacedThread:
+        """
+        Places one thread on its cores, and gives it its priority.
+
+        :param role: What the thread does.
+        :param thread: The thread to place.
+        :param available_cores: The cores the program is allowed to run on.
+        :return: Where the thread ended up running.
+        """
+        native_id = thread.native_id
+        if native_id is None or not thread.is_alive():
+            return PlacedThread(
+                role=role,
+                name=thread.name,
+                native_id=None,
+                cores=(),
+                fifo_priority=None,
+                notes=("not running",),
+            )
+
+        notes = []
+        wanted_cores = self._cores.get(role, ())
+        pinned = False
+        if wanted_cores:
+            cores = sorted(available_cores.intersection(wanted_cores))
+            if not cores:
+                notes.append(f"cores {','.join(map(str, wanted_cores))} aren't available")
+            else:
+                try:
+                    os.sched_setaffinity(native_id, cores)
+                    pinned = True
+                except OSError as e:
+                    notes.append(f"couldn't be pinned ({e.strerror})")
+
+        fifo_priority = self._fifo_priorities.get(role)
+        if pinned and fifo_priority is not None:
+            try:
+                os.sched_setscheduler(native_id, os.SCHED_FIFO, os.sched_param(fifo_priority))
+            except PermissionError:
+                notes.append("SCHED_FIFO needs root")
+            except OSError as e:
+                notes.append(f"couldn't get SCHED_FIFO ({e.strerror})")
+
+        return PlacedThread(
+            role=role,
+            name=thread.name,
+            native_id=native_id,
+            cores=tuple(sorted(os.sched_getaffinity(native_id))),
+            fifo_priority=(
+                os.sched_getparam(native_id).sched_priority
+                if os.sched_getscheduler(native_id) == os.SCHED_FIFO
+                else None
+            ),
+            notes=tuple(notes),
+        )
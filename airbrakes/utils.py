@@ -83,6 +83,21 @@ def get_all_packets_from_queue(packet_queue: queue.SimpleQueue, block: bool) ->
     return items
 
 
+def summarize_backlog(packets: list[Any], budget: int | None) -> list[Any]:
+    """
+    Spreads out a budget of packets evenly over a backlog, always keeping the newest packet.
+
+    :param packets: The packets, oldest first.
+    :param budget: The most packets to keep, or None to keep every packet.
+    :return: The packets to keep, oldest first, or `packets` itself if it is within the budget.
+    """
+    if budget is None or len(packets) <= budget:
+        return packets
+    # Every stride-th packet, counting back from the newest:
+    stride = -(-len(packets) // budget)
+    return packets[(len(packets) - 1) % stride :: stride]
+
+
 def deadband(input_value: float, threshold: float) -> float:
     """
     Returns 0.0 if input_value is within the deadband threshold.
@@ -112,6 +127,35 @@ def arg_parser() -> argparse.Namespace:
         "-v", "--verbose", action="store_true", help="Show the display with extended data."
     )
 
+    # The flights which run the main loop can profile it, and pin its threads:
+    profile_parser = argparse.ArgumentParser(add_help=False)
+    profile_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each stage of the main loop, show the times in the display with -v, and print"
+        " the p50, p99, and max of each stage at shutdown.",
+    )
+    profile_parser.add_argument(
+        "--profile-log",
+        action="store_true",
+        help="Also log how long each stage took in every loop. Implies --profile.",
+    )
+    profile_parser.add_argument(
+        "--pin-threads",
+        action=argparse.BooleanOptionalAction,
+        help="Pin the main loop, logger, apogee predictor, and display threads to their own cores"
+        " of the Pi, and run the main loop with SCHED_FIFO if run as root. Defaults to pinning"
+        " them in real and pretend flights, but not in mock replays.",
+    )
+    profile_parser.add_argument(
+        "--catch-up-budget",
+        type=int,
+        metavar="PACKETS",
+        help="The most FIRM packets the main loop processes in full in one loop. After a stall,"
+        " the state machine runs on that many packets spread over the backlog, and the logging"
+        " thread logs all of them. 0 processes every packet in full. Defaults to 20.",
+    )
+
     # Main Parser
     parser = argparse.ArgumentParser(
         description="Main parser for the Airbrakes program.", parents=[common_parser]
@@ -122,7 +166,7 @@ def arg_parser() -> argparse.Namespace:
     # Real Flight Parser
     real_parser = subparsers.add_parser(
         "real",
-        parents=[common_parser],
+        parents=[common_parser, profile_parser],
         help="Run real flight with hardware.",
         description="Configuration for the real flight.",
     )
@@ -133,7 +177,7 @@ def arg_parser() -> argparse.Namespace:
     # Mock Replay Parser
     mock_parser = subparsers.add_parser(
         "mock",
-        parents=[common_parser],
+        parents=[common_parser, profile_parser],
         help="Run in replay mode with mock data.",
         description="Configuration for the mock replay.",
     )
@@ -144,21 +188,43 @@ def arg_parser() -> argparse.Namespace:
     mock_parser.add_argument(
         "-l", "--keep-log-file", action="store_true", help="Keep the log file after replay stops."
     )
-    mock_parser.add_argument(
+    replay_speed_group = mock_parser.add_mutually_exclusive_group()
+    replay_speed_group.add_argument(
         "-f", "--fast-replay", action="store_true", help="Run replay at full speed."
     )
+    replay_speed_group.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Run the replay this many times faster than real time, from 0.25 to 50. Defaults"
+        " to 1.",
+    )
+    mock_parser.add_argument(
+        "--arrivals",
+        choices=["packets", "recorded", "synthetic"],
+        default="packets",
+        help="How to hand the packets to the main loop: one at a time (default), in the same"
+        " batches and at the same times as in the flight, or with random delays and bursts.",
+    )
+    mock_parser.add_argument(
+        "--start-at",
+        help="Start the replay part way through the flight: at a timestamp in seconds, or at a"
+        " state (Standby, MotorBurn, Coast, FreeFall, or Landed), optionally followed by an offset"
+        " in seconds, e.g. MotorBurn-2 or Coast+1.5.",
+    )
 
     mock_parser.add_argument(
         "-p",
         "--path",
-        help="Define the pathname of flight data to use in the mock replay. The first file"
-        " found in the launch_data directory will be used if not specified.",
+        help="Define the pathname of flight data to use in the mock replay, either a CSV log or a"
+        " raw .FRM log from FIRM. The first file found in the launch_data directory will be used"
+        " if not specified.",
         type=Path,
     )
 
     pretend_parser = subparsers.add_parser(
         "pretend",
-        parents=[common_parser],
+        parents=[common_parser, profile_parser],
         help="Run in pretend mode with FIRM outputting data from a previous log.",
         description="Configuration for the pretend replay.",
     )
@@ -179,4 +245,50 @@ def arg_parser() -> argparse.Namespace:
         "-l", "--keep-log-file", action="store_true", help="Keep the log file after replay stops."
     )
 
+    regress_parser = subparsers.add_parser(
+        "regress",
+        help="Run the air brakes over every flight in the launch data at once.",
+        description="Configuration for the regression run.",
+    )
+    regress_parser.add_argument(
+        "-p",
+        "--path",
+        nargs="+",
+        type=Path,
+        help="The logs of the flights to run, either CSV logs or raw .FRM logs from FIRM. Every"
+        " log in the launch_data directory is run if not specified.",
+    )
+    regress_parser.add_argument(
+        "--synthetic",
+        type=int,
+        help="How many synthetic flights to run along with the logs. Defaults to 4.",
+    )
+    regress_parser.add_argument(
+        "--target-apogee",
+        type=float,
+        help="The apogee in meters to aim for in every flight, instead of the target apogee of"
+        " each flight.",
+    )
+    regress_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="How many flights to run at once. Defaults to the number of cores.",
+    )
+    regress_parser.add_argument(
+        "-o", "--output", type=Path, help="Write the whole report to this JSON file."
+    )
+    regress_parser.add_argument(
+        "--faults",
+        action="store_true",
+        help="Inject faults into the packets of every flight: dropped and duplicated packets,"
+        " repeated and backwards timestamps, NaN bursts, stalls followed by a backlog, and clock"
+        " jumps, at the rates in airbrakes/mock/fault_injection.py.",
+    )
+    regress_parser.add_argument(
+        "--no-timing",
+        action="store_true",
+        help="Leave out how long the loops took, so the reports of two runs can be compared.",
+    )
+
     return parser.parse_args()
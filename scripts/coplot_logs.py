@@ -26,6 +26,7 @@ Fixes for "values exist but not plotted":
 from __future__ import annotations
 
 import argparse
+import io
 from pathlib import Path
 from typing import Optional
 
@@ -33,6 +34,9 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
+from airbrakes.data_handling.log_index import find_state_transition, read_log_index
+from airbrakes.data_handling.log_reader import read_log_bytes, read_log_schema
+
 
 G0 = 9.80665  # m/s^2 per g
 
@@ -145,12 +149,20 @@ def _sort_and_dedupe(df: pd.DataFrame, time_col: str = "t") -> pd.DataFrame:
 
 
 def load_firm_format(path: Path, motor_state: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+    schema = read_log_schema(path)
+    df = pd.read_csv(io.BytesIO(read_log_bytes(path)), dtype=schema.pandas_dtypes)
+    # The columns which rarely change are only written when they change:
+    df[schema.sparse_columns] = df[schema.sparse_columns].ffill()
 
     if "timestamp_seconds" not in df.columns:
         raise SystemExit(f"{path.name}: missing required column 'timestamp_seconds'")
 
-    t0 = find_motor_burn_start_time(df, "timestamp_seconds", motor_state)
+    # The log index knows where motor burn starts without scanning the log:
+    motor_burn = find_state_transition(read_log_index(path), motor_state)
+    if motor_burn is not None and motor_burn.timestamp_seconds is not None:
+        t0 = motor_burn.timestamp_seconds
+    else:
+        t0 = find_motor_burn_start_time(df, "timestamp_seconds", motor_state)
     if t0 is None:
         raise SystemExit(f"{path.name}: could not determine motor burn start time")
 
@@ -173,7 +185,7 @@ def load_firm_format(path: Path, motor_state: str) -> pd.DataFrame:
 
 
 def load_imu_format(path: Path, motor_state: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+    df = pd.read_csv(io.BytesIO(read_log_bytes(path)))
 
     if "timestamp" not in df.columns:
         raise SystemExit(f"{path.name}: missing required column 'timestamp' (ns)")
@@ -0,0 +1,34 @@
+"""
+Writes a schema alongside logs which were written before the logger wrote
+one, so they are read the same way as newer logs.
+
+The schema is built from the header row of each log, with the types of the
+LoggerDataPacket fields, and of the columns our older logs used to have.
+
+Usage:
+  python -m scripts.migrate_log_schema launch_data/real_firm_launches/*.csv
+"""
+
+import argparse
+from pathlib import Path
+
+from airbrakes.data_handling.log_reader import get_schema_path, read_log_schema, write_log_schema
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("logs", type=Path, nargs="+", help="Paths to the logs to migrate")
+    args = parser.parse_args()
+
+    for log_path in args.logs:
+        schema_path = get_schema_path(log_path)
+        if schema_path.exists():
+            print(f"{log_path}: already has a schema")
+            continue
+        schema = read_log_schema(log_path)
+        write_log_schema(log_path, schema)
+        print(f"{log_path}: wrote {schema_path.name} with {len(schema.columns)} columns")
+
+
+if __name__ == "__main__":
+    main()
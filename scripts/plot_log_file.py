@@ -5,17 +5,27 @@ Interactive Plotly viewer for FIRM CSV logs.
 
 Usage:
   python plot_firm_log.py path/to/log.csv
+  python plot_firm_log.py path/to/log.csv --from-state M --seconds-before 2 --until-state L
 """
 
 from __future__ import annotations
 
 import argparse
+import io
 from pathlib import Path
 from typing import Iterable
 
 import pandas as pd
 import plotly.graph_objects as go
 
+from airbrakes.data_handling.log_index import (
+    find_log_window,
+    find_state_transition,
+    read_log_index,
+    read_log_window_bytes,
+)
+from airbrakes.data_handling.log_reader import read_log_bytes, read_log_schema
+
 
 DEFAULT_TRACES = [
     # (column_name, pretty_label)
@@ -80,6 +90,22 @@ def main() -> None:
         action="store_true",
         help="Disable shaded regions for state_letter",
     )
+    ap.add_argument(
+        "--from-state",
+        default=None,
+        help="Only plot from where this state starts (e.g. M for MotorBurn), using the log index",
+    )
+    ap.add_argument(
+        "--until-state",
+        default=None,
+        help="Only plot until this state starts (e.g. L for Landed), using the log index",
+    )
+    ap.add_argument(
+        "--seconds-before",
+        type=float,
+        default=0.0,
+        help="How many seconds before --from-state to start plotting",
+    )
     ap.add_argument(
         "--out",
         type=Path,
@@ -91,8 +117,32 @@ def main() -> None:
     if not args.csv.exists():
         raise SystemExit(f"File not found: {args.csv}")
 
-    # Read CSV
-    df = pd.read_csv(args.csv)
+    # Read CSV, with the types of the columns from the schema of the log
+    schema = read_log_schema(args.csv)
+    dtypes = schema.pandas_dtypes
+    if args.from_state or args.until_state:
+        # Seek straight to the states we want instead of reading the whole log:
+        entries = read_log_index(args.csv)
+        start_seconds = end_seconds = None
+        if args.from_state:
+            start = find_state_transition(entries, args.from_state)
+            if start is None:
+                raise SystemExit(f"The log never got to state {args.from_state}")
+            start_seconds = start.timestamp_seconds - args.seconds_before
+        if args.until_state:
+            end = find_state_transition(entries, args.until_state)
+            end_seconds = end.timestamp_seconds if end else None
+        window = find_log_window(entries, start_seconds, end_seconds)
+        df = pd.read_csv(io.BytesIO(read_log_window_bytes(args.csv, *window)), dtype=dtypes)
+        if start_seconds is not None:
+            df = df[df["timestamp_seconds"] >= start_seconds]
+        if end_seconds is not None:
+            df = df[df["timestamp_seconds"] < end_seconds]
+    else:
+        df = pd.read_csv(io.BytesIO(read_log_bytes(args.csv)), dtype=dtypes)
+
+    # The columns which rarely change are only written when they change:
+    df[schema.sparse_columns] = df[schema.sparse_columns].ffill()
 
     if "timestamp_seconds" not in df.columns:
         raise SystemExit("CSV must contain 'timestamp_seconds' column")
@@ -115,7 +165,8 @@ def main() -> None:
         fig.add_trace(
             go.Scatter(
                 x=df["t"],
-                y=df[col],
+                # Some columns, like set_extension, are logged as strings:
+                y=pd.to_numeric(df[col], errors="coerce"),
                 mode="lines",
                 name=label,
             )
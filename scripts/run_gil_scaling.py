@@ -0,0 +1,56 @@
+"""
+Runs the full fast replay pipeline, the apogee predictor's work, and the
+logger's work on more and more threads at once, with the GIL disabled and
+enabled, to show how much running without the GIL gains.
+
+Each run is a Python process of its own, started with PYTHON_GIL set to 0 or
+1. For each one, the throughput of all the threads together, how long each
+loop, prediction, or call to log took, and how busy each thread was on
+average is printed.
+"""
+
+import argparse
+
+from airbrakes.constants import SCALING_THREAD_COUNTS, ScalingWorkload
+from airbrakes.mock.scaling import get_gil_settings, run_scaling_benchmark
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--threads",
+        nargs="+",
+        type=int,
+        default=SCALING_THREAD_COUNTS,
+        help="How many threads to run each workload on.",
+    )
+    parser.add_argument(
+        "--workloads",
+        nargs="+",
+        choices=list(ScalingWorkload),
+        default=list(ScalingWorkload),
+        help="The workloads to run.",
+    )
+    parser.add_argument(
+        "--items",
+        type=int,
+        help="How much work each thread does: the packets replayed or logged, or the apogees"
+        " predicted. Defaults to a few seconds' worth for each workload.",
+    )
+    args = parser.parse_args()
+
+    if get_gil_settings() == (True,):
+        print("This isn't the free-threaded build of Python, so it only runs with the GIL.\n")
+    print(
+        f"{'Workload':<10} {'GIL':<4} {'Threads':>7} {'Items/s':>12} {'p50 (us)':>9} "
+        f"{'p99 (us)':>9} {'max (us)':>10}  CPU per thread"
+    )
+    for workload in args.workloads:
+        for result in run_scaling_benchmark(
+            [ScalingWorkload(workload)], args.threads, items_per_thread=args.items
+        ):
+            print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Runs the main loop through synthetic flights at higher and higher packet
+rates, to find the rate at which `Context.update` can't keep up any more.
+
+Each flight is handed to the main loop as fast as it can take it, so the
+whole sweep takes about as long as the main loop is busy for.
+"""
+
+import argparse
+import tempfile
+from pathlib import Path
+
+from airbrakes.context import Context
+from airbrakes.data_handling.apogee_predictor import ApogeePredictor
+from airbrakes.data_handling.data_processor import DataProcessor
+from airbrakes.mock.mock_logger import MockLogger
+from airbrakes.mock.mock_servo import MockServo
+from airbrakes.mock.synthetic_flight import SyntheticFIRM, SyntheticFlight
+
+RATES_HZ = [100, 200, 500, 1000, 2000, 5000]
+
+
+def run_flight(rate_hz: float, logs_path: Path) -> SyntheticFIRM:
+    """Runs the main loop through a synthetic flight, and returns the FIRM it was fed by."""
+    firm = SyntheticFIRM(SyntheticFlight(rate_hz=rate_hz).generate())
+    context = Context(MockServo(), firm, MockLogger(logs_path), DataProcessor(), ApogeePredictor())
+    context.start(wait_for_start=True)
+    while firm.is_running and not context.shutdown_requested:
+        context.update()
+    context.stop()
+    return firm
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "rates", nargs="*", type=float, default=RATES_HZ, help="The packet rates to run, in Hz."
+    )
+    args = parser.parse_args()
+
+    print(f"{'Rate (Hz)':>10} {'Busy (s)':>10} {'Flight (s)':>11} {'Load':>7} {'Max lag (ms)':>13}")
+    with tempfile.TemporaryDirectory() as logs_path:
+        saturation_rate = None
+        for rate_hz in args.rates:
+            firm = run_flight(rate_hz, Path(logs_path))
+            # The main loop is saturated once it is busy for longer than the flight lasts:
+            load = firm.busy_seconds / firm.flight_seconds
+            if load >= 1.0 and saturation_rate is None:
+                saturation_rate = rate_hz
+            print(
+                f"{rate_hz:>10.0f} {firm.busy_seconds:>10.2f} {firm.flight_seconds:>11.1f} "
+                f"{load:>7.1%} {firm.max_lag_seconds * 1e3:>13.1f}"
+            )
+
+    if saturation_rate is None:
+        print("The main loop kept up with every rate.")
+    else:
+        print(f"The main loop can't keep up at {saturation_rate:.0f} Hz.")
+
+
+if __name__ == "__main__":
+    main()
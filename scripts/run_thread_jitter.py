@@ -0,0 +1,115 @@
+"""
+Measures the jitter of the main loop with its threads left wherever the
+scheduler puts them, and then with them pinned to the Pi's cores, as they are
+in a real flight.
+
+The main loop sleeps until each packet is due, as it waits for FIRM in a real
+flight, and then runs `Context.update` on the packets of a synthetic flight.
+How late it wakes up, and how late it is done, is measured while the logger
+and apogee predictor threads do their work, and busy threads stand in for the
+rest of the system. The main loop is only given SCHED_FIFO when run as root.
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from airbrakes.constants import PI_THREAD_CORES, THREAD_FIFO_PRIORITIES, ThreadRole
+from airbrakes.context import Context
+from airbrakes.data_handling.apogee_predictor import ApogeePredictor
+from airbrakes.data_handling.data_processor import DataProcessor
+from airbrakes.data_handling.loop_profiler import LatencyHistogram
+from airbrakes.mock.mock_logger import MockLogger
+from airbrakes.mock.mock_servo import MockServo
+from airbrakes.mock.synthetic_flight import SyntheticFIRM, SyntheticFlight
+from airbrakes.thread_placement import ThreadPlacer
+
+
+def keep_busy(stop: threading.Event) -> None:
+    """Keeps a core busy until told to stop, like the rest of the system would."""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def run_loop(
+    rate_hz: float, seconds: float, load_threads: int, pin: bool, logs_path: Path
+) -> tuple[LatencyHistogram, LatencyHistogram]:
+    """Runs the main loop on a timer, and returns how late each loop woke up, and was done."""
+    firm = SyntheticFIRM(SyntheticFlight(rate_hz=rate_hz).generate())
+    context = Context(MockServo(), firm, MockLogger(logs_path), DataProcessor(), ApogeePredictor())
+    stop = threading.Event()
+    # Started before anything is pinned, so they can run on every core:
+    load = [threading.Thread(target=keep_busy, args=(stop,)) for _ in range(load_threads)]
+    for thread in load:
+        thread.start()
+
+    context.start(wait_for_start=True)
+    if pin:
+        placer = ThreadPlacer(PI_THREAD_CORES, THREAD_FIFO_PRIORITIES)
+        placed_threads = placer.place(
+            {
+                ThreadRole.MAIN_LOOP: threading.current_thread(),
+                ThreadRole.LOGGER: context.logger.thread,
+                ThreadRole.APOGEE_PREDICTOR: context.apogee_predictor.thread,
+            }
+        )
+        for placed_thread in placed_threads:
+            print(f"  {placed_thread}")
+
+    wake_up = LatencyHistogram()
+    done = LatencyHistogram()
+    period_ns = round(1e9 / rate_hz)
+    deadline_ns = time.perf_counter_ns() + period_ns
+    end_ns = deadline_ns + round(seconds * 1e9)
+    while deadline_ns < end_ns and firm.is_running:
+        time.sleep(max(deadline_ns - time.perf_counter_ns(), 0) / 1e9)
+        wake_up.record(max(time.perf_counter_ns() - deadline_ns, 0))
+        context.update()
+        done.record(max(time.perf_counter_ns() - deadline_ns, 0))
+        deadline_ns += period_ns
+
+    context.stop()
+    stop.set()
+    for thread in load:
+        thread.join()
+    return wake_up, done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rate", type=float, default=100.0, help="How often the main loop runs, in Hz."
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=20.0, help="How long to run the main loop for each time."
+    )
+    parser.add_argument(
+        "--load",
+        type=int,
+        default=os.cpu_count() or 4,
+        help="How many busy threads stand in for the rest of the system. Defaults to one per core.",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as logs_path:
+        # Unpinned first, as the main thread stays pinned after:
+        for pin in (False, True):
+            print(f"Running {'pinned' if pin else 'unpinned'} for {args.seconds:.0f} s...")
+            results[pin] = run_loop(args.rate, args.seconds, args.load, pin, Path(logs_path))
+
+    print(f"\n{'':<10} {'':<8} {'p50 (us)':>10} {'p99 (us)':>10} {'max (us)':>10}")
+    for pin, histograms in results.items():
+        for name, histogram in zip(("Wake up", "Done"), histograms, strict=True):
+            print(
+                f"{'Pinned' if pin else 'Unpinned':<10} {name:<8} "
+                f"{histogram.percentile_ns(50) / 1e3:>10.1f} "
+                f"{histogram.percentile_ns(99) / 1e3:>10.1f} {histogram.max_ns / 1e3:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
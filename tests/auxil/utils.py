@@ -104,7 +104,9 @@ def make_servo_data_packet(**kwargs) -> ServoDataPacket:
 
     Provides dummy values for arguments not specified.
     """
-    dummy_values = dict.fromkeys(ServoDataPacket.__struct_fields__, "0.2")
+    # The servo command fields are left as None, as if the servo hadn't been told to move yet:
+    required_fields = ServoDataPacket.__struct_fields__[: -len(ServoDataPacket.__struct_defaults__)]
+    dummy_values = dict.fromkeys(required_fields, "0.2")
     return ServoDataPacket(**{**dummy_values, **kwargs})
 
 
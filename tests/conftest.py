@@ -8,6 +8,8 @@ from typing import TYPE_CHECKING
 
 import pytest
 
+import airbrakes.state
+from airbrakes import constants
 from airbrakes.constants import (
     ENCODER_PIN_A,
     ENCODER_PIN_B,
@@ -19,6 +21,7 @@ from airbrakes.data_handling.apogee_predictor import ApogeePredictor
 from airbrakes.data_handling.data_processor import DataProcessor
 from airbrakes.data_handling.logger import Logger
 from airbrakes.hardware.firm import FIRM
+from airbrakes.mock.lockstep import LockstepSimulation
 from airbrakes.mock.mock_firm import MockFIRM
 from airbrakes.mock.mock_servo import MockServo
 from tests.auxil.utils import make_firm_data_packet
@@ -32,10 +35,24 @@ LAUNCH_DATA = list(Path("launch_data").glob("*.csv"))
 LAUNCH_DATA_IDS = [log.stem for log in LAUNCH_DATA]
 
 
+@pytest.fixture(autouse=True)
+def restore_flight_constants(monkeypatch):
+    """
+    MockFIRM sets the rocket constants to the ones of the rocket it replays, and a regression
+    flight sets the target apogee, so they are put back after every test.
+    """
+    for name in dir(constants):
+        if name.startswith("ROCKET_"):
+            monkeypatch.setattr(constants, name, getattr(constants, name))
+    monkeypatch.setattr(
+        airbrakes.state, "TARGET_APOGEE_METERS", airbrakes.state.TARGET_APOGEE_METERS
+    )
+
+
 @pytest.fixture
 def logger():
     """Clear the tests/logs directory before making a new Logger."""
-    for log in LOG_PATH.glob("log_*.csv"):
+    for log in LOG_PATH.glob("log_*"):
         log.unlink()
     logger = Logger(LOG_PATH)
     yield logger
@@ -76,18 +93,20 @@ def context(idle_mock_firm, logger, servo, data_processor, apogee_predictor):
 
 
 @pytest.fixture
-def mock_firm_airbrakes(mock_firm, logger, servo, data_processor, apogee_predictor):
+def lockstep_simulation(mock_firm):
     """
-    Fixture that returns an Context object with a mock FIRM.
+    Fixture that returns a LockstepSimulation of the launch data of the mock_firm fixture, which
+    keeps its log in the tests/logs directory.
 
     This will run for all the launch data files (see the mock_firm
     fixture)
     """
-    ab = Context(servo, mock_firm, logger, data_processor, apogee_predictor)
-    yield ab
-    # Check if something is running:
-    if ab.firm.is_running or ab.apogee_predictor.is_running or ab.logger.is_running:
-        ab.stop()
+    for log in LOG_PATH.glob("log_*"):
+        log.unlink()
+    simulation = LockstepSimulation(mock_firm.iterate_packets(), LOG_PATH, delete_log_file=False)
+    yield simulation
+    if simulation.context.logger.is_running:
+        simulation.stop()
 
 
 @pytest.fixture
@@ -126,9 +145,16 @@ def mocked_args_parser():
         real_servo = False
         keep_log_file = False
         fast_replay = False
+        speed = 1.0
+        arrivals = "packets"
+        start_at = None
         debug = False
         path = None
         verbose = False
+        profile = False
+        profile_log = False
+        pin_threads = None
+        catch_up_budget = None
         sim = False
         real_firm = False
         pretend_firm = False
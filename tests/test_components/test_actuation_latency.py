@@ -0,0 +1,104 @@
+import math
+
+import polars as pl
+import pytest
+
+import airbrakes.state
+from airbrakes.constants import ServoExtension
+from airbrakes.data_handling.actuation_latency import ActuationLatency
+from airbrakes.data_handling.log_reader import scan_log
+from airbrakes.mock.closed_loop import ClosedLoopSimulation
+from airbrakes.mock.synthetic_flight import SyntheticFlight
+
+
+class TestActuationLatency:
+    """Tests the ActuationLatency class in actuation_latency.py."""
+
+    def test_slots(self):
+        inst = ActuationLatency()
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_no_packets_received(self):
+        actuation_latency = ActuationLatency()
+        servo_command = actuation_latency.record_command(ServoExtension.MAX_EXTENSION, 1, 0.5, 100)
+        assert servo_command.latency_ns is None
+        assert actuation_latency.last_command is servo_command
+        assert actuation_latency.get_report().commands == 0
+
+    def test_latency(self, monkeypatch):
+        """
+        Tests that the latency is measured from when the sample would have been received had it
+        come as quickly as the quickest packet.
+        """
+        clock_ns = iter([10_000_000, 22_000_000, 30_500_000])
+        monkeypatch.setattr("time.perf_counter_ns", lambda: next(clock_ns))
+        actuation_latency = ActuationLatency()
+        # Received 10 ms after it was sampled:
+        actuation_latency.receive(0.0)
+        # Received 2 ms after it was sampled, which is the quickest a packet has come:
+        actuation_latency.receive(0.02)
+        servo_command = actuation_latency.record_command(
+            ServoExtension.MAX_EXTENSION, 2, 0.02, 23_000_000
+        )
+        assert servo_command.loop_id == 2
+        assert servo_command.firm_timestamp_seconds == 0.02
+        assert servo_command.latency_ns == 1_000_000
+
+        # A packet which took longer to come doesn't change how the clocks are lined up:
+        actuation_latency.receive(0.025)
+        servo_command = actuation_latency.record_command(
+            ServoExtension.MIN_EXTENSION, 3, 0.025, 31_000_000
+        )
+        assert servo_command.latency_ns == 4_000_000
+
+        report = actuation_latency.get_report()
+        assert report.commands == 2
+        assert report.max_us == 4000.0
+        assert report.p50_us == pytest.approx(1000.0, rel=1 / 8)
+        assert str(report).endswith("over 2 servo commands")
+
+    def test_nan_timestamps(self):
+        actuation_latency = ActuationLatency()
+        actuation_latency.receive(math.nan)
+        assert (
+            actuation_latency.record_command(ServoExtension.MAX_EXTENSION, 1, 0.0, 0).latency_ns
+            is None
+        )
+        actuation_latency.receive(0.0)
+        assert (
+            actuation_latency.record_command(
+                ServoExtension.MAX_EXTENSION, 2, math.nan, 0
+            ).latency_ns
+            is None
+        )
+
+
+def test_closed_loop_flight_logs_servo_commands(tmp_path, monkeypatch):
+    """
+    Tests that every servo command of a flight is logged with the loop and FIRM packet which
+    caused it, and its latency.
+    """
+    monkeypatch.setattr(airbrakes.state, "TARGET_APOGEE_METERS", 2000.0)
+    simulation = ClosedLoopSimulation(SyntheticFlight(), tmp_path, delete_log_file=False)
+    simulation.run()
+    actuation_latency = simulation.context.actuation_latency
+    assert actuation_latency.histogram.count > 0
+    report = actuation_latency.get_report()
+    assert 0 < report.p50_us <= report.max_us
+
+    commands = (
+        scan_log(simulation.context.logger.log_path)
+        .select("command_loop_id", "command_firm_timestamp_seconds", "actuation_latency_ns")
+        .drop_nulls()
+        .unique(maintain_order=True)
+        .collect()
+    )
+    assert commands.height == actuation_latency.histogram.count
+    assert commands["command_loop_id"].is_sorted()
+    assert (commands["command_loop_id"] <= simulation.loops).all()
+    # The command was caused by a packet in the loop which issued it:
+    timestamps = scan_log(simulation.context.logger.log_path).select("timestamp_seconds").collect()
+    assert commands["command_firm_timestamp_seconds"].is_in(timestamps.to_series()).all()
+    assert commands["actuation_latency_ns"].max() == actuation_latency.histogram.max_ns
+    assert commands.schema["actuation_latency_ns"] == pl.Int64
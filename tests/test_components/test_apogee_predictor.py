@@ -40,6 +40,13 @@ class TestApogeePredictor:
         apogee_predictor.stop()
         assert not apogee_predictor.is_running
 
+    def test_wait_until_started(self, apogee_predictor):
+        assert not apogee_predictor.wait_until_started(timeout=0.01)
+        apogee_predictor.start()
+        assert apogee_predictor.wait_until_started(timeout=5)
+        assert apogee_predictor._prediction_thread.is_alive()
+        apogee_predictor.stop()
+
     def test_apogee_loop_add_to_queue(self, apogee_predictor):
         """Tests that the predictor adds to the queue when update is called."""
         packet = [make_processor_data_packet()]
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pytest
+
+from airbrakes.mock.arrival_patterns import RecordedArrivals, SyntheticArrivals
+from airbrakes.mock.mock_firm import MockFIRM
+
+# This launch has a few loops where the main loop got more than one packet:
+BATCHED_LAUNCH = Path("launch_data/real_firm_launches/jackpot_launch_4.csv")
+
+
+@pytest.fixture
+def replay_data(tmp_path):
+    return MockFIRM(log_file_path=BATCHED_LAUNCH, replay_cache_dir=tmp_path)._load_replay_data()
+
+
+def get_batch_sizes(batch_starts: np.ndarray, rows: int) -> list[int]:
+    return np.diff(batch_starts, append=rows).tolist()
+
+
+class TestRecordedArrivals:
+    """Tests the RecordedArrivals class in arrival_patterns.py."""
+
+    def test_batches_match_log(self, replay_data):
+        batch_starts, arrival_times = RecordedArrivals().get_batches(replay_data)
+        batch_sizes = get_batch_sizes(batch_starts, len(replay_data))
+
+        log = pl.read_csv(BATCHED_LAUNCH, columns=["retrieved_firm_packets", "update_timestamp_ns"])
+        assert batch_sizes == log["retrieved_firm_packets"].gather(batch_starts).to_list()
+        assert max(batch_sizes) == 9
+        assert sum(batch_sizes) == len(log)
+        assert arrival_times == pytest.approx(
+            log["update_timestamp_ns"].gather(batch_starts).to_numpy() / 1e9, abs=1e-6
+        )
+
+    def test_missing_update_timestamps(self, replay_data):
+        with pytest.raises(ValueError, match="update_timestamp_ns"):
+            RecordedArrivals().get_batches(replay_data[["timestamp_seconds"]])
+
+        with_missing_rows = replay_data[["timestamp_seconds", "update_timestamp_ns"]].astype(
+            [("timestamp_seconds", np.float64), ("update_timestamp_ns", np.float64)]
+        )
+        with_missing_rows["update_timestamp_ns"][5] = np.nan
+        with pytest.raises(ValueError, match="update_timestamp_ns"):
+            RecordedArrivals().get_batches(with_missing_rows)
+
+
+class TestSyntheticArrivals:
+    """Tests the SyntheticArrivals class in arrival_patterns.py."""
+
+    def test_same_seed_same_arrivals(self, replay_data):
+        first = SyntheticArrivals(seed=1).get_batches(replay_data)
+        second = SyntheticArrivals(seed=1).get_batches(replay_data)
+        other_seed = SyntheticArrivals(seed=2).get_batches(replay_data)
+        assert np.array_equal(first[0], second[0])
+        assert np.array_equal(first[1], second[1])
+        assert not np.array_equal(first[1], other_seed[1])
+
+    def test_no_jitter_or_bursts(self, replay_data):
+        model = SyntheticArrivals(jitter_ms=0.0, burst_probability=0.0)
+        batch_starts, arrival_times = model.get_batches(replay_data)
+        # Every packet arrives at its timestamp, so only packets with the same timestamp arrive
+        # together:
+        timestamps = replay_data["timestamp_seconds"]
+        assert len(batch_starts) == len(np.unique(timestamps))
+        assert np.array_equal(arrival_times, timestamps[batch_starts])
+
+    def test_bursts(self, replay_data):
+        model = SyntheticArrivals(jitter_ms=2.0, burst_probability=0.02, mean_burst_ms=200.0)
+        batch_starts, arrival_times = model.get_batches(replay_data)
+        batch_sizes = get_batch_sizes(batch_starts, len(replay_data))
+        assert sum(batch_sizes) == len(replay_data)
+        assert max(batch_sizes) > 10
+        # Packets never arrive before they were sent, or out of order:
+        assert np.all(arrival_times >= replay_data["timestamp_seconds"][batch_starts])
+        assert np.all(np.diff(arrival_times) > 0)
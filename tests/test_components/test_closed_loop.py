@@ -0,0 +1,138 @@
+import math
+
+import pytest
+
+import airbrakes.state
+from airbrakes.constants import SERVO_DELAY_SECONDS
+from airbrakes.mock.closed_loop import ClosedLoopFIRM, ClosedLoopSimulation
+from airbrakes.mock.fault_injection import FaultInjectingFIRM, FaultRates
+from airbrakes.mock.lockstep import LockstepServo
+from airbrakes.mock.synthetic_flight import NO_SENSOR_ERRORS, SyntheticFlight
+
+PERFECT_FLIGHT = SyntheticFlight(errors=NO_SENSOR_ERRORS)
+
+
+@pytest.fixture(scope="module")
+def open_loop_apogee():
+    """The apogee of the synthetic flight, which is flown with the air brakes retracted."""
+    return PERFECT_FLIGHT.generate()["est_position_z_meters"].max()
+
+
+def fly(firm: ClosedLoopFIRM) -> list:
+    """Flies the whole flight, and returns every packet."""
+    firm.start()
+    packets = []
+    while firm.is_running:
+        packets.extend(firm.get_data_packets())
+    return packets
+
+
+class TestClosedLoopFIRM:
+    """Tests the ClosedLoopFIRM class in closed_loop.py."""
+
+    def test_slots(self):
+        inst = ClosedLoopFIRM(PERFECT_FLIGHT)
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_retracted_flight_matches_synthetic_flight(self, open_loop_apogee):
+        """
+        Tests that with the air brakes retracted, the rocket flies like the synthetic flight,
+        which HPRM flies.
+        """
+        firm = ClosedLoopFIRM(PERFECT_FLIGHT)
+        assert math.isnan(firm.now_seconds())
+        packets = fly(firm)
+        assert firm.extension == 0.0
+        assert firm.apogee_meters == pytest.approx(open_loop_apogee, abs=1.0)
+        assert max(packet.est_position_z_meters for packet in packets) == pytest.approx(
+            firm.apogee_meters
+        )
+        timestamps = [packet.timestamp_seconds for packet in packets]
+        assert timestamps[0] == 0.0
+        assert timestamps == sorted(timestamps)
+        assert firm.now_seconds() == timestamps[-1]
+        # The flight is over once the rocket has lain on the ground for a while:
+        assert packets[-1].est_position_z_meters == 0.0
+        assert len(packets) == pytest.approx(len(PERFECT_FLIGHT.generate()), abs=10)
+        assert firm.get_data_packets() == []
+
+    @pytest.mark.parametrize("batch_size", [1, 4])
+    def test_batch_size(self, batch_size):
+        firm = ClosedLoopFIRM(PERFECT_FLIGHT, batch_size)
+        firm.start()
+        assert len(firm.get_data_packets()) == batch_size
+        assert firm.now_seconds() == pytest.approx((batch_size - 1) / PERFECT_FLIGHT.rate_hz)
+        firm.stop()
+        assert not firm.is_running
+        assert firm.get_data_packets() == []
+
+    def test_extended_air_brakes_lower_apogee(self, open_loop_apogee):
+        """Tests that the air brakes slow the rocket down once they are extended."""
+        firm = ClosedLoopFIRM(PERFECT_FLIGHT)
+        firm.servo = LockstepServo(firm.now_seconds)
+        firm.start()
+        # The air brakes are told to extend on the pad, so they are all the way out by burnout:
+        firm.servo.extend_airbrakes()
+        firm.get_data_packets()
+        seconds = 0.0
+        while seconds < SERVO_DELAY_SECONDS / 2:
+            seconds = firm.get_data_packets()[-1].timestamp_seconds
+        assert firm.extension == pytest.approx(0.5, abs=0.02)
+
+        fly(firm)
+        assert firm.extension == 1.0
+        assert firm.apogee_meters < open_loop_apogee - 300.0
+
+    def test_same_flight_same_packets(self):
+        flight = SyntheticFlight(seed=2)
+        first_packets = fly(ClosedLoopFIRM(flight, batch_size=3))
+        second_packets = fly(ClosedLoopFIRM(flight, batch_size=3))
+        assert [packet.pressure_pascals for packet in first_packets] == [
+            packet.pressure_pascals for packet in second_packets
+        ]
+
+
+class TestClosedLoopSimulation:
+    """Tests the ClosedLoopSimulation class in closed_loop.py."""
+
+    def test_slots(self, tmp_path):
+        inst = ClosedLoopSimulation(PERFECT_FLIGHT, tmp_path)
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_init(self, tmp_path):
+        """
+        Tests that the simulation is set up like a LockstepSimulation, with a ClosedLoopFIRM
+        whose air brakes follow the servo of the Context.
+        """
+        simulation = ClosedLoopSimulation(PERFECT_FLIGHT, tmp_path, faults=FaultRates())
+        assert isinstance(simulation.firm, ClosedLoopFIRM)
+        assert isinstance(simulation.context.firm, FaultInjectingFIRM)
+        assert simulation.firm.servo is simulation.context.servo
+        assert simulation.loops == 0
+        assert simulation.wall_seconds == 0.0
+        assert simulation.flight_seconds == 0.0
+
+    def test_air_brakes_change_apogee(self, tmp_path, monkeypatch, open_loop_apogee):
+        """
+        Tests that the air brakes extend when the rocket would go over the target, and that it
+        brings the apogee down towards the target, the same way every run.
+        """
+        monkeypatch.setattr(airbrakes.state, "TARGET_APOGEE_METERS", 2000.0)
+        apogees = []
+        for _ in range(2):
+            simulation = ClosedLoopSimulation(SyntheticFlight(), tmp_path)
+            simulation.run()
+            assert simulation.context.state.name == "LandedState"
+            assert simulation.firm.servo is simulation.context.servo
+            apogees.append(simulation.firm.apogee_meters)
+        assert apogees[0] == apogees[1]
+        assert 2000.0 < apogees[0] < open_loop_apogee - 50.0
+
+    def test_unreachable_target(self, tmp_path, monkeypatch, open_loop_apogee):
+        """Tests that the air brakes stay retracted if the rocket can't reach the target."""
+        monkeypatch.setattr(airbrakes.state, "TARGET_APOGEE_METERS", 3000.0)
+        simulation = ClosedLoopSimulation(PERFECT_FLIGHT, tmp_path)
+        simulation.run()
+        assert simulation.firm.apogee_meters == pytest.approx(open_loop_apogee, abs=1.0)
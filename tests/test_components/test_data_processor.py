@@ -241,6 +241,44 @@ class TestDataProcessor:
         initial_altitude = np.mean(altitudes[:10])
         assert d.max_altitude == pytest.approx(max(altitudes) - initial_altitude)
 
+    def test_nan_readings_keep_maxima(self, data_processor):
+        """Tests that a burst of NaN readings doesn't reset the max altitude and velocity."""
+        d = data_processor
+        d.update(
+            [
+                make_firm_data_packet(
+                    timestamp_seconds=i * 0.01,
+                    est_position_z_meters=float(i),
+                    est_velocity_z_meters_per_s=float(i),
+                )
+                for i in range(10)
+            ]
+        )
+        max_altitude = d.max_altitude
+        d.update(
+            [
+                make_firm_data_packet(
+                    timestamp_seconds=0.1,
+                    est_position_z_meters=np.nan,
+                    est_velocity_z_meters_per_s=np.nan,
+                )
+            ]
+        )
+        d.update([make_firm_data_packet(timestamp_seconds=0.11, est_position_z_meters=1.0)])
+        assert d.max_altitude == max_altitude
+        assert d.max_vertical_velocity == 9.0
+
+        # Nor make every altitude integrated after them NaN, while the air brakes are extended:
+        altitude = d.current_altitude
+        d.prepare_for_extending_airbrakes()
+        d.update(
+            [
+                make_firm_data_packet(timestamp_seconds=0.12, est_velocity_z_meters_per_s=np.nan),
+                make_firm_data_packet(timestamp_seconds=0.13, est_velocity_z_meters_per_s=10.0),
+            ]
+        )
+        assert d.current_altitude == pytest.approx(altitude + 0.1)
+
     def test_properties_values(self, data_processor):
         """
         Manually sets internal state to verify properties return correct
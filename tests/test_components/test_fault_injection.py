@@ -0,0 +1,182 @@
+import itertools
+import math
+
+import msgspec
+import pytest
+from firm_client import FIRMDataPacket
+
+from airbrakes.mock.fault_injection import NO_FAULTS, FaultInjectingFIRM, FaultRates
+from airbrakes.mock.lockstep import LockstepFIRM, LockstepSimulation
+from airbrakes.mock.synthetic_flight import SyntheticFlight
+from tests.auxil.utils import make_firm_data_packet
+
+PACKET_PERIOD_SECONDS = 0.01
+
+
+def make_firm(faults: FaultRates, packets: int = 10, batch_size: int = 1) -> FaultInjectingFIRM:
+    """Makes a FaultInjectingFIRM over packets 10 ms apart, and starts it."""
+    firm = FaultInjectingFIRM(
+        LockstepFIRM(
+            (
+                make_firm_data_packet(
+                    timestamp_seconds=round(i * PACKET_PERIOD_SECONDS, 2),
+                    est_position_z_meters=float(i),
+                )
+                for i in range(packets)
+            ),
+            batch_size,
+        ),
+        faults,
+    )
+    firm.start()
+    return firm
+
+
+def get_all_packets(firm: FaultInjectingFIRM) -> list:
+    """Gets every packet the FIRM hands out, until it stops running."""
+    packets = []
+    while firm.is_running:
+        packets.extend(firm.get_data_packets())
+    return packets
+
+
+class TestFaultInjectingFIRM:
+    """Tests the FaultInjectingFIRM class in fault_injection.py."""
+
+    def test_slots(self):
+        inst = FaultInjectingFIRM(LockstepFIRM([]), FaultRates())
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_no_faults(self):
+        firm = make_firm(NO_FAULTS)
+        assert firm.requested_to_run
+        packets = get_all_packets(firm)
+        assert [packet.est_position_z_meters for packet in packets] == list(range(10))
+        assert not any(msgspec.structs.asdict(firm.injected).values())
+        firm.stop()
+        assert not firm.requested_to_run
+
+    def test_dropped_packets(self):
+        firm = make_firm(msgspec.structs.replace(NO_FAULTS, drop_probability=1.0))
+        assert get_all_packets(firm) == []
+        assert firm.injected.dropped == 10
+
+    def test_duplicated_packets(self):
+        firm = make_firm(msgspec.structs.replace(NO_FAULTS, duplicate_probability=1.0), 3)
+        packets = get_all_packets(firm)
+        assert [packet.est_position_z_meters for packet in packets] == [0, 0, 1, 1, 2, 2]
+        assert firm.injected.duplicated == 3
+
+    def test_repeated_timestamps(self):
+        firm = make_firm(msgspec.structs.replace(NO_FAULTS, repeated_timestamp_probability=1.0))
+        packets = get_all_packets(firm)
+        assert {packet.timestamp_seconds for packet in packets} == {0.0}
+        # The readings aren't changed:
+        assert [packet.est_position_z_meters for packet in packets] == list(range(10))
+        assert firm.injected.repeated_timestamps == 9
+
+    def test_backwards_timestamps(self):
+        firm = make_firm(
+            msgspec.structs.replace(
+                NO_FAULTS, backwards_timestamp_probability=1.0, backwards_timestamp_seconds=0.005
+            )
+        )
+        timestamps = [packet.timestamp_seconds for packet in get_all_packets(firm)]
+        assert timestamps == pytest.approx([-0.005 * i for i in range(10)])
+        assert firm.injected.backwards_timestamps == 9
+
+    def test_nan_bursts(self):
+        firm = make_firm(
+            msgspec.structs.replace(NO_FAULTS, nan_burst_probability=0.2, mean_nan_burst_packets=3),
+            packets=200,
+        )
+        packets = get_all_packets(firm)
+        nan_packets = [packet for packet in packets if math.isnan(packet.est_position_z_meters)]
+        assert len(nan_packets) == firm.injected.nan_packets
+        assert 0 < len(nan_packets) < len(packets)
+        for packet in nan_packets:
+            assert not math.isnan(packet.timestamp_seconds)
+            assert math.isnan(packet.est_velocity_z_meters_per_s)
+            assert math.isnan(packet.raw_acceleration_z_gs)
+
+    def test_clock_jumps(self):
+        firm = make_firm(
+            msgspec.structs.replace(NO_FAULTS, clock_jump_probability=1.0, clock_jump_seconds=0.5)
+        )
+        timestamps = [packet.timestamp_seconds for packet in get_all_packets(firm)]
+        # The clock jumps at every packet, and stays jumped:
+        steps = [
+            later - earlier - PACKET_PERIOD_SECONDS
+            for earlier, later in itertools.pairwise(timestamps)
+        ]
+        assert [abs(step) for step in steps] == pytest.approx([0.5] * 9)
+        assert len({step > 0 for step in steps}) == 2
+        assert firm.injected.clock_jumps == 10
+
+    def test_stall_and_backlog(self):
+        """
+        Tests that nothing is handed out during a stall, and that the packets held back are
+        handed out at once when it ends.
+        """
+        firm = make_firm(
+            msgspec.structs.replace(NO_FAULTS, stall_probability=1.0, stall_seconds=0.05),
+            packets=12,
+        )
+        batches = []
+        while firm.is_running:
+            batches.append([packet.est_position_z_meters for packet in firm.get_data_packets()])
+            if batches[-1]:
+                assert firm.last_backlog_packets == len(batches[-1])
+            else:
+                assert firm.last_backlog_packets == 0
+        # Each stall starts at the packet the one before it ended at:
+        assert [batch for batch in batches if batch] == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9], [10, 11]]
+        assert firm.injected.stalls == 3
+
+    def test_layered_faults(self):
+        """Tests that a FaultInjectingFIRM can inject faults into another one."""
+        inner = make_firm(msgspec.structs.replace(NO_FAULTS, duplicate_probability=1.0), 3)
+        firm = FaultInjectingFIRM(
+            inner, msgspec.structs.replace(NO_FAULTS, repeated_timestamp_probability=1.0)
+        )
+        assert firm.firm is inner
+        packets = get_all_packets(firm)
+        assert [packet.est_position_z_meters for packet in packets] == [0, 0, 1, 1, 2, 2]
+        assert {packet.timestamp_seconds for packet in packets} == {0.0}
+
+    def test_same_seed_same_faults(self):
+        faults = FaultRates(drop_probability=0.2, nan_burst_probability=0.05, seed=3)
+        first_packets = get_all_packets(make_firm(faults, packets=100, batch_size=3))
+        second_packets = get_all_packets(make_firm(faults, packets=100, batch_size=3))
+        assert [packet.timestamp_seconds for packet in first_packets] == [
+            packet.timestamp_seconds for packet in second_packets
+        ]
+
+
+def test_simulation_drains_backlog(tmp_path):
+    """
+    Tests that the air brakes still fly the whole flight with every fault injected, and that
+    the main loop gets each backlog in one go.
+    """
+    packets = SyntheticFlight().generate().iter_rows()
+    simulation = LockstepSimulation(
+        (FIRMDataPacket(*row) for row in packets),
+        tmp_path,
+        faults=FaultRates(stall_probability=0.001, seed=1),
+    )
+    firm = simulation.context.firm
+    assert isinstance(firm, FaultInjectingFIRM)
+    assert firm.firm is simulation.firm
+
+    simulation.start()
+    backlogs = []
+    while simulation.step():
+        if firm.last_backlog_packets:
+            assert len(simulation.context.firm_data_packets) >= firm.last_backlog_packets
+            backlogs.append(firm.last_backlog_packets)
+    simulation.stop()
+    assert simulation.context.state.name == "LandedState"
+    assert firm.injected.stalls > 0
+    # A stall of a second holds back a second's worth of packets:
+    assert backlogs[0] == pytest.approx(SyntheticFlight().rate_hz, rel=0.05)
@@ -0,0 +1,156 @@
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pytest
+from firm_client import FIRMDataPacket
+
+from airbrakes.constants import FIRM_PACKET_INPUT_FIELDS, FRM_HEADER_BYTES
+from airbrakes.mock.frm_reader import (
+    FRMHeader,
+    is_frm_log,
+    read_frm_log,
+    read_frm_packets,
+)
+
+RAW_LOGS = sorted(Path("launch_data/raw_firm_data").glob("*.FRM"))
+RAW_LOG = Path("launch_data/raw_firm_data/jackpot_1_airbrakes.FRM")
+# The same flight, logged by the air brakes while FIRM replayed the raw log:
+PRETENDED_LOG = Path("launch_data/pretended_firm_launches/jackpot_1_airbrakes.csv")
+
+
+@pytest.fixture(scope="module")
+def frm_log():
+    return read_frm_log(RAW_LOG)
+
+
+@pytest.fixture(scope="module")
+def frm_packets():
+    return read_frm_packets(RAW_LOG)
+
+
+@pytest.fixture(scope="module")
+def pretended_log():
+    return pl.read_csv(PRETENDED_LOG)
+
+
+def assert_all_decoded(logged: pl.Series, decoded: np.ndarray) -> None:
+    """Asserts that every logged value is one of the decoded values, rounded to a float32."""
+    decoded = np.sort(decoded)
+    logged = logged.to_numpy()
+    nearest = np.clip(np.searchsorted(decoded, logged), 1, len(decoded) - 1)
+    errors = np.minimum(np.abs(decoded[nearest] - logged), np.abs(decoded[nearest - 1] - logged))
+    assert errors.max() <= 1e-5
+
+
+class TestFRMHeader:
+    """Tests the FRMHeader class in frm_reader.py."""
+
+    def test_from_bytes(self):
+        header = FRMHeader.from_bytes(RAW_LOG.read_bytes()[:FRM_HEADER_BYTES])
+        assert header.frequency_hz == 100
+        assert header.firmware_version.startswith("v")
+        assert header.acceleration_scale == 16384
+        assert header.pressure_scale == 64
+        assert len(header.accelerometer_calibration.scale_matrix) == 9
+
+    @pytest.mark.parametrize("data", [b"", b"state_letter,timestamp_seconds\n", b"FIRM LOG v1.3\n"])
+    def test_not_a_frm_log(self, data):
+        with pytest.raises(ValueError, match="Not a FIRM log"):
+            FRMHeader.from_bytes(data)
+
+
+class TestReadFRMLog:
+    """Tests the read_frm_log function in frm_reader.py."""
+
+    def test_is_frm_log(self):
+        assert is_frm_log(RAW_LOG)
+        assert is_frm_log(Path("LOG.frm"))
+        assert not is_frm_log(PRETENDED_LOG)
+
+    @pytest.mark.parametrize("log_path", RAW_LOGS, ids=[path.stem for path in RAW_LOGS])
+    def test_all_logs_decode(self, log_path):
+        frm_log = read_frm_log(log_path)
+        assert len(frm_log.frame_types) > 50_000
+        # The timestamps keep going up after the clock wraps around:
+        assert np.all(np.diff(frm_log.frame_timestamps) >= 0)
+        assert frm_log.frame_timestamps[-1] - frm_log.frame_timestamps[0] > 30
+        # FIRM feels 1 g on the pad:
+        pad_acceleration = frm_log.accelerations[:100].mean(axis=0)
+        assert np.linalg.norm(pad_acceleration) == pytest.approx(1.0, abs=0.05)
+        assert 80_000 < frm_log.pressures[0] < 110_000
+
+    def test_readings_match_pretended_log(self, frm_log, pretended_log):
+        """
+        Tests that the readings are decoded the same as FIRM decoded them, when it replayed
+        the log to the air brakes.
+        """
+        pretended_log = pretended_log.filter(
+            pl.col("timestamp_seconds") >= frm_log.frame_timestamps[0]
+        )
+        # FIRM's timestamps were rounded to floats:
+        timestamps = pretended_log["timestamp_seconds"].to_numpy()
+        nearest_frames = np.searchsorted(frm_log.frame_timestamps, timestamps - 1e-6)
+        assert frm_log.frame_timestamps[nearest_frames] == pytest.approx(timestamps, abs=1e-6)
+        assert_all_decoded(pretended_log["pressure_pascals"], frm_log.pressures)
+        for i, axis in enumerate("xyz"):
+            assert_all_decoded(
+                pretended_log[f"raw_acceleration_{axis}_gs"], frm_log.accelerations[:, i]
+            )
+            assert_all_decoded(
+                pretended_log[f"magnetic_field_{axis}_microteslas"], frm_log.magnetic_fields[:, i]
+            )
+
+    def test_truncated_log(self, tmp_path, frm_log):
+        """Tests that a frame which was cut off when FIRM lost power is left out."""
+        log_path = tmp_path / "truncated.FRM"
+        log_path.write_bytes(RAW_LOG.read_bytes()[: FRM_HEADER_BYTES + 100_003])
+        truncated = read_frm_log(log_path)
+        frames = len(truncated.frame_types)
+        assert 0 < frames < len(frm_log.frame_types)
+        assert np.array_equal(truncated.frame_timestamps, frm_log.frame_timestamps[:frames])
+
+    def test_unknown_frame(self, tmp_path):
+        log_path = tmp_path / "corrupt.FRM"
+        data = bytearray(RAW_LOG.read_bytes()[: FRM_HEADER_BYTES + 10_000])
+        data[FRM_HEADER_BYTES] = ord("X")
+        log_path.write_bytes(data)
+        with pytest.raises(ValueError, match=f"Unknown frame type .* {FRM_HEADER_BYTES}"):
+            read_frm_log(log_path)
+
+
+class TestReadFRMPackets:
+    """Tests the read_frm_packets function in frm_reader.py."""
+
+    def test_packet_fields(self, frm_packets):
+        assert frm_packets.columns == list(FIRM_PACKET_INPUT_FIELDS)
+        assert frm_packets.null_count().sum_horizontal().item() == 0
+        timestamps = frm_packets["timestamp_seconds"].to_numpy()
+        assert np.median(np.diff(timestamps)) == pytest.approx(0.01, rel=0.05)
+
+    def test_pad_orientation(self, frm_packets):
+        """Tests that the packets made on the pad point up, with gravity straight down."""
+        packets = [FIRMDataPacket(*row) for row in frm_packets.head(100).iter_rows()]
+        for packet in packets:
+            assert packet.raw_rotated_acceleration_z_gs == pytest.approx(1.0, abs=0.05)
+        assert frm_packets["est_position_z_meters"][0] == pytest.approx(0.0, abs=1.0)
+
+    @pytest.mark.parametrize(
+        "log_name",
+        ["government_work_2_airbrakes", "jackpot_1_airbrakes", "jackpot_1_nosecone"],
+    )
+    def test_estimates_match_firm(self, log_name):
+        """Tests that the estimated flight is close to the flight FIRM estimated."""
+        frm_packets = read_frm_packets(Path(f"launch_data/raw_firm_data/{log_name}.FRM"))
+        pretended_log = pl.read_csv(
+            Path(f"launch_data/pretended_firm_launches/{log_name}.csv"),
+            columns=["est_position_z_meters", "est_velocity_z_meters_per_s"],
+        )
+        assert frm_packets["est_position_z_meters"].max() == pytest.approx(
+            pretended_log["est_position_z_meters"].max(), rel=0.02
+        )
+        assert frm_packets["est_velocity_z_meters_per_s"].max() == pytest.approx(
+            pretended_log["est_velocity_z_meters_per_s"].max(), rel=0.15
+        )
+        # It lands where it took off from:
+        assert frm_packets["est_position_z_meters"][-1] == pytest.approx(0.0, abs=10.0)
@@ -0,0 +1,300 @@
+import math
+
+import numpy as np
+import polars as pl
+import pytest
+from firm_client import FIRMDataPacket
+
+from airbrakes.constants import SERVO_DELAY_SECONDS, ServoExtension
+from airbrakes.data_handling.apogee_predictor import make_rocket, predict_apogee
+from airbrakes.data_handling.log_reader import scan_log
+from airbrakes.mock.lockstep import (
+    InlineApogeePredictor,
+    LockstepFIRM,
+    LockstepServo,
+    LockstepSimulation,
+    PredictionLatency,
+    SynchronousLogger,
+)
+from airbrakes.mock.synthetic_flight import SyntheticFlight
+from airbrakes.state import CoastState
+from tests.auxil.utils import (
+    make_context_data_packet,
+    make_firm_data_packet,
+    make_processor_data_packet,
+    make_servo_data_packet,
+)
+
+
+class FlightClock:
+    """A clock of the flight which the tests move on by hand."""
+
+    __slots__ = ("now",)
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def synthetic_packets():
+    return [FIRMDataPacket(*row) for row in SyntheticFlight().generate().iter_rows()]
+
+
+class TestLockstepFIRM:
+    """Tests the LockstepFIRM class in lockstep.py."""
+
+    def test_slots(self):
+        inst = LockstepFIRM([])
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    @pytest.mark.parametrize("batch_size", [1, 3])
+    def test_batches(self, batch_size):
+        packets = [make_firm_data_packet(timestamp_seconds=float(i)) for i in range(7)]
+        firm = LockstepFIRM(packets, batch_size)
+        assert not firm.is_running
+        assert firm.get_data_packets() == []
+
+        firm.start()
+        assert firm.requested_to_run
+        batches = []
+        while firm.is_running:
+            batches.append(firm.get_data_packets())
+        assert [len(batch) for batch in batches[:-1]] == [batch_size] * (len(batches) - 1)
+        assert [packet for batch in batches for packet in batch] == packets
+        # Once the packets run out, there are no more:
+        assert firm.get_data_packets() == []
+
+    def test_batch_sizes_in_turn(self):
+        """Tests that the batches come in the sizes given, then one at a time."""
+        packets = [make_firm_data_packet(timestamp_seconds=float(i)) for i in range(7)]
+        firm = LockstepFIRM(packets, [2, 0, 3])
+        firm.start()
+        batches = []
+        while firm.is_running:
+            batches.append(firm.get_data_packets())
+        assert [len(batch) for batch in batches] == [2, 3, 1, 1]
+
+    def test_now_seconds(self):
+        firm = LockstepFIRM(make_firm_data_packet(timestamp_seconds=float(i)) for i in range(5))
+        assert math.isnan(firm.now_seconds())
+        firm = LockstepFIRM(
+            (make_firm_data_packet(timestamp_seconds=float(i)) for i in range(5)), batch_sizes=2
+        )
+        firm.start()
+        # The clock starts at the first packet, and moves on to the last packet handed out:
+        assert firm.now_seconds() == 0.0
+        firm.get_data_packets()
+        assert firm.now_seconds() == 1.0
+        firm.get_data_packets()
+        assert firm.now_seconds() == 3.0
+
+    def test_stop(self):
+        firm = LockstepFIRM(make_firm_data_packet() for _ in range(3))
+        firm.start()
+        assert len(firm.get_data_packets()) == 1
+        firm.stop()
+        assert not firm.is_running
+        assert not firm.requested_to_run
+        assert firm.get_data_packets() == []
+
+
+class TestInlineApogeePredictor:
+    """Tests the InlineApogeePredictor class in lockstep.py."""
+
+    def test_slots(self):
+        inst = InlineApogeePredictor()
+        for attr in inst.__slots__:
+            val = getattr(inst, attr, "err")
+            if isinstance(val, np.ndarray):
+                continue
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_start_stop(self):
+        apogee_predictor = InlineApogeePredictor()
+        assert not apogee_predictor.is_running
+        apogee_predictor.start()
+        assert apogee_predictor.is_running
+        apogee_predictor.stop()
+        assert not apogee_predictor.is_running
+
+    def test_prediction_is_handed_back_once(self):
+        """Tests that the prediction is made straight away, and handed back only once."""
+        apogee_predictor = InlineApogeePredictor()
+        apogee_predictor.start()
+        packet = make_processor_data_packet(
+            current_altitude=500.0, vertical_velocity_meters_per_s=150.0, tilt_angle_degrees=5.0
+        )
+        apogee_predictor.update(packet)
+        assert apogee_predictor.processor_data_packet_queue_size == 0
+
+        prediction = apogee_predictor.get_prediction_data_packet()
+        assert prediction == predict_apogee(make_rocket(), packet)
+        assert prediction.predicted_apogee > 500.0
+        assert apogee_predictor.get_prediction_data_packet() is None
+        apogee_predictor.stop()
+
+    def test_no_prediction_when_stopped(self):
+        apogee_predictor = InlineApogeePredictor()
+        apogee_predictor.update(make_processor_data_packet())
+        assert apogee_predictor.get_prediction_data_packet() is None
+
+    def test_prediction_latency(self):
+        """
+        Tests that a prediction is only handed back once it is done on the clock of the flight,
+        and that only the newest data waiting for it is predicted with next.
+        """
+        clock = FlightClock()
+        apogee_predictor = InlineApogeePredictor(PredictionLatency(base_seconds=0.1), clock)
+        apogee_predictor.start()
+        packets = [
+            make_processor_data_packet(
+                current_altitude=500.0 + i, vertical_velocity_meters_per_s=150.0
+            )
+            for i in range(3)
+        ]
+        apogee_predictor.update(packets[0])
+        assert apogee_predictor.processor_data_packet_queue_size == 0
+
+        clock.now = 0.05
+        apogee_predictor.update(packets[1])
+        apogee_predictor.update(packets[2])
+        assert apogee_predictor.processor_data_packet_queue_size == 1
+        assert apogee_predictor.get_prediction_data_packet() is None
+
+        clock.now = 0.1
+        rocket = make_rocket()
+        assert apogee_predictor.get_prediction_data_packet() == predict_apogee(rocket, packets[0])
+        # The newest data went straight into the next prediction, and the rest was skipped:
+        assert apogee_predictor.processor_data_packet_queue_size == 0
+        clock.now = 0.15
+        assert apogee_predictor.get_prediction_data_packet() is None
+        clock.now = 0.2
+        assert apogee_predictor.get_prediction_data_packet() == predict_apogee(rocket, packets[2])
+
+    def test_prediction_latency_jitter_is_seeded(self):
+        """Tests that the random part of the latency is the same every time it is started."""
+        latency = PredictionLatency(base_seconds=0.01, jitter_seconds=0.05, seed=3)
+        done_times = []
+        for _ in range(2):
+            clock = FlightClock()
+            apogee_predictor = InlineApogeePredictor(latency, clock)
+            apogee_predictor.start()
+            times = []
+            while clock.now < 1.0:
+                apogee_predictor.update(make_processor_data_packet(current_altitude=500.0))
+                if apogee_predictor.get_prediction_data_packet() is not None:
+                    times.append(clock.now)
+                clock.now = round(clock.now + 0.001, 3)
+            done_times.append(times)
+        assert done_times[0] == done_times[1]
+        # Each prediction took between the base latency, and the base latency plus the jitter:
+        gaps = np.diff(done_times[0])
+        assert gaps.min() >= 0.01
+        assert gaps.max() <= 0.061
+        assert len(set(gaps.round(3))) > 1
+
+
+class TestLockstepServo:
+    """Tests the LockstepServo class in lockstep.py."""
+
+    def test_slots(self):
+        inst = LockstepServo(FlightClock())
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_stops_buzzing_on_flight_clock(self):
+        clock = FlightClock()
+        servo = LockstepServo(clock)
+        servo.extend_airbrakes()
+        assert servo.servo_extension == ServoExtension.MAX_EXTENSION
+        clock.now = SERVO_DELAY_SECONDS / 2
+        assert servo.servo_extension == ServoExtension.MAX_EXTENSION
+        clock.now = SERVO_DELAY_SECONDS
+        assert servo.servo_extension == ServoExtension.MAX_NO_BUZZ
+
+        servo.retract_airbrakes()
+        assert servo.servo_extension == ServoExtension.MIN_EXTENSION
+        clock.now = 2 * SERVO_DELAY_SECONDS
+        assert servo.servo_extension == ServoExtension.MIN_NO_BUZZ
+
+
+class TestSynchronousLogger:
+    """Tests the SynchronousLogger class in lockstep.py."""
+
+    def test_slots(self, tmp_path):
+        inst = SynchronousLogger(tmp_path)
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_writes_rows_in_main_loop(self, tmp_path):
+        """Tests that logged rows are in the log straight away, without a logging thread."""
+        logger = SynchronousLogger(tmp_path, delete_log_file=False)
+        logger.start()
+        assert logger.is_running
+        logger.log(
+            make_context_data_packet(state=CoastState),
+            make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION),
+            [make_firm_data_packet(timestamp_seconds=float(i)) for i in range(3)],
+            None,
+        )
+        assert logger.log_queue_size == 0
+        logger.stop()
+        assert not logger.is_running
+
+        df = scan_log(logger.log_path).collect()
+        assert df.height == 3
+        assert df.get_column("timestamp_seconds").to_list() == [0.0, 1.0, 2.0]
+
+    def test_deletes_log(self, tmp_path):
+        logger = SynchronousLogger(tmp_path)
+        logger.start()
+        logger.stop()
+        assert not logger.log_path.exists()
+
+
+class TestLockstepSimulation:
+    """Tests the LockstepSimulation class in lockstep.py."""
+
+    def test_slots(self, tmp_path):
+        inst = LockstepSimulation([], tmp_path)
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_runs_are_reproducible(self, tmp_path, synthetic_packets):
+        """Tests that two runs over the same packets log the same rows."""
+        logs = []
+        for run in range(2):
+            simulation = LockstepSimulation(
+                synthetic_packets,
+                tmp_path / str(run),
+                batch_sizes=[1, 2, 3] * 1000,
+                prediction_latency=PredictionLatency(0.005, 0.01, seed=1),
+                delete_log_file=False,
+            )
+            simulation.run()
+            assert simulation.context.state.name == "LandedState"
+            # Only the wall clock time of each loop differs between runs:
+            logs.append(
+                scan_log(simulation.context.logger.log_path).collect().drop("update_timestamp_ns")
+            )
+        assert logs[0].height > 1000
+        assert logs[0].filter(pl.col("predicted_apogee").is_not_null()).height > 0
+        assert logs[0].equals(logs[1])
+
+    def test_faster_than_real_time(self, tmp_path, synthetic_packets):
+        """
+        Tests that a flight runs at least 100 times faster than real time, with a few packets
+        per loop like the main loop gets.
+        """
+        simulation = LockstepSimulation(synthetic_packets, tmp_path, batch_sizes=5)
+        simulation.run()
+        assert simulation.loops == pytest.approx(len(synthetic_packets) / 5, abs=2)
+        assert simulation.flight_seconds == pytest.approx(
+            synthetic_packets[-1].timestamp_seconds - synthetic_packets[0].timestamp_seconds,
+            abs=0.1,
+        )
+        assert simulation.speedup > 100
@@ -0,0 +1,74 @@
+import lzma
+import time
+
+import pytest
+
+from airbrakes.constants import LOG_COMPRESSION_CHUNK_BYTES, LogCompression
+from airbrakes.data_handling.log_compressor import LogCompressor
+from airbrakes.data_handling.log_reader import open_log_segment
+from tests.conftest import LOG_PATH
+
+
+@pytest.fixture
+def segment_path():
+    """Makes a segment which takes a few chunks to compress."""
+    LOG_PATH.mkdir(exist_ok=True)
+    path = LOG_PATH / "log_1.2.csv"
+    path.write_bytes(b"1.00000000,2.00000000,S\n" * (3 * LOG_COMPRESSION_CHUNK_BYTES // 24))
+    yield path
+    for log in LOG_PATH.glob("log_*"):
+        log.unlink()
+
+
+class TestLogCompressor:
+    """Tests the LogCompressor class in log_compressor.py."""
+
+    def test_slots(self):
+        inst = LogCompressor(LogCompression.LZMA)
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_init(self):
+        compressor = LogCompressor(LogCompression.LZMA)
+        assert not compressor.is_running
+        assert not compressor.is_paused
+
+    @pytest.mark.parametrize("compression", list(LogCompression))
+    def test_compress_segment(self, segment_path, compression):
+        contents = segment_path.read_bytes()
+        compressor = LogCompressor(compression)
+        compressor.start()
+        assert compressor.is_running
+        compressor.compress(segment_path)
+        compressor.stop()
+        assert not compressor.is_running
+
+        compressed_path = segment_path.with_name(segment_path.name + compression.value)
+        assert not segment_path.exists()
+        assert compressed_path.stat().st_size < len(contents)
+        with open_log_segment(compressed_path) as f:
+            assert f.read() == contents
+
+    def test_pause_and_resume(self, segment_path):
+        """Tests that a paused compressor doesn't make progress until it is resumed."""
+        contents = segment_path.read_bytes()
+        compressor = LogCompressor(LogCompression.LZMA)
+        compressor.pause()
+        assert compressor.is_paused
+        compressor.start()
+        compressor.compress(segment_path)
+        time.sleep(0.1)
+
+        # Nothing was compressed, and the original segment is untouched:
+        compressed_path = segment_path.with_name(segment_path.name + ".xz")
+        part_path = compressed_path.with_name(compressed_path.name + ".part")
+        assert segment_path.read_bytes() == contents
+        assert not compressed_path.exists()
+        assert part_path.stat().st_size == 0
+
+        compressor.resume()
+        assert not compressor.is_paused
+        compressor.stop()
+        assert not segment_path.exists()
+        assert not part_path.exists()
+        assert lzma.decompress(compressed_path.read_bytes()) == contents
@@ -0,0 +1,201 @@
+import pytest
+
+from airbrakes.constants import LOG_BUFFER_SIZE, LogIndexKind, ServoExtension
+from airbrakes.data_handling.log_index import (
+    LogIndexEntry,
+    LogIndexer,
+    build_log_index,
+    find_log_window,
+    find_state_transition,
+    get_index_path,
+    read_log_index,
+    read_log_window_bytes,
+    scan_log_window,
+)
+from airbrakes.data_handling.log_reader import get_log_segments, open_log_segment
+from airbrakes.data_handling.logger import Logger
+from airbrakes.data_handling.packets.logger_data_packet import LoggerDataPacket
+from airbrakes.mock.mock_firm import MockFIRM
+from airbrakes.state import CoastState, LandedState, MotorBurnState, StandbyState
+from tests.auxil.utils import (
+    make_apogee_predictor_data_packet,
+    make_context_data_packet,
+    make_firm_data_packet,
+    make_servo_data_packet,
+)
+from tests.conftest import LOG_PATH
+
+STANDBY_ROWS = 700
+MOTOR_BURN_ROWS = 150
+COAST_ROWS = 400
+LANDED_ROWS = 50
+TIMESTAMP_COLUMN = LoggerDataPacket.__struct_fields__.index("timestamp_seconds")
+
+
+@pytest.fixture(autouse=True)
+def _clear_directory():
+    """Clear the tests/logs directory after running each test."""
+    yield
+    for log in LOG_PATH.glob("log_*"):
+        log.unlink()
+
+
+@pytest.fixture
+def flight_log():
+    """
+    Logs a short flight, split into several segments, and returns the path
+    of the log.
+    """
+    logger = Logger(LOG_PATH, max_segment_bytes=100_000, compression=None)
+    servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+    timestamp = 0
+    logger.start()
+    for state, rows in (
+        (StandbyState, STANDBY_ROWS),
+        (MotorBurnState, MOTOR_BURN_ROWS),
+        (CoastState, COAST_ROWS),
+        (LandedState, LANDED_ROWS),
+    ):
+        context_packet = make_context_data_packet(state=state)
+        # Log 10 rows per loop, like the main loop would:
+        for _ in range(rows // 10):
+            apogee_packet = None
+            if state is CoastState:
+                apogee_packet = make_apogee_predictor_data_packet(predicted_apogee=timestamp / 10)
+            logger.log(
+                context_packet,
+                servo_packet,
+                [make_firm_data_packet(timestamp_seconds=(timestamp + i) / 100) for i in range(10)],
+                apogee_packet,
+            )
+            timestamp += 10
+    logger.stop()
+    return logger.log_path
+
+
+def read_row_at(log_path, entry: LogIndexEntry) -> list[str]:
+    """Reads the row an index entry points to."""
+    with open_log_segment(get_log_segments(log_path)[entry.segment - 1]) as segment:
+        segment.seek(entry.offset)
+        return segment.readline().decode().rstrip("\r\n").split(",")
+
+
+class TestLogIndexer:
+    """Tests the LogIndexer class in log_index.py."""
+
+    def test_slots(self):
+        inst = LogIndexer(["state_letter"])
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_index_row(self):
+        indexer = LogIndexer(
+            ["state_letter", "timestamp_seconds", "predicted_apogee"], interval_rows=4
+        )
+
+        def kinds(values, row, first_in_segment=False):
+            return [e.kind for e in indexer.index_row(values, row, 1, 0, first_in_segment)]
+
+        assert kinds(["S", 1.0, None], 0, first_in_segment=True) == [
+            LogIndexKind.STATE,
+            LogIndexKind.SEGMENT,
+            LogIndexKind.PERIODIC,
+        ]
+        assert kinds(["S", 1.1, None], 1) == []
+        assert kinds(["C", 1.2, None], 2) == [LogIndexKind.STATE]
+        assert kinds(["C", 1.3, 500.0], 3) == [LogIndexKind.PREDICTION]
+        assert kinds(["C", 1.4, 500.0], 4) == [LogIndexKind.PERIODIC]
+        assert kinds(["C", 1.5, 510.0], 5, first_in_segment=True) == [
+            LogIndexKind.PREDICTION,
+            LogIndexKind.SEGMENT,
+        ]
+
+        # Values read back from a CSV are strings, with empty strings for missing values:
+        entry = indexer.index_row(["F", "1.60000000", ""], 6, 2, 123, False)[0]
+        assert entry == LogIndexEntry(LogIndexKind.STATE, 6, 2, 123, 1.6, "F")
+
+    def test_missing_columns(self):
+        """Tests that logs which don't have all the columns can still be indexed."""
+        indexer = LogIndexer(["pressure_pascals"], interval_rows=2)
+        entries = indexer.index_row(["101325.0"], 0, 1, 10, True)
+        assert [e.kind for e in entries] == [LogIndexKind.SEGMENT, LogIndexKind.PERIODIC]
+        assert entries[0].timestamp_seconds is None
+        assert entries[0].state_letter is None
+
+
+class TestLogIndex:
+    """Tests the index the Logger writes alongside the log."""
+
+    def test_index_written_with_log(self, flight_log):
+        assert get_index_path(flight_log) == LOG_PATH / "log_1.idx"
+        assert get_index_path(flight_log).exists()
+        assert len(get_log_segments(flight_log)) > 1
+
+        entries = read_log_index(flight_log)
+        # The decimated Standby rows and the log buffer come before motor burn:
+        states = [(e.state_letter, e.row) for e in entries if e.kind == LogIndexKind.STATE]
+        assert [letter for letter, _ in states] == ["S", "M", "C", "L"]
+
+        # Every entry points to the start of its row:
+        for entry in entries:
+            row = read_row_at(flight_log, entry)
+            assert row[0] == entry.state_letter
+            assert float(row[TIMESTAMP_COLUMN]) == entry.timestamp_seconds
+
+        predictions = [e for e in entries if e.kind == LogIndexKind.PREDICTION]
+        assert len(predictions) == COAST_ROWS // 10
+        assert all(e.state_letter == "C" for e in predictions)
+
+    def test_build_log_index_matches_written_index(self, flight_log):
+        assert build_log_index(flight_log) == read_log_index(flight_log)
+
+    def test_read_log_index_without_index_file(self, flight_log):
+        entries = read_log_index(flight_log)
+        get_index_path(flight_log).unlink()
+        assert read_log_index(flight_log) == entries
+
+    def test_read_log_index_with_cut_off_line(self, flight_log):
+        """Tests that the index is still usable if we lost power while writing it."""
+        entries = read_log_index(flight_log)
+        index_path = get_index_path(flight_log)
+        index_path.write_bytes(index_path.read_bytes()[:-20])
+        assert read_log_index(flight_log) == entries[:-1]
+
+    def test_find_state_transition(self, flight_log):
+        entries = read_log_index(flight_log)
+        coast = find_state_transition(entries, "C")
+        assert coast.kind == LogIndexKind.STATE
+        assert read_row_at(flight_log, coast)[0] == "C"
+        assert find_state_transition(entries, "F") is None
+
+    def test_scan_log_window(self, flight_log):
+        """Tests that a window of the log is read without reading all of it."""
+        entries = read_log_index(flight_log)
+        coast = find_state_transition(entries, "C")
+        start_seconds = coast.timestamp_seconds - 0.5
+        end_seconds = coast.timestamp_seconds + 1.0
+
+        df = scan_log_window(flight_log, start_seconds, end_seconds).collect()
+        assert df["timestamp_seconds"].min() == pytest.approx(start_seconds)
+        assert df["timestamp_seconds"].max() == pytest.approx(end_seconds)
+        assert set(df["state_letter"]) == {"M", "C"}
+
+        window_bytes = read_log_window_bytes(
+            flight_log, *find_log_window(entries, start_seconds, end_seconds)
+        )
+        assert len(window_bytes) < sum(path.stat().st_size for path in get_log_segments(flight_log))
+
+    def test_scan_log_window_whole_log(self, flight_log):
+        df = scan_log_window(flight_log).collect()
+        assert df["state_letter"][0] == "S"
+        assert df["state_letter"][-1] == "L"
+        assert df["timestamp_seconds"].is_sorted()
+
+    def test_mock_firm_start_index_from_index(self, flight_log):
+        """
+        Tests that a log without metadata starts replaying at the log buffer,
+        found through the index.
+        """
+        mock_firm = MockFIRM(log_file_path=flight_log)
+        motor_burn = find_state_transition(read_log_index(flight_log), "M")
+        assert mock_firm._calculate_start_index() == motor_burn.row - LOG_BUFFER_SIZE
@@ -0,0 +1,143 @@
+import gzip
+import lzma
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from airbrakes.data_handling.log_reader import (
+    get_log_base_path,
+    get_log_segments,
+    get_schema_path,
+    get_segment_path,
+    iterate_log_batches,
+    read_log_bytes,
+    read_log_schema,
+    scan_log,
+    write_log_schema,
+)
+from airbrakes.data_handling.log_schema import build_log_schema
+from tests.conftest import LOG_PATH
+
+HEADER = b"timestamp_seconds,state_letter\n"
+
+
+@pytest.fixture(autouse=True)
+def _clear_directory():
+    """Clear the tests/logs directory after running each test."""
+    yield
+    for log in LOG_PATH.glob("log_*"):
+        log.unlink()
+
+
+@pytest.mark.parametrize(
+    ("log_path", "expected"),
+    [
+        ("log_1.csv", "log_1.csv"),
+        ("log_1.csv.xz", "log_1.csv"),
+        ("log_12.3.csv", "log_12.csv"),
+        ("log_12.3.csv.gz", "log_12.csv"),
+        ("jackpot_launch_1.csv", "jackpot_launch_1.csv"),
+    ],
+)
+def test_get_log_base_path(log_path, expected):
+    assert get_log_base_path(Path("logs") / log_path) == Path("logs") / expected
+
+
+def test_get_segment_path():
+    assert get_segment_path(Path("logs/log_1.csv"), 1) == Path("logs/log_1.csv")
+    assert get_segment_path(Path("logs/log_1.csv"), 2) == Path("logs/log_1.2.csv")
+    assert get_segment_path(Path("logs/log_1.csv"), 10) == Path("logs/log_1.10.csv")
+
+
+def test_get_log_segments_mixed_compression():
+    """Tests that segments are found in order, however each one is compressed."""
+    LOG_PATH.mkdir(exist_ok=True)
+    (LOG_PATH / "log_1.csv.xz").write_bytes(lzma.compress(HEADER + b"1.0,S\n"))
+    (LOG_PATH / "log_1.2.csv.gz").write_bytes(gzip.compress(HEADER + b"2.0,M\n"))
+    (LOG_PATH / "log_1.3.csv").write_bytes(HEADER + b"3.0,C\n")
+    # A segment which is both compressed and uncompressed uses the uncompressed one:
+    (LOG_PATH / "log_1.4.csv").write_bytes(HEADER + b"4.0,F\n")
+    (LOG_PATH / "log_1.4.csv.xz").write_bytes(b"half written")
+    # Segments of other logs are not included:
+    (LOG_PATH / "log_2.csv").write_bytes(HEADER)
+
+    for log_path in (LOG_PATH / "log_1.csv", LOG_PATH / "log_1.3.csv"):
+        assert get_log_segments(log_path) == [
+            LOG_PATH / "log_1.csv.xz",
+            LOG_PATH / "log_1.2.csv.gz",
+            LOG_PATH / "log_1.3.csv",
+            LOG_PATH / "log_1.4.csv",
+        ]
+
+    # The header is only kept once:
+    assert read_log_bytes(LOG_PATH / "log_1.csv") == HEADER + b"1.0,S\n2.0,M\n3.0,C\n4.0,F\n"
+    df = scan_log(LOG_PATH / "log_1.csv").collect()
+    assert df["timestamp_seconds"].to_list() == [1.0, 2.0, 3.0, 4.0]
+    assert df["state_letter"].to_list() == ["S", "M", "C", "F"]
+    batches = list(iterate_log_batches(LOG_PATH / "log_1.csv", ["state_letter"], batch_rows=10))
+    assert pl.concat(batches).equals(df.select("state_letter"))
+
+
+def test_scan_log_single_file():
+    """Tests that a log which was never split is read like any other CSV."""
+    LOG_PATH.mkdir(exist_ok=True)
+    log_path = LOG_PATH / "log_1.csv"
+    log_path.write_bytes(HEADER + b"1.0,S\n2.0,S\n")
+    df = scan_log(log_path, skip_rows_after_header=1).collect()
+    assert df["timestamp_seconds"].to_list() == [2.0]
+
+
+def test_read_log_schema_of_older_log():
+    """Tests that a log without a schema gets one built from its header."""
+    LOG_PATH.mkdir(exist_ok=True)
+    log_path = LOG_PATH / "log_1.csv"
+    log_path.write_bytes(b"state_letter,set_extension,encoder_position\nS,112,0\n")
+    assert not get_schema_path(log_path).exists()
+
+    schema = read_log_schema(log_path)
+    assert schema.version == 0
+    assert schema.polars_schema == {
+        "state_letter": pl.String,
+        "set_extension": pl.String,
+        "encoder_position": pl.Int64,
+    }
+    df = scan_log(log_path).collect()
+    assert df.schema == schema.polars_schema
+
+    # Writing the schema alongside the log doesn't change how it is read:
+    write_log_schema(log_path, schema)
+    assert read_log_schema(log_path) == schema
+    assert scan_log(log_path).collect().equals(df)
+
+
+def test_scan_log_uses_schema():
+    """Tests that the schema is used instead of guessing the types from the values."""
+    LOG_PATH.mkdir(exist_ok=True)
+    log_path = LOG_PATH / "log_1.csv"
+    log_path.write_bytes(HEADER + b"1,S\n2,S\n")
+    write_log_schema(log_path, build_log_schema(["timestamp_seconds", "state_letter"]))
+    df = scan_log(log_path).collect()
+    # polars would have guessed these are integers:
+    assert df["timestamp_seconds"].dtype == pl.Float64
+
+
+@pytest.mark.parametrize("launch", ["jackpot_launch_1", "jackpot_launch_3", "jackpot_launch_4"])
+def test_scan_real_launch(launch):
+    """Tests that our older flight logs read with the types of the logger fields."""
+    log_path = Path("launch_data/real_firm_launches") / f"{launch}.csv"
+    df = scan_log(log_path).collect()
+    assert df.schema == read_log_schema(log_path).polars_schema
+    assert df["state_letter"].dtype == pl.String
+    assert df["timestamp_seconds"].dtype == pl.Float64
+    assert df["update_timestamp_ns"].dtype == pl.Int64
+
+
+@pytest.mark.parametrize("batch_rows", [100, 1000])
+def test_iterate_log_batches(batch_rows):
+    """Tests that reading a log a batch at a time gives the same rows as scanning all of it."""
+    log_path = Path("launch_data/real_firm_launches/jackpot_launch_4.csv")
+    columns = ["timestamp_seconds", "state_letter", "update_timestamp_ns", "set_extension"]
+    batches = list(iterate_log_batches(log_path, columns, batch_rows))
+    assert max(len(batch) for batch in batches) <= batch_rows
+    assert pl.concat(batches).equals(scan_log(log_path).select(columns).collect())
@@ -0,0 +1,68 @@
+import msgspec
+import polars as pl
+import pytest
+
+from airbrakes.constants import LOG_SCHEMA_VERSION, LogColumnType
+from airbrakes.data_handling.log_schema import (
+    LogColumn,
+    LogSchema,
+    build_log_schema,
+    decode_log_schema,
+    get_column_type,
+)
+from airbrakes.data_handling.packets.logger_data_packet import LoggerDataPacket
+
+
+@pytest.mark.parametrize(
+    ("name", "expected"),
+    [
+        ("state_letter", LogColumnType.STRING),
+        ("battery_voltage", LogColumnType.STRING),
+        ("timestamp_seconds", LogColumnType.FLOAT),
+        ("predicted_apogee", LogColumnType.FLOAT),
+        ("update_timestamp_ns", LogColumnType.INT),
+        # Columns only our older logs have:
+        ("encoder_position", LogColumnType.INT),
+        ("velocity_used_for_prediction", LogColumnType.FLOAT),
+        # Columns we don't know about:
+        ("something_else", LogColumnType.STRING),
+    ],
+)
+def test_get_column_type(name, expected):
+    assert get_column_type(name) == expected
+
+
+def test_every_logger_field_has_a_column_type():
+    schema = build_log_schema(LoggerDataPacket.__struct_fields__)
+    assert schema.version == LOG_SCHEMA_VERSION
+    assert schema.column_names == list(LoggerDataPacket.__struct_fields__)
+    assert schema.polars_schema["timestamp_seconds"] == pl.Float64
+    assert schema.polars_schema["retrieved_firm_packets"] == pl.Int64
+    assert schema.pandas_dtypes["retrieved_firm_packets"] == "Int64"
+
+
+def test_build_log_schema():
+    schema = build_log_schema(["state_letter", "set_extension", "timestamp_seconds"], version=0)
+    assert schema == LogSchema(
+        version=0,
+        columns=(
+            LogColumn("state_letter", LogColumnType.STRING),
+            LogColumn("set_extension", LogColumnType.STRING, sparse=True),
+            LogColumn("timestamp_seconds", LogColumnType.FLOAT),
+        ),
+    )
+    assert schema.sparse_columns == ["set_extension"]
+
+
+def test_decode_log_schema():
+    schema = build_log_schema(LoggerDataPacket.__struct_fields__)
+    assert decode_log_schema(msgspec.json.encode(schema)) == schema
+
+
+def test_decode_newer_log_schema():
+    """Tests that we don't misread a log written by a newer version of the code."""
+    schema = msgspec.structs.replace(
+        build_log_schema(["timestamp_seconds"]), version=LOG_SCHEMA_VERSION + 1
+    )
+    with pytest.raises(ValueError, match="Update the code"):
+        decode_log_schema(msgspec.json.encode(schema))
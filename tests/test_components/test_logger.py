@@ -1,23 +1,37 @@
 import csv
-import queue
+import math
 import threading
 import time
 from functools import partial
 
+import polars as pl
 import pytest
 from msgspec.structs import asdict
 
 from airbrakes.constants import (
     IDLE_LOG_CAPACITY,
+    IDLE_LOG_DECIMATION,
     LOG_BUFFER_SIZE,
+    LOG_SCHEMA_VERSION,
     NUMBER_OF_LINES_TO_LOG_BEFORE_FLUSHING,
+    RING_WAIT_CHECK_SECONDS,
+    SPARSE_LOG_COLUMNS,
     STOP_SIGNAL,
+    LogCompression,
     ServoExtension,
 )
-from airbrakes.data_handling.logger import Logger
+from airbrakes.data_handling.log_reader import (
+    get_schema_path,
+    iterate_log_batches,
+    read_log_schema,
+    scan_log,
+)
+from airbrakes.data_handling.logger import Logger, LogWriter
 from airbrakes.data_handling.packets.logger_data_packet import LoggerDataPacket
+from airbrakes.data_handling.spsc_ring import SPSCRing
 from airbrakes.state import (
     CoastState,
+    FreeFallState,
     LandedState,
     MotorBurnState,
     StandbyState,
@@ -34,7 +48,7 @@ from tests.conftest import LOG_PATH
 def patched_stop(self):
     """Monkeypatched stop method which does not log the buffer."""
     # Make sure the rest of the code is the same as the original method!
-    self._log_queue.put(STOP_SIGNAL)
+    self._log_queue.push(STOP_SIGNAL)
     self._log_thread.join()
 
 
@@ -99,6 +113,8 @@ class TestLogger:
         timestamp_seconds=4,
         retrieved_firm_packets=None,
         apogee_predictor_queue_size=None,
+        log_queue_high_watermark=None,
+        dropped_log_packets=None,
         update_timestamp_ns=None,
     )
 
@@ -107,7 +123,7 @@ class TestLogger:
         """Clear the tests/logs directory after running each test."""
         yield  # This is where the test runs
         # Test run is over, now clean up
-        for log in LOG_PATH.glob("log_*.csv"):
+        for log in LOG_PATH.glob("log_*"):
             log.unlink()
 
     def test_slots(self, logger):
@@ -121,7 +137,7 @@ class TestLogger:
         assert logger.log_path.parent.name == "logs"
 
         # Test if all attributes are created correctly
-        assert isinstance(logger._log_queue, queue.SimpleQueue)
+        assert isinstance(logger._log_queue, SPSCRing)
         assert isinstance(logger._log_thread, threading.Thread)
 
         # Test that the thread is not running
@@ -149,20 +165,413 @@ class TestLogger:
             keys = reader.fieldnames
             assert list(keys) == list(LoggerDataPacket.__struct_fields__)
 
+    def test_init_writes_log_schema(self, logger):
+        """Tests that the schema written alongside the log matches its header."""
+        assert get_schema_path(logger.log_path) == LOG_PATH / "log_1.schema.json"
+        schema = read_log_schema(logger.log_path)
+        assert schema.version == LOG_SCHEMA_VERSION
+        assert schema.column_names == list(LoggerDataPacket.__struct_fields__)
+        assert schema.sparse_columns == list(SPARSE_LOG_COLUMNS)
+
     def test_log_buffer_is_full_property(self, logger):
         """Tests whether the property is_log_buffer_full works correctly."""
+        context_packet = make_context_data_packet(state=StandbyState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
         assert not logger.is_log_buffer_full
-        logger._log_buffer.extend([1] * (LOG_BUFFER_SIZE - 1))
+        logger._log_buffer.push(
+            [make_firm_data_packet()] * (LOG_BUFFER_SIZE - 1), context_packet, servo_packet, None
+        )
         assert not logger.is_log_buffer_full
-        logger._log_buffer.clear()
+        logger._log_buffer.flush()
         assert len(logger._log_buffer) == 0
-        logger._log_buffer.extend([1] * LOG_BUFFER_SIZE)
+        logger._log_buffer.push(
+            [make_firm_data_packet()] * LOG_BUFFER_SIZE, context_packet, servo_packet, None
+        )
         assert logger.is_log_buffer_full
 
+    def test_log_queue_drops_oldest_in_idle_states(self):
+        """
+        Tests that rows logged in the idle states are dropped oldest first once
+        the log queue is full, and that the drops are counted.
+        """
+        logger = Logger(LOG_PATH, log_queue_capacity=10)
+        context_packet = make_context_data_packet(state=StandbyState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+
+        # The logger thread is not started, so nothing is taken out of the queue:
+        logger.log(
+            context_packet,
+            servo_packet,
+            [make_firm_data_packet(timestamp_seconds=i) for i in range(15)],
+            None,
+        )
+
+        assert logger.log_queue_size == 10
+        assert logger.dropped_packets == 5
+        assert logger.log_queue_high_watermark == 10
+
+        # Only the newest rows are left in the queue:
+        queued = []
+        logger._log_queue.drain_into(queued)
+        assert [packet.timestamp_seconds for packet in queued] == list(range(5, 15))
+
+    def test_log_queue_counts_every_dropped_row_once(self):
+        """
+        Tests that when the logging thread is stuck, the rows discarded from the log queue and the
+        new rows it has no room for are each counted as dropped once.
+        """
+        logger = Logger(LOG_PATH, log_queue_capacity=10)
+        context_packet = make_context_data_packet(state=StandbyState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+
+        # The discarded rows keep their slots until they are skipped, so the queue fills up:
+        for _ in range(4):
+            logger.log(context_packet, servo_packet, [make_firm_data_packet()] * 10, None)
+            logger._log_counter = 0
+        assert logger.dropped_packets == 10 * 4 - logger._log_queue.capacity
+
+        queued = []
+        logger._log_queue.drain_into(queued)
+        assert logger.dropped_packets + len(queued) == 10 * 4
+
+    def test_log_queue_never_drops_in_flight_states(self):
+        """
+        Tests that rows logged during the flight are never dropped, even if
+        the log queue is over capacity.
+        """
+        logger = Logger(LOG_PATH, log_queue_capacity=10)
+        context_packet = make_context_data_packet(state=CoastState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+
+        logger.log(context_packet, servo_packet, [make_firm_data_packet()] * 15, None)
+
+        assert logger.log_queue_size == 15
+        assert logger.dropped_packets == 0
+        assert logger.log_queue_high_watermark == 15
+
+        # Once we are idle again, the oldest rows are dropped to get back under capacity:
+        context_packet = make_context_data_packet(state=LandedState)
+        logger.log(context_packet, servo_packet, [make_firm_data_packet()] * 2, None)
+        assert logger.log_queue_size == 10
+        assert logger.log_queue_high_watermark == 15
+        # The oldest rows are counted as dropped once they are skipped:
+        assert logger.dropped_packets == 0
+        queued = []
+        logger._log_queue.drain_into(queued)
+        assert len(queued) == 10
+        assert logger.dropped_packets == 7
+
+    def test_log_backlog(self, logger):
+        """
+        Tests that a backlog logged in flight takes a single slot in the log queue, but is counted
+        as all of its rows, and that the logging thread writes a row for every packet of it, in
+        order.
+        """
+        context_packet = make_context_data_packet(state=CoastState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+
+        logger.log_backlog(
+            context_packet,
+            servo_packet,
+            [make_firm_data_packet(timestamp_seconds=i) for i in range(50)],
+            None,
+        )
+        assert len(logger._log_queue) == 1
+        assert logger.log_queue_size == 50
+        logger.log(
+            context_packet, servo_packet, [make_firm_data_packet(timestamp_seconds=50)], None
+        )
+        assert len(logger._log_queue) == 2
+        assert logger.log_queue_size == 51
+        assert logger.log_queue_high_watermark == 51
+
+        logger.start()
+        logger.stop()
+        assert logger.log_queue_size == 0
+        with logger.log_path.open() as f:
+            rows = list(csv.DictReader(f))
+        assert [float(row["timestamp_seconds"]) for row in rows] == list(range(51))
+        assert {row["state_letter"] for row in rows} == {"C"}
+
+    def test_log_never_waits_in_flight(self, monkeypatch):
+        """
+        Tests that when the logging thread is stuck, logging in flight still returns straight
+        away, with the rows which don't fit in the log queue held until there is room, and that
+        every row is written in order once the logging thread gets going again.
+        """
+        logger = Logger(LOG_PATH, log_queue_capacity=4)
+        context_packet = make_context_data_packet(state=CoastState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        unstuck = threading.Event()
+        write = LogWriter.write
+
+        def stuck_write(self, logger_packets):
+            unstuck.wait()
+            write(self, logger_packets)
+
+        monkeypatch.setattr(LogWriter, "write", stuck_write)
+        logger.start()
+        logger.log(context_packet, servo_packet, [make_firm_data_packet(timestamp_seconds=0)], None)
+        # Wait for the logging thread to get stuck writing the first row:
+        while logger.log_queue_size:
+            time.sleep(0.001)
+
+        slowest_seconds = 0.0
+        for i in range(1, 50):
+            start = time.perf_counter()
+            logger.log(
+                context_packet, servo_packet, [make_firm_data_packet(timestamp_seconds=i)], None
+            )
+            slowest_seconds = max(slowest_seconds, time.perf_counter() - start)
+        start = time.perf_counter()
+        logger.log_backlog(
+            context_packet,
+            servo_packet,
+            [make_firm_data_packet(timestamp_seconds=i) for i in range(50, 60)],
+            None,
+        )
+        slowest_seconds = max(slowest_seconds, time.perf_counter() - start)
+
+        assert slowest_seconds < RING_WAIT_CHECK_SECONDS
+        assert logger._log_queue_overflow
+        assert logger.log_queue_size == 59
+        assert logger.log_queue_high_watermark == 59
+        assert logger.dropped_packets == 0
+        # Rows logged once we are idle again would have to wait behind them, so they are dropped:
+        logger.log(
+            make_context_data_packet(state=LandedState),
+            servo_packet,
+            [make_firm_data_packet(timestamp_seconds=60)],
+            None,
+        )
+        assert logger.dropped_packets == 1
+
+        unstuck.set()
+        logger.stop()
+        assert logger.log_queue_size == 0
+        with logger.log_path.open() as f:
+            rows = list(csv.DictReader(f))
+        assert [float(row["timestamp_seconds"]) for row in rows] == list(range(60))
+
+    def test_log_backlog_is_never_dropped(self):
+        """
+        Tests that once the log queue is full, rows logged in the idle states drop the newest
+        rows instead of a backlog from the flight still waiting in the queue.
+        """
+        logger = Logger(LOG_PATH, log_queue_capacity=10)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        logger.log_backlog(
+            make_context_data_packet(state=CoastState),
+            servo_packet,
+            [make_firm_data_packet(timestamp_seconds=i) for i in range(8)],
+            None,
+        )
+        logger.log(
+            make_context_data_packet(state=LandedState),
+            servo_packet,
+            [make_firm_data_packet(timestamp_seconds=i) for i in range(8, 13)],
+            None,
+        )
+        assert logger.log_queue_size == 10
+        assert logger.dropped_packets == 3
+
+        queued = []
+        logger._log_queue.drain_into(queued)
+        rows = logger._prepare_queued_packets(queued)
+        assert [packet.timestamp_seconds for packet in rows] == list(range(10))
+        assert logger.log_queue_size == 0
+
+    def test_log_backlog_in_idle_states(self, logger):
+        """Tests that a backlog in the idle states is logged and buffered like any other packets."""
+        context_packet = make_context_data_packet(state=StandbyState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        firm_data_packets = [make_firm_data_packet(timestamp_seconds=i) for i in range(50)]
+
+        logger.log_backlog(context_packet, servo_packet, firm_data_packets, None)
+        queued = []
+        logger._log_queue.drain_into(queued)
+        assert all(isinstance(packet, LoggerDataPacket) for packet in queued)
+        assert len(queued) == min(len(firm_data_packets), IDLE_LOG_CAPACITY)
+
+    def test_init_continues_numbering_after_segments(self):
+        """Tests that the numbering of new logs counts the segments of older logs."""
+        (LOG_PATH / "log_1.csv.xz").touch()
+        (LOG_PATH / "log_3.2.csv.gz").touch()
+        logger = Logger(LOG_PATH)
+        assert logger.log_path == LOG_PATH / "log_4.csv"
+
+    def test_log_rotates_segments_by_size(self):
+        """
+        Tests that the logger starts a new segment once the current one is
+        too big, and that every segment can be read on its own.
+        """
+        logger = Logger(LOG_PATH, max_segment_bytes=2000, compression=None)
+        context_packet = make_context_data_packet(state=CoastState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        logger.start()
+        logger.log(
+            context_packet,
+            servo_packet,
+            [make_firm_data_packet(timestamp_seconds=float(i)) for i in range(50)],
+            None,
+        )
+        logger.stop()
+
+        segment_paths = logger.segment_paths
+        assert len(segment_paths) > 1
+        assert segment_paths[0] == logger.log_path
+        assert segment_paths[1] == LOG_PATH / "log_1.2.csv"
+
+        timestamps = []
+        for segment_path in segment_paths:
+            # The size is only checked between rows, so a segment can go over by at most one row:
+            assert segment_path.stat().st_size < 2000 + 1000
+            with segment_path.open() as f:
+                rows = list(csv.DictReader(f))
+            assert rows
+            # Every segment starts with all the sparse columns written:
+            assert rows[0]["set_extension"] == str(ServoExtension.MIN_EXTENSION.value)
+            timestamps.extend(float(row["timestamp_seconds"]) for row in rows)
+        assert timestamps == list(range(50))
+
+        # The reader puts the segments back together:
+        df = scan_log(logger.log_path).collect()
+        assert df["timestamp_seconds"].to_list() == list(range(50))
+
+    def test_sparse_columns_written_only_when_changed(self, logger):
+        """
+        Tests that the sparse columns are left empty when they don't change,
+        and that the reader fills them back in.
+        """
+        context_packet = make_context_data_packet(state=CoastState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        logger.start()
+        for predicted_apogee in (1000.0, 1000.0, 1010.0):
+            logger.log(
+                context_packet,
+                servo_packet,
+                [make_firm_data_packet(timestamp_seconds=float(i)) for i in range(3)],
+                make_apogee_predictor_data_packet(predicted_apogee=predicted_apogee),
+            )
+        logger.stop()
+
+        with logger.log_path.open() as f:
+            rows = list(csv.DictReader(f))
+        assert [row["predicted_apogee"] for row in rows] == [
+            "1000.00000000",
+            *[""] * 5,
+            "1010.00000000",
+            "",
+            "",
+        ]
+        # The row with the new prediction is in the index, so all of it is written:
+        min_extension = str(ServoExtension.MIN_EXTENSION.value)
+        assert [row["set_extension"] for row in rows] == [
+            min_extension,
+            *[""] * 5,
+            min_extension,
+            "",
+            "",
+        ]
+        # The columns which change every row are always written:
+        assert all(row["timestamp_seconds"] for row in rows)
+
+        df = scan_log(logger.log_path).collect()
+        assert df["predicted_apogee"].to_list() == [1000.0] * 6 + [1010.0] * 3
+        assert df["set_extension"].to_list() == [min_extension] * 9
+
+    def test_sparse_int_column_going_back_to_missing_round_trips(self, logger):
+        """
+        Tests that an integer sparse column whose value goes back to being missing, like the
+        actuation latency of a command with a NaN FIRM timestamp, is read back as missing.
+        """
+        context_packet = make_context_data_packet(state=CoastState)
+        logger.start()
+        for actuation_latency_ns in (5000, 5000, 5000, None, None):
+            logger.log(
+                context_packet,
+                make_servo_data_packet(
+                    set_extension=ServoExtension.MAX_EXTENSION,
+                    command_loop_id=1,
+                    command_firm_timestamp_seconds=math.nan,
+                    actuation_latency_ns=actuation_latency_ns,
+                ),
+                [make_firm_data_packet()],
+                None,
+            )
+        logger.stop()
+
+        with logger.log_path.open() as f:
+            rows = list(csv.DictReader(f))
+        assert [row["actuation_latency_ns"] for row in rows] == ["5000", "", "", "nan", ""]
+        # A NaN which doesn't change isn't written again:
+        assert [row["command_firm_timestamp_seconds"] for row in rows] == ["nan", "", "", "", ""]
+
+        expected = [5000, 5000, 5000, None, None]
+        df = scan_log(logger.log_path).collect()
+        assert df["actuation_latency_ns"].dtype == pl.Int64
+        assert df["actuation_latency_ns"].to_list() == expected
+        assert df["command_loop_id"].to_list() == [1] * 5
+        columns = ["actuation_latency_ns", "command_loop_id"]
+        for batch_rows in (1, 2):
+            batches = pl.concat(iterate_log_batches(logger.log_path, columns, batch_rows))
+            assert batches.equals(df.select(columns))
+
+    def test_log_rotates_segments_by_duration(self):
+        logger = Logger(LOG_PATH, max_segment_seconds=0.0, compression=None)
+        context_packet = make_context_data_packet(state=CoastState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        logger.start()
+        logger.log(context_packet, servo_packet, [make_firm_data_packet()] * 3, None)
+        logger.stop()
+        # Every row is older than the maximum age of the segment before it:
+        assert len(logger.segment_paths) == 3
+
+    @pytest.mark.parametrize("compression", list(LogCompression))
+    def test_closed_segments_are_compressed(self, compression):
+        """
+        Tests that every segment but the last one is compressed, and that the
+        compressed log reads back the same as the uncompressed one.
+        """
+        logger = Logger(LOG_PATH, max_segment_bytes=2000, compression=compression)
+        context_packet = make_context_data_packet(state=LandedState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        logger.start()
+        logger.log(
+            context_packet,
+            servo_packet,
+            [make_firm_data_packet(timestamp_seconds=float(i)) for i in range(50)],
+            None,
+        )
+        logger.stop()
+
+        segment_paths = logger.segment_paths
+        assert all(path.suffix == compression.value for path in segment_paths[:-1])
+        assert segment_paths[-1].suffix == ".csv"
+        # Nothing is left half compressed:
+        assert not list(LOG_PATH.glob("*.part"))
+
+        df = scan_log(logger.log_path).collect()
+        assert df["timestamp_seconds"].to_list() == list(range(50))
+        assert (df["state_letter"] == "L").all()
+
+    def test_compression_is_paused_in_flight(self, logger):
+        """Tests that the compression never runs during MotorBurn or Coast."""
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        for state, paused in (
+            (StandbyState, False),
+            (MotorBurnState, True),
+            (CoastState, True),
+            (FreeFallState, False),
+            (LandedState, False),
+        ):
+            logger.log(make_context_data_packet(state=state), servo_packet, [], None)
+            assert logger._log_compressor.is_paused == paused
+
     def test_logger_stops_on_stop_signal(self, logger):
         """Tests whether the logger stops when it receives a stop signal."""
         logger.start()
-        logger._log_queue.put(STOP_SIGNAL)
+        logger._log_queue.push(STOP_SIGNAL)
         time.sleep(0.4)
         assert not logger.is_running
         assert not logger._log_thread.is_alive()
@@ -175,25 +584,40 @@ class TestLogger:
         logger.stop()
         assert not logger.is_running
 
+    def test_wait_until_started(self, logger):
+        assert not logger.wait_until_started(timeout=0.01)
+        logger.start()
+        assert logger.wait_until_started(timeout=5)
+        assert logger._log_thread.is_alive()
+        logger.stop()
+
     def test_logger_stop_logs_the_buffer(self, logger):
+        context_packet = make_context_data_packet(state=StandbyState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        firm_data_packet = make_firm_data_packet(timestamp_seconds=4.0)
         logger.start()
-        logger._log_buffer.appendleft(self.sample_ldp)
+        logger._log_buffer.push([firm_data_packet], context_packet, servo_packet, None)
         logger.stop()
+        expected = Logger._prepare_logger_packets(
+            context_packet, servo_packet, [firm_data_packet], None
+        )[0]
         with logger.log_path.open() as f:
             reader = csv.DictReader(f)
             count = 0
             for idx, row in enumerate(reader):
                 count = idx + 1
-                assert len(row) > 5  # Should have other fields with empty values
-                # Only fetch non-empty values:
-                row_dict = {k: v for k, v in row.items() if v}
-                assert row_dict == convert_dict_vals_to_str(asdict(self.sample_ldp), False)
+                assert row["state_letter"] == "S"
+                assert float(row["timestamp_seconds"]) == 4.0
+                assert float(row["pressure_pascals"]) == pytest.approx(expected.pressure_pascals)
+                assert float(row["est_tilt_angle_degrees"]) == pytest.approx(
+                    expected.est_tilt_angle_degrees
+                )
             assert count == 1
         assert len(logger._log_buffer) == 0
 
     def test_logging_loop_add_to_queue(self, logger):
         logger.start()
-        logger._log_queue.put(self.sample_ldp)
+        logger._log_queue.push(self.sample_ldp)
         time.sleep(0.1)  # Give the thread time to log to file
         logger.stop()
         # Let's check the contents of the file:
@@ -338,8 +762,14 @@ class TestLogger:
 
             # The row with the data packet:
             row: dict[str, str]
+            previous_row: dict[str, str] = {}
             idx = -1
             for idx, row in enumerate(reader):
+                # The sparse columns are only written when they change:
+                for column in SPARSE_LOG_COLUMNS:
+                    if not row[column]:
+                        row[column] = previous_row.get(column, "")
+                previous_row = row
                 # Only fetch non-empty values:
                 row_dict_non_empty = {k: v for k, v in row.items() if v}
                 # Random check to make sure we aren't missing any fields
@@ -432,8 +862,11 @@ class TestLogger:
         time.sleep(0.01)  # Give the thread time to log to file
 
         # The buffer should be capped at exactly LOG_BUFFER_SIZE.
-        # Any excess packets (the +10 and the previous +10) are dropped or fit within the cap.
+        # The 20 oldest rows are pushed out of the buffer, and only 1 in IDLE_LOG_DECIMATION of
+        # them is logged.
         assert len(logger._log_buffer) == LOG_BUFFER_SIZE
+        evicted = (10 + LOG_BUFFER_SIZE + 10) - LOG_BUFFER_SIZE
+        decimated = evicted // IDLE_LOG_DECIMATION
 
         logger.stop()  # stop() will flush the buffer to disk
 
@@ -444,8 +877,52 @@ class TestLogger:
             # First row is the header, so we subtract 1.
             # Total lines should be:
             #   IDLE_LOG_CAPACITY (written immediately in step 1)
+            # + the decimated rows pushed out of the buffer in step 2
             # + LOG_BUFFER_SIZE (flushed from buffer in step 3)
-            assert len(lines) - 1 == IDLE_LOG_CAPACITY + LOG_BUFFER_SIZE
+            assert len(lines) - 1 == IDLE_LOG_CAPACITY + decimated + LOG_BUFFER_SIZE
+
+    def test_log_buffer_decimates_evicted_rows(self, logger):
+        """
+        Tests that once the log buffer is full, only one in every
+        IDLE_LOG_DECIMATION rows pushed out of it is logged, and that the full
+        rate data right before the state change is logged in order.
+        """
+        context_standby = make_context_data_packet(state=StandbyState)
+        context_motor = make_context_data_packet(state=MotorBurnState)
+        servo_packet = make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION)
+        number_of_idle_rows = IDLE_LOG_CAPACITY + LOG_BUFFER_SIZE + 100
+
+        logger.start()
+        # Log the idle rows over many loops, like the main loop would:
+        for start in range(0, number_of_idle_rows, 7):
+            logger.log(
+                context_standby,
+                servo_packet,
+                [
+                    make_firm_data_packet(timestamp_seconds=float(i))
+                    for i in range(start, min(start + 7, number_of_idle_rows))
+                ],
+                None,
+            )
+        logger.log(
+            context_motor, servo_packet, [make_firm_data_packet(timestamp_seconds=-1.0)], None
+        )
+        logger.stop()
+
+        with logger.log_path.open() as f:
+            rows = list(csv.DictReader(f))
+        timestamps = [float(row["timestamp_seconds"]) for row in rows]
+
+        first_buffered = IDLE_LOG_CAPACITY
+        last_evicted = IDLE_LOG_CAPACITY + 100
+        expected = (
+            list(range(first_buffered))
+            + list(range(first_buffered, last_evicted, IDLE_LOG_DECIMATION))
+            + list(range(last_evicted, number_of_idle_rows))
+            + [-1]
+        )
+        assert timestamps == expected
+        assert [row["state_letter"] for row in rows[-2:]] == ["S", "M"]
 
     def test_log_buffer_reset_after_standby(self, logger):
         """
@@ -615,16 +1092,19 @@ class TestLogger:
 
         flush_calls = 0
         # Monkeypatch Path.open to return our custom TextIOWrapper
-        original_open = threaded_logger.log_path.open
+        original_open = threaded_logger.log_path.__class__.open
 
         def some_flush(original_flush):
             nonlocal flush_calls
             flush_calls += 1
             original_flush()
 
-        def mocked_open(*args, **kwargs):
+        def mocked_open(path, *args, **kwargs):
             # Call the original open with all keyword arguments
-            file = original_open(**kwargs)
+            file = original_open(path, *args, **kwargs)
+            # Only count the flushes of the log file, not of its index:
+            if path != threaded_logger.log_path:
+                return file
             original_flush = file.flush
             file.flush = partial(some_flush, original_flush)
             return file
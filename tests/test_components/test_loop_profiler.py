@@ -0,0 +1,111 @@
+import polars as pl
+import pytest
+from firm_client import FIRMDataPacket
+
+from airbrakes.constants import LoopStage
+from airbrakes.data_handling.log_reader import scan_log
+from airbrakes.data_handling.loop_profiler import LatencyHistogram, LoopProfiler
+from airbrakes.mock.lockstep import LockstepSimulation
+from airbrakes.mock.synthetic_flight import SyntheticFlight
+
+
+class TestLatencyHistogram:
+    """Tests the LatencyHistogram class in loop_profiler.py."""
+
+    def test_slots(self):
+        inst = LatencyHistogram()
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        assert histogram.count == 0
+        assert histogram.percentile_ns(50) == 0.0
+
+    @pytest.mark.parametrize("duration_ns", [0, 1, 7, 8, 15, 16, 1000, 123_456, 2**39, 2**45])
+    def test_buckets_hold_their_durations(self, duration_ns):
+        """Tests that every duration goes in a bucket whose bounds it is within."""
+        bucket = LatencyHistogram._bucket(duration_ns)
+        lowest_ns, highest_ns = LatencyHistogram._bucket_bounds(bucket)
+        if duration_ns < 2**40:
+            assert lowest_ns <= duration_ns <= highest_ns
+            # Each bucket is at most an eighth of the durations in it wide:
+            assert highest_ns - lowest_ns <= max(lowest_ns / 8, 0)
+        else:
+            # Durations too long for the histogram go in its last bucket:
+            assert bucket == LatencyHistogram._bucket(2**40 - 1)
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for duration_ns in range(1, 10_001):
+            histogram.record(duration_ns * 1000)
+        assert histogram.count == 10_000
+        assert histogram.max_ns == 10_000_000
+        assert histogram.percentile_ns(50) == pytest.approx(5_000_000, rel=1 / 8)
+        assert histogram.percentile_ns(99) == pytest.approx(9_900_000, rel=1 / 8)
+        # The percentile is never more than the max:
+        assert histogram.percentile_ns(100) <= histogram.max_ns
+
+
+class TestLoopProfiler:
+    """Tests the LoopProfiler class in loop_profiler.py."""
+
+    def test_slots(self):
+        inst = LoopProfiler()
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_laps(self, monkeypatch):
+        """Tests that each stage is timed from the end of the stage before it."""
+        clock_ns = iter([1000, 1500, 4000, 5000, 5200])
+        monkeypatch.setattr("time.perf_counter_ns", lambda: next(clock_ns))
+        loop_profiler = LoopProfiler()
+        loop_profiler.start_loop()
+        loop_profiler.lap(LoopStage.FIRM)
+        loop_profiler.lap(LoopStage.DATA_PROCESSOR)
+        loop_profiler.start_loop()
+        loop_profiler.lap(LoopStage.FIRM)
+
+        assert loop_profiler.last_loop_ns[: LoopStage.DATA_PROCESSOR + 1] == [200, 2500]
+        assert loop_profiler.get_stage_durations(LoopStage.DATA_PROCESSOR) == "200 2500"
+        report = loop_profiler.get_report()
+        # Only the stages which were timed are reported:
+        assert [stage_latency.stage for stage_latency in report] == ["firm", "data_processor"]
+        assert report[0].loops == 2
+        assert report[0].max_us == 0.5
+        # The percentiles are the middle of the bucket the duration is in, and the max is exact:
+        assert report[1].p99_us == pytest.approx(2.5, rel=1 / 8)
+        assert report[1].max_us == 2.5
+        assert str(report[1]).startswith("data_processor     p50       2.4 us")
+
+    def test_profiles_context_update(self, tmp_path):
+        """Tests that every stage of the main loop is timed, and logged each loop if asked to."""
+        packets = [FIRMDataPacket(*row) for row in SyntheticFlight().generate().iter_rows()]
+        simulation = LockstepSimulation(packets[:500], tmp_path, delete_log_file=False)
+        simulation.context.loop_profiler = LoopProfiler(log_each_loop=True)
+        simulation.run()
+
+        report = simulation.context.loop_profiler.get_report()
+        assert [stage_latency.stage for stage_latency in report] == [
+            stage.name.lower() for stage in LoopStage
+        ]
+        assert {stage_latency.loops for stage_latency in report} == {simulation.loops}
+        for stage_latency in report:
+            assert 0 < stage_latency.p50_us <= stage_latency.p99_us <= stage_latency.max_us
+
+        durations = (
+            scan_log(simulation.context.logger.log_path)
+            .select(pl.col("loop_stage_durations_ns").str.split(" ").list.len())
+            .collect()
+            .to_series()
+        )
+        # Each loop logs the stages which finished before it was logged:
+        assert durations.len() == 500
+        assert (durations == LoopStage.STATE + 1).all()
+
+    def test_context_update_is_not_logged_by_default(self, tmp_path):
+        simulation = LockstepSimulation([], tmp_path)
+        simulation.context.loop_profiler = LoopProfiler()
+        simulation.context.firm_data_packets = []
+        simulation.context.generate_data_packets()
+        assert simulation.context.context_data_packet.loop_stage_durations_ns is None
@@ -0,0 +1,337 @@
+import inspect
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import polars as pl
+import pytest
+from firm_client import FIRMDataPacket
+
+from airbrakes.constants import (
+    DERIVED_FIRM_FIELDS,
+    FIRM_PACKET_INPUT_FIELDS,
+    MAX_FETCHED_MOCK_FIRM_PACKETS,
+    STOP_SIGNAL,
+)
+from airbrakes.data_handling.log_reader import iterate_log_batches
+from airbrakes.mock.arrival_patterns import RecordedArrivals
+from airbrakes.mock.frm_reader import read_frm_packets
+from airbrakes.mock.mock_firm import MockFIRM
+from tests.auxil.utils import make_firm_data_packet
+
+REAL_LAUNCH = Path("launch_data/real_firm_launches/jackpot_launch_1.csv")
+PRETENDED_LAUNCH = Path("launch_data/pretended_firm_launches/jackpot_1_nosecone.csv")
+FRM_LAUNCH = Path("launch_data/raw_firm_data/jackpot_1_nosecone.FRM")
+
+
+def replay_packets(mock_firm: MockFIRM) -> list:
+    """Replays the whole log file in this thread, and returns the packets it put out."""
+    mock_firm._requested_to_run.set()
+    mock_firm._read_file(real_time_replay=False, start_after_log_buffer=True)
+    return [mock_firm._queued_packets.get() for _ in range(mock_firm._queued_packets.qsize())]
+
+
+class TestReplayCache:
+    """Tests the replay cache of the MockFIRM class in mock_firm.py."""
+
+    def test_cache_is_written_and_reused(self, tmp_path, monkeypatch):
+        mock_firm = MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path)
+        cache_path = mock_firm._get_replay_cache_path()
+        assert cache_path.parent == tmp_path
+        assert cache_path.name.startswith("jackpot_launch_1-")
+        assert not cache_path.exists()
+
+        converted = mock_firm._load_replay_data()
+        assert cache_path.exists()
+        assert not list(tmp_path.glob("*.part"))
+
+        # The second time, the CSV isn't parsed at all:
+        def fail(_self):
+            raise AssertionError("The log file should not be parsed again")
+
+        monkeypatch.setattr(MockFIRM, "_convert_log_file", fail)
+        cached = mock_firm._load_replay_data()
+        assert isinstance(cached, np.memmap)
+        assert np.array_equal(cached, converted)
+
+    def test_cached_replay_matches_csv_replay(self, tmp_path):
+        """Tests that the packets replayed from the cache are the same as from the CSV."""
+        uncached = replay_packets(MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=None))
+        MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path)._load_replay_data()
+        cached = replay_packets(MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path))
+        assert len(cached) == len(uncached) > 0
+        for cached_packet, uncached_packet in zip(cached, uncached, strict=True):
+            assert cached_packet.as_dict() == uncached_packet.as_dict()
+
+    def test_cache_key_changes_with_file(self, tmp_path):
+        log_path = tmp_path / "launch.csv"
+        lines = REAL_LAUNCH.read_text().splitlines(keepends=True)
+        log_path.write_text("".join(lines[:100]))
+        mock_firm = MockFIRM(log_file_path=log_path, replay_cache_dir=tmp_path / "cache")
+        first_path = mock_firm._get_replay_cache_path()
+        assert first_path == mock_firm._get_replay_cache_path()
+
+        log_path.write_text("".join(lines[:101]))
+        assert mock_firm._get_replay_cache_path() != first_path
+
+    @pytest.mark.parametrize("log_path", [PRETENDED_LAUNCH, REAL_LAUNCH])
+    def test_start_index_from_cached_states(self, tmp_path, log_path):
+        """
+        Tests that the state letters in the cache give the same start index as
+        the log index.
+        """
+        mock_firm = MockFIRM(log_file_path=log_path, replay_cache_dir=tmp_path)
+        mock_firm.file_metadata = {}
+        state_letters = mock_firm._load_replay_data()["state_letter"]
+        assert mock_firm._calculate_start_index(state_letters) == (
+            mock_firm._calculate_start_index()
+        )
+        assert mock_firm._calculate_start_index(state_letters) > 0
+
+
+class TestReplayPackets:
+    """Tests how the MockFIRM class in mock_firm.py makes and hands out the replayed packets."""
+
+    def test_packets_match_log(self, tmp_path):
+        mock_firm = MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path)
+        mock_firm._requested_to_run.set()
+        mock_firm._read_file(real_time_replay=False, start_after_log_buffer=False)
+        packets = [
+            mock_firm._queued_packets.get() for _ in range(mock_firm._queued_packets.qsize())
+        ]
+
+        log = pl.read_csv(REAL_LAUNCH)
+        assert len(packets) == len(log)
+        # Check rows from the first, a middle, and the last chunk:
+        for row_number in (0, 1000, len(log) - 1):
+            row = log.row(row_number, named=True)
+            packet = packets[row_number].as_dict()
+            # FIRMDataPacket stores its fields as 32 bit floats:
+            for field in FIRM_PACKET_INPUT_FIELDS:
+                assert packet[field] == pytest.approx(row[field], rel=1e-6), field
+
+    def test_packet_input_fields(self):
+        """
+        Tests that the packets are made from the fields FIRMDataPacket takes, in its order, and
+        that every other field of it is derived from them.
+        """
+        assert tuple(inspect.signature(FIRMDataPacket).parameters) == FIRM_PACKET_INPUT_FIELDS
+        assert set(FIRMDataPacket.__struct_fields__) == {
+            *FIRM_PACKET_INPUT_FIELDS,
+            *DERIVED_FIRM_FIELDS,
+        }
+
+    def test_iterate_packets(self, tmp_path):
+        """Tests that iterating over the packets gives the same packets as the replay thread."""
+        replayed = replay_packets(MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path))
+        iterated = list(
+            MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path).iterate_packets()
+        )
+        assert len(iterated) == len(replayed) > 0
+        assert iterated[0].as_dict() == replayed[0].as_dict()
+        assert iterated[-1].as_dict() == replayed[-1].as_dict()
+
+    def test_missing_field_raises(self, tmp_path):
+        log_path = tmp_path / "launch.csv"
+        pl.read_csv(REAL_LAUNCH, n_rows=100).drop("est_quaternion_z").write_csv(log_path)
+        mock_firm = MockFIRM(log_file_path=log_path, replay_cache_dir=tmp_path / "cache")
+        mock_firm._requested_to_run.set()
+        with pytest.raises(ValueError, match="est_quaternion_z"):
+            mock_firm._read_file(real_time_replay=False)
+        with pytest.raises(ValueError, match="est_quaternion_z"):
+            next(mock_firm.iterate_packets())
+
+    def test_get_data_packets_is_capped(self, tmp_path):
+        """
+        Tests that a fast replay hands out the packets a few at a time, and
+        doesn't block once they have all been handed out.
+        """
+        mock_firm = MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path)
+        packet_count = MAX_FETCHED_MOCK_FIRM_PACKETS * 2 + 5
+        for i in range(packet_count):
+            mock_firm._queued_packets.put(make_firm_data_packet(timestamp_seconds=i))
+        mock_firm._queued_packets.put(STOP_SIGNAL)
+
+        batches = [mock_firm.get_data_packets() for _ in range(4)]
+        assert [len(batch) for batch in batches] == [
+            MAX_FETCHED_MOCK_FIRM_PACKETS,
+            MAX_FETCHED_MOCK_FIRM_PACKETS,
+            5,
+            0,
+        ]
+        timestamps = [packet.timestamp_seconds for batch in batches for packet in batch]
+        assert timestamps == list(range(packet_count))
+        # The stop signal was read, so this would block forever if it waited for a packet:
+        assert mock_firm.get_data_packets() == []
+
+    def test_real_time_replay(self, tmp_path):
+        """Tests that a real time replay is timed from the timestamps of the packets."""
+        log_path = tmp_path / "launch.csv"
+        # One second of data:
+        pl.read_csv(REAL_LAUNCH, n_rows=101).write_csv(log_path)
+        mock_firm = MockFIRM(
+            log_file_path=log_path, replay_cache_dir=tmp_path / "cache", replay_speed=20.0
+        )
+        assert mock_firm.replay_jitter_report is None
+
+        mock_firm._requested_to_run.set()
+        start_time = time.monotonic()
+        mock_firm._read_file(real_time_replay=True)
+        assert time.monotonic() - start_time >= 1 / 20
+
+        report = mock_firm.replay_jitter_report
+        assert report.packets == 101
+        assert report.speed == 20.0
+
+    def test_wait_until_started(self, tmp_path):
+        """Tests that it waits for the thread to start, and stays started after the replay ends."""
+        log_path = tmp_path / "launch.csv"
+        pl.read_csv(REAL_LAUNCH, n_rows=10).write_csv(log_path)
+        mock_firm = MockFIRM(log_file_path=log_path, replay_cache_dir=tmp_path / "cache")
+        assert not mock_firm.wait_until_started(timeout=0.01)
+        mock_firm.start()
+        assert mock_firm.wait_until_started(timeout=5)
+        mock_firm._data_fetch_thread.join()
+        assert not mock_firm.is_running
+        assert mock_firm.wait_until_started(timeout=0)
+
+    def test_invalid_replay_speed(self, tmp_path):
+        with pytest.raises(ValueError, match="replay speed"):
+            MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path, replay_speed=100.0)
+
+    def test_recorded_arrivals(self, tmp_path):
+        """Tests that a replay with an arrival pattern hands out the packets in its batches."""
+        batch_sizes = [3, 1, 5, 1, 2, 8]
+        log_path = tmp_path / "launch.csv"
+        log = pl.read_csv(REAL_LAUNCH, n_rows=sum(batch_sizes))
+        update_timestamps = [
+            1_000_000_000 + batch * 11_000_000
+            for batch, batch_size in enumerate(batch_sizes)
+            for _ in range(batch_size)
+        ]
+        log.with_columns(
+            update_timestamp_ns=pl.Series(update_timestamps),
+            retrieved_firm_packets=pl.Series([size for size in batch_sizes for _ in range(size)]),
+        ).write_csv(log_path)
+
+        mock_firm = MockFIRM(
+            log_file_path=log_path,
+            replay_cache_dir=tmp_path / "cache",
+            arrival_pattern=RecordedArrivals(),
+        )
+        mock_firm._requested_to_run.set()
+        mock_firm._read_file(real_time_replay=False)
+
+        batches = [mock_firm.get_data_packets() for _ in range(len(batch_sizes) + 1)]
+        assert [len(batch) for batch in batches] == [*batch_sizes, 0]
+        timestamps = [packet.timestamp_seconds for batch in batches for packet in batch]
+        assert timestamps == log["timestamp_seconds"].to_list()
+
+
+class TestStreamedReplay:
+    """Tests replaying a log file while the MockFIRM class in mock_firm.py is still parsing it."""
+
+    def test_first_packet_before_log_is_parsed(self, tmp_path, monkeypatch):
+        """
+        Tests that the first packet is put out after one batch of the log was parsed, and that
+        the log is cached once the replay gets to the end of it.
+        """
+        batches_read = 0
+
+        def count_batches(*args):
+            nonlocal batches_read
+            for batch in iterate_log_batches(*args):
+                batches_read += 1
+                yield batch
+
+        monkeypatch.setattr("airbrakes.mock.mock_firm.iterate_log_batches", count_batches)
+        monkeypatch.setattr("airbrakes.mock.mock_firm.REPLAY_READ_BATCH_ROWS", 100)
+        mock_firm = MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path)
+        batches_read_at_put = []
+        monkeypatch.setattr(
+            mock_firm,
+            "_queued_packets",
+            SimpleNamespace(put=lambda _: batches_read_at_put.append(batches_read)),
+        )
+        mock_firm._requested_to_run.set()
+        mock_firm._read_file(real_time_replay=False, start_after_log_buffer=False)
+
+        rows = pl.scan_csv(REAL_LAUNCH).select(pl.len()).collect().item()
+        assert batches_read_at_put[0] == 1
+        assert len(batches_read_at_put) == rows
+        assert batches_read == -(-rows // 100)
+        cached = mock_firm._load_replay_data()
+        assert isinstance(cached, np.memmap)
+        assert len(cached) == rows
+
+    def test_stopped_replay_leaves_no_cache(self, tmp_path, monkeypatch):
+        mock_firm = MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=tmp_path)
+        # Stop the replay as soon as it puts out its first packet:
+        monkeypatch.setattr(
+            mock_firm,
+            "_queued_packets",
+            SimpleNamespace(put=lambda _: mock_firm._requested_to_run.clear()),
+        )
+        mock_firm._requested_to_run.set()
+        mock_firm._read_file(real_time_replay=False)
+        assert not list(tmp_path.iterdir())
+
+    @pytest.mark.parametrize("log_path", [PRETENDED_LAUNCH, REAL_LAUNCH])
+    @pytest.mark.parametrize("replay_cache_dir", ["cache", None])
+    def test_streamed_start_matches_start_index(
+        self, tmp_path, monkeypatch, log_path, replay_cache_dir
+    ):
+        """
+        Tests that a log without a log buffer index in its metadata, replayed while it is being
+        parsed, starts at the same row as one replayed from the whole log.
+        """
+        # Small batches, so the log buffer is spread over many of them:
+        monkeypatch.setattr("airbrakes.mock.mock_firm.REPLAY_READ_BATCH_ROWS", 128)
+        mock_firm = MockFIRM(
+            log_file_path=log_path,
+            replay_cache_dir=replay_cache_dir and tmp_path / replay_cache_dir,
+        )
+        mock_firm.file_metadata = {}
+        streamed = replay_packets(mock_firm)
+
+        replay_data = MockFIRM(log_file_path=log_path, replay_cache_dir=None)._load_replay_data()
+        start_index = mock_firm._calculate_start_index(replay_data["state_letter"])
+        assert len(streamed) == len(replay_data) - start_index
+        assert streamed[0].timestamp_seconds == pytest.approx(
+            replay_data["timestamp_seconds"][start_index]
+        )
+
+    @pytest.mark.parametrize("replay_cache_dir", ["cache", None])
+    def test_log_without_motor_burn(self, tmp_path, replay_cache_dir):
+        """Tests that all of a log which never got to motor burn is replayed."""
+        log_path = tmp_path / "launch.csv"
+        pl.read_csv(REAL_LAUNCH, n_rows=300).write_csv(log_path)
+        mock_firm = MockFIRM(
+            log_file_path=log_path,
+            replay_cache_dir=replay_cache_dir and tmp_path / replay_cache_dir,
+        )
+        packets = replay_packets(mock_firm)
+        assert len(packets) == 300
+
+    def test_cache_header_length(self):
+        dtype = MockFIRM(log_file_path=REAL_LAUNCH, replay_cache_dir=None)._get_replay_dtype()
+        header = MockFIRM._make_cache_header(dtype, 0)
+        assert len(header) % 64 == 0
+        assert len(MockFIRM._make_cache_header(dtype, 10**15)) == len(header)
+
+
+class TestFRMReplay:
+    """Tests replaying a raw .FRM log with the MockFIRM class in mock_firm.py."""
+
+    def test_replay_frm_log(self, tmp_path):
+        mock_firm = MockFIRM(log_file_path=FRM_LAUNCH, replay_cache_dir=tmp_path)
+        packets = replay_packets(mock_firm)
+        frm_packets = read_frm_packets(FRM_LAUNCH)
+        # There are no states in the log, so the whole log is replayed:
+        assert len(packets) == len(frm_packets)
+        assert packets[0].timestamp_seconds == pytest.approx(frm_packets["timestamp_seconds"][0])
+        assert packets[-1].est_position_z_meters == pytest.approx(
+            frm_packets["est_position_z_meters"][-1]
+        )
+        assert mock_firm._get_replay_cache_path().exists()
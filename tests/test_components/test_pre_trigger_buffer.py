@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from airbrakes.constants import (
+    FIRM_PACKET_INPUT_FIELDS,
+    IDLE_LOG_DECIMATION,
+    LOG_BUFFER_SIZE,
+    ServoExtension,
+)
+from airbrakes.data_handling.pre_trigger_buffer import (
+    LoopDataPackets,
+    PreTriggerBuffer,
+)
+from airbrakes.state import StandbyState
+from tests.auxil.utils import (
+    make_apogee_predictor_data_packet,
+    make_context_data_packet,
+    make_firm_data_packet,
+    make_servo_data_packet,
+)
+
+
+def timestamps_of(groups: list[tuple[LoopDataPackets, list]]) -> list[float]:
+    """Returns the timestamps of every FIRM data packet in the groups, in order."""
+    return [packet.timestamp_seconds for _, packets in groups for packet in packets]
+
+
+@pytest.fixture
+def loop_packets():
+    return (
+        make_context_data_packet(state=StandbyState),
+        make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION),
+        make_apogee_predictor_data_packet(),
+    )
+
+
+class TestPreTriggerBuffer:
+    """Tests the PreTriggerBuffer class in pre_trigger_buffer.py."""
+
+    def test_slots(self):
+        inst = PreTriggerBuffer()
+        for attr in inst.__slots__:
+            assert hasattr(inst, attr), f"got extra slot '{attr}'"
+
+    def test_init(self):
+        buffer = PreTriggerBuffer()
+        assert len(buffer) == 0
+        assert not buffer.is_full
+        assert buffer._capacity == LOG_BUFFER_SIZE
+        assert buffer._decimation == IDLE_LOG_DECIMATION
+        assert buffer._firm_values.shape == (LOG_BUFFER_SIZE, len(FIRM_PACKET_INPUT_FIELDS))
+
+    def test_push_and_flush_round_trip(self, loop_packets):
+        """Tests that the packets we get back are the same as the ones we pushed."""
+        buffer = PreTriggerBuffer(capacity=10)
+        firm_data_packets = [
+            make_firm_data_packet(timestamp_seconds=i, pressure_pascals=1000.0 + i)
+            for i in range(5)
+        ]
+        assert buffer.push(firm_data_packets, *loop_packets) == []
+        assert len(buffer) == 5
+
+        groups = buffer.flush()
+        assert len(buffer) == 0
+        assert len(groups) == 1
+        loop_data_packets, packets = groups[0]
+        assert loop_data_packets == LoopDataPackets(*loop_packets)
+        for original, restored in zip(firm_data_packets, packets, strict=True):
+            assert restored.as_dict() == pytest.approx(original.as_dict())
+
+    def test_flush_groups_rows_by_loop(self, loop_packets):
+        buffer = PreTriggerBuffer(capacity=10)
+        other_context = make_context_data_packet(state=StandbyState, retrieved_firm_packets=3)
+        buffer.push([make_firm_data_packet(timestamp_seconds=0)] * 2, *loop_packets)
+        buffer.push(
+            [make_firm_data_packet(timestamp_seconds=1)] * 3, other_context, *loop_packets[1:]
+        )
+
+        groups = buffer.flush()
+        assert [len(packets) for _, packets in groups] == [2, 3]
+        assert groups[0][0].context_data_packet is loop_packets[0]
+        assert groups[1][0].context_data_packet is other_context
+
+    @pytest.mark.parametrize("batch_size", [1, 3, 10, 25])
+    def test_push_evicts_oldest_and_decimates(self, loop_packets, batch_size):
+        """
+        Tests that once the buffer is full, the oldest rows are evicted and
+        only one in every `decimation` of them is returned, no matter how the
+        rows are batched.
+        """
+        capacity, decimation, total_rows = 10, 4, 53
+        buffer = PreTriggerBuffer(capacity=capacity, decimation=decimation)
+
+        evicted = []
+        for start in range(0, total_rows, batch_size):
+            firm_data_packets = [
+                make_firm_data_packet(timestamp_seconds=i)
+                for i in range(start, min(start + batch_size, total_rows))
+            ]
+            evicted.extend(timestamps_of(buffer.push(firm_data_packets, *loop_packets)))
+
+        assert buffer.is_full
+        assert evicted == list(range(0, total_rows - capacity, decimation))
+        # The buffer holds the most recent rows, at the full rate:
+        assert timestamps_of(buffer.flush()) == list(range(total_rows - capacity, total_rows))
+
+    def test_flush_releases_loop_packets(self, loop_packets):
+        buffer = PreTriggerBuffer(capacity=4)
+        buffer.push([make_firm_data_packet()] * 6, *loop_packets)
+        buffer.flush()
+        assert np.all(buffer._loop_data_packets == None)  # noqa: E711
@@ -0,0 +1,157 @@
+from pathlib import Path
+
+import msgspec
+import pytest
+
+from airbrakes.constants import (
+    CATCH_UP_PACKET_BUDGET,
+    REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS,
+    TARGET_APOGEE_METERS,
+)
+from airbrakes.mock.fault_injection import FaultRates
+from airbrakes.mock.regression import (
+    LoopTiming,
+    RegressionFlight,
+    find_launch_logs,
+    get_regression_flights,
+    run_regression,
+    run_regression_flight,
+)
+from airbrakes.mock.synthetic_flight import SyntheticFlight
+
+REAL_LAUNCH = Path("launch_data/real_firm_launches/jackpot_launch_1.csv")
+FRM_LAUNCH = Path("launch_data/raw_firm_data/government_work_2_nosecone.FRM")
+
+
+def test_find_launch_logs(tmp_path):
+    launch_logs = find_launch_logs()
+    assert REAL_LAUNCH in launch_logs
+    assert FRM_LAUNCH in launch_logs
+    assert launch_logs == sorted(launch_logs)
+
+    # A log split into segments is only run once:
+    for name in ("log_1.csv", "log_1.2.csv.xz", "log_1.schema.json", "notes.txt"):
+        (tmp_path / name).touch()
+    assert find_launch_logs(tmp_path) == [tmp_path / "log_1.csv"]
+
+
+def test_get_regression_flights():
+    flights = get_regression_flights([REAL_LAUNCH, FRM_LAUNCH], synthetic_flights=2)
+    assert [flight.name for flight in flights] == [
+        REAL_LAUNCH.as_posix(),
+        FRM_LAUNCH.as_posix(),
+        "synthetic_0",
+        "synthetic_1",
+    ]
+    # The target apogee comes from the launch metadata, if it is there:
+    assert flights[0].target_apogee_meters == 1036.32
+    assert flights[1].target_apogee_meters == TARGET_APOGEE_METERS
+    assert flights[2].target_apogee_meters == REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS
+    assert flights[3].synthetic_flight.seed == 1
+
+    flights = get_regression_flights([REAL_LAUNCH], synthetic_flights=1, target_apogee_meters=500)
+    assert [flight.target_apogee_meters for flight in flights] == [500, 500]
+    assert [flight.faults for flight in flights] == [None, None]
+
+    flights = get_regression_flights([REAL_LAUNCH], synthetic_flights=1, faults=FaultRates())
+    assert [flight.faults for flight in flights] == [FaultRates(), FaultRates()]
+
+
+def test_loop_timing():
+    timing = LoopTiming.from_durations([1000, 2000, 3000, 100_000])
+    assert timing.loops == 4
+    assert timing.mean_us == pytest.approx(26.5)
+    assert timing.p50_us == pytest.approx(2.5)
+    assert timing.max_us == pytest.approx(100.0)
+
+
+def test_run_synthetic_flight():
+    """Tests that the air brakes go through every state, and extend, in a synthetic flight."""
+    flight = RegressionFlight(
+        name="synthetic",
+        target_apogee_meters=REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS,
+        synthetic_flight=SyntheticFlight(),
+    )
+    report = run_regression_flight(flight)
+
+    assert [transition.state for transition in report.state_transitions] == [
+        "MotorBurnState",
+        "CoastState",
+        "FreeFallState",
+        "LandedState",
+    ]
+    coast, free_fall = report.state_transitions[1:3]
+    # The apogee is only predicted in coast:
+    assert report.apogee_predictions
+    for prediction in report.apogee_predictions:
+        assert coast.timestamp_seconds < prediction.timestamp_seconds
+        # The last prediction comes back in the loop after the one which went into free fall:
+        assert prediction.timestamp_seconds <= free_fall.timestamp_seconds + 0.01
+    # The predictions get closer to the apogee the closer the rocket gets to it:
+    assert max(
+        prediction.predicted_apogee_meters for prediction in report.apogee_predictions
+    ) == pytest.approx(report.max_altitude_meters, rel=0.01)
+    # The rocket would go over the target, so the air brakes extend, and retract by apogee:
+    assert report.extension_decisions[0].extended
+    assert not report.extension_decisions[-1].extended
+    assert coast.timestamp_seconds < report.extension_decisions[0].timestamp_seconds
+    assert report.extension_decisions[-1].timestamp_seconds <= free_fall.timestamp_seconds
+    # The flight is flown in a closed loop, so extending the air brakes brought the apogee down
+    # from the 2140 m the rocket reaches with them retracted, towards the target:
+    assert REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS < report.flown_apogee_meters < 2100.0
+    assert report.loop_timing.loops > 1000
+
+
+def test_run_synthetic_flight_with_faults():
+    """
+    Tests that the air brakes still go through every state with faults injected, and that the
+    report says how they coped.
+    """
+    flight = RegressionFlight(
+        name="synthetic",
+        target_apogee_meters=REGRESSION_SYNTHETIC_TARGET_APOGEE_METERS,
+        synthetic_flight=SyntheticFlight(),
+        faults=FaultRates(stall_probability=0.001, nan_burst_probability=0.005),
+    )
+    report = run_regression_flight(flight)
+
+    assert [transition.state for transition in report.state_transitions] == [
+        "MotorBurnState",
+        "CoastState",
+        "FreeFallState",
+        "LandedState",
+    ]
+    faults = report.faults
+    assert faults.injected.dropped > 0
+    assert faults.injected.nan_packets > 0
+    assert faults.nan_processor_packets > 0
+    # Bursts of NaN readings don't reset the max altitude:
+    assert report.max_altitude_meters == pytest.approx(report.flown_apogee_meters, rel=0.01)
+    # Each stall of a second ends with a second's worth of packets, drained in a single loop,
+    # which only processes a summary of them:
+    assert len(faults.backlog_drains) == faults.injected.stalls
+    for drain in faults.backlog_drains:
+        assert drain.packets == pytest.approx(flight.synthetic_flight.rate_hz, rel=0.05)
+        assert 0 < drain.processed_packets <= CATCH_UP_PACKET_BUDGET
+        assert drain.drain_us > 0
+
+
+def test_run_regression_is_deterministic():
+    """Tests that running the same flights again gives the same report, in the same order."""
+    flights = get_regression_flights([FRM_LAUNCH], synthetic_flights=1)
+    first_report = run_regression(flights, jobs=2, time_loops=False)
+    second_report = run_regression(list(reversed(flights)), jobs=2, time_loops=False)
+
+    assert [flight.name for flight in first_report.flights] == [
+        "synthetic_0",
+        FRM_LAUNCH.as_posix(),
+    ][::-1]
+    assert first_report.flights == list(reversed(second_report.flights))
+    assert msgspec.json.encode(first_report) == msgspec.json.encode(
+        run_regression(flights, jobs=1, time_loops=False)
+    )
+    frm_report = first_report.flights[0]
+    assert frm_report.loop_timing is None
+    assert frm_report.state_transitions[0].state == "MotorBurnState"
+    assert frm_report.flown_apogee_meters is None
+    assert frm_report.faults is None
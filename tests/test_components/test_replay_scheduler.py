@@ -0,0 +1,122 @@
+import pytest
+
+from airbrakes.constants import MAX_REPLAY_GAP_SECONDS, MAX_REPLAY_SPEED, MIN_REPLAY_SPEED
+from airbrakes.mock.replay_scheduler import ReplayJitterReport, ReplayScheduler
+
+OVERSLEEP_NS = 1_000_000
+
+
+class FakeClock:
+    """
+    Stands in for the time module, with a clock which only moves when we
+    sleep, and a sleep which always wakes up late.
+    """
+
+    def __init__(self):
+        self.now_ns = 5_000_000_000
+        self.sleeps: list[float] = []
+
+    def monotonic_ns(self) -> int:
+        return self.now_ns
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now_ns += round(seconds * 1e9) + OVERSLEEP_NS
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr("airbrakes.mock.replay_scheduler.time", fake_clock)
+    return fake_clock
+
+
+class TestReplayScheduler:
+    """Tests the ReplayScheduler class in replay_scheduler.py."""
+
+    def test_slots(self):
+        inst = ReplayScheduler()
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    @pytest.mark.parametrize("speed", [0.0, MIN_REPLAY_SPEED / 2, MAX_REPLAY_SPEED * 2, -1.0])
+    def test_invalid_speed(self, speed):
+        with pytest.raises(ValueError, match="replay speed"):
+            ReplayScheduler(speed)
+
+    def test_late_wakeups_dont_accumulate(self, clock):
+        """
+        Tests that each packet is timed from the first one, so oversleeping
+        doesn't make the replay drift.
+        """
+        scheduler = ReplayScheduler()
+        start_ns = clock.now_ns
+        for i in range(1000):
+            scheduler.wait_until_due(100.0 + i / 100)
+        # Every sleep after the first packet woke up 1 ms late, but the last packet was still
+        # sent 1 ms after it should have been, not 1 second:
+        assert clock.now_ns - start_ns == pytest.approx(9.99e9 + OVERSLEEP_NS, abs=1000)
+        assert all(seconds == pytest.approx(0.009, abs=1e-6) for seconds in clock.sleeps[1:])
+
+    def test_timestamp_gaps_and_speed(self, clock):
+        scheduler = ReplayScheduler(speed=4.0)
+        start_ns = clock.now_ns
+        scheduler.wait_until_due(10.0)
+        assert clock.now_ns == start_ns
+        scheduler.wait_until_due(10.01)
+        assert clock.sleeps == [pytest.approx(0.0025)]
+        # A gap in the log, e.g. from the decimated standby rows, is replayed too:
+        scheduler.wait_until_due(10.51)
+        assert clock.sleeps[-1] == pytest.approx(0.125 - OVERSLEEP_NS / 1e9)
+        assert clock.now_ns - start_ns == pytest.approx(0.1275e9 + OVERSLEEP_NS, abs=1000)
+
+    def test_long_gaps_are_shortened(self, clock):
+        scheduler = ReplayScheduler()
+        start_ns = clock.now_ns
+        scheduler.wait_until_due(10.0)
+        scheduler.wait_until_due(10.01)
+        # Nothing was logged for 20 minutes:
+        scheduler.wait_until_due(1210.01)
+        assert clock.now_ns - start_ns == pytest.approx(
+            (0.01 + MAX_REPLAY_GAP_SECONDS) * 1e9 + OVERSLEEP_NS, abs=1000
+        )
+        # The packets after the gap are timed from the shortened gap:
+        scheduler.wait_until_due(1210.02)
+        assert clock.sleeps[-1] == pytest.approx(0.009, abs=1e-6)
+
+    def test_late_packets_dont_wait(self, clock):
+        """Tests that packets which are already late are sent straight away."""
+        scheduler = ReplayScheduler()
+        scheduler.wait_until_due(1.0)
+        clock.now_ns += 50_000_000  # The main loop held us up for 50 ms
+        scheduler.wait_until_due(1.01)
+        scheduler.wait_until_due(1.02)
+        assert clock.sleeps == []
+        # Timestamps which go backwards are due with the packet before them:
+        scheduler.wait_until_due(0.5)
+        assert clock.sleeps == []
+
+        report = scheduler.get_jitter_report()
+        assert report.packets == 4
+        assert report.max_lateness_ms == pytest.approx(40.0)
+        assert report.p50_lateness_ms == pytest.approx(30.0)
+
+    @pytest.mark.usefixtures("clock")
+    def test_jitter_report(self):
+        scheduler = ReplayScheduler(speed=2.0)
+        assert scheduler.get_jitter_report() is None
+        for i in range(101):
+            scheduler.wait_until_due(i / 100)
+
+        report = scheduler.get_jitter_report()
+        assert report == ReplayJitterReport(
+            packets=101,
+            speed=2.0,
+            mean_lateness_ms=pytest.approx(100 / 101),
+            p50_lateness_ms=pytest.approx(1.0),
+            p99_lateness_ms=pytest.approx(1.0),
+            max_lateness_ms=pytest.approx(1.0),
+        )
+        assert str(report) == (
+            "101 packets at 2x, lateness p50 1.000 ms, p99 1.000 ms, max 1.000 ms"
+        )
@@ -0,0 +1,196 @@
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pytest
+
+from airbrakes.context import Context
+from airbrakes.mock.arrival_patterns import RecordedArrivals
+from airbrakes.mock.mock_firm import MockFIRM
+from airbrakes.mock.mock_logger import MockLogger
+from airbrakes.mock.replay_seek import ReplaySeekPoint, seed_context
+from airbrakes.state import CoastState, FreeFallState, MotorBurnState, StandbyState
+
+LAUNCH = Path("launch_data/real_firm_launches/jackpot_launch_4.csv")
+
+
+@pytest.fixture(scope="module")
+def log():
+    return pl.read_csv(LAUNCH, columns=["timestamp_seconds", "state_letter"])
+
+
+def first_row(log: pl.DataFrame, state_letter: str) -> int:
+    return log["state_letter"].to_list().index(state_letter)
+
+
+def run_replay(mock_firm: MockFIRM, tmp_path: Path, servo, data_processor, apogee_predictor):
+    """
+    Runs a fast replay to the end, and returns the Context and the states it went through.
+    """
+    context = Context(
+        servo, mock_firm, MockLogger(tmp_path / "logs"), data_processor, apogee_predictor
+    )
+    if mock_firm.replay_seek is not None:
+        seed_context(context, mock_firm.replay_seek)
+    states = [type(context.state)]
+    context.start(wait_for_start=True)
+    while not context.shutdown_requested:
+        context.update()
+        if type(context.state) is not states[-1]:
+            states.append(type(context.state))
+        if not context.firm.is_running and not context.firm_data_packets:
+            break
+    context.stop()
+    return context, states
+
+
+class TestReplaySeekPoint:
+    """Tests the ReplaySeekPoint class in replay_seek.py."""
+
+    @pytest.mark.parametrize(
+        ("text", "expected"),
+        [
+            ("Coast", ReplaySeekPoint(state_letter="C")),
+            ("motorburn-2", ReplaySeekPoint(state_letter="M", offset_seconds=-2.0)),
+            ("FreeFall+1.5", ReplaySeekPoint(state_letter="F", offset_seconds=1.5)),
+            ("152.4", ReplaySeekPoint(timestamp_seconds=152.4)),
+        ],
+    )
+    def test_from_string(self, text, expected):
+        assert ReplaySeekPoint.from_string(text) == expected
+
+    @pytest.mark.parametrize("text", ["Apogee", "Coast+", "Coast 2", ""])
+    def test_invalid_string(self, text):
+        with pytest.raises(ValueError, match="Can't start a replay"):
+            ReplaySeekPoint.from_string(text)
+
+    def test_find_start_row(self, log):
+        timestamps = log["timestamp_seconds"].to_numpy()
+        state_letters = log["state_letter"].to_numpy()
+        motor_burn_row = first_row(log, "M")
+
+        assert ReplaySeekPoint(state_letter="M").find_start_row(timestamps, state_letters) == (
+            motor_burn_row
+        )
+        start_row = ReplaySeekPoint(state_letter="M", offset_seconds=-2.0).find_start_row(
+            timestamps, state_letters
+        )
+        assert timestamps[start_row] >= timestamps[motor_burn_row] - 2.0
+        assert timestamps[start_row - 1] < timestamps[motor_burn_row] - 2.0
+
+        assert ReplaySeekPoint(timestamp_seconds=timestamps[1234]).find_start_row(
+            timestamps, state_letters
+        ) == (1234)
+
+    def test_seek_outside_log(self, log):
+        timestamps = log["timestamp_seconds"].to_numpy()
+        state_letters = log["state_letter"].to_numpy()
+        with pytest.raises(ValueError, match="never got to"):
+            ReplaySeekPoint(state_letter="L").find_start_row(
+                timestamps, np.where(state_letters == "L", "F", state_letters)
+            )
+        with pytest.raises(ValueError, match="ends before"):
+            ReplaySeekPoint(state_letter="L", offset_seconds=1e6).find_start_row(
+                timestamps, state_letters
+            )
+
+
+class TestReplaySeek:
+    """Tests seeking in a MockFIRM replay, and bringing the Context up to date with it."""
+
+    def test_seek_to_state(self, tmp_path, log):
+        mock_firm = MockFIRM(
+            log_file_path=LAUNCH, replay_cache_dir=tmp_path, start_at=ReplaySeekPoint("C")
+        )
+        replay_seek = mock_firm.replay_seek
+        coast_row = first_row(log, "C")
+        assert replay_seek.start_row == coast_row
+        # The history starts where a replay without a seek starts:
+        history_start = mock_firm._get_first_row(mock_firm._load_replay_data(), True)
+        assert len(replay_seek.history) == coast_row - history_start
+        assert [packet.timestamp_seconds for packet in replay_seek.history] == pytest.approx(
+            log["timestamp_seconds"][history_start:coast_row].to_list()
+        )
+        # The coast row was processed in motor burn:
+        assert replay_seek.state_letter == "M"
+        motor_burn_seconds = log["timestamp_seconds"][first_row(log, "M")]
+        assert replay_seek.state_start_seconds == motor_burn_seconds
+        assert replay_seek.launch_time_seconds == motor_burn_seconds
+
+        # The replay starts at the seek point:
+        mock_firm._requested_to_run.set()
+        mock_firm._read_file(real_time_replay=False)
+        assert mock_firm.get_data_packets()[0].timestamp_seconds == pytest.approx(
+            log["timestamp_seconds"][coast_row]
+        )
+
+    def test_seek_before_log_buffer(self, tmp_path, log):
+        mock_firm = MockFIRM(
+            log_file_path=LAUNCH,
+            replay_cache_dir=tmp_path,
+            start_at=ReplaySeekPoint(timestamp_seconds=log["timestamp_seconds"][10]),
+        )
+        assert mock_firm.replay_seek.start_row == 10
+        assert mock_firm.replay_seek.history == []
+        assert mock_firm.replay_seek.state_letter == "S"
+        assert mock_firm.replay_seek.launch_time_seconds == 0.0
+
+    def test_seed_context(self, tmp_path, log, servo, data_processor, apogee_predictor):
+        mock_firm = MockFIRM(
+            log_file_path=LAUNCH,
+            replay_cache_dir=tmp_path,
+            start_at=ReplaySeekPoint("C", offset_seconds=3.0),
+        )
+        context = Context(servo, mock_firm, None, data_processor, apogee_predictor)
+        seed_context(context, mock_firm.replay_seek)
+
+        history = mock_firm.replay_seek.history
+        assert type(context.state) is CoastState
+        assert context.state.start_time_seconds == log["timestamp_seconds"][first_row(log, "C")]
+        assert context.launch_time_seconds == log["timestamp_seconds"][first_row(log, "M")]
+        assert data_processor.current_timestamp_seconds == history[-1].timestamp_seconds
+        assert data_processor.max_vertical_velocity == pytest.approx(
+            max(packet.est_velocity_z_meters_per_s for packet in history)
+        )
+        assert data_processor.current_altitude == pytest.approx(
+            history[-1].est_position_z_meters - history[0].est_position_z_meters
+        )
+
+    def test_seeked_replay_matches_full_replay(
+        self, tmp_path, servo, data_processor, apogee_predictor
+    ):
+        """
+        Tests that a replay which starts at motor burn ends up where a replay from the start
+        does. Both replays get one packet per loop, so the state machine sees the same batches.
+        """
+        full_context, full_states = run_replay(
+            MockFIRM(
+                log_file_path=LAUNCH, replay_cache_dir=tmp_path, arrival_pattern=RecordedArrivals()
+            ),
+            tmp_path,
+            servo,
+            data_processor,
+            apogee_predictor,
+        )
+        seeked_context, seeked_states = run_replay(
+            MockFIRM(
+                log_file_path=LAUNCH,
+                replay_cache_dir=tmp_path,
+                arrival_pattern=RecordedArrivals(),
+                start_at=ReplaySeekPoint("M", offset_seconds=-0.5),
+            ),
+            tmp_path,
+            type(servo)(),
+            type(data_processor)(),
+            type(apogee_predictor)(),
+        )
+
+        assert full_states[0] is StandbyState
+        assert seeked_states == full_states
+        assert seeked_states[1:3] == [MotorBurnState, CoastState]
+        assert FreeFallState in seeked_states
+        assert seeked_context.launch_time_seconds == full_context.launch_time_seconds
+        assert seeked_context.state.start_time_seconds == full_context.state.start_time_seconds
+        assert seeked_context.data_processor.max_altitude == pytest.approx(
+            full_context.data_processor.max_altitude
+        )
@@ -0,0 +1,84 @@
+import math
+import sys
+import threading
+
+import pytest
+
+from airbrakes.constants import ScalingWorkload
+from airbrakes.mock.regression import LoopTiming
+from airbrakes.mock.scaling import (
+    FlightPackets,
+    ScalingResult,
+    get_thread_cpu_seconds,
+    run_scaling_benchmark,
+    run_workload,
+)
+from airbrakes.mock.synthetic_flight import SyntheticFlight
+
+
+def test_flight_packets():
+    flight_packets = FlightPackets.from_synthetic_flight(SyntheticFlight())
+    assert len(flight_packets.firm_data_packets) > len(flight_packets.coast_processor_data_packets)
+    assert flight_packets.coast_processor_data_packets
+    assert all(
+        packet.vertical_velocity_meters_per_s > 0
+        for packet in flight_packets.coast_processor_data_packets
+    )
+
+
+@pytest.mark.parametrize(
+    ("workload", "items", "thread_names"),
+    [
+        (ScalingWorkload.PIPELINE, 500, {"main loop", "FIRM", "logger", "predictor"}),
+        (ScalingWorkload.APOGEE_PREDICTOR, 20, {"predictor"}),
+        (ScalingWorkload.LOGGER, 200, {"logger"}),
+    ],
+)
+def test_run_workload(workload, items, thread_names):
+    """Tests that every thread does its work, and how long it took is measured."""
+    result = run_workload(workload, 2, items)
+    assert result.workload == workload
+    assert result.threads == 2
+    assert result.gil_enabled == sys._is_gil_enabled()
+    assert result.items >= 2 * items
+    assert result.timing.loops > 0
+    assert 0 < result.timing.p50_us <= result.timing.max_us
+    assert result.wall_seconds > 0
+    assert result.throughput == result.items / result.wall_seconds
+    assert result.thread_cpu_seconds.keys() == thread_names
+    assert str(result).startswith(f"{workload:<10} ")
+
+
+def test_run_scaling_benchmark():
+    """Tests that each run is done in a process of its own, with the GIL setting asked for."""
+    results = run_scaling_benchmark(
+        [ScalingWorkload.APOGEE_PREDICTOR], [1, 2], gil_settings=[True], items_per_thread=5
+    )
+    assert [(result.threads, result.items) for result in results] == [(1, 5), (2, 10)]
+    assert all(result.gil_enabled for result in results)
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Reads the CPU clock of another thread")
+def test_get_thread_cpu_seconds():
+    done = threading.Event()
+    thread = threading.Thread(target=done.wait)
+    assert math.isnan(get_thread_cpu_seconds(thread))
+    thread.start()
+    assert get_thread_cpu_seconds(thread) >= 0
+    done.set()
+    thread.join()
+
+
+def test_scaling_result_str():
+    result = ScalingResult(
+        workload=ScalingWorkload.LOGGER,
+        threads=2,
+        gil_enabled=False,
+        items=1000,
+        wall_seconds=0.5,
+        timing=LoopTiming(loops=100, mean_us=12.0, p50_us=10.0, p99_us=20.0, max_us=30.0),
+        thread_cpu_seconds={"logger": 0.5},
+    )
+    assert str(result) == (
+        "logger     off        2        2,000      10.0      20.0       30.0  logger 50%"
+    )
@@ -0,0 +1,97 @@
+import math
+
+import polars as pl
+import pytest
+
+from airbrakes.data_handling.sparse_columns import (
+    MISSING_VALUE_MARKER,
+    SparseColumnEncoder,
+    SparseColumnFiller,
+    forward_fill_sparse_columns,
+)
+
+COLUMNS = ["timestamp_seconds", "set_extension", "predicted_apogee"]
+SPARSE_COLUMNS = ["set_extension", "predicted_apogee", "battery_voltage"]
+
+
+class TestSparseColumnEncoder:
+    """Tests the SparseColumnEncoder class in sparse_columns.py."""
+
+    def test_slots(self):
+        inst = SparseColumnEncoder(COLUMNS)
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    def test_encode_row(self):
+        encoder = SparseColumnEncoder(COLUMNS, SPARSE_COLUMNS)
+
+        def encode(values, keyframe=False):
+            encoder.encode_row(values, keyframe)
+            return values
+
+        assert encode([1.0, "0.0", None], keyframe=True) == [1.0, "0.0", None]
+        assert encode([2.0, "0.0", None]) == [2.0, None, None]
+        assert encode([3.0, "0.0", 500.0]) == [3.0, None, 500.0]
+        assert encode([4.0, "1.0", 500.0]) == [4.0, "1.0", None]
+        # Keyframes have every value written:
+        assert encode([5.0, "1.0", 500.0], keyframe=True) == [5.0, "1.0", 500.0]
+        # A value which goes back to being missing is marked, so it isn't filled in:
+        assert encode([6.0, "1.0", None]) == [6.0, None, MISSING_VALUE_MARKER]
+        assert encode([7.0, "1.0", None]) == [7.0, None, None]
+        # NaN isn't equal to itself, but it is only written when it changes:
+        written = encode([8.0, "1.0", float("nan")])[2]
+        assert math.isnan(written)
+        assert encode([9.0, "1.0", float("nan")]) == [9.0, None, None]
+
+
+def test_forward_fill_sparse_columns():
+    log = pl.LazyFrame(
+        {
+            "timestamp_seconds": [1.0, 2.0, 3.0, 4.0, 5.0],
+            "set_extension": [0.0, None, 1.0, None, None],
+            "predicted_apogee": [None, 500.0, None, float("nan"), None],
+        }
+    )
+    df = forward_fill_sparse_columns(log, SPARSE_COLUMNS).collect()
+    assert df["timestamp_seconds"].to_list() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert df["set_extension"].to_list() == [0.0, 0.0, 1.0, 1.0, 1.0]
+    assert df["predicted_apogee"].to_list() == [None, 500.0, 500.0, None, None]
+
+
+def test_forward_fill_sparse_columns_casts_integer_columns():
+    """Tests that an integer column read as strings is cast back once the marker is replaced."""
+    log = pl.LazyFrame({"command_loop_id": ["1", None, MISSING_VALUE_MARKER, None, "3"]})
+    df = forward_fill_sparse_columns(
+        log, ["command_loop_id"], {"command_loop_id": pl.Int64}
+    ).collect()
+    assert df["command_loop_id"].dtype == pl.Int64
+    assert df["command_loop_id"].to_list() == [1, 1, None, None, 3]
+
+
+class TestSparseColumnFiller:
+    """Tests the SparseColumnFiller class in sparse_columns.py."""
+
+    def test_slots(self):
+        inst = SparseColumnFiller(SPARSE_COLUMNS)
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    @pytest.mark.parametrize("batch_rows", [1, 2, 3, 6])
+    def test_fill_matches_forward_fill(self, batch_rows):
+        """Tests that filling a log a batch at a time is the same as filling all of it."""
+        log = pl.DataFrame(
+            {
+                "timestamp_seconds": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+                "set_extension": [None, 0.0, None, 1.0, None, None],
+                "predicted_apogee": [500.0, None, float("nan"), None, 600.0, None],
+                "state_letter": ["S", None, "nan", None, "C", None],
+            }
+        )
+        sparse_columns = [*SPARSE_COLUMNS, "state_letter"]
+        filler = SparseColumnFiller(sparse_columns)
+        filled = pl.concat(
+            [filler.fill(log.slice(start, batch_rows)) for start in range(0, len(log), batch_rows)]
+        )
+        assert filled.equals(forward_fill_sparse_columns(log.lazy(), sparse_columns).collect())
+        assert filled["predicted_apogee"].to_list() == [500.0, 500.0, None, None, 600.0, 600.0]
+        assert filled["state_letter"].to_list() == ["S", "S", None, None, "C", "C"]
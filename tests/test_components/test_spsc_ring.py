@@ -0,0 +1,211 @@
+import itertools
+import queue
+import threading
+import time
+
+import pytest
+
+from airbrakes.data_handling.spsc_ring import SPSCRing
+from airbrakes.utils import get_all_packets_from_queue
+
+BENCHMARK_BATCH_SIZES = [1, 10, 100, 1000]
+
+
+def drain(ring: SPSCRing) -> list:
+    """Takes every item out of the ring, without waiting."""
+    items = []
+    ring.drain_into(items)
+    return items
+
+
+class TestSPSCRing:
+    """Tests the SPSCRing class in spsc_ring.py."""
+
+    def test_slots(self):
+        inst = SPSCRing(4)
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    @pytest.mark.parametrize(("capacity", "expected"), [(1, 1), (3, 4), (8, 8), (6000, 8192)])
+    def test_capacity_is_a_power_of_two(self, capacity, expected):
+        assert SPSCRing(capacity).capacity == expected
+
+    def test_invalid_capacity(self):
+        with pytest.raises(ValueError, match="at least 1"):
+            SPSCRing(0)
+
+    def test_push_and_drain_in_order(self):
+        """Tests that the items come out in the order they went in, as they wrap round."""
+        ring = SPSCRing(8)
+        assert drain(ring) == []
+        for start in range(0, 60, 6):
+            ring.push_many(list(range(start, start + 6)))
+            ring.push(start + 6)
+            assert len(ring) == 7
+            assert drain(ring) == list(range(start, start + 7))
+            assert len(ring) == 0
+
+    def test_try_push_when_full(self):
+        ring = SPSCRing(4)
+        assert ring.try_push_many([1, 2, 3]) == 3
+        assert ring.try_push_many([4, 5, 6]) == 1
+        assert ring.try_push_many([5]) == 0
+        assert drain(ring) == [1, 2, 3, 4]
+        assert ring.try_push_many((5, 6)) == 2
+        assert drain(ring) == [5, 6]
+
+    def test_discard_oldest(self):
+        """Tests that the discarded items are skipped, and only their slots are freed after."""
+        ring = SPSCRing(8)
+        ring.push_many(list(range(6)))
+        assert ring.discard_oldest(4) == 4
+        assert len(ring) == 2
+        # Only as many as are waiting can be discarded:
+        assert ring.discard_oldest(10) == 2
+        assert len(ring) == 0
+        # The slots of the discarded items are still taken:
+        assert ring.try_push_many(list(range(6, 10))) == 2
+        assert drain(ring) == [6, 7]
+        assert ring.dropped == 6
+        assert ring.try_push_many(list(range(8, 16))) == 8
+
+    def test_drain_waits_for_items(self):
+        ring = SPSCRing(8)
+        items = []
+        assert ring.drain_into(items, block=True, timeout=0.01) == 0
+
+        def push_later():
+            time.sleep(0.05)
+            ring.push_many([1, 2])
+
+        thread = threading.Thread(target=push_later)
+        thread.start()
+        assert ring.drain_into(items, block=True, timeout=5) == 2
+        assert items == [1, 2]
+        thread.join()
+
+    def test_push_waits_for_space(self):
+        """Tests that pushing into a full ring waits until the consumer takes items out."""
+        ring = SPSCRing(4)
+        ring.push_many([0, 1, 2, 3])
+        thread = threading.Thread(target=ring.push_many, args=([4, 5, 6],))
+        thread.start()
+        time.sleep(0.05)
+        # It's still waiting for space:
+        assert thread.is_alive()
+        assert drain(ring) == [0, 1, 2, 3]
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert drain(ring) == [4, 5, 6]
+
+    def test_threads_hand_over_every_item(self):
+        """Tests that every item a producer thread puts in reaches the consumer, in order."""
+        ring = SPSCRing(64)
+        count = 50_000
+
+        def produce():
+            for start in range(0, count, 100):
+                ring.push_many(range(start, start + 100))
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        items = []
+        while len(items) < count:
+            ring.drain_into(items, block=True, timeout=5)
+        producer.join()
+        assert items == list(range(count))
+
+    @pytest.mark.parametrize("capacity", [1, 7, 64, 1024])
+    def test_threads_stress(self, capacity):
+        """
+        Tests that batches of every size, put in with and without waiting, reach a consumer
+        which takes them out with and without waiting, in order and with none lost or repeated.
+        With the GIL disabled, nothing but the order of the stores keeps the ring consistent.
+        """
+        ring = SPSCRing(capacity)
+        batch_sizes = [1, 2, 3, 10, 100, 1000] * 20
+        count = sum(batch_sizes)
+
+        def produce():
+            start = 0
+            for i, batch_size in enumerate(batch_sizes):
+                batch = range(start, start + batch_size)
+                if i % 2:
+                    ring.push_many(batch)
+                else:
+                    pushed = ring.try_push_many(batch)
+                    while pushed < batch_size:
+                        time.sleep(0)  # Lets the consumer run, if there is a GIL
+                        pushed += ring.try_push_many(batch[pushed:])
+                start += batch_size
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        items = []
+        drains = 0
+        while len(items) < count and drains < 10 * count:
+            ring.drain_into(items, block=bool(drains % 2), timeout=5)
+            drains += 1
+        producer.join(timeout=5)
+        assert not producer.is_alive()
+        assert len(items) == count
+        assert items == list(range(count))
+        assert not len(ring)
+        assert ring.dropped == 0
+
+    def test_threads_stress_with_discards(self):
+        """
+        Tests that while the producer discards the oldest items, every item is either taken out,
+        in order, or counted as dropped, once.
+        """
+        ring = SPSCRing(64)
+        count = 100_000
+
+        def produce():
+            for start in range(0, count, 10):
+                ring.push_many(range(start, start + 10))
+                if start % 100 == 0:
+                    ring.discard_oldest(20)
+            ring.push_many((None,))
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        items = []
+        while not items or items[-1] is not None:
+            ring.drain_into(items, block=True, timeout=5)
+        producer.join(timeout=5)
+        assert not producer.is_alive()
+        items.pop()
+        assert all(a < b for a, b in itertools.pairwise(items))
+        assert len(items) + ring.dropped == count
+
+
+@pytest.mark.parametrize("batch_size", BENCHMARK_BATCH_SIZES)
+def test_benchmark_spsc_ring(benchmark, batch_size):
+    """Benchmarks putting a batch in the ring and taking it out."""
+    benchmark.group = f"inter-thread transport, batch of {batch_size}"
+    ring = SPSCRing(2 * batch_size)
+    batch = list(range(batch_size))
+
+    def transport():
+        ring.push_many(batch)
+        items = []
+        ring.drain_into(items)
+        return items
+
+    assert benchmark(transport) == batch
+
+
+@pytest.mark.parametrize("batch_size", BENCHMARK_BATCH_SIZES)
+def test_benchmark_simple_queue(benchmark, batch_size):
+    """Benchmarks putting a batch in a SimpleQueue and taking it out, as we used to."""
+    benchmark.group = f"inter-thread transport, batch of {batch_size}"
+    packet_queue = queue.SimpleQueue()
+    batch = list(range(batch_size))
+
+    def transport():
+        for item in batch:
+            packet_queue.put(item)
+        return get_all_packets_from_queue(packet_queue, block=False)
+
+    assert benchmark(transport) == batch
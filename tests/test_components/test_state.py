@@ -19,7 +19,12 @@ from airbrakes.state import (
     StandbyState,
     State,
 )
-from tests.auxil.utils import make_apogee_predictor_data_packet, make_firm_data_packet
+from tests.auxil.utils import (
+    make_apogee_predictor_data_packet,
+    make_context_data_packet,
+    make_firm_data_packet,
+    make_servo_data_packet,
+)
 
 
 @pytest.fixture
@@ -503,7 +508,12 @@ class TestLandedState:
         assert context.firm.is_running
         assert not context.logger.is_log_buffer_full
         # Test that if our log buffer is full, we shut down the system:
-        context.logger._log_buffer.extend([[1]] * LOG_BUFFER_SIZE)
+        context.logger._log_buffer.push(
+            [make_firm_data_packet()] * LOG_BUFFER_SIZE,
+            make_context_data_packet(state=LandedState),
+            make_servo_data_packet(set_extension=ServoExtension.MIN_EXTENSION),
+            None,
+        )
         assert context.logger.is_log_buffer_full
         ls.update()
         assert context.shutdown_requested
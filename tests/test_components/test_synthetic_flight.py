@@ -0,0 +1,145 @@
+import time
+
+import numpy as np
+import pytest
+from firm_client import FIRMDataPacket
+
+from airbrakes.constants import FIRM_PACKET_INPUT_FIELDS
+from airbrakes.context import Context
+from airbrakes.mock.mock_logger import MockLogger
+from airbrakes.mock.synthetic_flight import (
+    NO_SENSOR_ERRORS,
+    SensorErrors,
+    SyntheticFIRM,
+    SyntheticFlight,
+)
+from airbrakes.state import CoastState, FreeFallState, LandedState, MotorBurnState, StandbyState
+
+
+@pytest.fixture(scope="module")
+def perfect_flight():
+    return SyntheticFlight(errors=NO_SENSOR_ERRORS).generate()
+
+
+class TestSyntheticFlight:
+    """Tests the SyntheticFlight class in synthetic_flight.py."""
+
+    def test_packet_fields(self, perfect_flight):
+        assert perfect_flight.columns == list(FIRM_PACKET_INPUT_FIELDS)
+        timestamps = perfect_flight["timestamp_seconds"].to_numpy()
+        assert np.diff(timestamps) == pytest.approx(0.01)
+
+    @pytest.mark.parametrize("rate_hz", [100, 1000, 5000])
+    def test_rates(self, rate_hz, perfect_flight):
+        """Tests that the flight is the same at any packet rate, with more packets."""
+        flight = SyntheticFlight(rate_hz=rate_hz, errors=NO_SENSOR_ERRORS).generate()
+        assert len(flight) == pytest.approx(len(perfect_flight) * rate_hz / 100, rel=1e-3)
+        assert flight["est_position_z_meters"].max() == pytest.approx(
+            perfect_flight["est_position_z_meters"].max(), abs=1.0
+        )
+        assert flight["timestamp_seconds"][-1] == pytest.approx(
+            perfect_flight["timestamp_seconds"][-1], abs=0.02
+        )
+
+    def test_physically_consistent(self, perfect_flight):
+        """Tests that the readings all agree with how the rocket flew."""
+        timestamps = perfect_flight["timestamp_seconds"].to_numpy()
+        altitudes = perfect_flight["est_position_z_meters"].to_numpy()
+        velocities = perfect_flight["est_velocity_z_meters_per_s"].to_numpy()
+        # The velocity is the rate of change of the altitude, until the rocket hits the ground:
+        flying = slice(0, np.flatnonzero(altitudes > 0)[-1])
+        assert np.gradient(altitudes[flying], timestamps[flying]) == pytest.approx(
+            velocities[flying], abs=1.0
+        )
+        # The pressure drops as the rocket climbs:
+        pressures = perfect_flight["pressure_pascals"].to_numpy()
+        apogee = np.argmax(altitudes)
+        assert np.all(np.diff(pressures[:apogee]) <= 0)
+        assert pressures[0] == pytest.approx(101_325.0)
+
+        packets = [FIRMDataPacket(*row) for row in perfect_flight[::50].iter_rows()]
+        for packet in packets:
+            # Everything the rocket feels is along its axis:
+            assert packet.raw_rotated_acceleration_x_gs == pytest.approx(0.0, abs=1e-6)
+            assert packet.raw_rotated_acceleration_y_gs == pytest.approx(0.0, abs=1e-6)
+        assert packets[0].raw_rotated_acceleration_z_gs == pytest.approx(1.0)
+        assert packets[0].est_tilt_angle_degrees == pytest.approx(3.0, abs=1e-3)
+        # The motor pushes the rocket up:
+        burn = next(p for p in packets if p.est_velocity_z_meters_per_s > 10)
+        assert burn.raw_rotated_acceleration_z_gs > 5
+
+    def test_sensor_errors(self, perfect_flight):
+        errors = SensorErrors(acceleration_bias_gs=0.1, pressure_bias_pascals=50.0)
+        flight = SyntheticFlight(errors=errors).generate()
+        pad = slice(0, 400)
+        noise = flight["raw_acceleration_x_gs"][pad] - perfect_flight["raw_acceleration_x_gs"][pad]
+        assert noise.mean() == pytest.approx(0.1, abs=0.005)
+        assert noise.std() == pytest.approx(errors.acceleration_noise_gs, rel=0.2)
+        pressure_noise = flight["pressure_pascals"][pad] - perfect_flight["pressure_pascals"][pad]
+        assert pressure_noise.mean() == pytest.approx(50.0, abs=2.0)
+        # The estimates wander instead of jumping from packet to packet:
+        altitude_noise = (
+            flight["est_position_z_meters"] - perfect_flight["est_position_z_meters"]
+        ).to_numpy()
+        assert np.abs(np.diff(altitude_noise)).max() < errors.altitude_noise_meters
+
+    def test_same_seed_same_flight(self):
+        assert SyntheticFlight(seed=1).generate().equals(SyntheticFlight(seed=1).generate())
+        assert not SyntheticFlight(seed=1).generate().equals(SyntheticFlight(seed=2).generate())
+
+    def test_dropouts(self, perfect_flight):
+        flight = SyntheticFlight(
+            errors=SensorErrors(dropout_probability=0.01, mean_dropout_ms=100.0)
+        ).generate()
+        timestamps = flight["timestamp_seconds"].to_numpy()
+        assert 0.5 * len(perfect_flight) < len(flight) < len(perfect_flight)
+        # The packets which got through are still on time:
+        assert np.isin(timestamps, perfect_flight["timestamp_seconds"].to_numpy()).all()
+        assert np.diff(timestamps).max() > 0.05
+
+
+class TestSyntheticFIRM:
+    """Tests the SyntheticFIRM class in synthetic_flight.py."""
+
+    def test_slots(self, perfect_flight):
+        inst = SyntheticFIRM(perfect_flight)
+        for attr in inst.__slots__:
+            assert hasattr(inst, attr), f"got extra slot '{attr}'"
+
+    def test_packets_arrive_on_clock(self, perfect_flight):
+        firm = SyntheticFIRM(perfect_flight)
+        assert not firm.is_running
+        firm.start()
+        assert firm.is_running
+        # The first call waits for the first packet:
+        assert len(firm.get_data_packets()) == 1
+        time.sleep(0.1)
+        # The packets sent while the main loop was busy all arrive at once:
+        packets = firm.get_data_packets()
+        assert len(packets) == pytest.approx(10, abs=2)
+        assert firm.busy_seconds == pytest.approx(0.1, abs=0.02)
+        assert firm.max_lag_seconds < 0.01
+        # If the main loop isn't busy, the next packet arrives straight away:
+        assert firm.get_data_packets()[0].timestamp_seconds == pytest.approx(
+            packets[-1].timestamp_seconds + 0.01
+        )
+        firm.stop()
+        assert not firm.is_running
+        assert firm.get_data_packets() == []
+
+    def test_flight_state_transitions(self, tmp_path, servo, data_processor, apogee_predictor):
+        """Tests that a noisy synthetic flight goes through every state of the state machine."""
+        flight = SyntheticFlight(rate_hz=500, errors=SensorErrors(dropout_probability=0.001))
+        firm = SyntheticFIRM(flight.generate())
+        context = Context(servo, firm, MockLogger(tmp_path), data_processor, apogee_predictor)
+        states = [type(context.state)]
+        context.start(wait_for_start=True)
+        while firm.is_running and not context.shutdown_requested:
+            context.update()
+            if type(context.state) is not states[-1]:
+                states.append(type(context.state))
+        context.stop()
+
+        assert states == [StandbyState, MotorBurnState, CoastState, FreeFallState, LandedState]
+        assert context.data_processor.max_altitude == pytest.approx(2140, rel=0.02)
+        assert firm.busy_seconds < firm.flight_seconds
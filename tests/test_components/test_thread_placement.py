@@ -0,0 +1,130 @@
+import os
+import threading
+
+import pytest
+
+from airbrakes.constants import ThreadRole
+from airbrakes.thread_placement import PlacedThread, ThreadPlacer
+
+needs_affinity = pytest.mark.skipif(
+    not hasattr(os, "sched_setaffinity"), reason="This OS can't pin threads"
+)
+
+
+@pytest.fixture
+def waiting_thread():
+    """A thread which waits until the test is done."""
+    done = threading.Event()
+    thread = threading.Thread(target=done.wait, name="Waiting Thread")
+    thread.start()
+    yield thread
+    done.set()
+    thread.join()
+
+
+class TestThreadPlacer:
+    """Tests the ThreadPlacer class in thread_placement.py."""
+
+    def test_slots(self):
+        inst = ThreadPlacer({})
+        for attr in inst.__slots__:
+            assert getattr(inst, attr, "err") != "err", f"got extra slot '{attr}'"
+
+    @needs_affinity
+    def test_no_cores_leaves_threads(self, waiting_thread):
+        available_cores = tuple(sorted(os.sched_getaffinity(0)))
+        placed_threads = ThreadPlacer({}).place({ThreadRole.LOGGER: waiting_thread})
+        assert placed_threads == [
+            PlacedThread(
+                role=ThreadRole.LOGGER,
+                name="Waiting Thread",
+                native_id=waiting_thread.native_id,
+                cores=available_cores,
+                fifo_priority=None,
+            )
+        ]
+
+    @needs_affinity
+    def test_pins_thread(self, waiting_thread):
+        core = max(os.sched_getaffinity(0))
+        thread_placer = ThreadPlacer({ThreadRole.LOGGER: (core, 1000)})
+        (placed_thread,) = thread_placer.place({ThreadRole.LOGGER: waiting_thread})
+        assert placed_thread.cores == (core,)
+        assert placed_thread.notes == ()
+        assert os.sched_getaffinity(waiting_thread.native_id) == {core}
+        assert thread_placer.placed_threads == [placed_thread]
+
+    @needs_affinity
+    def test_unavailable_cores(self, waiting_thread):
+        (placed_thread,) = ThreadPlacer({ThreadRole.LOGGER: (1000, 1001)}).place(
+            {ThreadRole.LOGGER: waiting_thread}
+        )
+        assert placed_thread.cores == tuple(sorted(os.sched_getaffinity(0)))
+        assert placed_thread.notes == ("cores 1000,1001 aren't available",)
+
+    @needs_affinity
+    def test_fifo_needs_root(self, monkeypatch, waiting_thread):
+        """Tests that a thread which can't have SCHED_FIFO is still pinned."""
+
+        def deny(*_):
+            raise PermissionError(1, "Operation not permitted")
+
+        monkeypatch.setattr(os, "sched_setscheduler", deny)
+        core = min(os.sched_getaffinity(0))
+        (placed_thread,) = ThreadPlacer(
+            {ThreadRole.MAIN_LOOP: (core,)}, {ThreadRole.MAIN_LOOP: 40}
+        ).place({ThreadRole.MAIN_LOOP: waiting_thread})
+        assert placed_thread.cores == (core,)
+        assert placed_thread.fifo_priority is None
+        assert placed_thread.notes == ("SCHED_FIFO needs root",)
+        assert "SCHED_FIFO needs root" in str(placed_thread)
+
+    @needs_affinity
+    def test_fifo_only_for_pinned_threads(self, monkeypatch, waiting_thread):
+        calls = []
+        monkeypatch.setattr(os, "sched_setscheduler", lambda *args: calls.append(args))
+        ThreadPlacer({}, {ThreadRole.MAIN_LOOP: 40}).place({ThreadRole.MAIN_LOOP: waiting_thread})
+        assert calls == []
+
+    @needs_affinity
+    def test_pinning_fails(self, monkeypatch, waiting_thread):
+        def fail(*_):
+            raise OSError(22, "Invalid argument")
+
+        core = min(os.sched_getaffinity(0))
+        monkeypatch.setattr(os, "sched_setaffinity", fail)
+        (placed_thread,) = ThreadPlacer({ThreadRole.DISPLAY: (core,)}).place(
+            {ThreadRole.DISPLAY: waiting_thread}
+        )
+        assert placed_thread.notes == ("couldn't be pinned (Invalid argument)",)
+
+    def test_unsupported_os(self, monkeypatch, waiting_thread):
+        monkeypatch.delattr(os, "sched_setaffinity", raising=False)
+        (placed_thread,) = ThreadPlacer({ThreadRole.DISPLAY: (0,)}).place(
+            {ThreadRole.DISPLAY: waiting_thread}
+        )
+        assert placed_thread.cores == ()
+        assert placed_thread.notes == ("this OS can't pin threads",)
+        assert "cores ?" in str(placed_thread)
+
+    @needs_affinity
+    def test_thread_not_running(self):
+        thread = threading.Thread(target=lambda: None, name="Display Thread")
+        (placed_thread,) = ThreadPlacer({ThreadRole.DISPLAY: (0,)}).place(
+            {ThreadRole.DISPLAY: thread}
+        )
+        assert placed_thread.native_id is None
+        assert placed_thread.notes == ("not running",)
+
+
+def test_placed_thread_str():
+    placed_thread = PlacedThread(
+        role=ThreadRole.MAIN_LOOP,
+        name="MainThread",
+        native_id=1234,
+        cores=(2, 3),
+        fifo_priority=40,
+    )
+    assert str(placed_thread) == (
+        "Main Loop         cores 2,3              SCHED_FIFO 40  (MainThread, 1234)"
+    )
@@ -1,4 +1,5 @@
 import contextlib
+import math
 import queue
 import threading
 import time
@@ -7,6 +8,7 @@ from typing import TYPE_CHECKING
 import pytest
 
 from airbrakes.constants import (
+    CATCH_UP_PACKET_BUDGET,
     FIRM_SERIAL_TIMEOUT_SECONDS,
     SERVO_DELAY_SECONDS,
     ServoExtension,
@@ -22,6 +24,7 @@ from tests.auxil.utils import (
     make_apogee_predictor_data_packet,
     make_firm_data_packet,
     make_firm_data_packet_zeroed,
+    make_processor_data_packet,
 )
 
 if TYPE_CHECKING:
@@ -69,6 +72,68 @@ class TestContext:
         assert context.servo.duty_cycle == pytest.approx(expected_duty_cycle)
         context.stop()
 
+    def test_wait_until_started(self, context):
+        """Tests that it waits for the threads of the Logger and ApogeePredictor to be ready."""
+        assert not context.wait_until_started(timeout=0.01)
+        context.start()
+        assert context.wait_until_started(timeout=5)
+        assert context.logger._started.is_set()
+        assert context.apogee_predictor._started.is_set()
+        context.stop()
+
+    def test_wait_for_first_packet(self, context: Context, random_data_mock_firm):
+        """Tests that it waits until the first packets went all the way through update()."""
+        context.firm = random_data_mock_firm
+        context.start(wait_for_start=True)
+        assert not context.wait_for_first_packet(timeout=0.01)
+        threading.Timer(0.1, context.update).start()
+        assert context.wait_for_first_packet(timeout=5)
+        assert context.context_data_packet is not None
+        assert context.data_processor._last_data_packet is not None
+        context.stop()
+
+    def test_wait_for_state(self, monkeypatch, context: Context):
+        """Tests that it wakes up when the state changes, or when the air brakes are stopped."""
+        assert context.wait_for_state(StandbyState, timeout=0)
+        assert not context.wait_for_state(MotorBurnState, timeout=0.01)
+
+        # The state only changes in update(), as if the motor was ignited:
+        monkeypatch.setattr(StandbyState, "update", StandbyState.next_state)
+        context.firm._queue.put(make_firm_data_packet_zeroed())
+        context.start()
+        threading.Timer(0.1, context.update).start()
+        assert context.wait_for_state(MotorBurnState, timeout=5)
+
+        start = time.monotonic()
+        threading.Timer(0.1, context.stop).start()
+        assert not context.wait_for_state(CoastState, timeout=5)
+        assert time.monotonic() - start < 1
+        assert context.shutdown_requested
+
+    @pytest.mark.parametrize("catch_up_budget", [CATCH_UP_PACKET_BUDGET, None])
+    def test_update_catches_up_on_backlog(self, context: Context, catch_up_budget):
+        """
+        Tests that after a stall, the state machine only runs on a summary of the backlog, and
+        the whole backlog is handed to the logger in a single slot of the log queue.
+        """
+        context.catch_up_budget = catch_up_budget
+        context.state = MotorBurnState(context)
+        for i in range(200):
+            context.firm._queue.put(make_firm_data_packet(timestamp_seconds=i / 100))
+        context.update()
+
+        assert context.context_data_packet.retrieved_firm_packets == 200
+        assert context.data_processor.current_timestamp_seconds == 1.99
+        if catch_up_budget is None:
+            assert len(context.processor_data_packets) == 200
+            assert len(context.logger._log_queue) == 200
+        else:
+            assert 0 < len(context.processor_data_packets) <= catch_up_budget
+            assert context.processor_data_packets[-1].timestamp_seconds == 1.99
+            assert len(context.logger._log_queue) == 1
+        # Every row of the backlog is counted as waiting:
+        assert context.logger.log_queue_size == 200
+
     def test_stop_simple(self, context):
         """
         Tests that stop() shuts down all subsystems and zeroes the servo PWM
@@ -178,6 +243,8 @@ class TestContext:
 
         mocked_airbrakes = context
         mocked_airbrakes.firm = random_data_mock_firm
+        # The packets which pile up while we sleep are all processed in full:
+        mocked_airbrakes.catch_up_budget = None
         mocked_airbrakes.state = CoastState(
             mocked_airbrakes
         )  # Set to coast state to test apogee update
@@ -411,6 +478,53 @@ class TestContext:
 
         context.stop()
 
+    def test_nan_data_not_sent_to_apogee_predictor(self, context, monkeypatch):
+        """Tests that processed data with NaN readings isn't predicted from."""
+        packets = []
+        monkeypatch.setattr(
+            context.apogee_predictor.__class__, "update", lambda _, packet: packets.append(packet)
+        )
+        context.processor_data_packets = [make_processor_data_packet(current_altitude=math.nan)]
+        context.predict_apogee()
+        assert not packets
+
+        context.processor_data_packets = [make_processor_data_packet(current_altitude=100.0)]
+        context.predict_apogee()
+        assert packets == context.processor_data_packets
+
+    def test_servo_commands_are_tagged(self, context):
+        """Tests that each servo command is tagged with the loop and FIRM packet which caused it."""
+        context.generate_data_packets()
+        assert context.servo_data_packet.command_loop_id is None
+        assert context.servo_data_packet.actuation_latency_ns is None
+
+        context.loop_id = 7
+        context.firm_data_packets = [
+            make_firm_data_packet(timestamp_seconds=1.0),
+            make_firm_data_packet(timestamp_seconds=1.01),
+        ]
+        context.actuation_latency.receive(1.01)
+        context.extend_airbrakes()
+        servo_command = context.actuation_latency.last_command
+        assert servo_command.extension == ServoExtension.MAX_EXTENSION
+        assert servo_command.loop_id == 7
+        assert servo_command.firm_timestamp_seconds == 1.01
+        assert servo_command.issued_ns == context.servo.command_issued_ns
+        assert servo_command.latency_ns >= 0
+
+        context.generate_data_packets()
+        assert context.servo_data_packet.command_loop_id == 7
+        assert context.servo_data_packet.command_firm_timestamp_seconds == 1.01
+        assert context.servo_data_packet.actuation_latency_ns == servo_command.latency_ns
+
+        # The air brakes are retracted at shutdown even if there are no packets:
+        context.firm_data_packets = []
+        context.retract_airbrakes()
+        assert context.actuation_latency.last_command.extension == ServoExtension.MIN_EXTENSION
+        assert math.isnan(context.actuation_latency.last_command.firm_timestamp_seconds)
+        assert context.actuation_latency.last_command.latency_ns is None
+        assert context.actuation_latency.histogram.count == 1
+
     def test_airbrakes_receives_apogee_predictor_packet(
         self, context: Context, monkeypatch, random_data_mock_firm
     ):
@@ -473,6 +587,8 @@ class TestContext:
         assert context.context_data_packet.state == StandbyState
         assert context.context_data_packet.retrieved_firm_packets == 0
         assert context.context_data_packet.apogee_predictor_queue_size >= 0
+        assert context.context_data_packet.log_queue_high_watermark == 0
+        assert context.context_data_packet.dropped_log_packets == 0
         assert context.context_data_packet.update_timestamp_ns == pytest.approx(
             time.time_ns(), rel=1e9
         )
@@ -1,3 +1,5 @@
+import time
+
 import pytest
 
 from airbrakes.constants import ServoExtension
@@ -54,6 +56,17 @@ class TestBaseServo:
         servo.retract_airbrakes()
         assert servo.servo_extension == ServoExtension.MIN_EXTENSION
 
+    def test_command_issued_ns(self, servo):
+        """
+        Tests that the time the PWM signal was changed at is kept, to measure the latency of the
+        servo commands.
+        """
+        assert servo.command_issued_ns == 0
+        before_ns = time.perf_counter_ns()
+        servo.extend_airbrakes()
+        assert before_ns <= servo.command_issued_ns <= time.perf_counter_ns()
+        servo.stop()
+
     def test_repeated_extension_retraction(self, servo):
         """
         Tests that repeatedly extending and retracting the servo works as
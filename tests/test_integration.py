@@ -2,15 +2,15 @@
 Tests the full integration of the airbrakes system.
 
 This is done by reading data from a previous
-launch and manually verifying the data output by the code. This test will run at full speed in the
-CI. To run it in real time, see `main.py` or instructions in the `README.md`.
+launch and manually verifying the data output by the code. The launch is run in lockstep with its
+data, so this test runs at full speed in the CI, and the same way every time. To run it in real
+time, see `main.py` or instructions in the `README.md`.
 """
 
-from typing import TYPE_CHECKING
-
 import polars as pl
 
-from airbrakes.constants import STOP_SIGNAL, ServoExtension
+from airbrakes.constants import ServoExtension
+from airbrakes.data_handling.log_reader import scan_log
 from airbrakes.data_handling.packets.logger_data_packet import LoggerDataPacket
 from tests.auxil.launch_cases import (
     JackPotLaunchCase1,
@@ -18,46 +18,6 @@ from tests.auxil.launch_cases import (
     StateInformation,
 )
 
-if TYPE_CHECKING:
-    from firm_client import FIRMDataPacket
-
-SNAPSHOT_INTERVAL = 0.001  # seconds
-
-
-def get_some_packets(
-    self, block: bool = True, max_packets_to_fetch: int = 5
-) -> list[FIRMDataPacket]:
-    """
-    Keep this the same as the one in mock_firm.py.
-
-    This is here because we need to limit the number of packets received
-    for the integration test, so it doesn't skip over data and fails
-    test cases.
-    :param max_packets_to_fetch: The maximum number of packets to fetch.
-        0 means no limit.
-    """
-    items = []
-
-    if block:
-        # Block until at least one item is available
-        item = self._queued_packets.get(block=True)
-        if item == STOP_SIGNAL:
-            return items
-        items.append(item)
-
-    # Drain the rest of the queue, non-blocking
-    while not self._queued_packets.empty() and (
-        max_packets_to_fetch == 0 or len(items) < max_packets_to_fetch
-    ):
-        item = self._queued_packets.get(block=block)
-
-        # If we hit the stop signal
-        if item == STOP_SIGNAL:
-            break
-
-        items.append(item)
-    return items
-
 
 class TestIntegration:
     """
@@ -71,7 +31,7 @@ class TestIntegration:
         self,
         request,
         target_altitude,
-        mock_firm_airbrakes,
+        lockstep_simulation,
         monkeypatch,
     ):
         """
@@ -103,20 +63,18 @@ class TestIntegration:
         # here, and not in the actual state module.
 
         monkeypatch.setattr("airbrakes.state.TARGET_APOGEE_METERS", target_altitude)
-        monkeypatch.setattr("airbrakes.mock.mock_firm.MockFIRM.get_data_packets", get_some_packets)
 
         states_dict: dict[str, StateInformation] = {}
 
-        ab = mock_firm_airbrakes
-
-        # Start testing!
-        snap_start_timer = ab.data_processor.current_timestamp_seconds
-        ab.start(wait_for_start=True)
+        ab = lockstep_simulation.context
 
-        # Run until the patched method in our IMU has finished (i.e. the data is exhausted)
-        while ab.firm.is_running or ab.firm._queued_packets.qsize() > 0:
-            ab.update()
-            if ab.data_processor.current_timestamp_seconds - snap_start_timer >= SNAPSHOT_INTERVAL:
+        # Start testing! The simulation hands the main loop one packet per loop, so we can
+        # snapshot the system after every loop without skipping over any data:
+        lockstep_simulation.start()
+        running = True
+        while running:
+            running = lockstep_simulation.step()
+            if ab.firm_data_packets:
                 if ab.state.name not in states_dict:
                     # Reset the current state velocities and altitudes
                     states_dict[ab.state.name] = StateInformation(
@@ -175,11 +133,8 @@ class TestIntegration:
                 # Update the state information in the dictionary
                 states_dict[ab.state.name] = state_info
 
-                # Reset the snapshot timer
-                snap_start_timer = ab.data_processor.current_timestamp_seconds
-
         # Stop the airbrakes system after the data is exhausted from the csv file:
-        ab.stop()
+        lockstep_simulation.stop()
 
         # Let's validate our data!
         launch_case_init = launch_case(states_dict, target_altitude)
@@ -205,7 +160,7 @@ class TestIntegration:
         # Now let's check if everything was logged correctly using polars
 
         # Read the log file into a polars DataFrame
-        df = pl.read_csv(ab.logger.log_path)
+        df = scan_log(ab.logger.log_path).collect()
 
         # Check if all headers were logged
         assert list(df.columns) == list(LoggerDataPacket.__struct_fields__)
@@ -214,7 +169,7 @@ class TestIntegration:
         first_row = df.row(0, named=True)
 
         # Check if values are rounded to 8 decimal places
-        accel = first_row["est_acceleration_z_gs"]
+        accel = first_row["raw_acceleration_z_gs"]
         accel_str = str(accel)
         assert accel_str.count(".") == 1
         assert len(accel_str.split(".")[1]) in [7, 8]  # polars might drop trailing zeros
@@ -4,7 +4,7 @@ import sys
 
 import pytest
 
-from airbrakes.constants import LOGS_PATH
+from airbrakes.constants import CATCH_UP_PACKET_BUDGET, LOGS_PATH, PI_THREAD_CORES
 from airbrakes.data_handling.apogee_predictor import ApogeePredictor
 from airbrakes.data_handling.data_processor import DataProcessor
 from airbrakes.data_handling.logger import Logger
@@ -12,6 +12,8 @@ from airbrakes.hardware.firm import FIRM
 from airbrakes.hardware.servo import Servo
 from airbrakes.main import (
     create_components,
+    get_catch_up_budget,
+    get_thread_cores,
     run_flight,
     run_mock_flight,
     run_real_flight,
@@ -37,7 +39,7 @@ class MockedServo:
 def _clear_directory():
     """Clear the tests/logs directory after running each test."""
     yield
-    for log in LOGS_PATH.glob("log_*.csv"):
+    for log in LOGS_PATH.glob("log_*"):
         log.unlink()
 
 
@@ -255,3 +257,29 @@ def test_run_flight(monkeypatch, mocked_args_parser):
     assert len(called_args[1]) == 2
     assert isinstance(called_args[1][0], PatchedContext)
     assert called_args[1][1] == mocked_args_parser
+
+
+@pytest.mark.parametrize(
+    ("mode", "pin_threads", "expected"),
+    [
+        ("real", None, PI_THREAD_CORES),
+        ("pretend", None, PI_THREAD_CORES),
+        ("mock", None, {}),
+        ("mock", True, PI_THREAD_CORES),
+        ("real", False, {}),
+    ],
+)
+def test_get_thread_cores(mocked_args_parser, mode, pin_threads, expected):
+    """Tests that the threads are pinned by default in the modes which fly on the Pi."""
+    mocked_args_parser.mode = mode
+    mocked_args_parser.pin_threads = pin_threads
+    assert get_thread_cores(mocked_args_parser) == expected
+
+
+@pytest.mark.parametrize(
+    ("catch_up_budget", "expected"),
+    [(None, CATCH_UP_PACKET_BUDGET), (50, 50), (0, None)],
+)
+def test_get_catch_up_budget(mocked_args_parser, catch_up_budget, expected):
+    mocked_args_parser.catch_up_budget = catch_up_budget
+    assert get_catch_up_budget(mocked_args_parser) == expected
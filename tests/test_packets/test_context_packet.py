@@ -10,6 +10,8 @@ def context_packet():
         state=StandbyState,
         retrieved_firm_packets=0,
         apogee_predictor_queue_size=1,
+        log_queue_high_watermark=3,
+        dropped_log_packets=0,
         update_timestamp_ns=4782379489276,
     )
 
@@ -21,6 +23,8 @@ class TestContextDataPacket:
     state_letter = "S"
     queued_imu_packets = 1
     apogee_predictor_queue_size = 1
+    log_queue_high_watermark = 3
+    dropped_log_packets = 0
     imu_packets_per_cycle = 2
     update_timestamp = 4782379489276
 
@@ -29,6 +33,8 @@ class TestContextDataPacket:
         assert packet.state.__name__[0] == self.state_letter
         assert packet.retrieved_firm_packets == self.retrieved_imu_packets
         assert packet.apogee_predictor_queue_size == self.apogee_predictor_queue_size
+        assert packet.log_queue_high_watermark == self.log_queue_high_watermark
+        assert packet.dropped_log_packets == self.dropped_log_packets
         assert packet.update_timestamp_ns == self.update_timestamp
 
     def test_required_args(self):
@@ -3,7 +3,7 @@ from pathlib import Path
 
 import pytest
 
-from airbrakes.utils import arg_parser, deadband
+from airbrakes.utils import arg_parser, deadband, summarize_backlog
 
 
 def test_deadband():
@@ -14,6 +14,26 @@ def test_deadband():
     assert deadband(-1.0, 0.5) == -1.0
 
 
+@pytest.mark.parametrize(
+    ("packets", "budget", "expected"),
+    [
+        (list(range(10)), None, list(range(10))),
+        (list(range(10)), 10, list(range(10))),
+        (list(range(10)), 5, [1, 3, 5, 7, 9]),
+        (list(range(100)), 20, list(range(4, 100, 5))),
+        (list(range(101)), 20, list(range(4, 101, 6))),
+        (list(range(10)), 1, [9]),
+        ([], 5, []),
+    ],
+)
+def test_summarize_backlog(packets, budget, expected):
+    """Tests that the packets kept are spread evenly, end with the newest, and fit the budget."""
+    summary = summarize_backlog(packets, budget)
+    assert summary == expected
+    if budget is not None:
+        assert len(summary) <= budget
+
+
 class TestArgumentParsing:
     """Tests for the updated argument parsing function (arg_parser())."""
 
@@ -28,10 +48,23 @@ class TestArgumentParsing:
         monkeypatch.setattr(sys, "argv", ["main.py", "real", "-v", "-s"])
 
         args = arg_parser()
-        assert args.__dict__.keys() == {"mode", "verbose", "debug", "mock_servo"}
+        assert args.__dict__.keys() == {
+            "mode",
+            "verbose",
+            "debug",
+            "profile",
+            "profile_log",
+            "pin_threads",
+            "catch_up_budget",
+            "mock_servo",
+        }
         assert args.mode == "real"
         assert args.verbose is True
         assert args.debug is False
+        assert args.profile is False
+        assert args.profile_log is False
+        assert args.pin_threads is None
+        assert args.catch_up_budget is None
         assert args.mock_servo is True
 
     def test_mock_mode(self, monkeypatch):
@@ -48,9 +81,16 @@ class TestArgumentParsing:
             "real_servo",
             "keep_log_file",
             "fast_replay",
+            "speed",
+            "arrivals",
+            "start_at",
             "path",
             "verbose",
             "debug",
+            "profile",
+            "profile_log",
+            "pin_threads",
+            "catch_up_budget",
         }
         assert args.mode == "mock"
         assert args.real_servo is True
@@ -60,6 +100,27 @@ class TestArgumentParsing:
         assert args.verbose is False
         assert args.debug is False
 
+    def test_mock_mode_replay_speed(self, monkeypatch, capsys):
+        """Tests the speed of the mock replay, which can't be used with a fast replay."""
+        monkeypatch.setattr(sys, "argv", ["main.py", "mock"])
+        assert arg_parser().speed == 1.0
+
+        monkeypatch.setattr(sys, "argv", ["main.py", "mock", "--speed", "2.5"])
+        assert arg_parser().speed == 2.5
+
+        monkeypatch.setattr(sys, "argv", ["main.py", "mock", "-f", "--speed", "2.5"])
+        with pytest.raises(SystemExit):
+            arg_parser()
+        assert "not allowed with argument" in capsys.readouterr().err
+
+    def test_mock_mode_start_at(self, monkeypatch):
+        """Tests the point a mock replay starts at, which is parsed by the replay."""
+        monkeypatch.setattr(sys, "argv", ["main.py", "mock"])
+        assert arg_parser().start_at is None
+
+        monkeypatch.setattr(sys, "argv", ["main.py", "mock", "--start-at", "MotorBurn-2"])
+        assert arg_parser().start_at == "MotorBurn-2"
+
     def test_pretend_mode(self, monkeypatch):
         """Tests 'pretend' mode arguments."""
         path_str = "mock/data/firm.FRM"
@@ -69,6 +130,83 @@ class TestArgumentParsing:
         assert args.mode == "pretend"
         assert args.path == Path(path_str)
 
+    @pytest.mark.parametrize(
+        "mode_args",
+        [["real"], ["mock"], ["pretend", "-p", "a.FRM"]],
+        ids=["real", "mock", "pretend"],
+    )
+    def test_profile_flags(self, monkeypatch, mode_args):
+        """Tests the flags which profile the main loop, in every mode which runs it."""
+        monkeypatch.setattr(sys, "argv", ["main.py", *mode_args, "--profile"])
+        args = arg_parser()
+        assert args.profile is True
+        assert args.profile_log is False
+
+        monkeypatch.setattr(sys, "argv", ["main.py", *mode_args, "--profile-log"])
+        assert arg_parser().profile_log is True
+
+    @pytest.mark.parametrize(
+        "mode_args",
+        [["real"], ["mock"], ["pretend", "-p", "a.FRM"]],
+        ids=["real", "mock", "pretend"],
+    )
+    def test_pin_threads_flags(self, monkeypatch, mode_args):
+        """Tests the flags which pin the threads of the main loop, in every mode which runs it."""
+        monkeypatch.setattr(sys, "argv", ["main.py", *mode_args])
+        assert arg_parser().pin_threads is None
+        monkeypatch.setattr(sys, "argv", ["main.py", *mode_args, "--pin-threads"])
+        assert arg_parser().pin_threads is True
+        monkeypatch.setattr(sys, "argv", ["main.py", *mode_args, "--no-pin-threads"])
+        assert arg_parser().pin_threads is False
+
+    def test_catch_up_budget_flag(self, monkeypatch):
+        monkeypatch.setattr(sys, "argv", ["main.py", "mock", "--catch-up-budget", "50"])
+        assert arg_parser().catch_up_budget == 50
+
+    def test_regress_mode(self, monkeypatch):
+        """Tests 'regress' mode arguments and defaults."""
+        monkeypatch.setattr(sys, "argv", ["main.py", "regress"])
+        args = arg_parser()
+        assert args.__dict__.keys() == {
+            "mode",
+            "path",
+            "synthetic",
+            "target_apogee",
+            "jobs",
+            "output",
+            "faults",
+            "no_timing",
+            "verbose",
+            "debug",
+        }
+        assert args.path is None
+        assert args.synthetic is None
+        assert args.jobs is None
+        assert args.faults is False
+        assert args.no_timing is False
+
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "main.py",
+                "regress",
+                "-p",
+                "a.csv",
+                "b.FRM",
+                "--synthetic",
+                "0",
+                "-j",
+                "2",
+                "--faults",
+            ],
+        )
+        args = arg_parser()
+        assert args.path == [Path("a.csv"), Path("b.FRM")]
+        assert args.synthetic == 0
+        assert args.jobs == 2
+        assert args.faults is True
+
     def test_verbose_and_debug_exclusivity(self, monkeypatch, capsys):
         """Tests that the `-v` and `-d` flags are mutually exclusive."""
         monkeypatch.setattr(sys, "argv", ["main.py", "real", "-v", "-d"])